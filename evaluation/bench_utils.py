@@ -0,0 +1,94 @@
+"""
+Shared helpers for the evaluation benchmarks.
+
+The benchmarks normally use the configured EMBEDDING_MODEL. With
+--random-weights they build a model with the same architecture as
+all-MiniLM-L6-v2 (6 layers, 384 hidden, 12 heads) but random weights and a
+vocabulary taken from the guides in DATA_DIR, so latency can be measured
+offline without downloading anything. Scores from such a model are
+meaningless; timings are representative.
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import tempfile
+import statistics
+from typing import Callable, Dict, List
+
+import numpy as np
+
+DATA_DIR = os.getenv('DATA_DIR', './data')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+TEST_QUERIES_PATH = os.path.join(os.path.dirname(__file__), 'test_queries.json')
+
+
+def load_test_queries() -> List[str]:
+    with open(TEST_QUERIES_PATH, 'r', encoding='utf-8') as f:
+        return [q['query'] for q in json.load(f)]
+
+
+def load_guide_texts(data_dir: str = DATA_DIR) -> Dict[str, str]:
+    texts = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, '*.md'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            texts[os.path.basename(path)] = f.read()
+    return texts
+
+
+def _build_random_minilm(data_dir: str) -> str:
+    """Write a MiniLM-shaped, randomly initialised BERT model to a temp dir."""
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    words = set()
+    for text in load_guide_texts(data_dir).values():
+        words.update(re.findall(r"[a-z0-9]+", text.lower()))
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + sorted(words)
+
+    model_dir = tempfile.mkdtemp(prefix='random-minilm-')
+    with open(os.path.join(model_dir, 'vocab.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(vocab))
+    tokenizer = BertTokenizerFast(vocab_file=os.path.join(model_dir, 'vocab.txt'))
+    config = BertConfig(
+        vocab_size=len(vocab), hidden_size=384, num_hidden_layers=6,
+        num_attention_heads=12, intermediate_size=1536, max_position_embeddings=512
+    )
+    BertModel(config).save_pretrained(model_dir)
+    tokenizer.save_pretrained(model_dir)
+    return model_dir
+
+
+def load_embedding_model(random_weights: bool = False, data_dir: str = DATA_DIR):
+    """The configured embedding model, or an offline stand-in of the same shape."""
+    from sentence_transformers import SentenceTransformer, models
+
+    if not random_weights:
+        return SentenceTransformer(EMBEDDING_MODEL)
+    transformer = models.Transformer(_build_random_minilm(data_dir), max_seq_length=256)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension())
+    return SentenceTransformer(modules=[transformer, pooling])
+
+
+def time_call(fn: Callable, repeat: int = 20, warmup: int = 2) -> Dict[str, float]:
+    """Median and p95 wall time of fn() in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'median_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def random_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
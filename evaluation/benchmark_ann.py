@@ -0,0 +1,123 @@
+"""
+Recall@k and latency of approximate FAISS indexes against the exact flat index.
+
+Vectors come from the current index in VECTOR_DB_PATH (when it is flat) or
+from a synthetic clustered corpus of --num-vectors vectors, which better
+resembles sentence embeddings than uniform noise. Queries are perturbed
+corpus vectors, so every query has meaningful near neighbours.
+
+Usage:
+    python -m evaluation.benchmark_ann --num-vectors 100000 \\
+        --hnsw-ef-search 16,64,128 --ivf-nprobe 1,8,32
+"""
+
+import os
+import time
+import argparse
+from typing import Dict, List
+
+import numpy as np
+import faiss
+
+from evaluation.bench_utils import time_call
+from rag.ann import build_index, apply_search_params
+from rag.snapshots import active_path
+
+VECTOR_DB_PATH = os.getenv('VECTOR_DB_PATH', './data/vector_db')
+
+
+def load_corpus(num_vectors: int, dim: int, use_existing: bool, seed: int = 0) -> np.ndarray:
+    index_path = os.path.join(active_path(VECTOR_DB_PATH), 'faiss.index')
+    if use_existing and os.path.exists(index_path):
+        index = faiss.read_index(index_path)
+        if isinstance(index, faiss.IndexFlat):
+            print(f"Using {index.ntotal} vectors from {index_path}")
+            return index.reconstruct_n(0, index.ntotal)
+        print(f"{index_path} is not a flat index; falling back to synthetic vectors")
+
+    rng = np.random.default_rng(seed)
+    num_clusters = max(1, num_vectors // 200)
+    centers = rng.standard_normal((num_clusters, dim)).astype('float32')
+    assignment = rng.integers(0, num_clusters, num_vectors)
+    vectors = centers[assignment] + 0.35 * rng.standard_normal((num_vectors, dim)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(corpus: np.ndarray, num_queries: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.integers(0, len(corpus), num_queries)]
+    noisy = picks + 0.05 * rng.standard_normal(picks.shape).astype('float32')
+    return noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / (len(truth) * k)
+
+
+def evaluate(index, queries: np.ndarray, truth: np.ndarray, k: int, repeat: int) -> Dict[str, float]:
+    _, found = index.search(queries, k)
+    single = queries[:1]
+    latency = time_call(lambda: index.search(single, k), repeat=repeat)
+    return {
+        'recall': recall_at_k(truth, found),
+        'latency_ms': latency['median_ms'],
+        'p95_ms': latency['p95_ms'],
+        'bytes': faiss.serialize_index(index).nbytes,
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num-vectors', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--num-queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--use-existing', action='store_true', help='benchmark the vectors in VECTOR_DB_PATH')
+    parser.add_argument('--hnsw-m', type=int, default=32)
+    parser.add_argument('--hnsw-ef-search', type=_int_list, default=[16, 64, 128])
+    parser.add_argument('--ivf-nlist', type=int, default=0, help='0 = min(4 * sqrt(N), N / 39)')
+    parser.add_argument('--ivf-nprobe', type=_int_list, default=[1, 8, 32])
+    parser.add_argument('--pq-m', type=int, default=16)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.num_vectors, args.dim, args.use_existing)
+    queries = make_queries(corpus, args.num_queries)
+    nlist = args.ivf_nlist or max(1, min(int(4 * np.sqrt(len(corpus))), len(corpus) // 39))
+
+    flat, _ = build_index(corpus, 'flat')
+    _, truth = flat.search(queries, args.k)
+    rows = [('flat', '', 0.0, evaluate(flat, queries, truth, args.k, args.repeat))]
+
+    configs = [('hnsw', {'hnsw_m': args.hnsw_m, 'ef_search': ef}, f"M={args.hnsw_m} efSearch={ef}")
+               for ef in args.hnsw_ef_search]
+    configs += [(kind, {'nlist': nlist, 'nprobe': p, 'pq_m': args.pq_m}, f"nlist={nlist} nprobe={p}"
+                 + (f" pq_m={args.pq_m}" if kind == 'ivf_pq' else ''))
+                for kind in ('ivf_flat', 'ivf_pq') for p in args.ivf_nprobe]
+
+    built = {}
+    for kind, params, label in configs:
+        # Search-time parameters do not need a rebuild; reuse one index per type.
+        if kind not in built:
+            start = time.perf_counter()
+            built[kind] = build_index(corpus, kind, params)[0]
+            built[kind + '_build_s'] = time.perf_counter() - start
+        index = built[kind]
+        apply_search_params(index, {'index_type': kind, 'params': params})
+        rows.append((kind, label, built[kind + '_build_s'], evaluate(index, queries, truth, args.k, args.repeat)))
+
+    print(f"\n{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'type':<9} {'params':<32} {'build s':>8} {f'recall@{args.k}':>9} {'p50 ms':>8} {'p95 ms':>8} {'size MB':>8}")
+    for kind, label, build_s, r in rows:
+        print(f"{kind:<9} {label:<32} {build_s:>8.2f} {r['recall']:>9.3f} {r['latency_ms']:>8.3f} "
+              f"{r['p95_ms']:>8.3f} {r['bytes'] / 1e6:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
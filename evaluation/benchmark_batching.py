@@ -0,0 +1,87 @@
+"""
+Throughput of concurrent retrievals with and without cross-request batching.
+
+--concurrency threads each run --requests single-variant searches (distinct
+queries, so the query embedding cache never hits) through a RetrievalCoalescer,
+once with batching disabled and once enabled. Reports requests per second,
+latency percentiles and the coalescer's batch-size distribution.
+
+Usage:
+    python -m evaluation.benchmark_batching [--random-weights] [--concurrency 1,8,32]
+"""
+
+import time
+import argparse
+import threading
+from typing import List
+
+import faiss
+import numpy as np
+
+from evaluation.bench_utils import load_embedding_model, load_test_queries, random_vectors
+from rag.batcher import RetrievalCoalescer
+from rag.embedding_cache import QueryEmbeddingCache
+
+
+def run(coalescer: RetrievalCoalescer, model, index, queries: List[str], concurrency: int,
+        requests: int, top_k: int):
+    encode_fn = lambda texts: model.encode(texts, convert_to_numpy=True)  # noqa: E731
+    cache = QueryEmbeddingCache(max_entries=0)
+    latencies: List[float] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+
+    def worker(worker_id: int):
+        barrier.wait()
+        for i in range(requests):
+            query = f"{queries[(worker_id + i) % len(queries)]} ({worker_id}-{i})"
+            start = time.perf_counter()
+            with coalescer.announce() as ticket:
+                coalescer.search(ticket, [query], top_k, 'bench', encode_fn, index, cache)
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--random-weights', action='store_true', help='offline MiniLM-shaped model with random weights')
+    parser.add_argument('--num-chunks', type=int, default=10000, help='size of the synthetic flat index')
+    parser.add_argument('--concurrency', type=_int_list, default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=20, help='requests per thread')
+    parser.add_argument('--window-ms', type=float, default=3.0)
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    model = load_embedding_model(random_weights=args.random_weights)
+    dim = model.encode(['probe']).shape[1]
+    index = faiss.IndexFlatL2(dim)
+    index.add(random_vectors(args.num_chunks, dim))
+    queries = load_test_queries()
+
+    print(f"Flat index: {args.num_chunks} x {dim}, window={args.window_ms} ms, max batch={args.max_batch}")
+    print(f"{'threads':>7} | {'mode':>8} | {'req/s':>7} | {'p50 ms':>7} | {'p95 ms':>7} | batch sizes")
+    for concurrency in args.concurrency:
+        for enabled in (False, True):
+            coalescer = RetrievalCoalescer(args.window_ms, args.max_batch, enabled=enabled)
+            rps, p50, p95 = run(coalescer, model, index, queries, concurrency, args.requests, args.top_k)
+            stats = coalescer.stats()
+            print(f"{concurrency:>7} | {'batched' if enabled else 'single':>8} | {rps:>7.1f} | {p50:>7.1f} | "
+                  f"{p95:>7.1f} | mean {stats['mean_batch_size']}, queue p95 {stats['queue_ms_p95']} ms")
+
+
+if __name__ == '__main__':
+    main()
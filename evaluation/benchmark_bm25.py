@@ -0,0 +1,72 @@
+"""
+Build time and per-query latency of the BM25 index over the guide chunks.
+
+The guides in DATA_DIR are chunked exactly as rag.indexing does; --replicate
+repeats the corpus to estimate how lexical search scales with more chunks.
+Reciprocal rank fusion of a dense and a lexical ranking is timed separately,
+since together they are what hybrid mode adds on top of dense retrieval.
+
+Usage:
+    python -m evaluation.benchmark_bm25 --replicate 1,10,100
+"""
+
+import time
+import argparse
+from typing import List
+
+import numpy as np
+
+from evaluation.bench_utils import time_call, load_test_queries, load_guide_texts
+from rag.bm25 import BM25Index, reciprocal_rank_fusion
+
+# Same defaults as rag.indexing, without importing it (it reads its own env)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def chunk_guides(chunk_size: int, overlap: int) -> List[str]:
+    chunks = []
+    for text in load_guide_texts().values():
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_size, len(text))
+            chunks.append(text[start:end])
+            if end == len(text):
+                break
+            start += chunk_size - overlap
+    return chunks
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replicate', type=_int_list, default=[1, 10, 100])
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    base = chunk_guides(CHUNK_SIZE, CHUNK_OVERLAP)
+    queries = load_test_queries() + ['STAR method', 'LinkedIn summary']
+
+    print(f"{'chunks':>8} {'terms':>7} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'rrf ms':>8} {'size MB':>8}")
+    for factor in args.replicate:
+        corpus = base * factor
+        start = time.perf_counter()
+        index = BM25Index.build(corpus)
+        build_s = time.perf_counter() - start
+
+        per_query = [time_call(lambda q=q: index.search(q, args.k), repeat=args.repeat) for q in queries]
+        p50 = float(np.median([t['median_ms'] for t in per_query]))
+        p95 = float(np.median([t['p95_ms'] for t in per_query]))
+        dense_ids = np.arange(args.k)
+        lexical_ids, _ = index.search(queries[0], args.k)
+        rrf = time_call(lambda: reciprocal_rank_fusion([dense_ids, lexical_ids]), repeat=args.repeat)
+        print(f"{len(corpus):>8} {len(index.terms):>7} {build_s:>8.2f} {p50:>8.3f} {p95:>8.3f} "
+              f"{rrf['median_ms']:>8.3f} {index.nbytes / 1e6:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Latency of agenerate_response while the primary provider is down.
+
+A simulated Gemini fails every call after --failure-ms, as a provider
+timing out would; a simulated OpenAI answers after --fallback-ms. Sends
+--requests distinct prompts, --concurrency at a time, through LLMClient
+with the circuit breakers disabled and enabled, then lets Gemini recover
+and reports how long the enabled breaker took to send traffic back to it
+(--open-seconds cool-down before the trial call).
+
+Usage:
+    python -m evaluation.benchmark_circuit_breaker [--requests 100] [--failure-ms 1000]
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import statistics
+from unittest.mock import Mock, patch
+
+from mcp_server.circuit_breaker import CircuitBreaker
+from mcp_server.llm_client import LLMClient
+
+
+class SimulatedProvider:
+    def __init__(self, delay_ms: float, text: str, failing: bool = False):
+        self.delay = delay_ms / 1000
+        self.text = text
+        self.failing = failing
+        self.calls = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.failing:
+            raise TimeoutError(f"no response after {self.delay:.1f}s")
+        return Mock(text=self.text, choices=[Mock(message=Mock(content=self.text))])
+
+
+def make_client(args, enabled: bool):
+    with patch.dict(os.environ, {'DEFAULT_LLM': 'gemini-2.5-flash', 'LLM_CACHE_ENABLED': 'false'}, clear=True):
+        client = LLMClient()
+    client.breakers = {name: CircuitBreaker(name, enabled=enabled, open_seconds=args.open_seconds)
+                       for name in ('gemini', 'openai')}
+    gemini = SimulatedProvider(args.failure_ms, "Gemini answer", failing=True)
+    client.gemini_client = Mock(generate_content_async=gemini)
+    client.openai_async_client = Mock()
+    client.openai_async_client.chat.completions.create = SimulatedProvider(args.fallback_ms, "OpenAI answer")
+    return client, gemini
+
+
+async def run(client, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.agenerate_response(f"Career question {i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, time.perf_counter() - start
+
+
+async def recovery(client, gemini, step_seconds: float = 0.1):
+    """Seconds after Gemini recovers until a request is answered by it again."""
+    gemini.failing = False
+    start = time.perf_counter()
+    while await client.agenerate_response(f"Recovery probe {time.perf_counter()}") != "Gemini answer":
+        await asyncio.sleep(step_seconds)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--failure-ms', type=float, default=1000)
+    parser.add_argument('--fallback-ms', type=float, default=300)
+    parser.add_argument('--open-seconds', type=float, default=2)
+    args = parser.parse_args()
+
+    print(f"Gemini failing after {args.failure_ms:.0f} ms, OpenAI answering in {args.fallback_ms:.0f} ms; "
+          f"{args.requests} requests, {args.concurrency} concurrent")
+    print(f"  {'breaker':<10} {'p50 ms':>8} {'p95 ms':>8} {'wall s':>7} {'gemini calls':>13}")
+    for enabled in (False, True):
+        client, gemini = make_client(args, enabled)
+        latencies, wall = asyncio.run(run(client, args.requests, args.concurrency))
+        latencies.sort()
+        print(f"  {'enabled' if enabled else 'disabled':<10} {statistics.median(latencies):>8.0f} "
+              f"{latencies[int(len(latencies) * 0.95)]:>8.0f} {wall:>7.1f} {gemini.calls:>13}")
+        if enabled:
+            seconds = asyncio.run(recovery(client, gemini))
+            states = ' -> '.join(['closed'] + [t['to'] for t in client.breakers['gemini'].transitions])
+            print(f"  Gemini answering again {seconds:.1f} s after it recovered ({args.open_seconds:g} s cool-down)")
+            print(f"  Gemini circuit: {states}")
+
+
+if __name__ == '__main__':
+    main()
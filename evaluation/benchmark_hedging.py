@@ -0,0 +1,98 @@
+"""
+Tail latency of agenerate_response with and without hedged requests.
+
+A simulated Gemini answers in a log-normal time around --primary-ms, except
+for a --straggler-rate share of calls that take --straggler-ms; a simulated
+OpenAI answers around --secondary-ms. Sends --requests distinct prompts,
+--concurrency at a time, through LLMClient with hedging off and on (the
+HedgePolicy defaults: p95 delay, 10% budget), and reports latency
+percentiles, extra OpenAI calls and how often the hedge won.
+
+Usage:
+    python -m evaluation.benchmark_hedging [--requests 1000] [--straggler-rate 0.04]
+"""
+
+import os
+import time
+import random
+import asyncio
+import argparse
+from unittest.mock import Mock, patch
+
+from mcp_server.hedging import HedgePolicy
+from mcp_server.llm_client import LLMClient
+
+
+class SimulatedProvider:
+    def __init__(self, text: str, median_ms: float, rng: random.Random,
+                 straggler_rate: float = 0.0, straggler_ms: float = 0.0):
+        self.text = text
+        self.median = median_ms / 1000
+        self.rng = rng
+        self.straggler_rate = straggler_rate
+        self.straggler = straggler_ms / 1000
+        self.calls = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.rng.random() < self.straggler_rate:
+            seconds = self.straggler
+        else:
+            seconds = self.median * self.rng.lognormvariate(0, 0.3)
+        await asyncio.sleep(seconds)
+        return Mock(text=self.text, choices=[Mock(message=Mock(content=self.text))])
+
+
+def make_client(args, hedging: bool):
+    with patch.dict(os.environ, {'DEFAULT_LLM': 'gemini-2.5-flash', 'LLM_CACHE_ENABLED': 'false'}, clear=True):
+        client = LLMClient()
+    client.hedge = HedgePolicy(enabled=hedging)
+    rng = random.Random(args.seed)
+    client.gemini_client = Mock(generate_content_async=SimulatedProvider(
+        "Gemini answer", args.primary_ms, rng, args.straggler_rate, args.straggler_ms))
+    client.openai_async_client = Mock()
+    client.openai_async_client.chat.completions.create = SimulatedProvider("OpenAI answer", args.secondary_ms, rng)
+    return client
+
+
+async def run(client, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.agenerate_response(f"Career question {i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--primary-ms', type=float, default=400)
+    parser.add_argument('--straggler-rate', type=float, default=0.04)
+    parser.add_argument('--straggler-ms', type=float, default=4000)
+    parser.add_argument('--secondary-ms', type=float, default=600)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Gemini ~{args.primary_ms:.0f} ms with {args.straggler_rate:.0%} of calls at {args.straggler_ms:.0f} ms, "
+          f"OpenAI ~{args.secondary_ms:.0f} ms; {args.requests} requests, {args.concurrency} concurrent")
+    print(f"  {'hedging':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'extra calls':>12} {'hedges won':>11} {'delay ms':>9}")
+    for hedging in (False, True):
+        client = make_client(args, hedging)
+        latencies = asyncio.run(run(client, args.requests, args.concurrency))
+        stats = client.hedge.stats()
+        extra = client.openai_async_client.chat.completions.create.calls / args.requests
+        p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+        print(f"  {'on' if hedging else 'off':<8} {p(0.5):>8.0f} {p(0.95):>8.0f} {p(0.99):>8.0f} {latencies[-1]:>8.0f} "
+              f"{extra:>12.1%} {stats['won']:>5}/{stats['fired']:<5} {stats['delay_ms']:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Throughput and peak memory of the streaming ingestion pipeline.
+
+Builds synthetic corpora by replicating the guides --copies times (each copy
+is tagged so its chunks are distinct), then runs a full `rag.indexing` build
+on each with the embedding store disabled. Reports documents, chunks and
+vectors per second and the peak memory traced by tracemalloc during the
+build (Python objects and numpy arrays; the model's and FAISS's own buffers
+are not traced).
+
+--hash-model replaces the embedding model with a fast deterministic hashing
+encoder, so the pipeline itself (reading, chunking, index and chunk store
+writes) is what gets measured.
+
+Usage:
+    python -m evaluation.benchmark_ingest [--random-weights | --hash-model] [--copies 1,10] [--workers 1,4]
+"""
+
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from typing import List
+from unittest.mock import patch
+
+import numpy as np
+
+from evaluation.bench_utils import load_embedding_model, load_guide_texts
+import rag.indexing as indexing
+from rag.snapshots import active_path
+
+
+class HashModel:
+    """384-d vectors seeded from each text's hash; costs microseconds per chunk."""
+
+    def encode(self, texts, **kwargs):
+        return np.stack([np.random.default_rng(abs(hash(t)) % (2 ** 32)).standard_normal(384).astype('float32')
+                         for t in texts])
+
+
+def make_corpus(target: str, copies: int):
+    for name, text in load_guide_texts().items():
+        stem = name[:-len('.md')]
+        for copy in range(copies):
+            with open(os.path.join(target, f"{stem}_{copy:04d}.md"), 'w', encoding='utf-8') as f:
+                f.write(f"Copy {copy}\n{text}".replace('. ', f'. [{copy}] '))
+
+
+def run(model, data_dir: str, workers: int, batch_size: int):
+    vector_db = tempfile.mkdtemp(prefix='ingest-db-')
+    env = {'DATA_DIR': data_dir, 'VECTOR_DB_PATH': vector_db, 'EMBEDDING_STORE_ENABLED': 'false',
+           'INDEX_WORKERS': str(workers), 'INDEX_EMBED_BATCH_SIZE': str(batch_size)}
+    try:
+        with patch.dict(os.environ, env), patch.object(indexing, 'SentenceTransformer', lambda name: model):
+            tracemalloc.start()
+            indexing.main(full_rebuild=True)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        with open(os.path.join(active_path(vector_db), 'manifest.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)['throughput'], peak / (1024 * 1024)
+    finally:
+        shutil.rmtree(vector_db)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    models = parser.add_mutually_exclusive_group()
+    models.add_argument('--random-weights', action='store_true', help='offline MiniLM-shaped model with random weights')
+    models.add_argument('--hash-model', action='store_true', help='hashing encoder instead of a transformer')
+    parser.add_argument('--copies', type=_int_list, default=[1, 10], help='replicas of the guides per corpus')
+    parser.add_argument('--workers', type=_int_list, default=[1, 4])
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    model = HashModel() if args.hash_model else load_embedding_model(random_weights=args.random_weights)
+    print(f"{'docs':>6} | {'workers':>7} | {'chunks':>7} | {'docs/s':>8} | {'chunks/s':>9} | "
+          f"{'vectors/s':>9} | peak MB")
+    for copies in args.copies:
+        data_dir = tempfile.mkdtemp(prefix='ingest-corpus-')
+        try:
+            make_corpus(data_dir, copies)
+            for workers in args.workers:
+                t, peak = run(model, data_dir, workers, args.batch_size)
+                print(f"{t['documents']:>6} | {workers:>7} | {t['chunks']:>7} | {t['documents_per_second']:>8} | "
+                      f"{t['chunks_per_second']:>9} | {t['vectors_per_second']:>9} | {peak:.1f}")
+        finally:
+            shutil.rmtree(data_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Microbenchmark: per-query vs batched multi-query retrieval.
+
+"before" reproduces the original retrieve() loop: one encode() and one
+index.search() per query variant, then a Python sort over a list of dicts.
+"after" is the current path: one batched encode(), one multi-row search and
+the vectorized merge from rag.retrieval.
+
+Usage:
+    python -m evaluation.benchmark_retrieval [--random-weights] [--num-chunks 10000]
+"""
+
+import argparse
+from typing import List
+
+import faiss
+import numpy as np
+
+from evaluation.bench_utils import load_embedding_model, load_test_queries, random_vectors, time_call
+from rag.retrieval import merge_search_results
+
+
+def search_per_query(model, index, queries: List[str], top_k: int):
+    all_results = []
+    for q in queries:
+        q_emb = model.encode([q], convert_to_numpy=True)
+        D, I = index.search(q_emb, top_k)
+        for i, idx in enumerate(I[0]):
+            all_results.append({'score': float(D[0][i]), 'id': int(idx), 'query': q})
+    seen = set()
+    deduped = []
+    for r in sorted(all_results, key=lambda x: x['score']):
+        if r['id'] not in seen:
+            deduped.append(r)
+            seen.add(r['id'])
+    return deduped[:top_k]
+
+
+def search_batched(model, index, queries: List[str], top_k: int):
+    q_emb = np.asarray(model.encode(queries, convert_to_numpy=True), dtype='float32')
+    D, I = index.search(q_emb, top_k)
+    ids, dists, rows = merge_search_results(D, I)
+    return [{'score': float(d), 'id': int(i), 'query': queries[r]}
+            for i, d, r in zip(ids[:top_k], dists[:top_k], rows[:top_k])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--random-weights', action='store_true', help='offline MiniLM-shaped model with random weights')
+    parser.add_argument('--num-chunks', type=int, default=10000, help='size of the synthetic flat index')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    model = load_embedding_model(random_weights=args.random_weights)
+    dim = model.encode(['probe']).shape[1]
+    index = faiss.IndexFlatL2(dim)
+    index.add(random_vectors(args.num_chunks, dim))
+
+    base_queries = load_test_queries()
+    print(f"Flat index: {args.num_chunks} x {dim}, top_k={args.top_k}, repeat={args.repeat}")
+    print(f"{'variants':>8} | {'before (ms)':>12} | {'after (ms)':>11} | {'speedup':>7}")
+    for n in (1, 3, 8):
+        queries = [base_queries[i % len(base_queries)] for i in range(n)]
+        before = time_call(lambda: search_per_query(model, index, queries, args.top_k), repeat=args.repeat)
+        after = time_call(lambda: search_batched(model, index, queries, args.top_k), repeat=args.repeat)
+        print(f"{n:>8} | {before['median_ms']:>12.2f} | {after['median_ms']:>11.2f} | "
+              f"{before['median_ms'] / after['median_ms']:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
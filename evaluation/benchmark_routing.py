@@ -0,0 +1,120 @@
+"""
+Latency and recall@k of document-centroid routing (rag.routing) against
+the exact flat scan, as the corpus grows.
+
+The synthetic corpus is made of documents of --chunks-per-doc chunks on
+average. Each chunk mixes its document's direction with one of a set of
+topics shared across documents (--topic-weight), the way networking advice
+shows up in several guides, plus noise. Queries are perturbed chunks, as
+in benchmark_ann, except for an --off-topic share of random directions
+that are near no document in particular. Each query is searched on its own, as a server request
+would be, and the percentiles are over the query set. "routed" is the share
+of queries answered from their top-M units; the others fell back to the
+full scan because their best units did not stand out (--min-gap). "build
+recall" is the estimate the indexer records for the largest M (see
+rag.routing.measure_recall); with DOC_ROUTING=auto, routing is used only
+if it reaches DOC_ROUTING_MIN_RECALL. Raise --topic-weight to see a corpus
+where it does not.
+
+Usage:
+    python -m evaluation.benchmark_routing --sizes 10000,100000,1000000 --top-m 8,32,128
+"""
+
+import os
+import time
+import argparse
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+from evaluation.benchmark_ann import make_queries, recall_at_k, _int_list
+from rag.ann import build_index
+from rag.routing import DocumentRouter, RoutedIndex, RoutingTableBuilder, measure_recall, DOC_ROUTING_MIN_GAP
+
+_BLOCK = 100_000
+
+
+def make_corpus(num_chunks: int, dim: int, chunks_per_doc: int, topic_weight: float, seed: int = 0):
+    """(vectors, (document, chunk_id) keys) of a synthetic clustered corpus, generated block by block."""
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(max(1, chunks_per_doc // 4), chunks_per_doc * 7 // 4 + 1,
+                         size=num_chunks // max(1, chunks_per_doc // 4) + 1)
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), num_chunks) + 1]
+    doc_of = np.repeat(np.arange(len(sizes)), sizes)[:num_chunks]
+    chunk_of = np.arange(num_chunks) - np.repeat(np.cumsum(sizes) - sizes, sizes)[:num_chunks]
+    doc_centers = rng.standard_normal((len(sizes), dim)).astype('float32')
+    topics = rng.standard_normal((max(1, len(sizes) // 4), dim)).astype('float32')
+    vectors = np.empty((num_chunks, dim), dtype='float32')
+    for start in range(0, num_chunks, _BLOCK):
+        end = min(num_chunks, start + _BLOCK)
+        block = doc_centers[doc_of[start:end]]
+        block += topic_weight * topics[rng.integers(0, len(topics), end - start)]
+        block += rng.standard_normal(block.shape).astype('float32')
+        vectors[start:end] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    keys = list(zip((f"doc{d}" for d in doc_of.tolist()), chunk_of.tolist()))
+    return vectors, keys
+
+
+def per_query(index, queries: np.ndarray, k: int) -> Dict[str, float]:
+    found, samples = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        samples.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+    return {'found': np.array(found), 'p50_ms': float(np.percentile(samples, 50)),
+            'p95_ms': float(np.percentile(samples, 95))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=_int_list, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--chunks-per-doc', type=int, default=40)
+    parser.add_argument('--group-chunks', type=int, default=64, help='DOC_ROUTING_GROUP_CHUNKS')
+    parser.add_argument('--topic-weight', type=float, default=0.8)
+    parser.add_argument('--top-m', type=_int_list, default=[8, 32, 128])
+    parser.add_argument('--min-gap', type=float, default=DOC_ROUTING_MIN_GAP)
+    parser.add_argument('--num-queries', type=int, default=100)
+    parser.add_argument('--off-topic', type=float, default=0.1, help='share of random queries')
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>9} {'units':>7} {'search':<22} {'routed':>7} {f'recall@{args.k}':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8}")
+    for size in args.sizes:
+        vectors, keys = make_corpus(size, args.dim, args.chunks_per_doc, args.topic_weight)
+        queries = make_queries(vectors, args.num_queries)
+        off_topic = np.random.default_rng(1).standard_normal((int(args.off_topic * len(queries)), args.dim))
+        queries[:len(off_topic)] = off_topic / np.linalg.norm(off_topic, axis=1, keepdims=True)
+        builder = RoutingTableBuilder(args.group_chunks)
+        for start in range(0, size, _BLOCK):
+            builder.add(keys[start:start + _BLOCK], vectors[start:start + _BLOCK], range(start, start + _BLOCK))
+        with tempfile.TemporaryDirectory() as tmp:
+            builder.save(tmp)
+            router = DocumentRouter.load(tmp)
+        # Same index type as the indexer builds: flat vectors under explicit ids
+        index, _ = build_index(vectors, 'flat', ids=np.arange(size, dtype='int64'))
+        del vectors
+        router.top_m = max(args.top_m)
+        print(f"{size:>9} chunks: build recall {measure_recall(index, router):.3f} at M={router.top_m}")
+
+        flat = per_query(index, queries, args.k)
+        truth = flat['found']
+        rows: List = [('flat scan', 1.0, flat)]
+        for top_m in args.top_m:
+            for min_gap in dict.fromkeys([args.min_gap, 0.0]):
+                router.top_m, router.min_gap = top_m, min_gap
+                routed = RoutedIndex(index, router)
+                result = per_query(routed, queries, args.k)
+                label = f"M={top_m} " + (f"gap>={min_gap:g}" if min_gap else "always")
+                rows.append((label, routed.routed / len(queries), result))
+        for label, share, r in rows:
+            print(f"{size:>9} {len(router):>7} {label:<22} {share:>7.0%} {recall_at_k(truth, r['found']):>9.3f} "
+                  f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+        del index
+
+
+if __name__ == '__main__':
+    main()
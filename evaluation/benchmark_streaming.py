@@ -0,0 +1,129 @@
+"""
+Time to first byte of the answer on /chat/stream.
+
+Serves the app with uvicorn on localhost and asks career-advice questions
+through /chat/stream. A simulated LLM stands in for the provider: it
+answers the intent prompt at once, and generates the --answer-chars advice
+at --token-ms per --token-chars token after --first-token-ms, either all at
+once (agenerate_response) or token by token (astream_response). Retrieval
+returns fixed chunks, so only the streaming path is measured.
+
+For each request it reports when the first SSE event, the first 'content'
+event (the format's header counts), the first text written by the model and
+the last event arrived, and how long the response kept streaming after the
+simulated model had finished.
+
+Usage:
+    python -m evaluation.benchmark_streaming [--requests 3] [--answer-chars 3000] [--token-ms 10]
+"""
+
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import statistics
+from unittest.mock import patch
+
+import httpx
+import uvicorn
+
+from mcp_server.server import app
+
+DOCS = [{'chunk': 'Negotiate after the written offer arrives.',
+         'metadata': {'file': 'salary_negotiation_guide.md', 'chunk_id': 0}, 'score': 0.1}]
+
+
+async def fixed_retrieve(query, top_k=3, **kwargs):
+    return DOCS
+
+
+class SimulatedLLM:
+    def __init__(self, answer_chars: int, token_chars: int, first_token_ms: float, token_ms: float):
+        text = ("Research the market rate for the role, wait for the written offer, then ask for more. ")
+        answer = (text * (answer_chars // len(text) + 1))[:answer_chars]
+        self.tokens = [answer[i:i + token_chars] for i in range(0, len(answer), token_chars)]
+        self.first_token = first_token_ms / 1000
+        self.per_token = token_ms / 1000
+        self.finished_at = 0.0
+
+    def is_available(self) -> bool:
+        return True
+
+    async def agenerate_response(self, prompt: str, max_tokens: int = None) -> str:
+        if 'Respond with just the action type' in prompt:
+            return 'CAREER_ADVICE'
+        parts = []
+        async for token in self.astream_response(prompt, max_tokens):
+            parts.append(token)
+        return ''.join(parts)
+
+    async def astream_response(self, prompt: str, max_tokens: int = None):
+        await asyncio.sleep(self.first_token)
+        for token in self.tokens:
+            yield token
+            await asyncio.sleep(self.per_token)
+        self.finished_at = time.perf_counter()
+
+
+def serve() -> uvicorn.Server:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def one_request(base_url: str, llm: SimulatedLLM):
+    times = {}
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async with client.stream('POST', '/chat/stream', json={'message': 'How do I negotiate salary?'}) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith('data: '):
+                    continue
+                now = time.perf_counter()
+                event = json.loads(line[len('data: '):])
+                times.setdefault('first_event', now)
+                if event['type'] == 'content':
+                    times.setdefault('first_content', now)
+                    if llm.tokens[0] in event['content']:
+                        times.setdefault('first_token', now)
+                times['last'] = now
+    return {name: (t - start) * 1000 for name, t in times.items()} | {
+        'after_model_ms': (times['last'] - llm.finished_at) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=3)
+    parser.add_argument('--answer-chars', type=int, default=3000)
+    parser.add_argument('--token-chars', type=int, default=4)
+    parser.add_argument('--first-token-ms', type=float, default=300)
+    parser.add_argument('--token-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    llm = SimulatedLLM(args.answer_chars, args.token_chars, args.first_token_ms, args.token_ms)
+    generation_ms = args.first_token_ms + len(llm.tokens) * args.token_ms
+    with patch('mcp_server.server.llm_client', llm), \
+            patch('mcp_server.server.aretrieve', new=fixed_retrieve):
+        server = serve()
+        try:
+            results = [asyncio.run(one_request(f"http://127.0.0.1:{server.config.port}", llm))
+                       for _ in range(args.requests)]
+        finally:
+            server.should_exit = True
+
+    print(f"{args.answer_chars}-char answer, {len(llm.tokens)} tokens, simulated generation {generation_ms:.0f} ms "
+          f"(first token {args.first_token_ms:.0f} ms); median of {args.requests} requests")
+    for name, label in [('first_event', 'first SSE event'), ('first_content', 'first content event'),
+                        ('first_token', 'first text from the model'), ('last', 'last event'), ('after_model_ms', 'streaming after the model finished')]:
+        print(f"  {label:<36} {statistics.median(r[name] for r in results):>8.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
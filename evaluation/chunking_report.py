@@ -0,0 +1,77 @@
+"""
+How well character chunks fit the embedding model's window, compared with
+token-aware chunks.
+
+For each scheme it chunks the guides, tokenizes every chunk with the
+model's tokenizer and reports how many chunks exceed the window (the model
+silently drops their tail), the share of tokens that never reach the model,
+and the chunk count and index size that result.
+
+--random-weights uses the tokenizer of the offline MiniLM-shaped model from
+bench_utils. Its vocabulary holds whole guide words, so it produces fewer
+tokens than the real WordPiece tokenizer and the truncation figures are a
+lower bound.
+
+Usage:
+    python -m evaluation.chunking_report [--random-weights] [--chunk-size 1000] [--chunk-overlap 200]
+                                         [--max-tokens 256] [--overlap-tokens 32]
+"""
+
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+from evaluation.bench_utils import DATA_DIR, EMBEDDING_MODEL, _build_random_minilm, load_guide_texts
+from rag.chunking import chunk_by_tokens, chunk_text, load_tokenizer, token_offsets
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+
+def measure(tokenizer, chunks: List[str], budget: int) -> Dict[str, float]:
+    lengths = np.array([len(token_offsets(tokenizer, c)) for c in chunks], dtype=np.int64)
+    lost = np.maximum(lengths - budget, 0)
+    text_bytes = sum(len(c.encode('utf-8')) for c in chunks)
+    return {
+        'chunks': len(chunks),
+        'truncated': int((lost > 0).sum()),
+        'tokens_lost_pct': 100.0 * lost.sum() / max(1, lengths.sum()),
+        'mean_tokens': float(lengths.mean()) if len(lengths) else 0.0,
+        'max_tokens': int(lengths.max()) if len(lengths) else 0,
+        'index_mb': len(chunks) * EMBEDDING_DIM * 4 / (1024 * 1024),
+        # chunks.bin plus the int64 offsets and two int32 id columns
+        'store_mb': (text_bytes + len(chunks) * 16) / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--random-weights', action='store_true', help="offline MiniLM-shaped model's tokenizer")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    parser.add_argument('--max-tokens', type=int, default=256)
+    parser.add_argument('--overlap-tokens', type=int, default=32)
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer(_build_random_minilm(DATA_DIR) if args.random_weights else EMBEDDING_MODEL)
+    budget = args.max_tokens - tokenizer.num_special_tokens_to_add()
+    texts = list(load_guide_texts().values())
+
+    char_chunks = [c for text in texts for c in chunk_text(text, args.chunk_size, args.chunk_overlap)]
+    token_chunks = [c for text in texts
+                    for c in chunk_by_tokens(text, token_offsets(tokenizer, text), budget, args.overlap_tokens)]
+    rows = {
+        f'chars {args.chunk_size}/{args.chunk_overlap}': measure(tokenizer, char_chunks, budget),
+        f'tokens {args.max_tokens}/{args.overlap_tokens}': measure(tokenizer, token_chunks, budget),
+    }
+
+    print(f"{len(texts)} guides, window {args.max_tokens} tokens ({budget} after special tokens)")
+    print(f"{'scheme':>16} | {'chunks':>6} | {'truncated':>9} | {'tokens lost':>11} | {'mean tok':>8} | "
+          f"{'max tok':>7} | {'index MB':>8} | store MB")
+    for name, r in rows.items():
+        print(f"{name:>16} | {r['chunks']:>6} | {r['truncated']:>9} | {r['tokens_lost_pct']:>10.1f}% | "
+              f"{r['mean_tokens']:>8.1f} | {r['max_tokens']:>7} | {r['index_mb']:>8.3f} | {r['store_mb']:.3f}")
+
+
+if __name__ == '__main__':
+    main()
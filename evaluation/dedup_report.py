@@ -0,0 +1,99 @@
+"""
+How much near-duplicate elimination (rag.dedup) shrinks the index and the
+retrieved context.
+
+Chunks the guides, runs the indexer's streaming deduplication over them and
+reports the vectors and index size with and without it, how many signature
+comparisons LSH needed instead of comparing every pair, and, for the test
+queries, the share of the top-k context that repeats a higher-ranked chunk.
+At a fixed top-k the prompt still holds k chunks; deduplication replaces the
+repeated ones with new text, or lets the same distinct content fit in a
+prompt that much smaller. BM25 ranks the chunks so the report runs offline.
+
+--copies N adds lightly edited copies of N guides (a different title line),
+the way a guide exported to a second format or pasted into a wiki would
+arrive, to show the effect on a corpus that does repeat itself.
+
+Usage:
+    python -m evaluation.dedup_report [--threshold 0.8] [--copies 0] [--top-k 5]
+                                      [--chunk-size 1000] [--chunk-overlap 200]
+"""
+
+import time
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from evaluation.bench_utils import load_guide_texts, load_test_queries
+from rag.bm25 import BM25Index
+from rag.chunking import chunk_text
+from rag.dedup import ChunkDeduplicator, CHUNK_DEDUP_THRESHOLD
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+
+def with_copies(texts: Dict[str, str], copies: int) -> Dict[str, str]:
+    texts = dict(texts)
+    for name in sorted(texts)[:copies]:
+        lines = texts[name].split('\n', 1)
+        texts[f"{name[:-3]}_wiki_copy.md"] = f"{lines[0]} (team wiki copy)\n" + (lines[1] if len(lines) > 1 else '')
+    return texts
+
+
+def prompt_sizes(chunks: List[str], cluster: np.ndarray, queries: List[str], top_k: int,
+                 searchable: np.ndarray) -> Tuple[float, float]:
+    """Mean characters of the top-k chunks per query, and mean characters repeating a higher-ranked chunk."""
+    index = BM25Index.build(c if searchable[i] else '' for i, c in enumerate(chunks))
+    total, repeated = [], []
+    for query in queries:
+        ids, _ = index.search(query, top_k)
+        seen, size, extra = set(), 0, 0
+        for i in ids:
+            size += len(chunks[i])
+            if cluster[i] in seen:
+                extra += len(chunks[i])
+            seen.add(cluster[i])
+        total.append(size)
+        repeated.append(extra)
+    return float(np.mean(total)), float(np.mean(repeated))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threshold', type=float, default=CHUNK_DEDUP_THRESHOLD)
+    parser.add_argument('--copies', type=int, default=0)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    args = parser.parse_args()
+
+    texts = with_copies(load_guide_texts(), args.copies)
+    chunks = [c for name in sorted(texts) for c in chunk_text(texts[name], args.chunk_size, args.chunk_overlap)]
+
+    dedup = ChunkDeduplicator(args.threshold)
+    start = time.perf_counter()
+    cluster = np.array([rep if (rep := dedup.check(row, c)) is not None else row for row, c in enumerate(chunks)])
+    seconds = time.perf_counter() - start
+    kept = cluster == np.arange(len(chunks))
+
+    queries = load_test_queries()
+    before, repeated_before = prompt_sizes(chunks, cluster, queries, args.top_k, np.ones(len(chunks), dtype=bool))
+    after, repeated_after = prompt_sizes(chunks, cluster, queries, args.top_k, kept)
+
+    vectors = int(kept.sum())
+    pairs = len(chunks) * (len(chunks) - 1) // 2
+    print(f"{len(texts)} documents ({args.copies} edited copies), {len(chunks)} chunks of "
+          f"{args.chunk_size}/{args.chunk_overlap} chars, threshold {args.threshold}")
+    print(f"Near-duplicates: {len(chunks) - vectors} chunks folded into {len(set(cluster[~kept]))} representatives "
+          f"in {seconds * 1000:.0f} ms ({dedup.index.comparisons} signature comparisons instead of {pairs} pairs)")
+    print(f"Vectors: {len(chunks)} -> {vectors} ({1 - vectors / len(chunks):.1%} smaller index, "
+          f"{len(chunks) * EMBEDDING_DIM * 4 / 1024 / 1024:.3f} -> {vectors * EMBEDDING_DIM * 4 / 1024 / 1024:.3f} MB)")
+    print(f"Top-{args.top_k} context over {len(queries)} queries: {before:.0f} chars, {repeated_before:.0f} repeated "
+          f"({repeated_before / before:.1%}) without dedup; {after:.0f} chars, {repeated_after:.0f} repeated with dedup")
+    print(f"Distinct content of the top-{args.top_k} fits in {before - repeated_before:.0f} chars "
+          f"({repeated_before / before:.1%} smaller prompt)")
+
+
+if __name__ == '__main__':
+    main()
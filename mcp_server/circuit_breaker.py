@@ -0,0 +1,220 @@
+"""
+Circuit breakers for LLM providers.
+
+Without one, every request to a degraded provider waits for its timeout or
+error before LLMClient falls back to the next provider, so an outage adds
+the full failure latency to every request. A CircuitBreaker tracks the
+calls to one provider over the last LLM_BREAKER_WINDOW_SECONDS:
+
+- closed: calls go through. Once the window holds LLM_BREAKER_MIN_REQUESTS
+  calls and their error rate reaches LLM_BREAKER_ERROR_RATE, or the share
+  slower than LLM_BREAKER_SLOW_CALL_SECONDS reaches
+  LLM_BREAKER_SLOW_CALL_RATE, the circuit opens.
+- open: calls are refused, so LLMClient goes straight to the fallback.
+  After LLM_BREAKER_OPEN_SECONDS the circuit is half-open.
+- half_open: up to LLM_BREAKER_HALF_OPEN_PROBES trial calls go through at a
+  time. As many fast successes close the circuit; one failed or slow probe
+  opens it again.
+
+Every transition starts a new generation. A call belongs to the generation it
+started in, and its result is ignored once the state has moved on, so a
+straggler from before the circuit opened can neither close it as a probe nor
+count toward the fresh window of a closed circuit.
+
+State transitions are logged and kept for stats(), which /health reports.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LLM_BREAKER_ENABLED = os.getenv('LLM_BREAKER_ENABLED', 'true').lower() == 'true'
+LLM_BREAKER_WINDOW_SECONDS = float(os.getenv('LLM_BREAKER_WINDOW_SECONDS', '60'))
+LLM_BREAKER_MIN_REQUESTS = int(os.getenv('LLM_BREAKER_MIN_REQUESTS', '5'))
+LLM_BREAKER_ERROR_RATE = float(os.getenv('LLM_BREAKER_ERROR_RATE', '0.5'))
+LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv('LLM_BREAKER_SLOW_CALL_SECONDS', '20'))
+LLM_BREAKER_SLOW_CALL_RATE = float(os.getenv('LLM_BREAKER_SLOW_CALL_RATE', '0.8'))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv('LLM_BREAKER_OPEN_SECONDS', '30'))
+LLM_BREAKER_HALF_OPEN_PROBES = int(os.getenv('LLM_BREAKER_HALF_OPEN_PROBES', '1'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# State transitions kept for stats()
+TRANSITION_HISTORY = 20
+
+
+class Attempt:
+    """One call let through by a breaker; latency is taken at first_byte() if the caller marks it."""
+
+    def __init__(self, generation: int = 0):
+        self.generation = generation
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+
+    def first_byte(self):
+        """Mark the first piece of a streamed response, so latency excludes the generation time."""
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+
+    def elapsed(self) -> float:
+        return self.latency if self.latency is not None else time.monotonic() - self.started
+
+
+class CircuitBreaker:
+    """Rolling error-rate and latency breaker for one provider."""
+
+    def __init__(self, name: str, enabled: bool = LLM_BREAKER_ENABLED,
+                 window_seconds: float = LLM_BREAKER_WINDOW_SECONDS, min_requests: int = LLM_BREAKER_MIN_REQUESTS,
+                 error_rate: float = LLM_BREAKER_ERROR_RATE, slow_call_seconds: float = LLM_BREAKER_SLOW_CALL_SECONDS,
+                 slow_call_rate: float = LLM_BREAKER_SLOW_CALL_RATE, open_seconds: float = LLM_BREAKER_OPEN_SECONDS,
+                 half_open_probes: int = LLM_BREAKER_HALF_OPEN_PROBES):
+        self.name = name
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._generation = 0
+        self._changed_at = time.monotonic()
+        # (finished_at, failed, slow, latency) of the calls in the window
+        self._calls: deque = deque()
+        self._failures = 0
+        self._slow = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        # Results of calls that started before the last transition
+        self.stale = 0
+        self.times_opened = 0
+        self.transitions: deque = deque(maxlen=TRANSITION_HISTORY)
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now; one that may must then be recorded or released."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._changed_at >= self.open_seconds:
+                self._transition(HALF_OPEN, f"{self.open_seconds:g}s cool-down elapsed")
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, failed: bool, latency: float, generation: Optional[int] = None):
+        """Outcome of a call that allow() let through in the given generation (default: the current one)."""
+        if not self.enabled:
+            return
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self.stale += 1
+                return
+            now = time.monotonic()
+            self._calls.append((now, failed, slow, latency))
+            self._failures += failed
+            self._slow += slow
+            self._prune(now)
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._transition(OPEN, f"trial call {'failed' if failed else f'took {latency:.1f}s'}")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._transition(CLOSED, f"{self._probe_successes} trial call(s) succeeded")
+            elif self.state == CLOSED and len(self._calls) >= self.min_requests:
+                error_rate, slow_rate = self._rates()
+                if error_rate >= self.error_rate:
+                    self._transition(OPEN, f"error rate {error_rate:.0%} over {len(self._calls)} calls")
+                elif slow_rate >= self.slow_call_rate:
+                    self._transition(OPEN, f"{slow_rate:.0%} of {len(self._calls)} calls slower than "
+                                           f"{self.slow_call_seconds:g}s")
+
+    def release(self, generation: Optional[int] = None):
+        """Give back a call that ended without an outcome, e.g. cancelled by the client."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state == HALF_OPEN and generation in (None, self._generation):
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    @contextmanager
+    def attempt(self) -> Iterator[Attempt]:
+        """Time a call that allow() let through and record it: an exception is a failure."""
+        with self._lock:
+            attempt = Attempt(self._generation)
+        try:
+            yield attempt
+        except Exception:
+            self.record(True, attempt.elapsed(), attempt.generation)
+            raise
+        except BaseException:
+            self.release(attempt.generation)
+            raise
+        self.record(False, attempt.elapsed(), attempt.generation)
+
+    def _transition(self, state: str, reason: str):
+        previous, self.state = self.state, state
+        self._generation += 1
+        self._changed_at = time.monotonic()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state == OPEN:
+            self.times_opened += 1
+        if state == CLOSED:
+            # Start the new window from scratch, not from the calls that opened the circuit
+            self._calls.clear()
+            self._failures = self._slow = 0
+        self.transitions.append({"from": previous, "to": state, "at": time.time(), "reason": reason})
+        log = logger.warning if state == OPEN else logger.info
+        log(f"LLM circuit breaker {self.name}: {previous} -> {state} ({reason})")
+
+    def _prune(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            _, failed, slow, _ = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _rates(self):
+        calls = len(self._calls)
+        return (self._failures / calls, self._slow / calls) if calls else (0.0, 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune(time.monotonic())
+            error_rate, slow_rate = self._rates()
+            latencies = sorted(latency for _, failed, _, latency in self._calls if not failed)
+            return {
+                "enabled": self.enabled,
+                "state": self.state,
+                "state_seconds": round(time.monotonic() - self._changed_at, 1),
+                "calls": len(self._calls),
+                "error_rate": round(error_rate, 4),
+                "slow_call_rate": round(slow_rate, 4),
+                "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+                "rejected": self.rejected,
+                "stale_results": self.stale,
+                "times_opened": self.times_opened,
+                "transitions": list(self.transitions),
+            }
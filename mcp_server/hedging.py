@@ -0,0 +1,109 @@
+"""
+Hedged LLM requests.
+
+Tail latency comes from slow provider calls more than failed ones. With
+LLM_HEDGE_ENABLED, LLMClient.agenerate_response() gives the primary
+provider (Gemini) a head start; if it has not answered by then, the same
+prompt goes to the secondary (OpenAI). Whichever answers first is returned,
+and the other call is cancelled.
+
+The head start is the LLM_HEDGE_PERCENTILE of the primary's recent
+latencies (at least LLM_HEDGE_MIN_DELAY_MS), or LLM_HEDGE_DELAY_MS until
+LLM_HEDGE_MIN_SAMPLES have been seen. A call cancelled because the
+secondary won counts with the time it had run, a lower bound that keeps
+the slow tail in the samples. Of the last LLM_HEDGE_WINDOW requests (or of
+all requests, while fewer have been seen), at most a LLM_HEDGE_BUDGET share
+fire a hedge, so hedging adds at most that share of extra calls. Only
+requests that call the primary count: cache hits and calls refused by its
+circuit breaker do not.
+"""
+
+import os
+import math
+import bisect
+from collections import deque
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '95'))
+LLM_HEDGE_DELAY_MS = float(os.getenv('LLM_HEDGE_DELAY_MS', '2000'))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv('LLM_HEDGE_MIN_DELAY_MS', '200'))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+LLM_HEDGE_BUDGET = float(os.getenv('LLM_HEDGE_BUDGET', '0.1'))
+LLM_HEDGE_WINDOW = int(os.getenv('LLM_HEDGE_WINDOW', '200'))
+
+
+class HedgePolicy:
+    """When to hedge a request, within a budget of extra calls, and how often hedges fired and won."""
+
+    def __init__(self, enabled: bool = LLM_HEDGE_ENABLED, percentile: float = LLM_HEDGE_PERCENTILE,
+                 delay_ms: float = LLM_HEDGE_DELAY_MS, min_delay_ms: float = LLM_HEDGE_MIN_DELAY_MS,
+                 min_samples: int = LLM_HEDGE_MIN_SAMPLES, budget: float = LLM_HEDGE_BUDGET,
+                 window: int = LLM_HEDGE_WINDOW):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.default_delay = delay_ms / 1000
+        self.min_delay = min_delay_ms / 1000
+        self.min_samples = min_samples
+        self.budget = budget
+        self.window = window
+        self.latencies: deque = deque(maxlen=window)
+        # Sequence numbers (from start()) of the requests that fired a hedge, oldest first
+        self._fired: List[int] = []
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.over_budget = 0
+
+    def delay(self) -> float:
+        """Seconds the primary is given before the request is hedged."""
+        if len(self.latencies) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(self.latencies)
+        rank = min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)
+        return max(self.min_delay, ordered[max(0, rank)])
+
+    def observe(self, latency: float):
+        """Latency of a primary call: how long it took, or ran before it was cancelled."""
+        self.latencies.append(latency)
+
+    def start(self) -> int:
+        """Count a call to the primary that may be hedged; returns its sequence number for try_fire()."""
+        self.requests += 1
+        return self.requests
+
+    def try_fire(self, request: int) -> bool:
+        """Take a hedge for the request numbered request if the budget allows it."""
+        # Only hedges of the last `window` requests started count against the budget
+        oldest = self.requests - self.window
+        del self._fired[:bisect.bisect_right(self._fired, oldest)]
+        in_window = min(self.requests, self.window)
+        if len(self._fired) + 1 > self.budget * in_window:
+            self.over_budget += 1
+            return False
+        bisect.insort(self._fired, request)
+        self.fired += 1
+        return True
+
+    def record_win(self):
+        """The hedge answered before the primary."""
+        self.won += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "delay_ms": round(self.delay() * 1000, 1),
+            "percentile": self.percentile,
+            "samples": len(self.latencies),
+            "budget": self.budget,
+            "requests": self.requests,
+            "fired": self.fired,
+            "won": self.won,
+            "over_budget": self.over_budget,
+            "fire_rate": round(self.fired / self.requests, 4) if self.requests else 0.0,
+            "win_rate": round(self.won / self.fired, 4) if self.fired else 0.0,
+        }
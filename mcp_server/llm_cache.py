@@ -0,0 +1,297 @@
+"""
+Cache of LLM responses.
+
+Many prompts are byte-identical across users: the tool prompts for common
+positions, the intent prompt for common messages, RAG prompts for popular
+questions over an unchanged index. Responses are keyed by provider, model,
+a SHA-256 of the prompt and the generation parameters sent with it, so a
+different model or max_tokens simply misses.
+
+The first level is an in-process LRU bounded by LLM_CACHE_SIZE entries and
+LLM_CACHE_MAX_MB of response text. With LLM_CACHE_PATH set, responses are
+also kept in a SQLite file there that survives restarts and is shared by
+the workers of one host, bounded by LLM_CACHE_DISK_MAX_MB (least recently
+used rows go first). Entries of both levels expire after
+LLM_CACHE_TTL_SECONDS. The async client reads and writes the file through
+aget()/aset(), on the cache's own thread, so a slow disk or a lock held by
+another worker never stalls the event loop.
+
+Only text returned by a provider is ever stored; LLMClient's fallback
+response never is.
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '1024'))
+LLM_CACHE_MAX_MB = float(os.getenv('LLM_CACHE_MAX_MB', '32'))
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', '86400'))
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', '')
+LLM_CACHE_DISK_MAX_MB = float(os.getenv('LLM_CACHE_DISK_MAX_MB', '256'))
+
+
+def make_key(provider: str, model: str, prompt: str, **params: Any) -> str:
+    """Key for one provider call; params are the generation parameters sent with the prompt."""
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    return hashlib.sha256(json.dumps([provider, model, prompt_hash, sorted(params.items())]).encode('utf-8')).hexdigest()
+
+
+class MemoryStore:
+    """In-process LRU with per-entry expiry, bounded by entries and bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, size = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, expires_at: float):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[key] = (expires_at, value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskStore:
+    """
+    SQLite table of responses on local disk, trimmed to max_bytes by last use.
+
+    The total size is kept in a one-row table, updated in the same
+    transaction as every insert and eviction, so a write costs the same
+    however large the table is and every process sharing the file sees it.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                             'size INTEGER NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), '
+                             'bytes INTEGER NOT NULL)')
+            self._db.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time(),))
+            # Counted once at startup, which also repairs a total left behind by older versions
+            self._db.execute('INSERT OR REPLACE INTO totals VALUES (0, '
+                             '(SELECT COALESCE(SUM(size), 0) FROM responses))')
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """(value, expires_at), or None."""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute('SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?',
+                                   (key, now)).fetchone()
+            if row is not None:
+                self._db.execute('UPDATE responses SET used_at = ? WHERE key = ?', (now, key))
+        return row
+
+    def set(self, key: str, value: str, expires_at: float):
+        size = len(value.encode('utf-8'))
+        with self._lock, self._db:
+            old = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                             (key, value, size, expires_at, time.time()))
+            total = self._add_bytes(size - (old[0] if old else 0))
+            if total > self.max_bytes:
+                # Least recently used first, read from the index only as far as needed
+                oldest = self._db.execute('SELECT key, size FROM responses ORDER BY used_at')
+                evicted = []
+                for old_key, old_size in oldest:
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append(old_key)
+                    total -= old_size
+                oldest.close()
+                self._db.executemany('DELETE FROM responses WHERE key = ?', [(k,) for k in evicted])
+                self._db.execute('UPDATE totals SET bytes = ? WHERE id = 0', (total,))
+                self.evictions += len(evicted)
+
+    def _add_bytes(self, delta: int) -> int:
+        self._db.execute('UPDATE totals SET bytes = bytes + ? WHERE id = 0', (delta,))
+        return self._db.execute('SELECT bytes FROM totals WHERE id = 0').fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM responses')
+            self._db.execute('UPDATE totals SET bytes = 0 WHERE id = 0')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            size = self._db.execute('SELECT bytes FROM totals WHERE id = 0').fetchone()[0]
+        return {"path": self.path, "entries": entries, "bytes": size, "max_bytes": self.max_bytes,
+                "evictions": self.evictions}
+
+
+class LLMResponseCache:
+    """Two-level (memory, optional disk) TTL cache of LLM response text."""
+
+    def __init__(self, enabled: bool = LLM_CACHE_ENABLED, max_entries: int = LLM_CACHE_SIZE,
+                 max_bytes: int = int(LLM_CACHE_MAX_MB * 1024 * 1024), ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 path: str = LLM_CACHE_PATH, disk_max_bytes: int = int(LLM_CACHE_DISK_MAX_MB * 1024 * 1024)):
+        self.ttl_seconds = ttl_seconds
+        self.memory = MemoryStore(max_entries, max_bytes)
+        self._enabled = enabled
+        self.disk = None
+        self._disk_executor = None
+        if self.enabled and path:
+            try:
+                self.disk = DiskStore(path, disk_max_bytes)
+                # One thread: the store serializes its calls on one connection anyway
+                self._disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='llm-cache')
+                logger.info(f"LLM response cache persisted in {path}")
+            except Exception as e:
+                logger.warning(f"LLM response cache file {path} unavailable ({e}); caching in memory only")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled and self.ttl_seconds > 0 and self.memory.max_entries > 0
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        row = self._disk_get(key) if value is None and self.disk is not None else None
+        return self._found(key, value, row)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for the event loop: the disk level is read on the cache's thread."""
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        row = None
+        if value is None and self.disk is not None:
+            row = await asyncio.get_running_loop().run_in_executor(self._disk_executor, self._disk_get, key)
+        return self._found(key, value, row)
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        try:
+            return self.disk.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"LLM cache lookup failed: {e}")
+            return None
+
+    def _found(self, key: str, value: Optional[str], row: Optional[Tuple[str, float]]) -> Optional[str]:
+        """Count a lookup that found value in memory, or row on disk, or neither."""
+        if value is not None:
+            self.memory_hits += 1
+        elif row is not None:
+            value, expires_at = row
+            self.memory.set(key, value, expires_at)
+            self.disk_hits += 1
+        if value is None:
+            self.misses += 1
+        else:
+            self.bytes_saved += len(value.encode('utf-8'))
+        return value
+
+    def set(self, key: str, value: str):
+        if not self.enabled or not value:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        self.memory.set(key, value, expires_at)
+        if self.disk is not None:
+            self._disk_set(key, value, expires_at)
+
+    async def aset(self, key: str, value: str):
+        """set() for the event loop: the disk level is written on the cache's thread."""
+        if not self.enabled or not value:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        self.memory.set(key, value, expires_at)
+        if self.disk is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                self._disk_executor, self._disk_set, key, value, expires_at)
+
+    def _disk_set(self, key: str, value: str, expires_at: float):
+        try:
+            self.disk.set(key, value, expires_at)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"LLM cache store failed: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hits, misses and response bytes served from the cache instead of a provider."""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.memory),
+            "bytes": self.memory.bytes,
+            "max_entries": self.memory.max_entries,
+            "max_bytes": self.memory.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "evictions": self.memory.evictions,
+            "errors": self.errors,
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
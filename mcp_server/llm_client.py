@@ -1,13 +1,34 @@
 """
 LLM Client for Career Coach AI
 Supports Gemini (default), OpenAI, and Claude with unified interface.
+
+generate_response() blocks; agenerate_response() is its coroutine
+counterpart for async endpoints, and astream_response() yields the text as
+the provider generates it. The async OpenAI client shares one pool of
+keep-alive HTTP connections (LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS,
+LLM_KEEPALIVE_EXPIRY); Gemini's async API multiplexes requests over a single
+gRPC channel.
+
+Each provider call goes through an LLMResponseCache (mcp_server/llm_cache.py)
+keyed by provider, model, prompt and generation parameters; pass
+use_cache=False to always ask the provider. A CircuitBreaker per provider
+(mcp_server/circuit_breaker.py) skips a provider that keeps failing or
+stalling and goes straight to the fallback until trial calls succeed again.
+agenerate_response() can also hedge a slow Gemini call with OpenAI
+(mcp_server/hedging.py).
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
 from dotenv import load_dotenv
 
+from mcp_server.circuit_breaker import CircuitBreaker
+from mcp_server.hedging import HedgePolicy
+from mcp_server.llm_cache import LLMResponseCache, make_key
+
 load_dotenv()
 
 # Configure logging
@@ -22,10 +43,19 @@ class LLMClient:
         self.gemini_model = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
         self.openai_model = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
         self.default_max_tokens = int(os.getenv('DEFAULT_MAX_TOKENS', '1000'))
+        # Connection pool shared by concurrent async requests
+        self.max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', '200'))
+        self.max_keepalive_connections = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '50'))
+        self.keepalive_expiry = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '30'))
+        self.request_timeout = float(os.getenv('LLM_REQUEST_TIMEOUT', '60'))
         
         # Initialize clients
         self.gemini_client = None
         self.openai_client = None
+        self.openai_async_client = None
+        self.cache = LLMResponseCache()
+        self.breakers = {'gemini': CircuitBreaker('gemini'), 'openai': CircuitBreaker('openai')}
+        self.hedge = HedgePolicy()
         
         self._initialize_clients()
     
@@ -46,19 +76,53 @@ class LLMClient:
             if os.getenv('OPENAI_API_KEY'):
                 import openai
                 self.openai_client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+                self.openai_async_client = openai.AsyncOpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'), http_client=self._async_http_client())
                 logger.info(f"OpenAI client initialized with model: {self.openai_model}")
         except ImportError:
             logger.warning("openai not installed. OpenAI unavailable.")
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI client: {e}")
     
-    def generate_response(self, prompt: str, max_tokens: int = None) -> str:
+    def _async_http_client(self):
+        """httpx client whose connection pool all async OpenAI requests share."""
+        import httpx
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.max_keepalive_connections,
+                              keepalive_expiry=self.keepalive_expiry)
+        return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(self.request_timeout, connect=10.0))
+    
+    def _gemini_first(self) -> bool:
+        """Gemini is tried first, and OpenAI is the fallback, only for these default models."""
+        return self.default_llm in ('gemini-2.5-flash', 'gemini-2.5-pro') and bool(self.gemini_client)
+    
+    def _cached(self, key: str, use_cache: bool) -> Optional[str]:
+        return self.cache.get(key) if use_cache else None
+    
+    def _store(self, key: str, prompt: str, text: str, use_cache: bool) -> str:
+        """Cache a provider's text (never the default response) and return it."""
+        if use_cache and isinstance(text, str) and text != self._get_default_response(prompt):
+            self.cache.set(key, text)
+        return text
+    
+    async def _acached(self, key: str, use_cache: bool) -> Optional[str]:
+        """_cached() without blocking the event loop on the disk cache."""
+        return await self.cache.aget(key) if use_cache else None
+    
+    async def _astore(self, key: str, prompt: str, text: str, use_cache: bool) -> str:
+        """_store() without blocking the event loop on the disk cache."""
+        if use_cache and isinstance(text, str) and text != self._get_default_response(prompt):
+            await self.cache.aset(key, text)
+        return text
+    
+    def generate_response(self, prompt: str, max_tokens: int = None, use_cache: bool = True) -> str:
         """
         Generate response using the preferred LLM with fallback.
         
         Args:
             prompt: The input prompt
             max_tokens: Maximum tokens for response (uses DEFAULT_MAX_TOKENS if not specified)
+            use_cache: Serve and store the response through the LLM response cache
             
         Returns:
             Generated response text
@@ -68,35 +132,254 @@ class LLMClient:
             max_tokens = self.default_max_tokens
             
         # Try default LLM first
-        if self.default_llm == 'gemini-2.5-flash' and self.gemini_client:
-            try:
-                response = self.gemini_client.generate_content(prompt)
-                return response.text
-            except Exception as e:
-                logger.warning(f"Gemini failed, trying fallback: {e}")
-        
-        if self.default_llm == 'gemini-2.5-pro' and self.gemini_client:
-            try:
-                response = self.gemini_client.generate_content(prompt)
-                return response.text
-            except Exception as e:
-                logger.warning(f"Gemini failed, trying fallback: {e}")
+        if self._gemini_first():
+            key = make_key('gemini', self.gemini_model, prompt)
+            cached = self._cached(key, use_cache)
+            if cached is not None:
+                return cached
+            breaker = self.breakers['gemini']
+            if breaker.allow():
+                try:
+                    with breaker.attempt():
+                        text = self.gemini_client.generate_content(prompt).text
+                    return self._store(key, prompt, text, use_cache)
+                except Exception as e:
+                    logger.warning(f"Gemini failed, trying fallback: {e}")
 
         # Fallback to OpenAI
         if self.openai_client:
+            key = make_key('openai', self.openai_model, prompt, max_tokens=max_tokens)
+            cached = self._cached(key, use_cache)
+            if cached is not None:
+                return cached
+            breaker = self.breakers['openai']
+            if breaker.allow():
+                try:
+                    with breaker.attempt():
+                        response = self.openai_client.chat.completions.create(
+                            model=self.openai_model,
+                            messages=[{"role": "user", "content": prompt}],
+                            max_tokens=max_tokens
+                        )
+                        text = response.choices[0].message.content
+                    return self._store(key, prompt, text, use_cache)
+                except Exception as e:
+                    logger.error(f"OpenAI fallback failed: {e}")
+        
+        # If all LLMs fail, return a default response
+        logger.error("All LLM providers failed. Using default response.")
+        return self._get_default_response(prompt)
+    
+    async def agenerate_response(self, prompt: str, max_tokens: int = None, use_cache: bool = True) -> str:
+        """
+        Generate response without blocking the event loop.
+        
+        Same providers, fallback order, cache, circuit breakers and default
+        response as generate_response(), through the providers' async APIs.
+        With hedging enabled (mcp_server/hedging.py), OpenAI is also asked
+        if Gemini is slow to answer, and the first answer wins.
+        
+        Args:
+            prompt: The input prompt
+            max_tokens: Maximum tokens for response (uses DEFAULT_MAX_TOKENS if not specified)
+            use_cache: Serve and store the response through the LLM response cache
+            
+        Returns:
+            Generated response text
+        """
+        if max_tokens is None:
+            max_tokens = self.default_max_tokens
+        
+        if self._gemini_first():
+            if self.hedge.enabled and self.openai_async_client:
+                text = await self._ahedged(prompt, max_tokens, use_cache)
+                if text is not None:
+                    return text
+                logger.error("All LLM providers failed. Using default response.")
+                return self._get_default_response(prompt)
+            text = await self._agemini(prompt, use_cache)
+            if text is not None:
+                return text
+        
+        if self.openai_async_client:
+            text = await self._aopenai(prompt, max_tokens, use_cache)
+            if text is not None:
+                return text
+        
+        logger.error("All LLM providers failed. Using default response.")
+        return self._get_default_response(prompt)
+    
+    async def _agemini(self, prompt: str, use_cache: bool) -> Optional[str]:
+        """Gemini's (or the cache's) answer, or None if its circuit is open or the call fails."""
+        key = make_key('gemini', self.gemini_model, prompt)
+        cached = await self._acached(key, use_cache)
+        if cached is not None:
+            return cached
+        if self.breakers['gemini'].allow():
+            return await self._acall_gemini(key, prompt, use_cache)
+        return None
+    
+    async def _acall_gemini(self, key: str, prompt: str, use_cache: bool) -> Optional[str]:
+        """Gemini's answer to a call its breaker has let through, or None if the call fails."""
+        breaker = self.breakers['gemini']
+        try:
+            with breaker.attempt() as attempt:
+                text = (await self.gemini_client.generate_content_async(prompt)).text
+            self.hedge.observe(attempt.elapsed())
+            return await self._astore(key, prompt, text, use_cache)
+        except Exception as e:
+            logger.warning(f"Gemini failed, trying fallback: {e}")
+        return None
+    
+    async def _aopenai(self, prompt: str, max_tokens: int, use_cache: bool) -> Optional[str]:
+        """OpenAI's (or the cache's) answer, or None if its circuit is open or the call fails."""
+        key = make_key('openai', self.openai_model, prompt, max_tokens=max_tokens)
+        cached = await self._acached(key, use_cache)
+        if cached is not None:
+            return cached
+        breaker = self.breakers['openai']
+        if breaker.allow():
             try:
-                response = self.openai_client.chat.completions.create(
-                    model=self.openai_model,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=max_tokens
-                )
-                return response.choices[0].message.content
+                with breaker.attempt():
+                    response = await self.openai_async_client.chat.completions.create(
+                        model=self.openai_model,
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=max_tokens
+                    )
+                    text = response.choices[0].message.content
+                return await self._astore(key, prompt, text, use_cache)
             except Exception as e:
                 logger.error(f"OpenAI fallback failed: {e}")
+        return None
+    
+    async def _ahedged(self, prompt: str, max_tokens: int, use_cache: bool) -> Optional[str]:
+        """
+        Ask Gemini, and OpenAI too if Gemini has not answered within the hedge
+        delay and the budget allows; the first answer wins and the other call
+        is cancelled. If Gemini fails first, OpenAI is the fallback as usual.
+        Only requests that actually call Gemini count toward the hedge budget.
+        """
+        key = make_key('gemini', self.gemini_model, prompt)
+        cached = await self._acached(key, use_cache)
+        if cached is not None:
+            return cached
+        if not self.breakers['gemini'].allow():
+            return await self._aopenai(prompt, max_tokens, use_cache)
+        request = self.hedge.start()
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._acall_gemini(key, prompt, use_cache))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge.delay())
+            if not done and not self.hedge.try_fire(request):
+                await asyncio.wait(tasks)
+            if primary.done():
+                text = primary.result()
+                return text if text is not None else await self._aopenai(prompt, max_tokens, use_cache)
+            
+            secondary = asyncio.ensure_future(self._aopenai(prompt, max_tokens, use_cache))
+            tasks.add(secondary)
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer Gemini if both answered in the same turn of the event loop
+                for task in sorted(done, key=lambda task: task is not primary):
+                    text = task.result()
+                    if text is None:
+                        continue
+                    if task is secondary:
+                        self.hedge.record_win()
+                        if not primary.done():
+                            self.hedge.observe(time.monotonic() - started)
+                    return text
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def astream_response(self, prompt: str, max_tokens: int = None,
+                               use_cache: bool = True) -> AsyncIterator[str]:
+        """
+        Yield the response text in pieces, as the provider streams them.
+        
+        Same providers and fallback order as agenerate_response(). A provider
+        is abandoned for the next only if it fails before its first piece;
+        once text has been yielded, its errors are raised. Yields the default
+        response if every provider fails. A cached response is yielded whole,
+        and a streamed one is cached once it is complete.
+        
+        Args:
+            prompt: The input prompt
+            max_tokens: Maximum tokens for response (uses DEFAULT_MAX_TOKENS if not specified)
+            use_cache: Serve and store the response through the LLM response cache
+        """
+        if max_tokens is None:
+            max_tokens = self.default_max_tokens
+        
+        if self._gemini_first():
+            key = make_key('gemini', self.gemini_model, prompt)
+            cached = await self._acached(key, use_cache)
+            if cached is not None:
+                yield cached
+                return
+            breaker = self.breakers['gemini']
+            if breaker.allow():
+                pieces = []
+                try:
+                    with breaker.attempt() as attempt:
+                        response = await self.gemini_client.generate_content_async(prompt, stream=True)
+                        async for chunk in response:
+                            if chunk.text:
+                                attempt.first_byte()
+                                pieces.append(chunk.text)
+                                yield chunk.text
+                    await self._astore(key, prompt, ''.join(pieces), use_cache)
+                    return
+                except Exception as e:
+                    if pieces:
+                        raise
+                    logger.warning(f"Gemini failed, trying fallback: {e}")
+        
+        if self.openai_async_client:
+            key = make_key('openai', self.openai_model, prompt, max_tokens=max_tokens)
+            cached = await self._acached(key, use_cache)
+            if cached is not None:
+                yield cached
+                return
+            breaker = self.breakers['openai']
+            if breaker.allow():
+                pieces = []
+                try:
+                    with breaker.attempt() as attempt:
+                        stream = await self.openai_async_client.chat.completions.create(
+                            model=self.openai_model,
+                            messages=[{"role": "user", "content": prompt}],
+                            max_tokens=max_tokens,
+                            stream=True
+                        )
+                        try:
+                            async for event in stream:
+                                delta = event.choices[0].delta.content if event.choices else None
+                                if delta:
+                                    attempt.first_byte()
+                                    pieces.append(delta)
+                                    yield delta
+                        finally:
+                            # Hand the connection back to the pool even if the client went away mid-answer
+                            await stream.close()
+                    await self._astore(key, prompt, ''.join(pieces), use_cache)
+                    return
+                except Exception as e:
+                    if pieces:
+                        raise
+                    logger.error(f"OpenAI fallback failed: {e}")
         
-        # If all LLMs fail, return a default response
         logger.error("All LLM providers failed. Using default response.")
-        return self._get_default_response(prompt)
+        yield self._get_default_response(prompt)
+    
+    async def aclose(self):
+        """Close the pooled connections of the async clients."""
+        if self.openai_async_client:
+            await self.openai_async_client.close()
     
     def _get_default_response(self, prompt: str) -> str:
         """Provide a default response when LLM is unavailable."""
@@ -118,7 +401,12 @@ class LLMClient:
             "gemini_available": bool(self.gemini_client),
             "openai_available": bool(self.openai_client),
             "gemini_model": self.gemini_model if self.gemini_client else None,
-            "openai_model": self.openai_model if self.openai_client else None
+            "openai_model": self.openai_model if self.openai_client else None,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "cache": self.cache.stats(),
+            "circuit_breakers": {name: breaker.stats() for name, breaker in self.breakers.items()},
+            "hedging": self.hedge.stats()
         }
 
 # Global LLM client instance
@@ -4,17 +4,17 @@ import logging
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 import uvicorn
-import subprocess
 import json
-import asyncio
 
 # Import our custom modules
 from mcp_server.llm_client import llm_client
 from prompts.rag_prompt import get_rag_prompt, get_tool_prompt, get_clean_rag_prompt
-from rag.retrieval import retrieve
+from rag.retrieval import retrieve, aretrieve, cite, index_store, query_embedding_cache, result_cache, retrieval_coalescer
+from rag.models import model_registry
+from rag.rerank import reranker
 
 load_dotenv()
 
@@ -27,6 +27,17 @@ app = FastAPI(
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+def warm_up_models():
+    """Start building the models in the background so requests never wait on them."""
+    model_registry.start_embedding_loading()
+    model_registry.start_paraphraser_loading()
+    reranker.start_loading()
+
+@app.on_event("shutdown")
+async def close_llm_connections():
+    await llm_client.aclose()
+
 # --- Request Models ---
 class ResumeRequest(BaseModel):
     resume_text: str
@@ -58,9 +69,26 @@ class StreamingChatRequest(BaseModel):
     format_preference: Optional[str] = "markdown"
     auto_tool_selection: bool = True
 
+# --- Streaming helpers ---
+def _content_event(text: str, is_final: bool = False) -> str:
+    return f"data: {json.dumps({'type': 'content', 'content': text, 'is_final': is_final})}\n\n"
+
+def _advice_format(format_preference: str, sources: List[str]) -> Tuple[str, Callable[[str], str], str]:
+    """Text before the advice, the escaping applied to it and the text after it, per response format."""
+    if format_preference == "markdown":
+        sources_text = "\n".join([f"- {source}" for source in sources])
+        return ("## Career Advice\n\n", lambda text: text,
+                f"\n\n### Sources:\n{sources_text}\n\n---\n*Advice generated using RAG-enhanced knowledge base*")
+    elif format_preference == "code":
+        # Escape quotes properly for JSON; escaping is per character, so it can be applied piece by piece
+        return ('```json\n{\n  "advice": "', lambda text: text.replace('"', '\\"').replace('\n', '\\n'),
+                f'",\n  "sources": {sources}\n}}\n```')
+    else:
+        return "Career Advice:\n\n", lambda text: text, f"\n\nSources: {', '.join(sources)}"
+
 # --- Tool 1: Enhanced Resume Analysis ---
 @app.post("/tools/analyze_resume")
-def analyze_resume(req: ResumeRequest):
+async def analyze_resume(req: ResumeRequest):
     """
     Analyze resume text and provide detailed feedback.
     
@@ -76,7 +104,7 @@ def analyze_resume(req: ResumeRequest):
         if req.use_llm and llm_client.is_available():
             # Use LLM for enhanced analysis
             prompt = get_tool_prompt("analyze_resume", req.resume_text)
-            response = llm_client.generate_response(prompt)
+            response = await llm_client.agenerate_response(prompt)
             return {
                 "feedback": response,
                 "analysis_type": "llm_enhanced",
@@ -129,7 +157,7 @@ def analyze_resume(req: ResumeRequest):
 
 # --- Tool 2: Enhanced Mock Interview ---
 @app.post("/tools/mock_interview")
-def mock_interview(req: InterviewRequest):
+async def mock_interview(req: InterviewRequest):
     """
     Generate role-specific interview questions and preparation tips.
     
@@ -143,7 +171,7 @@ def mock_interview(req: InterviewRequest):
         if req.use_llm and llm_client.is_available():
             # Use LLM for enhanced interview questions
             prompt = get_tool_prompt("mock_interview", req.position)
-            response = llm_client.generate_response(prompt)
+            response = await llm_client.agenerate_response(prompt)
             return {
                 "questions": response,
                 "position": req.position,
@@ -249,7 +277,7 @@ def career_guides_featured(req: GuideRequest):
             
             return {
                 "tips": response,
-                "sources": [doc['metadata']['file'] for doc in retrieved_docs],
+                "sources": [cite(doc['metadata']) for doc in retrieved_docs],
                 "query": req.query,
                 "generation_type": "rag_enhanced"
             }
@@ -258,7 +286,7 @@ def career_guides_featured(req: GuideRequest):
             tips = [doc['chunk'][:500] + "..." for doc in retrieved_docs]
             return {
                 "tips": tips,
-                "sources": [doc['metadata']['file'] for doc in retrieved_docs],
+                "sources": [cite(doc['metadata']) for doc in retrieved_docs],
                 "query": req.query,
                 "generation_type": "raw_retrieval"
             }
@@ -326,7 +354,7 @@ def chat_with_assistant(req: ChatRequest):
             
             return {
                 "response": response,
-                "sources": [doc['metadata']['file'] for doc in retrieved_docs],
+                "sources": [cite(doc['metadata']) for doc in retrieved_docs],
                 "reasoning": "Used RAG to provide relevant career advice"
             }
         
@@ -387,7 +415,7 @@ async def enhanced_chat_with_assistant(req: EnhancedChatRequest):
         Respond with just the action type.
         """
         
-        intent_response = llm_client.generate_response(intent_prompt, max_tokens=50).strip()
+        intent_response = (await llm_client.agenerate_response(intent_prompt, max_tokens=50)).strip()
         
         # Execute based on detected intent
         if "RESUME_ANALYSIS" in intent_response:
@@ -413,7 +441,7 @@ async def enhanced_chat_with_assistant(req: EnhancedChatRequest):
             
             # Call resume analysis tool
             try:
-                analysis_result = analyze_resume(ResumeRequest(resume_text=resume_text))
+                analysis_result = await analyze_resume(ResumeRequest(resume_text=resume_text))
                 
                 if req.format_preference == "markdown":
                     response = f"""## Resume Analysis Results
@@ -441,7 +469,12 @@ async def enhanced_chat_with_assistant(req: EnhancedChatRequest):
 }}
 ```"""
                 else:
-                    response = f"Resume Analysis Results:\n\nAnalysis Type: {analysis_result.get('analysis_type', 'Unknown')}\nResume Length: {analysis_result.get('resume_length', 0)} characters\n\nFeedback:\n{analysis_result.get('feedback', 'No feedback available')}"
+                    response = (
+                        "Resume Analysis Results:\n\n"
+                        f"Analysis Type: {analysis_result.get('analysis_type', 'Unknown')}\n"
+                        f"Resume Length: {analysis_result.get('resume_length', 0)} characters\n\n"
+                        f"Feedback:\n{analysis_result.get('feedback', 'No feedback available')}"
+                    )
                 
                 return {
                     "response": response,
@@ -482,7 +515,7 @@ async def enhanced_chat_with_assistant(req: EnhancedChatRequest):
             
             # Call mock interview tool
             try:
-                interview_result = mock_interview(InterviewRequest(position=position))
+                interview_result = await mock_interview(InterviewRequest(position=position))
                 
                 if req.format_preference == "markdown":
                     questions_text = "\n".join([f"{i+1}. {q}" for i, q in enumerate(interview_result.get('questions', []))])
@@ -533,17 +566,17 @@ async def enhanced_chat_with_assistant(req: EnhancedChatRequest):
             # Use RAG for career advice
             try:
                 # Retrieve relevant documents
-                retrieved_docs = retrieve(req.message, 3)
+                retrieved_docs = await aretrieve(req.message, 3)
                 context = "\n\n".join([doc['chunk'] for doc in retrieved_docs])
                 
                 if llm_client.is_available():
                     prompt = get_clean_rag_prompt(context, req.message)
-                    advice = llm_client.generate_response(prompt)
+                    advice = await llm_client.agenerate_response(prompt)
                 else:
                     advice = f"Based on our career guides, here's what I found:\n\n{context[:1000]}..."
                 
                 if req.format_preference == "markdown":
-                    sources_text = "\n".join([f"- {source}" for source in [doc['metadata']['file'] for doc in retrieved_docs]])
+                    sources_text = "\n".join([f"- {source}" for source in [cite(doc['metadata']) for doc in retrieved_docs]])
                     response = f"""## Career Advice
 
 {advice}
@@ -559,11 +592,11 @@ async def enhanced_chat_with_assistant(req: EnhancedChatRequest):
                     response = f"""```json
 {{
   "advice": "{escaped_advice}",
-  "sources": {[doc['metadata']['file'] for doc in retrieved_docs]}
+  "sources": {[cite(doc['metadata']) for doc in retrieved_docs]}
 }}
 ```"""
                 else:
-                    response = f"Career Advice:\n\n{advice}\n\nSources: {', '.join([doc['metadata']['file'] for doc in retrieved_docs])}"
+                    response = f"Career Advice:\n\n{advice}\n\nSources: {', '.join([cite(doc['metadata']) for doc in retrieved_docs])}"
                 
                 return {
                     "response": response,
@@ -583,7 +616,13 @@ async def enhanced_chat_with_assistant(req: EnhancedChatRequest):
         
         else:
             # General chat response
-            general_response = "I'm here to help with your career development! I can assist with:\n\n- **Resume Analysis**: Get detailed feedback on your resume\n- **Interview Preparation**: Receive role-specific interview questions\n- **Career Advice**: Access expert guidance on career transitions and development\n\nWhat would you like to work on today?"
+            general_response = (
+                "I'm here to help with your career development! I can assist with:\n\n"
+                "- **Resume Analysis**: Get detailed feedback on your resume\n"
+                "- **Interview Preparation**: Receive role-specific interview questions\n"
+                "- **Career Advice**: Access expert guidance on career transitions and development\n\n"
+                "What would you like to work on today?"
+            )
             
             if req.format_preference == "markdown":
                 response = f"""## Welcome to Career Coach AI!
@@ -675,7 +714,7 @@ async def streaming_chat_with_assistant(req: StreamingChatRequest):
             Respond with just the action type.
             """
             
-            intent_response = llm_client.generate_response(intent_prompt, max_tokens=50).strip()
+            intent_response = (await llm_client.agenerate_response(intent_prompt, max_tokens=50)).strip()
             
             # Send intent detection message
             yield f"data: {json.dumps({'type': 'intent', 'content': f'Detected intent: {intent_response}'})}\n\n"
@@ -704,7 +743,7 @@ async def streaming_chat_with_assistant(req: StreamingChatRequest):
                         # Show tool call step
                         yield f"data: {json.dumps({'type': 'tool_call', 'content': '📄 Calling resume analysis tool...'})}\n\n"
                         
-                        analysis_result = analyze_resume(ResumeRequest(resume_text=resume_text))
+                        analysis_result = await analyze_resume(ResumeRequest(resume_text=resume_text))
                         
                         # Show tool result
                         analysis_type = analysis_result.get('analysis_type', 'Unknown')
@@ -736,7 +775,12 @@ async def streaming_chat_with_assistant(req: StreamingChatRequest):
 }}
 ```"""
                         else:
-                            response = f"Resume Analysis Results:\n\nAnalysis Type: {analysis_result.get('analysis_type', 'Unknown')}\nResume Length: {analysis_result.get('resume_length', 0)} characters\n\nFeedback:\n{analysis_result.get('feedback', 'No feedback available')}"
+                            response = (
+                                "Resume Analysis Results:\n\n"
+                                f"Analysis Type: {analysis_result.get('analysis_type', 'Unknown')}\n"
+                                f"Resume Length: {analysis_result.get('resume_length', 0)} characters\n\n"
+                                f"Feedback:\n{analysis_result.get('feedback', 'No feedback available')}"
+                            )
                         
                         action = "resume_analysis_complete"
                         tools_used = ["analyze_resume"]
@@ -771,7 +815,7 @@ async def streaming_chat_with_assistant(req: StreamingChatRequest):
                         # Show tool call step
                         yield f"data: {json.dumps({'type': 'tool_call', 'content': f'🎯 Calling mock interview tool for {position}...'})}\n\n"
                         
-                        interview_result = mock_interview(InterviewRequest(position=position))
+                        interview_result = await mock_interview(InterviewRequest(position=position))
                         
                         # Show tool result
                         generation_type = interview_result.get('generation_type', 'Unknown')
@@ -825,50 +869,47 @@ async def streaming_chat_with_assistant(req: StreamingChatRequest):
                     # Show RAG retrieval step
                     yield f"data: {json.dumps({'type': 'tool_call', 'content': '🔍 Retrieving relevant career guides...'})}\n\n"
                     
-                    retrieved_docs = retrieve(req.message, 3)
-                    sources = [doc['metadata']['file'] for doc in retrieved_docs]
+                    retrieved_docs = await aretrieve(req.message, 3)
+                    sources = [cite(doc['metadata']) for doc in retrieved_docs]
                     
                     # Show what was found
                     sources_text = ", ".join(sources)
                     yield f"data: {json.dumps({'type': 'tool_result', 'content': f'📚 Found guides: {sources_text}'})}\n\n"
                     
                     context = "\n\n".join([doc['chunk'] for doc in retrieved_docs])
+                    prefix, escape, suffix = _advice_format(req.format_preference, sources)
                     
                     if llm_client.is_available():
                         # Show LLM processing step
                         yield f"data: {json.dumps({'type': 'llm_processing', 'content': '🤖 Generating personalized advice using AI...'})}\n\n"
                         
+                        # Forward the advice as the model writes it, inside the format's wrapper
                         prompt = get_clean_rag_prompt(context, req.message)
-                        advice = llm_client.generate_response(prompt)
+                        stream_error = None
+                        yield _content_event(prefix)
+                        try:
+                            async for delta in llm_client.astream_response(prompt):
+                                yield _content_event(escape(delta))
+                        except Exception as e:
+                            # Part of the advice is out: report the failure apart from it, and still close the wrapper
+                            logger.error(f"LLM stream failed mid-answer: {e}")
+                            stream_error = e
+                            error = {'type': 'error', 'content': f'The advice was cut short: {str(e)}'}
+                            yield f"data: {json.dumps(error)}\n\n"
+                        yield _content_event(suffix, is_final=True)
+                        response = None
                     else:
+                        stream_error = None
                         advice = f"Based on our career guides, here's what I found:\n\n{context[:1000]}..."
+                        response = prefix + escape(advice) + suffix
                     
-                    if req.format_preference == "markdown":
-                        sources_text = "\n".join([f"- {source}" for source in [doc['metadata']['file'] for doc in retrieved_docs]])
-                        response = f"""## Career Advice
-
-{advice}
-
-### Sources:
-{sources_text}
-
----
-*Advice generated using RAG-enhanced knowledge base*"""
-                    elif req.format_preference == "code":
-                        # Escape quotes properly for JSON
-                        escaped_advice = advice.replace('"', '\\"').replace('\n', '\\n')
-                        response = f"""```json
-{{
-  "advice": "{escaped_advice}",
-  "sources": {[doc['metadata']['file'] for doc in retrieved_docs]}
-}}
-```"""
-                    else:
-                        response = f"Career Advice:\n\n{advice}\n\nSources: {', '.join([doc['metadata']['file'] for doc in retrieved_docs])}"
-                    
-                    action = "career_advice_provided"
                     tools_used = ["career_guides"]
-                    reasoning = "Provided career advice using RAG"
+                    if stream_error is None:
+                        action = "career_advice_provided"
+                        reasoning = "Provided career advice using RAG"
+                    else:
+                        action = "error"
+                        reasoning = f"Career advice generation failed mid-stream: {str(stream_error)}"
                     
                 except Exception as e:
                     response = f"Sorry, I encountered an error while retrieving career advice: {str(e)}"
@@ -878,7 +919,13 @@ async def streaming_chat_with_assistant(req: StreamingChatRequest):
             
             else:
                 # General chat response
-                general_response = "I'm here to help with your career development! I can assist with:\n\n- **Resume Analysis**: Get detailed feedback on your resume\n- **Interview Preparation**: Receive role-specific interview questions\n- **Career Advice**: Access expert guidance on career transitions and development\n\nWhat would you like to work on today?"
+                general_response = (
+                    "I'm here to help with your career development! I can assist with:\n\n"
+                    "- **Resume Analysis**: Get detailed feedback on your resume\n"
+                    "- **Interview Preparation**: Receive role-specific interview questions\n"
+                    "- **Career Advice**: Access expert guidance on career transitions and development\n\n"
+                    "What would you like to work on today?"
+                )
                 
                 if req.format_preference == "markdown":
                     response = f"""## Welcome to Career Coach AI!
@@ -905,12 +952,9 @@ async def streaming_chat_with_assistant(req: StreamingChatRequest):
                 tools_used = []
                 reasoning = "Provided general welcome and capabilities overview"
             
-            # Stream the response in chunks
-            chunk_size = 50  # Characters per chunk
-            for i in range(0, len(response), chunk_size):
-                chunk = response[i:i + chunk_size]
-                yield f"data: {json.dumps({'type': 'content', 'content': chunk, 'is_final': i + chunk_size >= len(response)})}\n\n"
-                await asyncio.sleep(0.05)  # Small delay for smooth streaming
+            # Responses that were not streamed from the LLM above are complete already
+            if response is not None:
+                yield _content_event(response, is_final=True)
             
             # Send final metadata
             yield f"data: {json.dumps({'type': 'metadata', 'action': action, 'tools_used': tools_used, 'reasoning': reasoning, 'format': req.format_preference})}\n\n"
@@ -963,11 +1007,20 @@ def root():
 
 @app.get("/health")
 def health_check():
-    """Health check endpoint."""
+    """Health check endpoint; degraded while an LLM provider's circuit breaker is not closed."""
+    llm_providers = llm_client.get_provider_info()
+    breakers = llm_providers.get("circuit_breakers", {})
+    degraded = any(breaker["state"] != "closed" for breaker in breakers.values())
     return {
-        "status": "healthy",
+        "status": "degraded" if degraded else "healthy",
         "llm_available": llm_client.is_available(),
-        "llm_providers": llm_client.get_provider_info()
+        "llm_providers": llm_providers,
+        "index": index_store.stats(),
+        "models": model_registry.stats(),
+        "reranker": reranker.stats(),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "retrieval_batching": retrieval_coalescer.stats()
     }
 
 if __name__ == "__main__":
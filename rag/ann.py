@@ -0,0 +1,204 @@
+"""
+FAISS index construction and search settings for the vector store.
+
+Supported index types:
+- flat:     exact brute-force L2 scan (IndexFlatL2), the default
+- hnsw:     graph-based ANN (IndexHNSWFlat), params: M, ef_construction, ef_search
+- ivf_flat: inverted lists over full vectors (IndexIVFFlat), params: nlist, nprobe
+- ivf_pq:   inverted lists over product-quantized codes (IndexIVFPQ), params: nlist, nprobe, pq_m, pq_nbits
+
+The chosen type and parameters are written next to the index as
+index_info.json so retrieval can apply the matching search-time settings.
+Built with explicit ids, flat and HNSW indexes are wrapped in IndexIDMap2
+(IVF indexes map ids natively) so vectors can later be removed by id.
+"""
+
+import os
+import json
+import math
+import logging
+from typing import Any, Dict, Optional
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+INDEX_INFO_FILE = 'index_info.json'
+INDEX_TYPES = ('flat', 'hnsw', 'ivf_flat', 'ivf_pq')
+
+FAISS_INDEX_TYPE = os.getenv('FAISS_INDEX_TYPE', 'flat').lower()
+DEFAULT_INDEX_PARAMS = {
+    'hnsw_m': int(os.getenv('FAISS_HNSW_M', '32')),
+    'ef_construction': int(os.getenv('FAISS_HNSW_EF_CONSTRUCTION', '200')),
+    'ef_search': int(os.getenv('FAISS_HNSW_EF_SEARCH', '64')),
+    'nlist': int(os.getenv('FAISS_IVF_NLIST', '100')),
+    'nprobe': int(os.getenv('FAISS_IVF_NPROBE', '8')),
+    'pq_m': int(os.getenv('FAISS_PQ_M', '16')),
+    'pq_nbits': int(os.getenv('FAISS_PQ_NBITS', '8')),
+}
+
+# Index types whose vectors can be deleted by id (HNSW graphs cannot drop nodes)
+REMOVABLE_INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq')
+
+# FAISS wants roughly this many training points per k-means centroid
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def _effective_params(index_type: str, params: Dict[str, Any], n: int, dim: int) -> Dict[str, Any]:
+    """Keep only the parameters the index type uses, clamped to what the data supports."""
+    if index_type == 'hnsw':
+        return {k: int(params[k]) for k in ('hnsw_m', 'ef_construction', 'ef_search')}
+
+    nlist = max(1, min(int(params['nlist']), n // _MIN_POINTS_PER_CENTROID or 1))
+    if nlist != params['nlist']:
+        logger.warning(f"nlist={params['nlist']} is too large for {n} vectors; using nlist={nlist}")
+    effective = {'nlist': nlist, 'nprobe': max(1, min(int(params['nprobe']), nlist))}
+    if index_type == 'ivf_pq':
+        pq_m = int(params['pq_m'])
+        if dim % pq_m != 0:
+            pq_m = max(m for m in range(1, pq_m + 1) if dim % m == 0)
+            logger.warning(f"pq_m={params['pq_m']} does not divide dim={dim}; using pq_m={pq_m}")
+        pq_nbits = max(1, min(int(params['pq_nbits']), int(math.log2(max(n, 2)))))
+        if pq_nbits != params['pq_nbits']:
+            logger.warning(f"pq_nbits={params['pq_nbits']} needs more training data; using pq_nbits={pq_nbits}")
+        effective.update({'pq_m': pq_m, 'pq_nbits': pq_nbits})
+    return effective
+
+
+def supports_removal(index_type: str) -> bool:
+    return index_type.lower() in REMOVABLE_INDEX_TYPES
+
+
+def build_index(embeddings: np.ndarray, index_type: str = FAISS_INDEX_TYPE,
+                params: Dict[str, Any] = None, ids: Optional[np.ndarray] = None):
+    """
+    Build and populate a FAISS index of the requested type.
+
+    With ids, vectors are added under those (int64) ids instead of their
+    position, so they can be updated or removed individually later.
+
+    Returns:
+        (index, index_info) where index_info records the type and the
+        effective parameters, ready to be saved with save_index_info().
+    """
+    index_type = index_type.lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{index_type}'. Choose one of: {', '.join(INDEX_TYPES)}")
+    params = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+    embeddings = np.asarray(embeddings, dtype='float32')
+    n, dim = embeddings.shape
+
+    if index_type == 'flat':
+        index = faiss.IndexFlatL2(dim)
+        effective = {}
+    elif index_type == 'hnsw':
+        effective = _effective_params(index_type, params, n, dim)
+        index = faiss.IndexHNSWFlat(dim, effective['hnsw_m'])
+        index.hnsw.efConstruction = effective['ef_construction']
+    else:
+        effective = _effective_params(index_type, params, n, dim)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, dim, effective['nlist'])
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, effective['nlist'], effective['pq_m'], effective['pq_nbits'])
+        index.train(embeddings)
+
+    if ids is None:
+        index.add(embeddings)
+    else:
+        if index_type in ('flat', 'hnsw'):
+            index = faiss.IndexIDMap2(index)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype='int64'))
+    index_info = {'index_type': index_type, 'params': effective, 'dim': int(dim), 'ntotal': int(n)}
+    apply_search_params(index, index_info)
+    return index, index_info
+
+
+def training_sample_size(index_type: str = FAISS_INDEX_TYPE, params: Dict[str, Any] = None) -> int:
+    """Vectors an index of this type should see before it is trained (1 if it needs no training)."""
+    index_type = index_type.lower()
+    if index_type not in ('ivf_flat', 'ivf_pq'):
+        return 1
+    params = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+    centroids = int(params['nlist'])
+    if index_type == 'ivf_pq':
+        centroids = max(centroids, 2 ** int(params['pq_nbits']))
+    return _MIN_POINTS_PER_CENTROID * centroids
+
+
+class StreamingIndexBuilder:
+    """
+    Build an index from batches of (vectors, ids) without holding them all.
+
+    Flat and HNSW indexes are created from the first batch. IVF indexes
+    buffer vectors until they have a training sample, are trained on it, and
+    then take every later batch directly. Pass an existing index (and its
+    index_info) to keep adding to it instead.
+    """
+
+    def __init__(self, index_type: str = FAISS_INDEX_TYPE, params: Dict[str, Any] = None,
+                 index=None, index_info: Dict[str, Any] = None):
+        self.index_type = index_type.lower()
+        self.params = params
+        self.index = index
+        self.index_info = index_info
+        self.train_size = training_sample_size(self.index_type, params)
+        self._pending = []
+        self._pending_ids = []
+        self._pending_count = 0
+
+    def add(self, embeddings: np.ndarray, ids: np.ndarray):
+        embeddings = np.asarray(embeddings, dtype='float32')
+        ids = np.asarray(ids, dtype='int64')
+        if self.index is not None:
+            self.index.add_with_ids(embeddings, ids)
+            return
+        self._pending.append(embeddings)
+        self._pending_ids.append(ids)
+        self._pending_count += len(embeddings)
+        if self._pending_count >= self.train_size:
+            self._build()
+
+    def _build(self):
+        embeddings = np.concatenate(self._pending)
+        ids = np.concatenate(self._pending_ids)
+        self._pending, self._pending_ids, self._pending_count = [], [], 0
+        self.index, self.index_info = build_index(embeddings, self.index_type, self.params, ids=ids)
+
+    def finish(self):
+        """Return (index, index_info); corpora smaller than the training sample are trained on what there is."""
+        if self.index is None:
+            if not self._pending_count:
+                raise ValueError("No vectors were added to the index")
+            self._build()
+        self.index_info['ntotal'] = int(self.index.ntotal)
+        return self.index, self.index_info
+
+
+def apply_search_params(index, index_info: Dict[str, Any]):
+    """Set efSearch / nprobe on a loaded index from its recorded parameters."""
+    index_type = index_info.get('index_type', 'flat')
+    params = index_info.get('params', {})
+    if index_type == 'hnsw' and 'ef_search' in params:
+        base = faiss.downcast_index(index)
+        if isinstance(base, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            base = faiss.downcast_index(base.index)
+        base.hnsw.efSearch = int(params['ef_search'])
+    elif index_type in ('ivf_flat', 'ivf_pq') and 'nprobe' in params:
+        faiss.extract_index_ivf(index).nprobe = int(params['nprobe'])
+
+
+def save_index_info(path: str, index_info: Dict[str, Any]):
+    with open(os.path.join(path, INDEX_INFO_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index_info, f, indent=2)
+
+
+def load_index_info(path: str) -> Dict[str, Any]:
+    """Recorded index type and parameters; indexes built before this file existed are flat."""
+    try:
+        with open(os.path.join(path, INDEX_INFO_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'index_type': 'flat', 'params': {}}
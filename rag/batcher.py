@@ -0,0 +1,231 @@
+"""
+Cross-request micro-batching of query embedding and FAISS search.
+
+Concurrent retrieve() calls hand their query variants to one coalescer thread,
+which waits up to RETRIEVAL_BATCH_WINDOW_MS for other in-flight requests (or
+until RETRIEVAL_BATCH_MAX_SIZE requests are queued), then encodes every
+variant in one model call and searches them as one FAISS matrix. Each caller
+gets back its own rows.
+
+Callers announce themselves when they start retrieving, before paraphrasing,
+so the coalescer only waits while another request is actually on its way; a
+lone request is dispatched immediately and pays no window.
+
+A caller waits at most the window plus RETRIEVAL_BATCH_TIMEOUT_MS for its
+batch; past that (for instance if the coalescer thread has died) it searches
+on its own thread instead.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_BATCHING = os.getenv('RETRIEVAL_BATCHING', 'true').lower() == 'true'
+RETRIEVAL_BATCH_WINDOW_MS = float(os.getenv('RETRIEVAL_BATCH_WINDOW_MS', '3'))
+RETRIEVAL_BATCH_MAX_SIZE = int(os.getenv('RETRIEVAL_BATCH_MAX_SIZE', '32'))
+RETRIEVAL_BATCH_TIMEOUT_MS = float(os.getenv('RETRIEVAL_BATCH_TIMEOUT_MS', '2000'))
+
+SearchResult = Tuple[np.ndarray, np.ndarray, int, Dict[str, Any]]
+
+
+class Ticket:
+    """A caller that may submit a search soon; the coalescer waits for open tickets."""
+
+    def __init__(self, owner: Optional['RetrievalCoalescer']):
+        self._owner = owner
+        self.open = owner is not None
+
+    def close(self):
+        if self.open:
+            self._owner._withdraw(self)
+
+    def __enter__(self) -> 'Ticket':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Request:
+    __slots__ = ('queries', 'k', 'model_name', 'encode_fn', 'index', 'cache', 'enqueued_at', 'future')
+
+    def __init__(self, queries, k, model_name, encode_fn, index, cache):
+        self.queries = list(queries)
+        self.k = k
+        self.model_name = model_name
+        self.encode_fn = encode_fn
+        self.index = index
+        self.cache = cache
+        self.enqueued_at = time.perf_counter()
+        self.future: Future = Future()
+
+
+def _search(queries: Sequence[str], k: int, model_name: str, encode_fn: Callable, index, cache):
+    q_emb, hit_mask = cache.encode_with_hits(queries, model_name, encode_fn)
+    D, I = index.search(q_emb, k)
+    return D, I, hit_mask
+
+
+class RetrievalCoalescer:
+    """Collects concurrent searches into one encode and one index.search call."""
+
+    def __init__(self, window_ms: float = RETRIEVAL_BATCH_WINDOW_MS,
+                 max_batch: int = RETRIEVAL_BATCH_MAX_SIZE, enabled: bool = RETRIEVAL_BATCHING,
+                 timeout_ms: float = RETRIEVAL_BATCH_TIMEOUT_MS):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.timeout_ms = timeout_ms
+        self.enabled = enabled and max_batch > 1
+
+        self._cond = threading.Condition()
+        self._pending: List[_Request] = []
+        self._announced = 0
+        self._thread: Optional[threading.Thread] = None
+
+        self.batches = 0
+        self.requests = 0
+        self.timeouts = 0
+        self._batch_sizes: Counter = Counter()
+        self._queue_ms = deque(maxlen=2048)
+
+    # --- Caller side ---
+    def announce(self) -> Ticket:
+        """Register a caller that will probably call search() shortly."""
+        if not self.enabled:
+            return Ticket(None)
+        with self._cond:
+            self._announced += 1
+        return Ticket(self)
+
+    def _withdraw(self, ticket: Ticket):
+        with self._cond:
+            if ticket.open:
+                ticket.open = False
+                self._announced -= 1
+                self._cond.notify_all()
+
+    def search(self, ticket: Ticket, queries: Sequence[str], k: int, model_name: str,
+               encode_fn: Callable[[List[str]], Any], index, cache) -> SearchResult:
+        """
+        Embed queries (through the query embedding cache) and search index.
+
+        Returns:
+            (D, I, cache_hits, batch_info) for this caller's queries only;
+            batch_info records the batch size and the queueing delay added.
+            If the batch does not answer within the window plus timeout_ms,
+            the caller searches on its own.
+        """
+        if not self.enabled:
+            D, I, hit_mask = _search(queries, k, model_name, encode_fn, index, cache)
+            return D, I, int(hit_mask.sum()), {"batched": False, "batch_size": 1, "queue_ms": 0.0}
+
+        request = _Request(queries, k, model_name, encode_fn, index, cache)
+        with self._cond:
+            self._pending.append(request)
+            if ticket.open:
+                ticket.open = False
+                self._announced -= 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='retrieval-batcher', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        try:
+            return request.future.result(timeout=(self.window_ms + self.timeout_ms) / 1000)
+        except FutureTimeoutError:
+            pass
+
+        with self._cond:
+            if request in self._pending:
+                self._pending.remove(request)
+            self.timeouts += 1
+        queue_ms = (time.perf_counter() - request.enqueued_at) * 1000
+        logger.warning(f"Retrieval batch did not answer within {queue_ms:.0f}ms; searching directly")
+        D, I, hit_mask = _search(queries, k, model_name, encode_fn, index, cache)
+        return D, I, int(hit_mask.sum()), {"batched": False, "batch_size": 1, "queue_ms": round(queue_ms, 3)}
+
+    # --- Coalescer thread ---
+    def _next_batch(self) -> List[_Request]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.window_ms / 1000
+            # Wait only while other announced requests may still join.
+            while len(self._pending) < self.max_batch and self._announced > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch = self._next_batch()
+                groups: Dict[Tuple[int, str, int], List[_Request]] = {}
+                for request in batch:
+                    key = (id(request.index), request.model_name, id(request.cache))
+                    groups.setdefault(key, []).append(request)
+                for group in groups.values():
+                    self._dispatch(group)
+            except Exception as e:
+                # Never leave a caller of this batch waiting on a future nobody will set
+                logger.exception("Retrieval coalescer failed a batch")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _dispatch(self, group: List[_Request]):
+        started = time.perf_counter()
+        first = group[0]
+        all_queries = [q for r in group for q in r.queries]
+        k = max(r.k for r in group)
+        try:
+            D, I, hit_mask = _search(all_queries, k, first.model_name, first.encode_fn, first.index, first.cache)
+        except Exception as e:
+            for request in group:
+                request.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.requests += len(group)
+        self._batch_sizes[len(group)] += 1
+        row = 0
+        for request in group:
+            n = len(request.queries)
+            queue_ms = (started - request.enqueued_at) * 1000
+            self._queue_ms.append(queue_ms)
+            request.future.set_result((
+                D[row:row + n, :request.k], I[row:row + n, :request.k], int(hit_mask[row:row + n].sum()),
+                {"batched": True, "batch_size": len(group), "queue_ms": round(queue_ms, 3)},
+            ))
+            row += n
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size distribution and the queueing delay added by batching."""
+        delays = np.array(self._queue_ms) if self._queue_ms else None
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window_ms,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "requests": self.requests,
+            "timeouts": self.timeouts,
+            "mean_batch_size": round(self.requests / self.batches, 3) if self.batches else 0.0,
+            "batch_sizes": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+            "queue_ms_mean": round(float(delays.mean()), 3) if delays is not None else 0.0,
+            "queue_ms_p95": round(float(np.percentile(delays, 95)), 3) if delays is not None else 0.0,
+        }
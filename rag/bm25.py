@@ -0,0 +1,161 @@
+"""
+Compact BM25 inverted index over the indexed chunks.
+
+Postings are stored in CSR form: for term id t, the chunks containing it are
+doc_ids[offsets[t]:offsets[t + 1]] and their precomputed BM25 term weights
+(idf * saturated, length-normalised tf) are the matching slice of weights.
+Scoring a query is therefore a gather plus one np.bincount, with no Python
+loop over postings.
+
+Files written next to the FAISS index:
+    bm25_vocab.json      {"terms": [...], "k1": ..., "b": ..., "num_docs": ...}
+    bm25_offsets.npy     int64 [V + 1]
+    bm25_doc_ids.npy     int32 [P]
+    bm25_weights.npy     float32 [P]
+"""
+
+import os
+import re
+import json
+import math
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+BM25_VOCAB = 'bm25_vocab.json'
+BM25_OFFSETS = 'bm25_offsets.npy'
+BM25_DOC_IDS = 'bm25_doc_ids.npy'
+BM25_WEIGHTS = 'bm25_weights.npy'
+BM25_FILES = (BM25_VOCAB, BM25_OFFSETS, BM25_DOC_IDS, BM25_WEIGHTS)
+
+BM25_K1 = float(os.getenv('BM25_K1', '1.5'))
+BM25_B = float(os.getenv('BM25_B', '0.75'))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its me my of on or our
+should so than that the their them then there these they this to was we what when where which who why will
+with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Read-only BM25 index with vectorized scoring."""
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, doc_ids: np.ndarray,
+                 weights: np.ndarray, num_docs: int, k1: float = BM25_K1, b: float = BM25_B):
+        self.terms = terms
+        self.term_ids: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.num_docs = num_docs
+        self.k1 = k1
+        self.b = b
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.offsets.nbytes + self.doc_ids.nbytes + self.weights.nbytes)
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = BM25_K1, b: float = BM25_B) -> 'BM25Index':
+        # One pass over texts, so they can be streamed (e.g. from the memory-mapped chunk store);
+        # postings are packed int arrays rather than lists of tuples to keep the build small.
+        postings: Dict[str, Tuple[array, array]] = {}
+        lengths = array('i')
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                plist = postings.get(term)
+                if plist is None:
+                    plist = postings[term] = (array('i'), array('i'))
+                plist[0].append(doc_id)
+                plist[1].append(tf)
+        num_docs = len(lengths)
+        doc_lens = np.frombuffer(lengths, dtype=np.int32).astype(np.float32)
+        avgdl = float(doc_lens.mean()) if num_docs and doc_lens.sum() else 1.0
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term][0])
+        doc_ids = np.empty(int(offsets[-1]), dtype=np.int32)
+        weights = np.empty(int(offsets[-1]), dtype=np.float32)
+        for i, term in enumerate(terms):
+            plist_ids, plist_tfs = postings.pop(term)
+            ids = np.frombuffer(plist_ids, dtype=np.int32)
+            tfs = np.frombuffer(plist_tfs, dtype=np.int32).astype(np.float32)
+            df = len(ids)
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * doc_lens[ids] / avgdl)
+            start, end = offsets[i], offsets[i + 1]
+            doc_ids[start:end] = ids
+            weights[start:end] = idf * tfs * (k1 + 1) / (tfs + norm)
+        return cls(terms, offsets, doc_ids, weights, num_docs, k1, b)
+
+    def search(self, query: str, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (doc_ids, scores) of the best top_k chunks, best first."""
+        ids = [self.term_ids[t] for t in set(tokenize(query)) if t in self.term_ids]
+        if not ids or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if len(ids) == 1:
+            start, end = self.offsets[ids[0]], self.offsets[ids[0] + 1]
+            docs, w = self.doc_ids[start:end], self.weights[start:end]
+        else:
+            docs = np.concatenate([self.doc_ids[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+            w = np.concatenate([self.weights[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        scores = np.bincount(docs, weights=w, minlength=self.num_docs)
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = np.argsort(-scores[candidates], kind='stable')
+        best = candidates[order]
+        return best.astype(np.int64), scores[best].astype(np.float32)
+
+    def save(self, path: str):
+        with open(os.path.join(path, BM25_VOCAB), 'w', encoding='utf-8') as f:
+            json.dump({'terms': self.terms, 'k1': self.k1, 'b': self.b, 'num_docs': self.num_docs}, f)
+        np.save(os.path.join(path, BM25_OFFSETS), self.offsets)
+        np.save(os.path.join(path, BM25_DOC_IDS), self.doc_ids)
+        np.save(os.path.join(path, BM25_WEIGHTS), self.weights)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        with open(os.path.join(path, BM25_VOCAB), 'r', encoding='utf-8') as f:
+            vocab = json.load(f)
+        return cls(
+            vocab['terms'],
+            np.load(os.path.join(path, BM25_OFFSETS), mmap_mode='r'),
+            np.load(os.path.join(path, BM25_DOC_IDS), mmap_mode='r'),
+            np.load(os.path.join(path, BM25_WEIGHTS), mmap_mode='r'),
+            vocab['num_docs'], vocab['k1'], vocab['b'],
+        )
+
+
+def load_bm25_index(path: str):
+    """The BM25 index in path, or None for indexes built without one."""
+    if not all(os.path.exists(os.path.join(path, name)) for name in BM25_FILES):
+        return None
+    return BM25Index.load(path)
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse several best-first id rankings; returns (ids, fused scores), best first."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            doc_id = int(doc_id)
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    if not fused:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    ids = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float64, count=len(fused))
+    order = np.argsort(-scores, kind='stable')
+    return ids[order], scores[order].astype(np.float32)
@@ -0,0 +1,188 @@
+"""
+Splitting guides into chunks for embedding.
+
+Two strategies, chosen with CHUNKING:
+
+    chars   fixed windows of CHUNK_SIZE characters overlapping by CHUNK_OVERLAP
+    tokens  chunks that fit the embedding model's window of max_seq_length
+            word-pieces (special tokens included; CHUNK_MAX_TOKENS overrides
+            it), split at the best markdown
+            boundary available: top-level headings, then sub-headings,
+            paragraphs, lines and sentences; a block with no boundary left is
+            cut into token windows overlapping by CHUNK_OVERLAP_TOKENS
+
+Character windows ignore the model's limit, so with all-MiniLM-L6-v2 (256
+word-pieces) the tail of a long chunk is never embedded although it is still
+retrieved and quoted. The token chunker tokenizes each document once and
+measures every candidate span from that tokenization's character offsets.
+"""
+
+import os
+import re
+import json
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+CHUNKING_STRATEGIES = ('tokens', 'chars')
+CHUNKING = os.getenv('CHUNKING', 'tokens').lower()
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS') or 0)  # 0: the embedding model's max_seq_length
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '32'))
+
+# Split points, best first; each pattern matches (zero-width) where a new piece starts
+_BOUNDARIES = [
+    re.compile(r'^(?=#{1,2} )', re.MULTILINE),    # top-level headings
+    re.compile(r'^(?=#{3,6} )', re.MULTILINE),    # sub-headings
+    re.compile(r'(?<=\n\n)(?=\S)'),               # paragraphs
+    re.compile(r'(?<=\n)(?=\S)'),                 # lines (list items)
+    re.compile(r'(?<=[.!?] )(?=\S)'),              # sentences
+]
+
+_tokenizers: Dict[str, Any] = {}
+_max_tokens: Dict[str, int] = {}
+# Window assumed when neither the model nor its tokenizer states one
+_DEFAULT_MAX_TOKENS = 256
+
+
+def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        chunks.append(text[start:end])
+        if end == len(text):
+            break
+        start += chunk_size - overlap
+    return chunks
+
+
+def load_tokenizer(model_name: str):
+    """The (fast) tokenizer of a sentence-transformers model, cached per process."""
+    if model_name not in _tokenizers:
+        from transformers import AutoTokenizer
+
+        error = None
+        for candidate in _model_ids(model_name):
+            try:
+                _tokenizers[model_name] = AutoTokenizer.from_pretrained(candidate, use_fast=True)
+                break
+            except Exception as e:
+                error = e
+        else:
+            raise error
+    return _tokenizers[model_name]
+
+
+def _model_ids(model_name: str) -> List[str]:
+    """Where a sentence-transformers model name may live: its hub organisation first, as SentenceTransformer resolves it."""
+    if '/' not in model_name and not os.path.isdir(model_name):
+        return [f'sentence-transformers/{model_name}', model_name]
+    return [model_name]
+
+
+def model_max_tokens(model_name: str) -> int:
+    """
+    The window SentenceTransformer truncates the model's input to (special
+    tokens included): max_seq_length from its sentence_bert_config.json,
+    else the tokenizer's model_max_length. Cached per process.
+    """
+    if model_name not in _max_tokens:
+        limit = None
+        for candidate in _model_ids(model_name):
+            try:
+                if os.path.isdir(candidate):
+                    path = os.path.join(candidate, 'sentence_bert_config.json')
+                else:
+                    from huggingface_hub import hf_hub_download
+                    path = hf_hub_download(candidate, 'sentence_bert_config.json')
+                with open(path, 'r', encoding='utf-8') as f:
+                    limit = json.load(f).get('max_seq_length')
+            except Exception:
+                continue
+            if limit:
+                break
+        if not limit:
+            # Tokenizers without a limit report a huge sentinel
+            limit = getattr(load_tokenizer(model_name), 'model_max_length', None)
+            if not limit or limit > 100_000:
+                limit = _DEFAULT_MAX_TOKENS
+        _max_tokens[model_name] = int(limit)
+    return _max_tokens[model_name]
+
+
+def token_offsets(tokenizer, text: str) -> np.ndarray:
+    """[n, 2] character (start, end) of every word-piece in text, without special tokens."""
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    offsets = np.asarray(encoding['offset_mapping'], dtype=np.int64)
+    return offsets.reshape(-1, 2)
+
+
+def _pieces(text: str, start: int, end: int, boundary: re.Pattern) -> List[Tuple[int, int]]:
+    cuts = [start] + [m.start() for m in boundary.finditer(text, start, end) if m.start() > start] + [end]
+    return list(zip(cuts, cuts[1:]))
+
+
+def chunk_by_tokens(text: str, offsets: np.ndarray, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens tokens.
+
+    Args:
+        offsets: token (start, end) character offsets from token_offsets()
+        max_tokens: token budget per chunk, excluding special tokens
+        overlap_tokens: overlap between windows of a block that has no boundary left
+    """
+    starts = offsets[:, 0] if len(offsets) else np.empty(0, dtype=np.int64)
+
+    def count(a: int, b: int) -> int:
+        return int(np.searchsorted(starts, b) - np.searchsorted(starts, a))
+
+    def windows(a: int, b: int) -> List[Tuple[int, int]]:
+        first, last = int(np.searchsorted(starts, a)), int(np.searchsorted(starts, b))
+        step = max(1, max_tokens - overlap_tokens)
+        spans = []
+        for i in range(first, last, step):
+            j = min(i + max_tokens, last)
+            spans.append((int(offsets[i, 0]), int(offsets[j - 1, 1])))
+            if j == last:
+                break
+        return spans
+
+    def split(a: int, b: int, level: int) -> List[Tuple[int, int]]:
+        if count(a, b) <= max_tokens:
+            return [(a, b)]
+        if level == len(_BOUNDARIES):
+            return windows(a, b)
+        pieces = _pieces(text, a, b, _BOUNDARIES[level])
+        if len(pieces) == 1:
+            return split(a, b, level + 1)
+        # Pack neighbouring pieces while they fit; a piece that is too big on its own is split further
+        spans: List[Tuple[int, int]] = []
+        current = None
+        for piece in pieces:
+            if current is not None and count(current[0], piece[1]) <= max_tokens:
+                current = (current[0], piece[1])
+                continue
+            if current is not None:
+                spans.append(current)
+            if count(*piece) <= max_tokens:
+                current = piece
+            else:
+                spans.extend(split(piece[0], piece[1], level + 1))
+                current = None
+        if current is not None:
+            spans.append(current)
+        return spans
+
+    if not text.strip():
+        return []
+    chunks = [text[a:b].strip() for a, b in split(0, len(text), 0)]
+    return [chunk for chunk in chunks if chunk]
+
+
+def chunk_document_text(text: str, settings: Dict[str, Any]) -> List[str]:
+    """Chunk one document with the strategy and sizes in settings (see rag.indexing._settings)."""
+    if settings.get('chunking', 'chars') == 'tokens':
+        tokenizer = load_tokenizer(settings['embedding_model'])
+        budget = settings['chunk_max_tokens'] - tokenizer.num_special_tokens_to_add()
+        return chunk_by_tokens(text, token_offsets(tokenizer, text), budget, settings['chunk_overlap_tokens'])
+    return chunk_text(text, settings['chunk_size'], settings['chunk_overlap'])
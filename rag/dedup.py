@@ -0,0 +1,176 @@
+"""
+Near-duplicate chunk detection with MinHash and locality-sensitive hashing.
+
+Guides repeat each other (the same networking advice appears in several
+files), so the indexer keeps one representative of every group of chunks
+whose word 5-gram sets have a Jaccard similarity of at least
+CHUNK_DEDUP_THRESHOLD. Duplicates stay in the chunk store, marked with
+'duplicate_of', but get no vector, so they take no top-k slot and no
+prompt space; the representative's metadata lists them under 'also_in'.
+
+Each chunk is reduced to a MINHASH_PERMUTATIONS-value signature. The
+signature is cut into MINHASH_BANDS bands and only chunks that share a
+band exactly are compared, so finding the duplicates of a chunk costs
+about the same however many chunks are indexed, instead of one comparison
+per indexed chunk.
+"""
+
+import os
+import re
+import hashlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+CHUNK_DEDUP = os.getenv('CHUNK_DEDUP', 'true').lower() == 'true'
+CHUNK_DEDUP_THRESHOLD = float(os.getenv('CHUNK_DEDUP_THRESHOLD', '0.8'))
+MINHASH_PERMUTATIONS = 128
+# 32 bands of 4 rows: chunk pairs at 0.8 similarity share a band with probability > 0.9999,
+# pairs at 0.3 with probability 0.23 (and are then rejected by comparing signatures)
+MINHASH_BANDS = 32
+SHINGLE_WORDS = 5
+MINHASH_FILE = 'minhash.npy'
+
+_WORD = re.compile(r'\w+')
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> Set[str]:
+    """Word n-grams of text, lowercased; text shorter than size words is one shingle."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHasher:
+    """MinHash signatures from seeded multiply-shift hash functions, identical in every process."""
+
+    def __init__(self, permutations: int = MINHASH_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.permutations = permutations
+        self._a = rng.integers(1, 2 ** 63, size=permutations, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=permutations, dtype=np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """uint32 [permutations] signature, or None for text without words."""
+        grams = shingles(text)
+        if not grams:
+            return None
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(g.encode('utf-8'), digest_size=8).digest(), 'little') for g in grams),
+            dtype=np.uint64, count=len(grams))
+        # (a * x + b) mod 2**64, top 32 bits; uint64 arithmetic wraps by design
+        values = (hashes[:, None] * self._a + self._b) >> np.uint64(32)
+        return values.min(axis=0).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity: the share of signature positions that agree."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """LSH index of MinHash signatures, keyed by an int (the chunk-store row)."""
+
+    def __init__(self, threshold: float = CHUNK_DEDUP_THRESHOLD, permutations: int = MINHASH_PERMUTATIONS,
+                 bands: int = MINHASH_BANDS):
+        if permutations % bands:
+            raise ValueError(f"{permutations} MinHash permutations cannot be split into {bands} bands")
+        self.threshold = threshold
+        self.rows = permutations // bands
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+        self.comparisons = 0
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _bands(self, signature: np.ndarray) -> Iterable[bytes]:
+        for i in range(len(self._buckets)):
+            yield signature[i * self.rows:(i + 1) * self.rows].tobytes()
+
+    def add(self, key: int, signature: np.ndarray):
+        self._signatures[key] = signature
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            bucket.setdefault(band, []).append(key)
+
+    def find(self, signature: np.ndarray) -> Optional[int]:
+        """Most similar indexed key at or above the threshold (lowest key on ties), or None."""
+        candidates = set()
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            candidates.update(bucket.get(band, ()))
+        best, best_similarity = None, self.threshold
+        for key in sorted(candidates):
+            self.comparisons += 1
+            s = similarity(signature, self._signatures[key])
+            if s > best_similarity or (best is None and s >= best_similarity):
+                best, best_similarity = key, s
+        return best
+
+
+class ChunkDeduplicator:
+    """
+    Streaming deduplication for the indexer.
+
+    check() is called with each chunk-store row in order and returns the
+    row it duplicates, or None if the chunk becomes a representative. The
+    signatures of representatives are saved row-aligned (zeros for other
+    rows) in MINHASH_FILE, so an incremental build only hashes new chunks.
+    """
+
+    def __init__(self, threshold: float = CHUNK_DEDUP_THRESHOLD):
+        self.hasher = MinHasher()
+        self.index = NearDuplicateIndex(threshold, self.hasher.permutations)
+        self._signatures = array('I')
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._signatures) // self.hasher.permutations
+
+    def _store(self, row: int, signature: Optional[np.ndarray]):
+        values = signature if signature is not None else np.zeros(self.hasher.permutations, dtype=np.uint32)
+        if row == len(self):
+            self._signatures.frombytes(values.tobytes())
+        else:
+            start = row * self.hasher.permutations
+            self._signatures[start:start + self.hasher.permutations] = array('I', values.tobytes())
+
+    def load(self, path: str, dead: Set[int] = frozenset()) -> bool:
+        """Take over the representatives saved in path, except rows in dead; False if there is no file."""
+        try:
+            signatures = np.load(os.path.join(path, MINHASH_FILE), mmap_mode='r')
+        except FileNotFoundError:
+            return False
+        for row in range(len(signatures)):
+            signature = np.array(signatures[row])
+            if row in dead or not signature.any():
+                self._store(row, None)
+            else:
+                self._store(row, signature)
+                self.index.add(row, signature)
+        return True
+
+    def skip(self, row: int):
+        """Record a row that takes no part in deduplication (e.g. a tombstone or a kept duplicate)."""
+        self._store(row, None)
+
+    def check(self, row: int, text: str) -> Optional[int]:
+        signature = self.hasher.signature(text)
+        representative = self.index.find(signature) if signature is not None else None
+        if representative is None:
+            self._store(row, signature)
+            if signature is not None:
+                self.index.add(row, signature)
+        else:
+            self._store(row, None)
+            self.duplicates += 1
+        return representative
+
+    def save(self, path: str):
+        with open(os.path.join(path, MINHASH_FILE), 'wb') as f:
+            np.save(f, np.frombuffer(self._signatures, dtype=np.uint32).reshape(-1, self.hasher.permutations))
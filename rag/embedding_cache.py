@@ -0,0 +1,148 @@
+"""
+LRU cache of query embeddings.
+
+Queries are keyed by their normalized text (case, whitespace and punctuation
+folded) plus the embedding model name, so "How do I negotiate salary?" and
+"how do i negotiate  salary" share one entry. Punctuation that is part of a
+name is kept, so "C++", "C#" and "C" or "Node.js" and "Node js" do not. The cache is bounded both by
+entry count and by the bytes held in embeddings, and is emptied as soon as a
+different embedding model is requested.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '2048'))
+QUERY_EMBEDDING_CACHE_MAX_MB = float(os.getenv('QUERY_EMBEDDING_CACHE_MAX_MB', '16'))
+
+# Punctuation, except + and # ending a word (C++, C#) and a dot before one (Node.js, .NET)
+_PUNCTUATION = re.compile(r"(?!(?<=[\w+#])[+#])(?!(?<![^\w\s])\.(?=\w))[^\w\s]", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, punctuation (other than in names such as C++, C# or Node.js) and runs of whitespace."""
+    text = _PUNCTUATION.sub(' ', query.casefold())
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class QueryEmbeddingCache:
+    """Thread-safe, size- and memory-capped LRU of query embeddings."""
+
+    def __init__(self, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE,
+                 max_bytes: int = int(QUERY_EMBEDDING_CACHE_MAX_MB * 1024 * 1024)):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._model_name = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def _check_model(self, model_name: str):
+        """Drop every entry when the embedding model changes. Caller holds the lock."""
+        if self._model_name != model_name:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._model_name = model_name
+
+    def _put(self, key: Tuple[str, str], vector: np.ndarray):
+        """Insert one vector and evict from the LRU end. Caller holds the lock."""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        self._entries[key] = vector
+        self._bytes += vector.nbytes
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def encode(self, queries: Sequence[str], model_name: str,
+               encode_fn: Callable[[List[str]], Any]) -> Tuple[np.ndarray, int]:
+        """
+        Embed queries, encoding only cache misses (in one batch).
+
+        Returns:
+            (embeddings as a float32 matrix in query order, number of cache hits)
+        """
+        embeddings, hit_mask = self.encode_with_hits(queries, model_name, encode_fn)
+        return embeddings, int(hit_mask.sum())
+
+    def encode_with_hits(self, queries: Sequence[str], model_name: str,
+                         encode_fn: Callable[[List[str]], Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """Like encode(), but returns a per-query boolean mask of cache hits."""
+        if not self.enabled:
+            return np.asarray(encode_fn(list(queries)), dtype='float32'), np.zeros(len(queries), dtype=bool)
+
+        keys = [(model_name, normalize_query(q)) for q in queries]
+        vectors: List[Any] = [None] * len(queries)
+        missing: Dict[Tuple[str, str], List[int]] = {}
+        with self._lock:
+            self._check_model(model_name)
+            for i, key in enumerate(keys):
+                cached = self._entries.get(key)
+                if cached is not None:
+                    self._entries.move_to_end(key)
+                    vectors[i] = cached
+                else:
+                    missing.setdefault(key, []).append(i)
+            # Both counted per query, so a repeated query counts every time it is looked up
+            hits = len(queries) - sum(len(v) for v in missing.values())
+            self.hits += hits
+            self.misses += len(queries) - hits
+
+        if missing:
+            miss_keys = list(missing)
+            texts = [queries[missing[k][0]] for k in miss_keys]
+            encoded = np.asarray(encode_fn(texts), dtype='float32')
+            with self._lock:
+                self._check_model(model_name)
+                for key, vector in zip(miss_keys, encoded):
+                    vector = np.array(vector, dtype='float32')  # own the memory, not a view of the batch
+                    vector.setflags(write=False)
+                    self._put(key, vector)
+                    for i in missing[key]:
+                        vectors[i] = vector
+
+        hit_mask = np.ones(len(queries), dtype=bool)
+        for positions in missing.values():
+            hit_mask[positions] = False
+        return np.vstack(vectors), hit_mask
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "model": self._model_name,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
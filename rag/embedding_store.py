@@ -0,0 +1,363 @@
+"""
+Persistent on-disk cache of chunk embeddings for the indexer.
+
+Vectors are keyed by (embedding model, SHA-256 of the chunk text), so a
+re-chunked corpus, a CI re-run or a rebuild after a settings change only
+encodes text the model has not seen before. Each model gets its own
+directory under EMBEDDING_STORE_PATH:
+
+    vectors.f32     float32 [n, dim] rows back to back, memory-mapped for reads
+    keys.npy        V32 [n] SHA-256 digest of each row's text
+    last_used.npy   int64 [n] build generation that last read or wrote the row
+    store.json      model name, dimension and current generation
+    store.lock      held (flock) by the build writing the store
+
+New rows are appended (flush() can be called between batches to bound
+memory); keys.npy is replaced atomically by save() afterwards, so rows
+written by an interrupted build are simply ignored, and store.json is written
+last. When the store grows past
+EMBEDDING_STORE_MAX_MB, compaction keeps the most recently used rows.
+
+One build writes a model's store at a time: a store holds the lock from
+opening until save() or close(), so a manual build started next to the
+--watch indexer waits for the other to finish with the store instead of
+truncating its rows.
+
+Usage:
+    python -m rag.embedding_store stats|compact|clear
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import logging
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds must not overlap
+    fcntl = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_STORE_ENABLED = os.getenv('EMBEDDING_STORE_ENABLED', 'true').lower() == 'true'
+EMBEDDING_STORE_PATH = os.getenv('EMBEDDING_STORE_PATH', './data/embedding_store')
+EMBEDDING_STORE_MAX_MB = float(os.getenv('EMBEDDING_STORE_MAX_MB', '512'))
+
+VECTORS_FILE = 'vectors.f32'
+KEYS_FILE = 'keys.npy'
+LAST_USED_FILE = 'last_used.npy'
+STORE_INFO_FILE = 'store.json'
+LOCK_FILE = 'store.lock'
+_DIGEST = 'V32'  # raw bytes; 'S' would strip trailing NULs
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def _model_dir(root: str, model_name: str) -> str:
+    return os.path.join(root, re.sub(r'[^A-Za-z0-9._-]+', '_', model_name))
+
+
+def _save_atomic(path: str, array: np.ndarray):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+class EmbeddingStore:
+    """Embeddings of previously seen chunk texts for one model."""
+
+    def __init__(self, model_name: str, root: str = EMBEDDING_STORE_PATH, max_mb: float = EMBEDDING_STORE_MAX_MB,
+                 lock: bool = True):
+        self.model_name = model_name
+        self.path = _model_dir(root, model_name)
+        self.max_mb = max_mb
+        self.dim = None
+        self.generation = 0
+        self._keys = np.empty(0, dtype=_DIGEST)
+        self._last_used = np.empty(0, dtype=np.int64)
+        self._vectors = None
+        self._rows: Dict[bytes, int] = {}
+        self._new_keys: List[bytes] = []
+        self._new_vectors: List[np.ndarray] = []
+        self.hits = 0
+        self.misses = 0
+        self.compacted = 0
+        # Builds lock before reading, so they extend the latest store; lock=False only reads (writes still lock)
+        self._lock_file = None
+        if lock:
+            self._acquire()
+        self._load()
+
+    # --- Locking ---
+    def _acquire(self) -> bool:
+        """Take the store's write lock, waiting for another build to release it; False if already held."""
+        if self._lock_file is not None or fcntl is None:
+            return False
+        os.makedirs(self.path, exist_ok=True)
+        lock_file = open(os.path.join(self.path, LOCK_FILE), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info(f"Waiting for another build to finish writing the embedding store {self.path}")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        self._lock_file = lock_file
+        return True
+
+    def close(self):
+        """Release the write lock without saving; vectors not saved are dropped by the next build."""
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _lock_for_writing(self):
+        """Take the lock again after save(), picking up what other builds saved in between."""
+        if not self._acquire():
+            return
+        try:
+            with open(os.path.join(self.path, STORE_INFO_FILE), 'r', encoding='utf-8') as f:
+                generation = json.load(f).get('generation')
+        except (OSError, ValueError):
+            generation = None
+        if generation is not None and generation != self.generation:
+            self._reload()
+
+    def _reload(self):
+        """Load the store from disk again, keeping the vectors added since the last flush."""
+        pending = list(zip(self._new_keys, self._new_vectors))
+        self._keys = np.empty(0, dtype=_DIGEST)
+        self._last_used = np.empty(0, dtype=np.int64)
+        self._vectors, self._rows = None, {}
+        self._new_keys, self._new_vectors = [], []
+        self._load()
+        for key, vector in pending:
+            if key not in self._rows:
+                self._rows[key] = len(self)
+                self._new_keys.append(key)
+                self._new_vectors.append(vector)
+
+    # --- Loading ---
+    def _load(self):
+        try:
+            with open(os.path.join(self.path, STORE_INFO_FILE), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            keys = np.load(os.path.join(self.path, KEYS_FILE))
+            last_used = np.load(os.path.join(self.path, LAST_USED_FILE))
+            dim = int(info['dim'])
+            vectors = np.memmap(os.path.join(self.path, VECTORS_FILE), dtype=np.float32, mode='r',
+                                shape=(len(keys), dim)) if len(keys) else None
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable embedding store in {self.path}: {e}")
+            return
+        if info.get('model') != self.model_name or len(last_used) != len(keys):
+            logger.warning(f"Ignoring inconsistent embedding store in {self.path}")
+            return
+        self.dim = dim
+        self.generation = int(info.get('generation', 0))
+        self._keys, self._last_used, self._vectors = keys, last_used, vectors
+        self._rows = {key: row for row, key in enumerate(keys.tolist())}
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._new_keys)
+
+    @property
+    def max_rows(self) -> int:
+        if not self.dim:
+            return 0
+        return int(self.max_mb * 1024 * 1024 // (self.dim * 4))
+
+    # --- Lookup ---
+    def encode(self, texts: Sequence[str], encode_fn: Callable[[List[str]], Any]) -> Tuple[np.ndarray, int]:
+        """
+        Embeddings for texts, encoding only the ones not in the store.
+
+        Returns:
+            (float32 [len(texts), dim] embeddings, number of texts served from the store)
+        """
+        digests = [text_digest(t) for t in texts]
+        rows = [self._rows.get(d) for d in digests]
+        # Texts seen for the first time, each encoded once even if repeated
+        missing: Dict[bytes, int] = {}
+        for i, row in enumerate(rows):
+            if row is None and digests[i] not in missing:
+                missing[digests[i]] = i
+
+        fresh = None
+        if missing:
+            fresh = np.asarray(encode_fn([texts[i] for i in missing.values()]), dtype=np.float32)
+            if fresh.ndim != 2 or len(fresh) != len(missing):
+                raise ValueError(f"Expected {len(missing)} embeddings, got an array of shape {fresh.shape}")
+            if self.dim is None:
+                self.dim = int(fresh.shape[1])
+            elif fresh.shape[1] != self.dim:
+                raise ValueError(f"{self.model_name} returned {fresh.shape[1]}-d vectors; the store holds {self.dim}-d")
+        if not texts:
+            return np.empty((0, self.dim or 0), dtype=np.float32), 0
+
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        hit_rows = [(i, row) for i, row in enumerate(rows) if row is not None]
+        if hit_rows:
+            positions, stored = zip(*hit_rows)
+            out[list(positions)] = self._read_rows(np.asarray(stored))
+        if fresh is not None:
+            first_new = len(self)
+            for j, digest in enumerate(missing):
+                self._rows[digest] = first_new + j
+            self._new_keys.extend(missing)
+            self._new_vectors.extend(fresh)
+            for i, row in enumerate(rows):
+                if row is None:
+                    out[i] = fresh[self._rows[digests[i]] - first_new]
+
+        self.hits += len(hit_rows)
+        self.misses += len(texts) - len(hit_rows)
+        return out, len(hit_rows)
+
+    def _read_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Rows may point into the memory-mapped file or at vectors added this build."""
+        stored = len(self._keys)
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        on_disk = rows < stored
+        if on_disk.any():
+            out[on_disk] = self._vectors[rows[on_disk]]
+            self._last_used[rows[on_disk]] = self.generation + 1
+        for i in np.flatnonzero(~on_disk):
+            out[i] = self._new_vectors[rows[i] - stored]
+        return out
+
+    # --- Persistence ---
+    def flush(self):
+        """Append vectors added since the last flush to vectors.f32, freeing them from memory."""
+        if not self._new_keys:
+            return
+        self._lock_for_writing()
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, VECTORS_FILE), 'ab') as f:
+            # Drop rows left by an interrupted build before appending
+            f.truncate(len(self._keys) * self.dim * 4)
+            f.write(np.stack(self._new_vectors).astype(np.float32).tobytes())
+        self._keys = np.concatenate([self._keys, np.array(self._new_keys, dtype=_DIGEST)])
+        self._last_used = np.concatenate([
+            self._last_used, np.full(len(self._new_keys), self.generation + 1, dtype=np.int64)])
+        self._new_keys, self._new_vectors = [], []
+        self._remap()
+
+    def save(self):
+        """Flush, record this build, compact if the store is over its size limit, and release the lock."""
+        if self.dim is None:
+            self.close()
+            return
+        self._lock_for_writing()
+        try:
+            self.flush()
+            self.generation += 1
+            os.makedirs(self.path, exist_ok=True)
+            self._vectors = None  # release the old map before the files change
+            if len(self._keys) > self.max_rows:
+                self._compact(self.max_rows)
+            else:
+                self._write_index()
+            self._remap()
+        finally:
+            self.close()
+
+    def _remap(self):
+        self._vectors = np.memmap(os.path.join(self.path, VECTORS_FILE), dtype=np.float32, mode='r',
+                                  shape=(len(self._keys), self.dim)) if len(self._keys) else None
+
+    def _write_index(self):
+        _save_atomic(os.path.join(self.path, LAST_USED_FILE), self._last_used)
+        _save_atomic(os.path.join(self.path, KEYS_FILE), self._keys)
+        tmp = os.path.join(self.path, STORE_INFO_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'dim': self.dim, 'generation': self.generation}, f)
+        os.replace(tmp, os.path.join(self.path, STORE_INFO_FILE))
+
+    def _compact(self, max_rows: int):
+        """Keep the max_rows most recently used rows (newest first among ties)."""
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        order = np.lexsort((-np.arange(len(self._keys)), -self._last_used))
+        keep = np.sort(order[:max_rows])
+        old = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(len(self._keys), self.dim))
+        with open(vectors_path + '.tmp', 'wb') as f:
+            for start in range(0, len(keep), 4096):
+                f.write(np.ascontiguousarray(old[keep[start:start + 4096]]).tobytes())
+        del old
+        self.compacted += len(self._keys) - len(keep)
+        self._keys, self._last_used = self._keys[keep], self._last_used[keep]
+        # Rows move, so the store is unreadable (not wrong) until store.json is written again
+        info_path = os.path.join(self.path, STORE_INFO_FILE)
+        if os.path.exists(info_path):
+            os.remove(info_path)
+        os.replace(vectors_path + '.tmp', vectors_path)
+        self._write_index()
+        self._rows = {key: row for row, key in enumerate(self._keys.tolist())}
+        logger.info(f"Compacted embedding store {self.path}: {len(keep)} rows kept")
+
+    def compact(self, max_rows: int = None):
+        """Shrink the store to max_rows (default: its size limit), dropping least recently used rows."""
+        self.save()
+        limit = self.max_rows if max_rows is None else max_rows
+        if self.dim is not None and len(self._keys) > limit:
+            self._lock_for_writing()
+            try:
+                self._vectors = None
+                self._compact(limit)
+                self._remap()
+            finally:
+                self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Size of the store and the hit ratio of this build."""
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self),
+            "max_entries": self.max_rows,
+            "size_mb": round(len(self) * (self.dim or 0) * 4 / (1024 * 1024), 3),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "compacted": self.compacted,
+        }
+
+
+def _main(argv: List[str]):
+    command = argv[0] if argv else 'stats'
+    if command not in ('stats', 'compact', 'clear'):
+        print("Usage: python -m rag.embedding_store stats|compact|clear")
+        sys.exit(2)
+    if not os.path.isdir(EMBEDDING_STORE_PATH):
+        print(f"No embedding store at {EMBEDDING_STORE_PATH}")
+        return
+    if command == 'clear':
+        shutil.rmtree(EMBEDDING_STORE_PATH)
+        print(f"Removed {EMBEDDING_STORE_PATH}")
+        return
+    for name in sorted(os.listdir(EMBEDDING_STORE_PATH)):
+        info_path = os.path.join(EMBEDDING_STORE_PATH, name, STORE_INFO_FILE)
+        if not os.path.exists(info_path):
+            continue
+        with open(info_path, 'r', encoding='utf-8') as f:
+            store = EmbeddingStore(json.load(f)['model'], lock=command == 'compact')
+        if command == 'compact':
+            store.compact()
+        print(json.dumps(store.stats()))
+
+
+if __name__ == '__main__':
+    _main(sys.argv[1:])
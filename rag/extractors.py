@@ -0,0 +1,181 @@
+"""
+Text extraction for each document format the indexer reads.
+
+An extractor takes a path and yields (text, location) sections as it reads
+the file, so the chunker sees one page or section at a time and a large
+document is never held in memory as a single string:
+
+    .md .markdown .txt  the whole file (guides are small), location {}
+    .html .htm          one section per <h1>/<h2>, parsed incrementally, {'section': title}
+    .docx               one section per Title/Heading 1/Heading 2 paragraph, {'section': title}
+    .pdf                one section per page, {'page': number}
+
+HTML and DOCX headings and list items are rewritten as markdown, so the
+token chunker's heading and paragraph boundaries apply to every format.
+PDF and DOCX need the optional PyPDF2 and python-docx packages. Other
+formats can be added with register_extractor().
+"""
+
+import os
+import re
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+Section = Tuple[str, Dict[str, Any]]
+Extractor = Callable[[str], Iterator[Section]]
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+_READ_BLOCK = 64 * 1024
+
+
+def register_extractor(*extensions: str):
+    """Decorator registering an extractor for file extensions such as '.pdf'."""
+    def decorator(fn: Extractor) -> Extractor:
+        for extension in extensions:
+            EXTRACTORS[extension.lower()] = fn
+        return fn
+    return decorator
+
+
+def extract(path: str) -> Iterator[Section]:
+    """Sections of the document at path, using the extractor for its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTRACTORS:
+        raise ValueError(f"No extractor for '{extension}' files. Supported: {', '.join(sorted(EXTRACTORS))}")
+    return EXTRACTORS[extension](path)
+
+
+def _location(title: Optional[str]) -> Dict[str, Any]:
+    return {'section': title} if title else {}
+
+
+@register_extractor('.md', '.markdown', '.txt')
+def extract_text(path: str) -> Iterator[Section]:
+    with open(path, 'r', encoding='utf-8') as f:
+        yield f.read(), {}
+
+
+class _HTMLSections(HTMLParser):
+    """Turns HTML into markdown-like text, split into sections at <h1>/<h2>."""
+
+    BLOCKS = {'p', 'div', 'section', 'article', 'main', 'header', 'footer', 'blockquote', 'pre',
+              'ul', 'ol', 'li', 'table', 'tr', 'br', 'hr', 'dd', 'dt'}
+    SKIPPED = {'script', 'style', 'head', 'template', 'noscript'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sections: List[Section] = []
+        self._paragraphs: List[str] = []
+        self._fragments: List[str] = []
+        self._title = None
+        self._heading = None  # level of the heading being read
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self._skipping += 1
+        elif re.fullmatch(r'h[1-6]', tag):
+            self._end_paragraph()
+            self._heading = int(tag[1])
+        elif tag in self.BLOCKS:
+            self._end_paragraph()
+            if tag == 'li':
+                self._fragments.append('- ')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self._skipping = max(0, self._skipping - 1)
+        elif self._heading and tag == f'h{self._heading}':
+            title = ' '.join(''.join(self._fragments).split())
+            level, self._heading, self._fragments = self._heading, None, []
+            if not title:
+                return
+            if level <= 2:
+                self.end_section()
+                self._title = title
+            self._paragraphs.append(f"{'#' * level} {title}")
+        elif tag in self.BLOCKS:
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._fragments.append(data)
+
+    def _end_paragraph(self):
+        if self._heading:  # a block tag inside a heading
+            return
+        text = ' '.join(''.join(self._fragments).split())
+        self._fragments = []
+        if text and text != '-':
+            self._paragraphs.append(text)
+
+    def end_section(self):
+        self._end_paragraph()
+        if self._paragraphs:
+            self.sections.append(('\n\n'.join(self._paragraphs), _location(self._title)))
+        self._paragraphs = []
+
+    def pop_sections(self) -> List[Section]:
+        sections, self.sections = self.sections, []
+        return sections
+
+
+@register_extractor('.html', '.htm')
+def extract_html(path: str) -> Iterator[Section]:
+    parser = _HTMLSections()
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for block in iter(lambda: f.read(_READ_BLOCK), ''):
+            parser.feed(block)
+            yield from parser.pop_sections()
+    parser.close()
+    parser.end_section()
+    yield from parser.pop_sections()
+
+
+@register_extractor('.docx')
+def extract_docx(path: str) -> Iterator[Section]:
+    try:
+        import docx
+    except ImportError as e:
+        raise ImportError("Reading .docx files requires python-docx (pip install python-docx)") from e
+
+    # python-docx parses the whole document.xml; sections are still handed on one at a time
+    title, paragraphs = None, []
+    for paragraph in docx.Document(path).paragraphs:
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        style = paragraph.style.name if paragraph.style is not None else ''
+        heading = re.fullmatch(r'Title|Heading (\d)', style)
+        if heading:
+            level = int(heading.group(1) or 1)
+            if level <= 2:
+                if paragraphs:
+                    yield '\n\n'.join(paragraphs), _location(title)
+                title, paragraphs = text, []
+            paragraphs.append(f"{'#' * min(level, 6)} {text}")
+        elif style.startswith('List'):
+            paragraphs.append(f"- {text}")
+        else:
+            paragraphs.append(text)
+    if paragraphs:
+        yield '\n\n'.join(paragraphs), _location(title)
+
+
+@register_extractor('.pdf')
+def extract_pdf(path: str) -> Iterator[Section]:
+    try:
+        from PyPDF2 import PdfReader
+    except ImportError as e:
+        raise ImportError("Reading .pdf files requires PyPDF2 (pip install PyPDF2)") from e
+
+    # PdfReader parses pages lazily from the open file
+    with open(path, 'rb') as f:
+        reader = PdfReader(f)
+        if reader.is_encrypted:
+            reader.decrypt('')
+        for number, page in enumerate(reader.pages, start=1):
+            text = page.extract_text() or ''
+            if text.strip():
+                yield text, {'page': number}
@@ -0,0 +1,257 @@
+"""
+Process-wide holder for the FAISS index, metadata and chunks.
+
+The vector store is loaded once and shared by every request. VECTOR_DB_PATH
+is re-checked at most every INDEX_RELOAD_CHECK_INTERVAL seconds. When its
+CURRENT pointer names a different snapshot (see rag.snapshots), that
+snapshot is loaded and swapped in. Requests already running keep the
+snapshot they started with. For an unversioned store, the index is reloaded
+when the files' modification time, size or version stamp changes.
+"""
+
+import os
+import sys
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rag.snapshots import CURRENT_FILE, active_version, version_path, snapshot_info
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILES = (
+    'faiss.index', 'metadata.pkl', 'chunks.pkl', 'index_info.json',
+    'chunks.bin', 'chunk_offsets.npy', 'chunk_file_ids.npy', 'chunk_ids.npy', 'files.json',
+    'bm25_vocab.json', 'bm25_offsets.npy', 'bm25_doc_ids.npy', 'bm25_weights.npy',
+)
+VERSION_FILE = 'VERSION'
+INDEX_RELOAD_CHECK_INTERVAL = float(os.getenv('INDEX_RELOAD_CHECK_INTERVAL', '2.0'))
+
+# (index, metadata, chunks) followed by any auxiliary indexes, e.g. the BM25 index
+IndexData = Tuple[Any, ...]
+_PART_NAMES = ('index', 'metadata', 'chunks', 'lexical')
+
+
+def _estimate_index_bytes(index) -> int:
+    """
+    Best-effort size of a FAISS index in memory, from its vector count and
+    per-vector code size (serializing it to measure would copy the whole index).
+    """
+    try:
+        import faiss
+        if isinstance(index, faiss.Index):
+            base = faiss.downcast_index(index)
+            per_vector = 0
+            if isinstance(base, faiss.IndexIDMap2):
+                per_vector += 24  # id, plus its entry in the reverse map
+                base = faiss.downcast_index(base.index)
+            elif isinstance(base, faiss.IndexIDMap):
+                per_vector += 8
+                base = faiss.downcast_index(base.index)
+            if isinstance(base, faiss.IndexHNSW):
+                links = int(base.hnsw.neighbors.size()) * 4
+                return int(base.ntotal) * (per_vector + int(base.storage.sa_code_size())) + links
+            if isinstance(base, faiss.IndexIVF):
+                # Inverted lists keep an 8-byte id next to each code
+                codebook = int(base.pq.centroids.size()) * 4 if hasattr(base, 'pq') else 0
+                return (int(base.ntotal) * (per_vector + int(base.code_size) + 8)
+                        + _estimate_index_bytes(base.quantizer) + codebook)
+            return int(base.ntotal) * (per_vector + int(base.sa_code_size()))
+    except Exception:
+        pass
+    try:
+        return int(index.ntotal) * int(index.d) * 4
+    except Exception:
+        return 0
+
+
+def _estimate_list_bytes(items: List[Any]) -> int:
+    """Shallow size of a list plus its elements (and dict values one level deep)."""
+    if items is None:
+        return 0
+    if hasattr(items, 'nbytes'):  # memory-mapped store: size of the mapped files
+        return int(items.nbytes)
+    total = sys.getsizeof(items)
+    for item in items:
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            total += sum(sys.getsizeof(v) for v in item.values())
+    return total
+
+
+class IndexStore:
+    """Thread-safe, hot-reloadable cache of the on-disk vector store."""
+
+    def __init__(self, path: str, loader: Callable[[str], IndexData],
+                 check_interval: float = INDEX_RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.loader = loader
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._data: Optional[IndexData] = None
+        # The loaded data and its version, replaced together so readers never pair one with the other's
+        self._current: Optional[Tuple[IndexData, str]] = None
+        self._fingerprint: Optional[Tuple] = None
+        self._last_check = 0.0
+
+        self.load_count = 0
+        self.reload_count = 0
+        self.failed_reloads = 0
+        self.last_load_seconds = 0.0
+        self.loaded_at: Optional[float] = None
+        self.version: Optional[str] = None
+        self.snapshot_path: Optional[str] = None
+        self.built_at: Optional[float] = None
+        self._memory: Dict[str, int] = {}
+
+    def _current_fingerprint(self) -> Tuple:
+        """
+        The active snapshot's name; for an unversioned store, the modification
+        time and size of every index file, plus the version stamp.
+        """
+        version = active_version(self.path)
+        if version is not None:
+            return ((CURRENT_FILE, version),)
+        parts = []
+        for name in INDEX_FILES:
+            try:
+                st = os.stat(os.path.join(self.path, name))
+                parts.append((name, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                parts.append((name, None, None))
+        try:
+            with open(os.path.join(self.path, VERSION_FILE), 'r', encoding='utf-8') as f:
+                parts.append((VERSION_FILE, f.read().strip()))
+        except (FileNotFoundError, OSError):
+            pass
+        return tuple(parts)
+
+    @staticmethod
+    def _version_of(fingerprint: Tuple) -> str:
+        """The VERSION stamp when the index has one, else a digest of the file fingerprint."""
+        for part in fingerprint:
+            if part[0] in (VERSION_FILE, CURRENT_FILE):
+                return part[1]
+        return hashlib.sha1(repr(fingerprint).encode('utf-8')).hexdigest()[:16]
+
+    def get(self) -> IndexData:
+        """Return (index, metadata, chunks, ...), loading or reloading if needed."""
+        data = self._data
+        if data is None:
+            return self._load(initial=True)
+
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return data
+        self._last_check = now
+        if self._current_fingerprint() != self._fingerprint:
+            return self._load(initial=False)
+        return data
+
+    def get_with_version(self) -> Tuple[IndexData, str]:
+        """Return get() and the version of that same data, for keys that must match what was read."""
+        while True:
+            data = self.get()
+            current = self._current
+            if current is not None and current[0] is data:
+                return current
+            # A reload landed between the two reads; take the new data and its version
+
+    def _load(self, initial: bool) -> IndexData:
+        with self._lock:
+            fingerprint = self._current_fingerprint()
+            # Another thread may have finished the same load while we waited.
+            if self._data is not None and fingerprint == self._fingerprint:
+                return self._data
+
+            versioned = fingerprint[0][0] == CURRENT_FILE
+            path = version_path(self.path, fingerprint[0][1]) if versioned else self.path
+            start = time.perf_counter()
+            try:
+                data = self.loader(path)
+            except Exception:
+                if self._data is None:
+                    raise
+                self.failed_reloads += 1
+                logger.exception("Index reload failed; keeping the previously loaded index")
+                return self._data
+
+            # Files changed while we were reading them: keep the old copy and retry later.
+            # Published snapshots never change, so this only applies to unversioned stores.
+            if not versioned and self._data is not None and self._current_fingerprint() != fingerprint:
+                self.failed_reloads += 1
+                logger.warning("Index files changed during reload; retrying on next check")
+                return self._data
+
+            elapsed = time.perf_counter() - start
+            index, metadata, chunks = data[:3]
+            self._memory = {
+                'index_bytes': _estimate_index_bytes(index),
+                'metadata_bytes': _estimate_list_bytes(metadata),
+                'chunks_bytes': _estimate_list_bytes(chunks),
+            }
+            for name, part in zip(_PART_NAMES[3:], data[3:]):
+                self._memory[f'{name}_bytes'] = _estimate_list_bytes(part)
+            self._memory['total_bytes'] = sum(self._memory.values())
+
+            if self._data is not None:
+                self.reload_count += 1
+            self.load_count += 1
+            self.last_load_seconds = elapsed
+            self.loaded_at = time.time()
+            self._fingerprint = fingerprint
+            self.version = self._version_of(fingerprint)
+            self.snapshot_path = path
+            self.built_at = snapshot_info(path).get('built_at')
+            self._last_check = time.monotonic()
+            self._data = data
+            self._current = (data, self.version)
+            logger.info(
+                f"{'Loaded' if initial else 'Reloaded'} index from {path} "
+                f"in {elapsed * 1000:.1f} ms ({len(chunks)} chunks)"
+            )
+            return data
+
+    def reload(self) -> IndexData:
+        """Force a reload from disk regardless of the file fingerprint."""
+        with self._lock:
+            self._fingerprint = None
+        return self._load(initial=self._data is None)
+
+    def clear(self):
+        """Drop the loaded index; the next get() loads it again."""
+        with self._lock:
+            self._data = None
+            self._current = None
+            self._fingerprint = None
+            self.version = None
+            self.snapshot_path = None
+            self.built_at = None
+            self._last_check = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Version, age, load time, reload count and memory footprint of the resident index."""
+        data = self._data
+        built_at = self.built_at
+        return {
+            "loaded": data is not None,
+            "path": self.path,
+            "version": self.version,
+            # What CURRENT points to (None if unversioned); lags version only until the next check
+            "published_version": active_version(self.path),
+            "snapshot_path": self.snapshot_path,
+            "built_at": built_at,
+            "age_seconds": round(time.time() - built_at, 1) if built_at else None,
+            "num_chunks": len(data[2]) if data is not None else 0,
+            "load_count": self.load_count,
+            "reload_count": self.reload_count,
+            "failed_reloads": self.failed_reloads,
+            "last_load_ms": round(self.last_load_seconds * 1000, 2),
+            "loaded_at": self.loaded_at,
+            "memory": dict(self._memory),
+            # Queries routed to their nearest documents vs full scans (rag.routing)
+            "routing": data[0].stats() if data is not None and hasattr(data[0], 'router') else None,
+        }
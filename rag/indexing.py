@@ -1,11 +1,30 @@
 import os
-import glob
-import pickle
-from typing import List, Dict
+import sys
+import time
+from typing import Any, List, Dict, Optional, Sequence
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
+import numpy as np
 import faiss
 
+from rag.ann import StreamingIndexBuilder, save_index_info, load_index_info, supports_removal, FAISS_INDEX_TYPE
+from rag.storage import ChunkStoreWriter, load_chunk_store, has_chunk_store
+from rag.bm25 import BM25Index
+from rag.manifest import load_manifest, save_manifest, plan_update
+from rag.snapshots import (
+    active_path, create_snapshot, discard_snapshot, publish_snapshot, prune_snapshots, INDEX_KEEP_VERSIONS,
+)
+from rag.embedding_store import EmbeddingStore, EMBEDDING_STORE_ENABLED, EMBEDDING_STORE_PATH
+from rag.dedup import ChunkDeduplicator, CHUNK_DEDUP, CHUNK_DEDUP_THRESHOLD
+from rag.routing import RoutingTableBuilder, DocumentRouter, measure_recall, is_flat, DOC_ROUTING_GROUP_CHUNKS
+from rag.chunking import (
+    load_tokenizer, model_max_tokens, CHUNKING, CHUNKING_STRATEGIES, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS,
+)
+from rag.ingest import (  # noqa: F401  chunk_text and load_documents are re-exported
+    chunk_text, load_documents, list_documents, hash_document, chunk_document, discard_chunks,
+    document_pool, imap_documents, IngestStats, INDEX_WORKERS, INDEX_EMBED_BATCH_SIZE, INDEX_MAX_PENDING_DOCS,
+)
+
 # Load environment variables
 load_dotenv()
 
@@ -15,52 +34,397 @@ CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 1000))
 CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 200))
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
 
-os.makedirs(VECTOR_DB_PATH, exist_ok=True)
-
-# Load embedding model
-model = SentenceTransformer(EMBEDDING_MODEL)
-
-def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(start + chunk_size, len(text))
-        chunks.append(text[start:end])
-        if end == len(text):
-            break
-        start += chunk_size - overlap
-    return chunks
-
-def load_documents(data_dir: str) -> List[Dict]:
-    docs = []
-    for file_path in glob.glob(os.path.join(data_dir, '*.md')):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-        docs.append({'file': os.path.basename(file_path), 'text': text})
-    return docs
-
-def main():
-    docs = load_documents(DATA_DIR)
-    all_chunks = []
-    metadata = []
-    for doc in docs:
-        chunks = chunk_text(doc['text'], CHUNK_SIZE, CHUNK_OVERLAP)
-        for i, chunk in enumerate(chunks):
-            all_chunks.append(chunk)
-            metadata.append({'file': doc['file'], 'chunk_id': i})
-    print(f"Total chunks: {len(all_chunks)}")
-    # Embed chunks
-    embeddings = model.encode(all_chunks, show_progress_bar=True, convert_to_numpy=True)
-    # Build FAISS index
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-    faiss.write_index(index, os.path.join(VECTOR_DB_PATH, 'faiss.index'))
-    with open(os.path.join(VECTOR_DB_PATH, 'metadata.pkl'), 'wb') as f:
-        pickle.dump(metadata, f)
-    with open(os.path.join(VECTOR_DB_PATH, 'chunks.pkl'), 'wb') as f:
-        pickle.dump(all_chunks, f)
-    print(f"Index and metadata saved to {VECTOR_DB_PATH}")
+# Chunk-store row left behind by a removed or changed file; its vector is gone from the index
+TOMBSTONE = {'file': '', 'chunk_id': -1}
+
+def _settings() -> Dict[str, Any]:
+    """Build settings that invalidate every stored vector when they change."""
+    settings = {
+        'chunking': os.getenv('CHUNKING', CHUNKING).lower(),
+        'embedding_model': os.getenv('EMBEDDING_MODEL', EMBEDDING_MODEL),
+        'index_type': FAISS_INDEX_TYPE,
+    }
+    if settings['chunking'] not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Unknown CHUNKING '{settings['chunking']}'. Choose one of: {', '.join(CHUNKING_STRATEGIES)}")
+    if settings['chunking'] == 'tokens':
+        try:
+            # Loaded before the worker pool forks, so workers inherit it
+            load_tokenizer(settings['embedding_model'])
+        except Exception as e:
+            print(f"Tokenizer of {settings['embedding_model']} unavailable ({e}); chunking by characters")
+            settings['chunking'] = 'chars'
+    if settings['chunking'] == 'tokens':
+        settings['chunk_max_tokens'] = (int(os.getenv('CHUNK_MAX_TOKENS') or CHUNK_MAX_TOKENS)
+                                        or model_max_tokens(settings['embedding_model']))
+        settings['chunk_overlap_tokens'] = int(os.getenv('CHUNK_OVERLAP_TOKENS', CHUNK_OVERLAP_TOKENS))
+    else:
+        settings['chunk_size'] = int(os.getenv('CHUNK_SIZE', CHUNK_SIZE))
+        settings['chunk_overlap'] = int(os.getenv('CHUNK_OVERLAP', CHUNK_OVERLAP))
+    dedup = os.getenv('CHUNK_DEDUP', str(CHUNK_DEDUP)).lower() == 'true'
+    settings['dedup_threshold'] = float(os.getenv('CHUNK_DEDUP_THRESHOLD', CHUNK_DEDUP_THRESHOLD)) if dedup else None
+    settings['routing_group_chunks'] = int(os.getenv('DOC_ROUTING_GROUP_CHUNKS', DOC_ROUTING_GROUP_CHUNKS))
+    return settings
+
+def _pipeline_settings() -> Dict[str, int]:
+    """Parallelism and batching of the ingestion pipeline; they do not change the index."""
+    return {
+        'workers': int(os.getenv('INDEX_WORKERS', INDEX_WORKERS)),
+        'batch_size': max(1, int(os.getenv('INDEX_EMBED_BATCH_SIZE', INDEX_EMBED_BATCH_SIZE))),
+        'max_pending': int(os.getenv('INDEX_MAX_PENDING_DOCS', INDEX_MAX_PENDING_DOCS)),
+    }
+
+def _embed(embedder: Dict[str, Any], chunks: List[str], settings: Dict[str, Any]) -> np.ndarray:
+    """Embed chunks, reusing vectors from the embedding store; model time and calls are tallied in embedder."""
+    def encode(texts: List[str]):
+        if 'model' not in embedder:
+            embedder['model'] = SentenceTransformer(settings['embedding_model'])
+        start = time.perf_counter()
+        vectors = embedder['model'].encode(texts, show_progress_bar=False, convert_to_numpy=True)
+        embedder['seconds'] += time.perf_counter() - start
+        embedder['encoded'] += len(texts)
+        return vectors
+
+    store = embedder.get('store')
+    if store is None:
+        return np.asarray(encode(chunks), dtype='float32')
+    embeddings, _ = store.encode(chunks, encode)
+    store.flush()  # new vectors go to disk batch by batch
+    return embeddings
+
+def _open_deduplicator(settings: Dict[str, Any]) -> Optional[ChunkDeduplicator]:
+    threshold = settings.get('dedup_threshold')
+    return ChunkDeduplicator(threshold) if threshold is not None else None
+
+def _open_embedding_store(settings: Dict[str, Any]):
+    if os.getenv('EMBEDDING_STORE_ENABLED', str(EMBEDDING_STORE_ENABLED)).lower() != 'true':
+        return None
+    return EmbeddingStore(settings['embedding_model'], os.getenv('EMBEDDING_STORE_PATH', EMBEDDING_STORE_PATH))
+
+def _ingest(pool, paths: Sequence[str], first_id: int, settings: Dict[str, Any], pipeline: Dict[str, int],
+            embedder: Dict[str, Any], builder: StreamingIndexBuilder, writer: ChunkStoreWriter,
+            files: Dict[str, Any], stats: IngestStats, dedup: ChunkDeduplicator = None,
+            routing: RoutingTableBuilder = None) -> int:
+    """
+    Stream documents through chunking (in the pool), embedding and the index.
+
+    Chunks are written to the chunk store as they arrive and embedded in
+    batches of pipeline['batch_size']; each batch is added to the index
+    under ids equal to its chunk-store rows. With dedup, a near-duplicate of
+    an earlier chunk is stored with 'duplicate_of' and gets no vector.
+    Every vector is also added to routing, if given. Returns the next free id.
+    """
+    batch: List[str] = []
+    batch_ids: List[int] = []
+    batch_keys: List[tuple] = []
+    next_id = first_id
+
+    def flush():
+        embeddings = _embed(embedder, batch, settings)
+        builder.add(embeddings, np.asarray(batch_ids, dtype='int64'))
+        if routing is not None:
+            routing.add(batch_keys, embeddings, batch_ids)
+        stats.vectors += len(batch)
+        batch.clear()
+        batch_ids.clear()
+        batch_keys.clear()
+
+    documents = imap_documents(pool, chunk_document, paths, settings, max_pending=pipeline['max_pending'],
+                               discard=discard_chunks)
+    for doc in documents:
+        name, chunks = doc['file'], doc['chunks']
+        if doc['error']:
+            # Listed under 'failed' with its hash; the next run tries it again only if it changed
+            print(f"Skipping {name}: {doc['error']}")
+            stats.failed[name] = doc['error']
+            stats.failed_sha256[name] = doc['sha256']
+            continue
+        files[name] = {'sha256': doc['sha256'], 'first_id': next_id, 'num_chunks': len(chunks)}
+        stats.documents += 1
+        stats.chunks += len(chunks)
+        try:
+            # Read back from the worker's spool a section at a time
+            for i, (chunk, location) in enumerate(chunks):
+                representative = dedup.check(next_id, chunk) if dedup is not None else None
+                if representative is not None:
+                    writer.append(chunk, {'file': name, 'chunk_id': i, **location, 'duplicate_of': representative})
+                    stats.duplicates += 1
+                    next_id += 1
+                    continue
+                writer.append(chunk, {'file': name, 'chunk_id': i, **location})
+                batch.append(chunk)
+                batch_ids.append(next_id)
+                batch_keys.append((name, i))
+                next_id += 1
+                if len(batch) >= pipeline['batch_size']:
+                    flush()
+        finally:
+            discard_chunks(doc)
+    if batch:
+        flush()
+    return next_id
+
+def _failed_entries(manifest: Optional[Dict[str, Any]], plan, stats: IngestStats) -> Dict[str, Any]:
+    """The manifest's 'failed': this run's unreadable files, plus unchanged ones an incremental run did not retry."""
+    failed = {}
+    if manifest and not plan.full_rebuild_reason:
+        previous = manifest.get('failed', {})
+        failed.update({name: previous[name] for name in plan.skipped if name in previous})
+    failed.update({name: {'sha256': stats.failed_sha256.get(name), 'error': error}
+                   for name, error in stats.failed.items()})
+    return failed
+
+def _write_index(vector_db_path: str, builder: StreamingIndexBuilder):
+    index, index_info = builder.finish()
+    faiss.write_index(index, os.path.join(vector_db_path, 'faiss.index'))
+    save_index_info(vector_db_path, index_info)
+    print(f"Built {index_info['index_type']} index with params {index_info['params']} "
+          f"({index_info['ntotal']} vectors)")
+    return index
+
+def _save_routing(vector_db_path: str, routing: RoutingTableBuilder, index):
+    """Save the routing table with the recall routing achieves on this index (flat indexes only)."""
+    table = routing.table()
+    recall = float('nan')
+    if is_flat(index) and len(table['ids']):
+        recall = measure_recall(index, DocumentRouter.from_table(table))
+        print(f"Document routing: {len(routing)} units, recall@5 {recall:.3f} on sampled chunks")
+    routing.save(vector_db_path, table, recall)
+
+def _full_rebuild(pool, vector_db_path: str, paths: Sequence[str], settings: Dict[str, Any],
+                  pipeline: Dict[str, int], embedder: Dict[str, Any], stats: IngestStats):
+    files: Dict[str, Any] = {}
+    builder = StreamingIndexBuilder(settings['index_type'])
+    dedup = _open_deduplicator(settings)
+    routing = RoutingTableBuilder(settings['routing_group_chunks'])
+    # The chunk store replaces the old one only once the index has been written
+    with ChunkStoreWriter(vector_db_path) as writer:
+        next_id = _ingest(pool, paths, 0, settings, pipeline, embedder, builder, writer, files, stats, dedup,
+                          routing)
+        if not next_id:
+            raise ValueError(f"No chunks to index: {len(stats.failed)} of {len(paths)} documents could not be read")
+        index = _write_index(vector_db_path, builder)
+    if dedup is not None:
+        dedup.save(vector_db_path)
+    _save_routing(vector_db_path, routing, index)
+    return files, next_id, stats.vectors
+
+def _incremental_update(pool, previous_path: str, vector_db_path: str, paths: Sequence[str], plan,
+                        manifest: Dict[str, Any], settings: Dict[str, Any], pipeline: Dict[str, int],
+                        embedder: Dict[str, Any], stats: IngestStats):
+    """
+    Build the snapshot in vector_db_path from the one in previous_path plus the changed files.
+
+    A kept near-duplicate whose representative belonged to a changed or
+    removed file is checked again: it is folded into another representative
+    or embedded and becomes one itself.
+    """
+    index = faiss.read_index(os.path.join(previous_path, 'faiss.index'))
+    stored_metadata, stored_chunks = load_chunk_store(previous_path)
+
+    files = dict(manifest['files'])
+    dead_ids = []
+    for name in plan.updated + plan.removed:
+        entry = files.pop(name)
+        dead_ids.extend(range(entry['first_id'], entry['first_id'] + entry['num_chunks']))
+    if dead_ids:
+        index.remove_ids(np.asarray(dead_ids, dtype='int64'))
+    dead = set(dead_ids)
+
+    dedup = _open_deduplicator(settings)
+    if dedup is not None and not dedup.load(previous_path, dead):
+        print("No MinHash signatures in the previous snapshot; new chunks are only compared with each other")
+        for row in range(len(stored_chunks)):
+            dedup.skip(row)
+    orphans = {row for rep in dead for row in stored_metadata.duplicates.get(rep, ()) if row not in dead}
+    routing = RoutingTableBuilder(settings['routing_group_chunks'])
+    if not routing.load(previous_path, plan.updated + plan.removed):
+        print("No routing table in the previous snapshot; document routing is off until the next full rebuild")
+        routing = None
+
+    changed = set(plan.added) | set(plan.updated)
+    builder = StreamingIndexBuilder(settings['index_type'], index=index, index_info=load_index_info(previous_path))
+    with ChunkStoreWriter(vector_db_path) as writer:
+        # Existing rows keep their ids; rows of changed and removed files become tombstones
+        promoted, promoted_ids, promoted_keys = [], [], []
+        for row in range(len(stored_chunks)):
+            if row in dead:
+                writer.append('', TOMBSTONE)
+                continue
+            meta = stored_metadata[row]
+            if row in orphans:
+                meta = {k: v for k, v in meta.items() if k != 'duplicate_of'}
+                representative = dedup.check(row, stored_chunks[row]) if dedup is not None else None
+                if representative is None:
+                    promoted.append(stored_chunks[row])
+                    promoted_ids.append(row)
+                    promoted_keys.append((meta['file'], meta['chunk_id']))
+                else:
+                    meta['duplicate_of'] = representative
+            writer.append(stored_chunks[row], meta)
+        if promoted:
+            embeddings = _embed(embedder, promoted, settings)
+            builder.add(embeddings, np.asarray(promoted_ids, dtype='int64'))
+            if routing is not None:
+                routing.add(promoted_keys, embeddings, promoted_ids)
+            stats.vectors += len(promoted)
+            print(f"Embedded {len(promoted)} near-duplicate chunks whose representative was removed")
+        next_id = _ingest(pool, [p for p in paths if os.path.basename(p) in changed], len(stored_chunks),
+                          settings, pipeline, embedder, builder, writer, files, stats, dedup, routing)
+        index = _write_index(vector_db_path, builder)
+    if dedup is not None:
+        dedup.save(vector_db_path)
+    if routing is not None:
+        _save_routing(vector_db_path, routing, index)
+    return files, next_id, stats.vectors
+
+def main(full_rebuild: bool = False, models: Dict[str, Any] = None) -> Optional[str]:
+    """
+    Bring the index in VECTOR_DB_PATH up to date with the documents in DATA_DIR.
+
+    Only new or changed files are chunked and embedded; vectors of changed
+    and deleted files are removed by id. A full rebuild happens when asked
+    for, when there is no manifest, when the chunking, model or index type
+    changed, or when too many removed chunks have accumulated.
+
+    Each run writes a new snapshot directory and publishes it atomically
+    (see rag.snapshots); a failed run leaves the active snapshot untouched.
+    Only the last INDEX_KEEP_VERSIONS snapshots are kept.
+
+    Documents are read and chunked by INDEX_WORKERS processes and embedded
+    in batches of INDEX_EMBED_BATCH_SIZE chunks, so memory does not grow
+    with the corpus beyond the index itself. Every format in
+    DOCUMENT_FORMATS is read (see rag.extractors); a document that cannot be
+    read is skipped and listed under 'failed' in the manifest with its hash,
+    and is only tried again once it changes. Near-duplicate
+    chunks get no vector (see rag.dedup) unless CHUNK_DEDUP is false.
+
+    Returns the published snapshot version, or None if the index was left
+    as it was. models, when given, caches embedding models by name across
+    calls (watch mode reuses it for every refresh).
+    """
+    start = time.perf_counter()
+    data_dir = os.getenv('DATA_DIR', DATA_DIR)
+    root = os.getenv('VECTOR_DB_PATH', VECTOR_DB_PATH)
+    os.makedirs(root, exist_ok=True)
+
+    paths = list_documents(data_dir)
+    if not paths:
+        print(f"No documents found in {data_dir}; index left unchanged")
+        return
+    settings = _settings()
+    pipeline = _pipeline_settings()
+    previous_path = active_path(root)
+
+    version = None
+    store = None
+    try:
+        with document_pool(min(pipeline['workers'], len(paths))) as pool:
+            docs = []
+            for doc in imap_documents(pool, hash_document, paths, max_pending=pipeline['max_pending']):
+                if 'error' in doc:
+                    print(f"Skipping {doc['file']}: {doc['error']}")
+                else:
+                    docs.append(doc)
+            manifest = load_manifest(previous_path)
+            plan = plan_update(manifest, docs, settings, supports_removal(settings['index_type']))
+            if full_rebuild:
+                plan.full_rebuild_reason = 'requested'
+            elif plan.full_rebuild_reason is None and not (
+                    os.path.exists(os.path.join(previous_path, 'faiss.index')) and has_chunk_store(previous_path)):
+                plan.full_rebuild_reason = 'index files missing'
+
+            if plan.full_rebuild_reason is None and not plan.changed:
+                print(f"Index is up to date ({len(plan.skipped)} files unchanged)")
+                return
+
+            version, vector_db_path = create_snapshot(root)
+            store = _open_embedding_store(settings)
+            embedder: Dict[str, Any] = {'store': store, 'encoded': 0, 'seconds': 0.0}
+            if models is not None and settings['embedding_model'] in models:
+                embedder['model'] = models[settings['embedding_model']]
+            stats = IngestStats()
+            if plan.full_rebuild_reason:
+                print(f"Full rebuild: {plan.full_rebuild_reason}")
+                files, next_id, embedded = _full_rebuild(pool, vector_db_path, paths, settings, pipeline,
+                                                         embedder, stats)
+            else:
+                files, next_id, embedded = _incremental_update(pool, previous_path, vector_db_path, paths, plan,
+                                                               manifest, settings, pipeline, embedder, stats)
+            stats.stop()
+        print(stats.summary())
+        embed_seconds = embedder['seconds']
+        store_stats = None
+        if store is not None:
+            store.save()
+            store_stats = store.stats()
+            print(f"Embedding store: {store_stats['hits']} of {embedded} chunks reused "
+                  f"({store_stats['hit_ratio']:.1%} hit ratio), {store_stats['entries']} entries, "
+                  f"{store_stats['size_mb']} MB")
+
+        # Inverted index over the same chunks for hybrid and lexical retrieval, streamed from the chunk store;
+        # near-duplicates are left out like tombstones, so they cannot take a slot there either
+        stored_metadata, stored_chunks = load_chunk_store(vector_db_path)
+        duplicates = stored_metadata.duplicate_rows()
+        bm25 = BM25Index.build('' if row in duplicates else text for row, text in enumerate(stored_chunks))
+        bm25.save(vector_db_path)
+        print(f"Built BM25 index with {len(bm25.terms)} terms")
+
+        live_chunks = sum(entry['num_chunks'] for entry in files.values())
+        if duplicates:
+            print(f"Near-duplicates: {len(duplicates)} of {live_chunks} chunks are folded into "
+                  f"{len(stored_metadata.duplicates)} representatives, {len(duplicates) / live_chunks:.1%} "
+                  f"fewer vectors")
+        encoded = embedder['encoded']
+        seconds_per_chunk = embed_seconds / encoded if encoded else (manifest or {}).get('seconds_per_chunk', 0.0)
+        save_manifest(vector_db_path, {
+            'settings': settings,
+            'files': files,
+            'next_id': next_id,
+            'tombstones': next_id - live_chunks,
+            'duplicates': len(duplicates),
+            'seconds_per_chunk': seconds_per_chunk,
+            'embedding_store': store_stats,
+            'throughput': stats.as_dict(),
+            'failed': _failed_entries(manifest, plan, stats),
+        })
+    except BaseException:
+        if store is not None:
+            store.close()
+        if version is not None:
+            discard_snapshot(root, version)
+        raise
+
+    if models is not None and 'model' in embedder:
+        models[settings['embedding_model']] = embedder['model']
+    publish_snapshot(root, version, {'files': len(files), 'chunks': live_chunks,
+                                     'vectors': live_chunks - len(duplicates),
+                                     'full_rebuild': plan.full_rebuild_reason})
+    pruned = prune_snapshots(root, int(os.getenv('INDEX_KEEP_VERSIONS', INDEX_KEEP_VERSIONS)))
+
+    elapsed = time.perf_counter() - start
+    if plan.full_rebuild_reason:
+        print(f"Indexed {len(files)} files ({live_chunks} chunks) in {elapsed:.1f}s")
+    else:
+        for label, names in plan.summary().items():
+            if names and label != 'skipped':
+                print(f"{label.capitalize()}: " + ", ".join(
+                    f"{n} ({files[n]['num_chunks']} chunks)" if n in files
+                    else f"{n} (unreadable)" if n in stats.failed else n for n in names))
+        print(f"Skipped {len(plan.skipped)} unchanged files")
+        estimated_full = seconds_per_chunk * live_chunks + (elapsed - embed_seconds)
+        print(f"Embedded {embedded} of {live_chunks} chunks in {elapsed:.1f}s; a full rebuild would take "
+              f"about {estimated_full:.1f}s (saved ~{max(0.0, estimated_full - elapsed):.1f}s)")
+    print(f"Published snapshot {version} in {vector_db_path}"
+          + (f"; removed old snapshots {', '.join(pruned)}" if pruned else ""))
+    return version
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    if '--watch' in sys.argv[1:]:
+        import logging
+        from rag.watch import watch
+
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+        models: Dict[str, Any] = {}
+        watch(os.getenv('DATA_DIR', DATA_DIR), lambda: main(models=models))
+    else:
+        main(full_rebuild='--full' in sys.argv[1:])
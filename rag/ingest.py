@@ -0,0 +1,281 @@
+"""
+Document reading and chunking for the indexer, in a pool of worker processes.
+
+Workers read, hash and chunk one document each. Results come back in input
+order with at most INDEX_MAX_PENDING_DOCS documents in flight. A worker
+writes a document's chunks to a spool file one page or section at a time
+and only the file's name comes back, so however large a document, neither
+the worker nor the main process holds more than a section of its chunks
+while the main process embeds them in fixed-size batches.
+
+Documents of every format in DOCUMENT_FORMATS are read through
+rag.extractors page by page or section by section. Each chunk records the
+page and the nearest heading it came from. A document that cannot be read is
+reported and left out instead of failing the build.
+
+Each indexing run forks a new pool and only runs the functions in this
+module in it. A single run forks before it loads the embedding model; under
+--watch the model stays loaded between refreshes, so the workers of every
+refresh after the first share its memory copy-on-write (they never touch
+it). Tokenizers used before a fork run single-threaded in the workers.
+"""
+
+import os
+import re
+import glob
+import time
+import bisect
+import pickle
+import tempfile
+import multiprocessing
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from rag.manifest import file_hash
+from rag.extractors import EXTRACTORS, extract
+from rag.chunking import chunk_text, chunk_document_text  # noqa: F401  chunk_text is re-exported
+
+DOCUMENT_FORMATS = os.getenv('DOCUMENT_FORMATS', 'md,markdown,html,htm,docx,pdf')
+
+INDEX_WORKERS = int(os.getenv('INDEX_WORKERS', str(min(4, os.cpu_count() or 1))))
+INDEX_EMBED_BATCH_SIZE = int(os.getenv('INDEX_EMBED_BATCH_SIZE', '256'))
+INDEX_MAX_PENDING_DOCS = int(os.getenv('INDEX_MAX_PENDING_DOCS', '16'))
+
+
+_HEADING = re.compile(r'^#{1,6} +(.+?)[ #]*$', re.MULTILINE)
+
+
+def document_extensions(formats: str = None) -> List[str]:
+    """Extensions listed in DOCUMENT_FORMATS that have an extractor."""
+    formats = os.getenv('DOCUMENT_FORMATS', DOCUMENT_FORMATS) if formats is None else formats
+    extensions = ['.' + f.strip().lower().lstrip('.') for f in formats.split(',') if f.strip()]
+    unknown = [e for e in extensions if e not in EXTRACTORS]
+    if unknown:
+        raise ValueError(f"No extractor for {', '.join(unknown)}. Supported: {', '.join(sorted(EXTRACTORS))}")
+    return extensions
+
+
+def list_documents(data_dir: str, formats: str = None) -> List[str]:
+    """Paths of the documents in data_dir, in a stable order."""
+    extensions = set(document_extensions(formats))
+    return sorted(path for path in glob.glob(os.path.join(data_dir, '*'))
+                  if os.path.splitext(path)[1].lower() in extensions and os.path.isfile(path))
+
+
+def read_document(path: str) -> Dict[str, str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return {'file': os.path.basename(path), 'text': text}
+
+
+def load_documents(data_dir: str) -> List[Dict]:
+    return [read_document(path) for path in glob.glob(os.path.join(data_dir, '*.md'))]
+
+
+def hash_document(path: str) -> Dict[str, Any]:
+    """{'file', 'sha256'} of one document, as plan_update() expects, or {'file', 'error'}."""
+    name = os.path.basename(path)
+    try:
+        return {'file': name, 'sha256': file_hash(path)}
+    except OSError as e:
+        return {'file': name, 'error': str(e)}
+
+
+def locate_chunks(text: str, chunks: List[str], location: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Location of each chunk of text: the section's location plus the markdown heading the chunk falls under."""
+    headings = [(m.start(), m.group(1)) for m in _HEADING.finditer(text)]
+    starts = [start for start, _ in headings]
+    locations = []
+    position = 0
+    for chunk in chunks:
+        start = text.find(chunk, position)
+        if start < 0:  # chunks are stripped slices of text, so this is not expected
+            start = max(0, position - 1)
+        position = start + 1
+        i = bisect.bisect_right(starts, start) - 1
+        locations.append({**location, 'section': headings[i][1]} if i >= 0 else dict(location))
+    return locations
+
+
+class SpooledChunks:
+    """
+    A document's (chunk, location) pairs in a temporary file, written and
+    read back one page or section at a time. Pickles as the file's name, so
+    a worker hands the chunks to the main process without sending them.
+    """
+
+    def __init__(self, path: Optional[str] = None, count: int = 0):
+        self.path = path
+        self.count = count
+
+    @classmethod
+    def write(cls, sections: Iterator[List[Tuple[str, Dict[str, Any]]]]) -> 'SpooledChunks':
+        fd, path = tempfile.mkstemp(prefix='rag-chunks-', suffix='.pkl')
+        spooled = cls(path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for section in sections:
+                    if section:
+                        pickle.dump(section, f, protocol=pickle.HIGHEST_PROTOCOL)
+                        spooled.count += len(section)
+        except BaseException:
+            spooled.discard()
+            raise
+        return spooled
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        if self.path is None:
+            return
+        with open(self.path, 'rb') as f:
+            while True:
+                try:
+                    section = pickle.load(f)
+                except EOFError:
+                    return
+                yield from section
+
+    def discard(self):
+        """Delete the spool file; the chunks are gone afterwards."""
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path, self.count = None, 0
+
+
+def discard_chunks(doc: Dict[str, Any]):
+    """Delete the spooled chunks of a chunk_document() result that will not be read."""
+    if isinstance(doc.get('chunks'), SpooledChunks):
+        doc['chunks'].discard()
+
+
+# Attempts at reading a document that keeps changing while it is read
+_READ_ATTEMPTS = 3
+
+
+def chunk_document(path: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract and chunk one document as settings say.
+
+    The file is hashed before and after it is read, and read again if it
+    changed in between, so sha256 always belongs to the content chunked.
+
+    Returns:
+        {'file', 'sha256', 'chunks': SpooledChunks, 'error'}; error is None,
+        or why the document could not be read (and chunks is empty; sha256 is
+        still set if the file's bytes could be read). The caller discards
+        chunks once read (see discard_chunks()).
+    """
+    name = os.path.basename(path)
+
+    def sections():
+        for text, location in extract(path):
+            section_chunks = chunk_document_text(text, settings)
+            yield list(zip(section_chunks, locate_chunks(text, section_chunks, location)))
+
+    sha256 = None
+    try:
+        for _ in range(_READ_ATTEMPTS):
+            sha256 = file_hash(path)
+            chunks = SpooledChunks.write(sections())
+            if file_hash(path) == sha256:
+                return {'file': name, 'sha256': sha256, 'chunks': chunks, 'error': None}
+            chunks.discard()
+        # No hash, so the next run reads it again
+        sha256 = None
+        raise RuntimeError(f"changed while being read, {_READ_ATTEMPTS} times")
+    except Exception as e:
+        # Recorded with the failure, so an unchanged unreadable file is not retried on every run
+        return {'file': name, 'sha256': sha256, 'chunks': SpooledChunks(), 'error': f"{type(e).__name__}: {e}"}
+
+
+@contextmanager
+def document_pool(workers: int = INDEX_WORKERS):
+    """A process pool for imap_documents(), or None to work in this process."""
+    if workers <= 1:
+        yield None
+        return
+    # Forked workers skip re-importing the indexer (and loading its models) that spawn would do
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        yield pool
+
+
+def imap_documents(pool: Optional[ProcessPoolExecutor], fn: Callable, paths: Sequence[str], *args: Any,
+                   max_pending: int = INDEX_MAX_PENDING_DOCS, discard: Callable[[Any], None] = None) -> Iterator:
+    """
+    Yield fn(path, *args) for each path in order, with at most max_pending documents in flight.
+
+    If iteration stops early, discard (when given) is called on every result
+    already computed but not yielded, such as the spooled chunks of chunk_document().
+    """
+    if pool is None:
+        for path in paths:
+            yield fn(path, *args)
+        return
+    remaining = iter(paths)
+    pending = deque(pool.submit(fn, path, *args) for path in islice(remaining, max(1, max_pending)))
+    try:
+        while pending:
+            result = pending.popleft().result()
+            path = next(remaining, None)
+            if path is not None:
+                pending.append(pool.submit(fn, path, *args))
+            yield result
+    finally:
+        for future in pending:
+            if not future.cancel() and discard is not None:
+                try:
+                    discard(future.result())
+                except Exception:
+                    pass
+
+
+class IngestStats:
+    """Documents, chunks and vectors processed by one indexing run, and their rates."""
+
+    def __init__(self):
+        self.documents = 0
+        self.chunks = 0
+        self.vectors = 0
+        self.duplicates = 0
+        self.failed: Dict[str, str] = {}
+        self.failed_sha256: Dict[str, Optional[str]] = {}
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self.started
+
+    def _rate(self, count: int) -> float:
+        return round(count / self.seconds, 1) if self.seconds else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "vectors": self.vectors,
+            "duplicates": self.duplicates,
+            "failed": len(self.failed),
+            "seconds": round(self.seconds, 3),
+            "documents_per_second": self._rate(self.documents),
+            "chunks_per_second": self._rate(self.chunks),
+            "vectors_per_second": self._rate(self.vectors),
+        }
+
+    def summary(self) -> str:
+        summary = (f"Ingested {self.documents} documents, {self.chunks} chunks and {self.vectors} vectors in "
+                   f"{self.seconds:.1f}s ({self._rate(self.documents)} docs/s, {self._rate(self.chunks)} chunks/s, "
+                   f"{self._rate(self.vectors)} vectors/s)")
+        if self.duplicates:
+            summary += f"; {self.duplicates} near-duplicate chunks got no vector"
+        if self.failed:
+            summary += f"; skipped {len(self.failed)} unreadable: {', '.join(self.failed)}"
+        return summary
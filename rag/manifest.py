@@ -0,0 +1,124 @@
+"""
+Content-hash manifest for incremental re-indexing.
+
+manifest.json, written next to the index, records the settings the index was
+built with and, for every source file, the SHA-256 of its bytes and the range
+of vector ids its chunks occupy. Vector ids equal row numbers in the chunk
+store; rows of removed or changed files are left behind as empty tombstones
+until the next full rebuild compacts them. Files that could not be read are
+listed under 'failed' with their SHA-256, so they are retried only once they
+change.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+# Rebuild from scratch once this share of chunk-store rows are tombstones
+MAX_TOMBSTONE_FRACTION = float(os.getenv('INDEX_MAX_TOMBSTONE_FRACTION', '0.3'))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's bytes, read in blocks; the same as content_hash() of a UTF-8 file with \n line endings"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """The manifest in path, or None if there is none (or it is unreadable)."""
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest in {path}: {e}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(path: str, manifest: Dict[str, Any]):
+    with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({**manifest, 'version': MANIFEST_VERSION}, f, indent=2, sort_keys=True)
+
+
+class UpdatePlan:
+    """Which source files to embed, drop or keep, or why a full rebuild is needed."""
+
+    def __init__(self):
+        self.added: List[str] = []
+        self.updated: List[str] = []
+        self.removed: List[str] = []
+        self.skipped: List[str] = []
+        self.full_rebuild_reason: Optional[str] = None
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+    def summary(self) -> Dict[str, List[str]]:
+        return {'added': self.added, 'updated': self.updated, 'removed': self.removed, 'skipped': self.skipped}
+
+
+def plan_update(manifest: Optional[Dict[str, Any]], docs: List[Dict[str, str]],
+                settings: Dict[str, Any], supports_removal: bool = True) -> UpdatePlan:
+    """
+    Compare the documents on disk with the manifest of the current index.
+
+    Args:
+        manifest: the current manifest, or None
+        docs: [{'file': ..., 'sha256': ...}] as returned by hash_document(), or
+            [{'file': ..., 'text': ...}] as returned by load_documents()
+        settings: chunking / embedding / index settings of this run
+        supports_removal: whether the index type can delete vectors by id
+    """
+    plan = UpdatePlan()
+    if manifest is None:
+        plan.full_rebuild_reason = 'no manifest'
+    elif manifest.get('settings') != settings:
+        plan.full_rebuild_reason = 'settings changed'
+
+    known = manifest.get('files', {}) if manifest else {}
+    # Files that could not be read last time: {'sha256', 'error'}
+    failed = manifest.get('failed', {}) if manifest else {}
+    on_disk = {doc['file'] for doc in docs}
+    for doc in docs:
+        entry = known.get(doc['file'])
+        sha256 = doc['sha256'] if 'sha256' in doc else content_hash(doc['text'])
+        if entry is None:
+            unreadable = failed.get(doc['file'])
+            if isinstance(unreadable, dict) and unreadable.get('sha256') == sha256:
+                plan.skipped.append(doc['file'])
+            else:
+                plan.added.append(doc['file'])
+        elif entry['sha256'] != sha256:
+            plan.updated.append(doc['file'])
+        else:
+            plan.skipped.append(doc['file'])
+    plan.removed = sorted(name for name in known if name not in on_disk)
+
+    if plan.full_rebuild_reason is None:
+        if (plan.updated or plan.removed) and not supports_removal:
+            plan.full_rebuild_reason = 'index type cannot remove vectors'
+        else:
+            total_rows = manifest.get('next_id', 0)
+            dead_rows = manifest.get('tombstones', 0) + sum(
+                known[name]['num_chunks'] for name in plan.updated + plan.removed)
+            if total_rows and dead_rows / total_rows > MAX_TOMBSTONE_FRACTION:
+                plan.full_rebuild_reason = 'compacting removed chunks'
+    return plan
@@ -0,0 +1,265 @@
+"""
+Model registry for the RAG pipeline.
+
+Builds the sentence-transformer embedding model and the T5 paraphraser once per
+process. The paraphraser is loaded (and optionally warmed up) on a background
+thread so that requests never pay for model construction; until it is ready,
+multi-query retrieval falls back to the original query only. The embedding
+model can be loaded the same way, in which case retrieval answers from the
+BM25 index while it loads.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from sentence_transformers import SentenceTransformer
+
+try:
+    from transformers import pipeline
+except ImportError:  # transformers is pulled in by sentence-transformers, but stay defensive
+    pipeline = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+PARAPHRASER_MODEL = os.getenv('PARAPHRASER_MODEL', 'Vamsi/T5_Paraphrase_Paws')
+PARAPHRASER_ENABLED = os.getenv('PARAPHRASER_ENABLED', 'true').lower() == 'true'
+PARAPHRASER_WARMUP = os.getenv('PARAPHRASER_WARMUP', 'true').lower() == 'true'
+PARAPHRASER_WARMUP_QUERY = os.getenv('PARAPHRASER_WARMUP_QUERY', 'How do I improve my resume?')
+PARAPHRASE_LATENCY_BUDGET_MS = float(os.getenv('PARAPHRASE_LATENCY_BUDGET_MS', '500'))
+PARAPHRASE_NUM_VARIANTS = int(os.getenv('PARAPHRASE_NUM_VARIANTS', '2'))
+# Seconds for the paraphrase latency estimate to halve while no paraphrase runs
+PARAPHRASE_ESTIMATE_HALF_LIFE_S = float(os.getenv('PARAPHRASE_ESTIMATE_HALF_LIFE_S', '30'))
+
+# Paraphraser lifecycle states
+NOT_LOADED = 'not_loaded'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+DISABLED = 'disabled'
+
+
+def current_embedding_model_name() -> str:
+    """Embedding model name, re-read from the environment on every call."""
+    return os.getenv('EMBEDDING_MODEL', EMBEDDING_MODEL)
+
+
+class ModelRegistry:
+    """Process-wide, lazily-built models shared by all requests."""
+
+    def __init__(self, paraphraser_model: str = PARAPHRASER_MODEL,
+                 paraphraser_enabled: bool = PARAPHRASER_ENABLED,
+                 warmup: bool = PARAPHRASER_WARMUP):
+        self.paraphraser_model = paraphraser_model
+        self.paraphraser_enabled = paraphraser_enabled
+        self.warmup = warmup
+
+        self._lock = threading.Lock()
+        self._embedding_lock = threading.Lock()
+        self._embedding_models: Dict[str, Any] = {}
+        self._embedding_threads: Dict[str, threading.Thread] = {}
+        self._embedding_errors: Dict[str, str] = {}
+
+        self._paraphraser = None
+        self._paraphraser_state = NOT_LOADED if paraphraser_enabled else DISABLED
+        self._paraphraser_error: Optional[str] = None
+        self._paraphraser_thread: Optional[threading.Thread] = None
+        # Single worker: the HF pipeline is not safe to call concurrently.
+        self._paraphrase_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='paraphraser')
+        # The last paraphrase submitted; a new one is only submitted once it is done
+        self._paraphrase_job = None
+
+        self.paraphraser_load_seconds = 0.0
+        self.paraphraser_warmup_seconds = 0.0
+        self._paraphrase_ewma_ms: Optional[float] = None
+        self._paraphrase_ewma_at = 0.0
+        self.paraphrase_busy = 0
+
+    # --- Embedding model ---
+    def get_embedding_model(self, name: str = None):
+        """Return the embedding model, building it on first use."""
+        name = name or current_embedding_model_name()
+        model = self._embedding_models.get(name)
+        if model is not None:
+            return model
+        with self._embedding_lock:
+            model = self._embedding_models.get(name)
+            if model is None:
+                start = time.perf_counter()
+                model = SentenceTransformer(name)
+                self._embedding_models = {name: model}
+                self._embedding_errors.pop(name, None)
+                logger.info(f"Embedding model {name} loaded in {time.perf_counter() - start:.2f}s")
+            return model
+
+    def embedding_model_ready(self, name: str = None) -> bool:
+        return (name or current_embedding_model_name()) in self._embedding_models
+
+    def embedding_model_loading(self, name: str = None) -> bool:
+        return (name or current_embedding_model_name()) in self._embedding_threads
+
+    def embedding_model_error(self, name: str = None) -> Optional[str]:
+        return self._embedding_errors.get(name or current_embedding_model_name())
+
+    def start_embedding_loading(self, name: str = None) -> Optional[threading.Thread]:
+        """Load the embedding model on a background thread (idempotent)."""
+        name = name or current_embedding_model_name()
+        if self.embedding_model_ready(name) or name in self._embedding_errors:
+            return None
+        with self._lock:
+            thread = self._embedding_threads.get(name)
+            if thread is None:
+                thread = threading.Thread(
+                    target=self._load_embedding_model, args=(name,), name='embedding-loader', daemon=True
+                )
+                self._embedding_threads[name] = thread
+                thread.start()
+            return thread
+
+    def _load_embedding_model(self, name: str):
+        try:
+            self.get_embedding_model(name)
+        except Exception as e:
+            self._embedding_errors[name] = str(e)
+            logger.error(f"Embedding model {name} failed to load: {e}")
+        finally:
+            with self._lock:
+                self._embedding_threads.pop(name, None)
+
+    # --- Paraphraser ---
+    @property
+    def paraphraser_state(self) -> str:
+        return self._paraphraser_state
+
+    def start_paraphraser_loading(self) -> Optional[threading.Thread]:
+        """Build the paraphraser on a background thread (idempotent)."""
+        with self._lock:
+            if self._paraphraser_state != NOT_LOADED:
+                return self._paraphraser_thread
+            self._paraphraser_state = LOADING
+            self._paraphraser_thread = threading.Thread(
+                target=self._load_paraphraser, name='paraphraser-loader', daemon=True
+            )
+            self._paraphraser_thread.start()
+            return self._paraphraser_thread
+
+    def _load_paraphraser(self):
+        start = time.perf_counter()
+        try:
+            if pipeline is None:
+                raise ImportError("transformers is not installed")
+            paraphraser = pipeline('text2text-generation', model=self.paraphraser_model)
+            self.paraphraser_load_seconds = time.perf_counter() - start
+            if self.warmup:
+                warm_start = time.perf_counter()
+                paraphraser(PARAPHRASER_WARMUP_QUERY, max_length=64, num_return_sequences=PARAPHRASE_NUM_VARIANTS)
+                self.paraphraser_warmup_seconds = time.perf_counter() - warm_start
+                self._record_latency(self.paraphraser_warmup_seconds * 1000)
+            self._paraphraser = paraphraser
+            self._paraphraser_state = READY
+            logger.info(
+                f"Paraphraser {self.paraphraser_model} ready "
+                f"(load {self.paraphraser_load_seconds:.2f}s, warm-up {self.paraphraser_warmup_seconds:.2f}s)"
+            )
+        except Exception as e:
+            self._paraphraser_error = str(e)
+            self._paraphraser_state = FAILED
+            logger.error(f"Paraphraser {self.paraphraser_model} unavailable; multi-query retrieval disabled: {e}")
+
+    def paraphrase(self, query: str, budget_ms: float = PARAPHRASE_LATENCY_BUDGET_MS,
+                   num_variants: int = PARAPHRASE_NUM_VARIANTS) -> Tuple[List[str], Dict[str, Any]]:
+        """
+        Generate alternative phrasings of a query within a latency budget.
+
+        Returns:
+            (variants, info) where info records whether expansion ran, why it
+            fell back if it did not, and how long it took.
+        """
+        info = {"expanded": False, "fallback_reason": None, "expansion_ms": 0.0, "budget_ms": budget_ms}
+
+        if self._paraphraser_state == NOT_LOADED:
+            self.start_paraphraser_loading()
+        if self._paraphraser_state != READY:
+            info["fallback_reason"] = {
+                DISABLED: 'paraphraser_disabled',
+                FAILED: 'paraphraser_unavailable',
+            }.get(self._paraphraser_state, 'paraphraser_not_ready')
+            return [], info
+
+        predicted_ms = self._predicted_latency_ms()
+        if predicted_ms is not None and predicted_ms > budget_ms:
+            info["fallback_reason"] = 'predicted_over_budget'
+            return [], info
+
+        start = time.perf_counter()
+        with self._lock:
+            job = self._paraphrase_job
+            if job is not None and not job.done():
+                # Another paraphrase (possibly one abandoned over budget) still holds the
+                # single worker; this one would only spend its budget waiting behind it
+                self.paraphrase_busy += 1
+                info["fallback_reason"] = 'paraphraser_busy'
+                return [], info
+            future = self._paraphrase_job = self._paraphrase_executor.submit(
+                self._paraphraser, query, max_length=64, num_return_sequences=num_variants
+            )
+        try:
+            alt = future.result(timeout=budget_ms / 1000)
+        except FutureTimeoutError:
+            info["fallback_reason"] = 'over_budget'
+            info["expansion_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            future.add_done_callback(lambda f: self._record_latency((time.perf_counter() - start) * 1000))
+            return [], info
+        except Exception as e:
+            logger.warning(f"Paraphrasing failed, using the original query only: {e}")
+            info["fallback_reason"] = 'paraphraser_error'
+            return [], info
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._record_latency(elapsed_ms)
+        info["expanded"] = True
+        info["expansion_ms"] = round(elapsed_ms, 2)
+        return [x['generated_text'] for x in alt], info
+
+    def _predicted_latency_ms(self) -> Optional[float]:
+        """
+        Expected paraphrase latency: the average of recent calls, halved every
+        PARAPHRASE_ESTIMATE_HALF_LIFE_S since the last one, so a slow period
+        skips expansion for a while rather than for a number of requests.
+        """
+        if self._paraphrase_ewma_ms is None:
+            return None
+        idle = max(0.0, time.monotonic() - self._paraphrase_ewma_at)
+        return self._paraphrase_ewma_ms * 0.5 ** (idle / PARAPHRASE_ESTIMATE_HALF_LIFE_S)
+
+    def _record_latency(self, elapsed_ms: float):
+        predicted_ms = self._predicted_latency_ms()
+        if predicted_ms is None:
+            self._paraphrase_ewma_ms = elapsed_ms
+        else:
+            self._paraphrase_ewma_ms = 0.8 * predicted_ms + 0.2 * elapsed_ms
+        self._paraphrase_ewma_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        """Load state and timings of the registered models."""
+        return {
+            "embedding_models": list(self._embedding_models),
+            "embedding_errors": dict(self._embedding_errors),
+            "paraphraser_model": self.paraphraser_model,
+            "paraphraser_state": self._paraphraser_state,
+            "paraphraser_error": self._paraphraser_error,
+            "paraphraser_load_s": round(self.paraphraser_load_seconds, 3),
+            "paraphraser_warmup_s": round(self.paraphraser_warmup_seconds, 3),
+            "paraphrase_latency_ms": round(self._predicted_latency_ms(), 2) if self._paraphrase_ewma_ms is not None else None,
+            "paraphrase_busy": self.paraphrase_busy,
+        }
+
+
+# Global model registry instance
+model_registry = ModelRegistry()
@@ -0,0 +1,222 @@
+"""
+Cross-encoder reranking of retrieved chunks.
+
+The bi-encoder search returns RERANK_CANDIDATES chunks; the cross-encoder scores
+every (query, chunk) pair in one batch and the best top_k are returned. Scores
+are cached by (query hash, file, chunk id), so a repeated question skips the
+model entirely. Scoring runs under a time cap: if the model is not loaded yet
+or does not answer within RERANK_TIME_CAP_MS, the bi-encoder order is returned
+unchanged. While a batch that ran past the cap is still scoring, new batches
+are not queued behind it and fall back at once.
+
+RERANK_ENABLED decides whether retrieval reranks by default and whether the
+model is loaded at startup; an explicit rerank request loads it on first use.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from rag.embedding_cache import normalize_query
+from rag.models import NOT_LOADED, LOADING, READY, FAILED, DISABLED
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'false').lower() == 'true'
+RERANKER_MODEL = os.getenv('RERANKER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '20'))
+RERANK_TIME_CAP_MS = float(os.getenv('RERANK_TIME_CAP_MS', '300'))
+RERANK_CACHE_SIZE = int(os.getenv('RERANK_CACHE_SIZE', '8192'))
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()
+
+
+class Reranker:
+    """Lazily-loaded cross-encoder with a score cache and a per-call time cap."""
+
+    def __init__(self, model_name: str = RERANKER_MODEL, enabled: bool = RERANK_ENABLED,
+                 time_cap_ms: float = RERANK_TIME_CAP_MS, cache_size: int = RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        self.enabled = enabled
+        self.time_cap_ms = time_cap_ms
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        self._model = None
+        self._state = NOT_LOADED if enabled else DISABLED
+        self._error: Optional[str] = None
+        # Single worker: one batch at a time, and a timed-out batch does not pile up more work.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reranker')
+        # A batch still scoring after its caller's time cap ran out
+        self._overrun = None
+
+        self._scores: "OrderedDict[Tuple[str, str, int], float]" = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.busy = 0
+        self.load_seconds = 0.0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def start_loading(self, force: bool = False) -> Optional[threading.Thread]:
+        """Build the cross-encoder on a background thread (idempotent); force loads it even if disabled."""
+        with self._lock:
+            if self._state != NOT_LOADED and not (force and self._state == DISABLED):
+                return None
+            self._state = LOADING
+            thread = threading.Thread(target=self._load, name='reranker-loader', daemon=True)
+            thread.start()
+            return thread
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name)
+            self.load_seconds = time.perf_counter() - start
+            self._state = READY
+            logger.info(f"Reranker {self.model_name} loaded in {self.load_seconds:.2f}s")
+        except Exception as e:
+            self._error = str(e)
+            self._state = FAILED
+            logger.error(f"Reranker {self.model_name} unavailable; keeping bi-encoder order: {e}")
+
+    def _check_version(self, version):
+        """Drop cached scores when the index is reloaded. Caller holds the lock."""
+        if version != self._version:
+            self._scores.clear()
+            self._version = version
+
+    def _score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        return [float(s) for s in self._model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)]
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], top_k: int,
+               version: Any = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Reorder retrieval results by cross-encoder score.
+
+        Calling this is a request to rerank: a disabled reranker starts
+        loading its model, and falls back until it is ready.
+
+        Returns:
+            (results, info): the best top_k candidates, each with a
+            'rerank_score', or the first top_k in their original order when
+            reranking falls back; info says which happened and why.
+        """
+        info = {"reranked": False, "fallback_reason": None, "rerank_ms": 0.0, "cache_hits": 0}
+        if self._state in (NOT_LOADED, DISABLED):
+            self.start_loading(force=True)
+        if self._state != READY:
+            info["fallback_reason"] = {
+                FAILED: 'reranker_unavailable',
+            }.get(self._state, 'reranker_not_ready')
+            return candidates[:top_k], info
+        if not candidates:
+            info["reranked"] = True
+            return [], info
+
+        start = time.perf_counter()
+        qhash = query_hash(query)
+        keys = [(qhash, c['metadata']['file'], int(c['metadata']['chunk_id'])) for c in candidates]
+        with self._lock:
+            self._check_version(version)
+            scores = [self._scores.get(k) for k in keys]
+            for k, s in zip(keys, scores):
+                if s is not None:
+                    self._scores.move_to_end(k)
+        missing = [i for i, s in enumerate(scores) if s is None]
+        info["cache_hits"] = len(keys) - len(missing)
+
+        if missing:
+            overrun = self._overrun
+            if overrun is not None and not overrun.done():
+                # The worker is busy past another request's cap; this batch would only wait behind it
+                self.busy += 1
+                info["fallback_reason"] = 'reranker_busy'
+                return candidates[:top_k], info
+            pairs = [(query, candidates[i]['chunk']) for i in missing]
+            remaining_s = max(0.0, self.time_cap_ms / 1000 - (time.perf_counter() - start))
+            future = self._executor.submit(self._score, pairs)
+            try:
+                new_scores = future.result(timeout=remaining_s)
+            except FutureTimeoutError:
+                self.timeouts += 1
+                info["fallback_reason"] = 'over_time_cap'
+                info["rerank_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                if future.cancel():
+                    # Still queued behind another batch: nobody is waiting for it any more
+                    return candidates[:top_k], info
+                self._overrun = future
+                # Keep the late scores so the next identical question is served from cache.
+                missing_keys = [keys[i] for i in missing]
+
+                def store_late_scores(f):
+                    if f.exception() is None:
+                        self._store(missing_keys, f.result(), version)
+
+                future.add_done_callback(store_late_scores)
+                return candidates[:top_k], info
+            except Exception as e:
+                logger.warning(f"Reranking failed, keeping bi-encoder order: {e}")
+                info["fallback_reason"] = 'reranker_error'
+                return candidates[:top_k], info
+            self._store([keys[i] for i in missing], new_scores, version)
+            for i, s in zip(missing, new_scores):
+                scores[i] = s
+
+        self.hits += info["cache_hits"]
+        self.misses += len(missing)
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:top_k]
+        reranked = [{**candidates[i], 'rerank_score': scores[i]} for i in order]
+        info["reranked"] = True
+        info["rerank_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return reranked, info
+
+    def _store(self, keys: List[Tuple[str, str, int]], scores: List[float], version: Any):
+        with self._lock:
+            if version != self._version:
+                return
+            for k, s in zip(keys, scores):
+                self._scores[k] = float(s)
+                self._scores.move_to_end(k)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Load state, cache effectiveness and time-cap fallbacks."""
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "state": self._state,
+            "error": self._error,
+            "load_s": round(self.load_seconds, 3),
+            "cached_scores": len(self._scores),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "timeouts": self.timeouts,
+            "busy": self.busy,
+        }
+
+
+# Global reranker instance
+reranker = Reranker()
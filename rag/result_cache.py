@@ -0,0 +1,221 @@
+"""
+Cache of full retrieve() results.
+
+Entries are keyed by the normalized query, top_k, the retrieval options and
+the version of the loaded index, so a rebuilt index never serves stale
+results: its new version simply misses. Entries also expire after
+RESULT_CACHE_TTL_SECONDS.
+
+The default backend is an in-process LRU. With RESULT_CACHE_BACKEND=redis
+(and the optional `redis` package), results are shared by every worker that
+points at REDIS_URL; if Redis cannot be reached the in-process cache is used.
+Redis keys are namespaced by index version and the namespaces of other versions
+are deleted in the background once a new version is seen. Redis itself must
+bound the cache: run it with maxmemory and an LRU eviction policy, as
+docker-compose.yml does.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from rag.embedding_cache import normalize_query
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_BACKEND = os.getenv('RESULT_CACHE_BACKEND', 'memory').lower()
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '1024'))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv('RESULT_CACHE_TTL_SECONDS', '300'))
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+REDIS_KEY_PREFIX = os.getenv('RESULT_CACHE_REDIS_PREFIX', 'careercoach:retrieval:')
+
+CacheKey = Tuple[Any, ...]
+
+
+def make_key(query: str, top_k: int, index_version: Optional[str], **options: Any) -> CacheKey:
+    """Key for one retrieve() call; options are the flags that change its results."""
+    return (normalize_query(query), int(top_k), index_version) + tuple(sorted(options.items()))
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: CacheKey, value: Dict[str, Any], ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def drop_other_versions(self, index_version: Optional[str]):
+        """Free entries of indexes that are no longer loaded."""
+        with self._lock:
+            for key in [k for k in self._entries if k[2] != index_version]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Redis-backed cache shared across workers; size is left to Redis (maxmemory with an LRU policy)."""
+
+    name = 'redis'
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = REDIS_KEY_PREFIX):
+        import redis  # optional dependency
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.5)
+        self.client.ping()
+        self.evictions = 0
+        self._purge_thread: Optional[threading.Thread] = None
+
+    def _namespace(self, index_version: Optional[str]) -> str:
+        return f"{self.prefix}{index_version}:"
+
+    def _redis_key(self, key: CacheKey) -> str:
+        digest = hashlib.sha1(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+        return f"{self._namespace(key[2])}{digest}"
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self._redis_key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: CacheKey, value: Dict[str, Any], ttl: float):
+        self.client.set(self._redis_key(key), json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def drop_other_versions(self, index_version: Optional[str]):
+        """Delete the namespaces of other index versions without holding up the caller."""
+        self._purge_thread = threading.Thread(target=self._purge, args=(index_version,),
+                                              name='result-cache-purge', daemon=True)
+        self._purge_thread.start()
+
+    def _purge(self, index_version: Optional[str], batch_size: int = 500):
+        keep = self._namespace(index_version).encode('utf-8')
+        stale = []
+        try:
+            for redis_key in self.client.scan_iter(match=f"{self.prefix}*", count=batch_size):
+                if not redis_key.startswith(keep):
+                    stale.append(redis_key)
+                if len(stale) >= batch_size:
+                    self.client.delete(*stale)
+                    stale = []
+            if stale:
+                self.client.delete(*stale)
+        except Exception as e:
+            logger.warning(f"Could not purge old result cache versions from Redis: {e}")
+
+    def clear(self):
+        for redis_key in self.client.scan_iter(match=f"{self.prefix}*"):
+            self.client.delete(redis_key)
+
+
+class ResultCache:
+    """TTL- and size-bounded cache of retrieval results for the current index version."""
+
+    def __init__(self, backend: str = RESULT_CACHE_BACKEND, max_entries: int = RESULT_CACHE_SIZE,
+                 ttl_seconds: float = RESULT_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.backend = MemoryBackend(max_entries)
+        if backend == 'redis':
+            try:
+                self.backend = RedisBackend()
+                logger.info(f"Retrieval result cache shared through Redis at {REDIS_URL}")
+            except ImportError:
+                logger.warning("redis package not installed; using the in-process result cache")
+            except Exception as e:
+                logger.warning(f"Redis unavailable ({e}); using the in-process result cache")
+        self._index_version = None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def _check_version(self, index_version: Optional[str]):
+        if index_version != self._index_version:
+            self.backend.drop_other_versions(index_version)
+            self._index_version = index_version
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        self._check_version(key[2])
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Result cache lookup failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: CacheKey, value: Dict[str, Any]):
+        if not self.enabled:
+            return
+        try:
+            self.backend.set(key, value, self.ttl_seconds)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Result cache store failed: {e}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Backend, size and hit rate of the result cache."""
+        lookups = self.hits + self.misses
+        entries = len(self.backend) if isinstance(self.backend, MemoryBackend) else None
+        return {
+            "backend": self.backend.name,
+            "enabled": self.enabled,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "index_version": self._index_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.backend.evictions,
+            "errors": self.errors,
+        }
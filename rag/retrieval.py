@@ -1,64 +1,282 @@
 import os
+import copy
 import pickle
-from typing import List, Dict
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
+import numpy as np
 import faiss
 
+from rag.index_store import IndexStore
+from rag.snapshots import active_path
+from rag.ann import apply_search_params, load_index_info
+from rag.storage import has_chunk_store, load_chunk_store, read_index
+from rag.bm25 import load_bm25_index, reciprocal_rank_fusion
+from rag.models import model_registry, current_embedding_model_name, PARAPHRASE_LATENCY_BUDGET_MS
+from rag.embedding_cache import QueryEmbeddingCache
+from rag.rerank import reranker, RERANK_CANDIDATES
+from rag.result_cache import ResultCache, make_key
+from rag.batcher import RetrievalCoalescer
+from rag.routing import routed_index
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 VECTOR_DB_PATH = os.getenv('VECTOR_DB_PATH', './data/vector_db')
-EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
 TOP_K_RESULTS = int(os.getenv('TOP_K_RESULTS', 5))
+# dense: FAISS only; hybrid: FAISS and BM25 fused with reciprocal rank fusion; lexical: BM25 only
+RETRIEVAL_MODES = ('dense', 'hybrid', 'lexical')
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'dense')
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 20))
+# Threads that run retrieve() for async callers (aretrieve)
+RETRIEVAL_WORKERS = int(os.getenv('RETRIEVAL_WORKERS', 4))
+RRF_K = int(os.getenv('RRF_K', 60))
+
 
-model = SentenceTransformer(EMBEDDING_MODEL)
+class RetrievalResults(list):
+    """List of retrieved chunks with request-level details in `info`."""
+
+    def __init__(self, results=(), info: Dict[str, Any] = None):
+        super().__init__(results)
+        self.info = info or {}
+
+def cite(metadata: Dict[str, Any]) -> str:
+    """
+    Source of a chunk for citations: its file, plus the page and section it
+    came from when known, and the other files that contain the same text.
+    """
+    parts = [metadata['file']]
+    if metadata.get('page') is not None:
+        parts.append(f"p. {metadata['page']}")
+    if metadata.get('section'):
+        parts.append(metadata['section'])
+    source = ', '.join(parts)
+    # Near-duplicate chunks folded into this one at index time (rag.dedup)
+    others = list(dict.fromkeys(m['file'] for m in metadata.get('also_in', ()) if m['file'] != metadata['file']))
+    return f"{source} (also in {', '.join(others)})" if others else source
 
 # Helper to load index and metadata
-def load_index_and_metadata():
-    index = faiss.read_index(os.path.join(VECTOR_DB_PATH, 'faiss.index'))
-    with open(os.path.join(VECTOR_DB_PATH, 'metadata.pkl'), 'rb') as f:
+def load_index_and_metadata(path: str = None):
+    path = path or active_path(os.getenv('VECTOR_DB_PATH', VECTOR_DB_PATH))
+    index = read_index(os.path.join(path, 'faiss.index'))
+    if has_chunk_store(path):
+        metadata, chunks = load_chunk_store(path)
+        return index, metadata, chunks
+    # Legacy pickle format; convert once with `python -m rag.storage migrate`
+    logger.warning(f"Loading pickled chunks from {path}; run `python -m rag.storage migrate` to memory-map them")
+    with open(os.path.join(path, 'metadata.pkl'), 'rb') as f:
         metadata = pickle.load(f)
-    with open(os.path.join(VECTOR_DB_PATH, 'chunks.pkl'), 'rb') as f:
+    with open(os.path.join(path, 'chunks.pkl'), 'rb') as f:
         chunks = pickle.load(f)
     return index, metadata, chunks
 
-def retrieve(query: str, top_k: int = TOP_K_RESULTS, multi_query: bool = True) -> List[Dict]:
-    index, metadata, chunks = load_index_and_metadata()
+def _load_vector_store(path: str):
+    """
+    Load the index files and apply the search settings recorded at build time.
+    A large flat index is wrapped so that queries are routed to their nearest
+    documents first (see rag.routing).
+    """
+    index, metadata, chunks = load_index_and_metadata(path)
+    apply_search_params(index, load_index_info(path))
+    return routed_index(index, path), metadata, chunks, load_bm25_index(path)
+
+# Process-wide index, loaded on first use and reloaded when the files change
+index_store = IndexStore(VECTOR_DB_PATH, loader=lambda path: _load_vector_store(path))
+
+# Embeddings of recent queries, keyed by normalized text and model name
+query_embedding_cache = QueryEmbeddingCache()
+
+# Dedicated, bounded pool for aretrieve(); keeps CPU-bound retrieval off the event loop
+# and out of the default executor shared with other blocking calls
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix='retrieval')
+
+# Joins the embedding and FAISS search of concurrent requests into one batch
+retrieval_coalescer = RetrievalCoalescer()
+
+# Full results of recent retrieve() calls, keyed by query, options and index version
+result_cache = ResultCache()
+
+# Fallbacks that only last until a model finishes loading; their results are not cached
+_TRANSIENT_FALLBACKS = frozenset({
+    'embedding_model_loading', 'paraphraser_not_ready', 'over_budget', 'predicted_over_budget',
+    'reranker_not_ready', 'over_time_cap', 'reranker_busy', 'paraphraser_busy',
+})
+
+def merge_search_results(D, I):
+    """
+    Merge a multi-row FAISS search result into a single ranking.
+
+    Every row is the top-k of one query variant. Returns the unique chunk ids
+    ordered by their best (lowest) distance, with that distance and the row it
+    came from.
+    """
+    D = np.asarray(D)
+    I = np.asarray(I)
+    if I.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    rows = np.repeat(np.arange(I.shape[0]), I.shape[1])
+    ids, dists = I.ravel(), D.ravel()
+    valid = ids >= 0  # FAISS pads with -1 when fewer than k vectors match
+    ids, dists, rows = ids[valid], dists[valid], rows[valid]
+    order = np.argsort(dists, kind='stable')
+    ids, dists, rows = ids[order], dists[order], rows[order]
+    _, first = np.unique(ids, return_index=True)
+    first.sort()
+    return ids[first], dists[first], rows[first]
+
+def _resolve_mode(mode: str, lexical, model_name: str):
+    """Pick the mode to run and, if it differs from the requested one, why."""
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}")
+    if lexical is None:
+        # Index built before BM25 was added
+        return 'dense', (None if mode == 'dense' else 'no_lexical_index')
+    if mode != 'lexical' and not model_registry.embedding_model_ready(model_name):
+        # Answer from BM25 while a background load is running (or after it failed)
+        # instead of blocking the request on model construction.
+        if model_registry.embedding_model_error(model_name):
+            return 'lexical', 'embedding_model_unavailable'
+        if model_registry.embedding_model_loading(model_name):
+            return 'lexical', 'embedding_model_loading'
+    return mode, None
+
+def _is_cacheable(info: Dict[str, Any]) -> bool:
+    reasons = {info.get('mode_fallback_reason'), info['expansion'].get('fallback_reason'),
+               info['rerank'].get('fallback_reason')}
+    return not reasons & _TRANSIENT_FALLBACKS
+
+def retrieve(query: str, top_k: int = TOP_K_RESULTS, multi_query: bool = True,
+             latency_budget_ms: float = PARAPHRASE_LATENCY_BUDGET_MS, mode: str = None,
+             rerank: bool = None, use_cache: bool = True) -> RetrievalResults:
+    """
+    Retrieve the top_k chunks for a query.
+
+    Results are served from `result_cache` when the same normalized query was
+    retrieved with the same options against the same index version;
+    `info["result_cache"]` is "hit", "miss" or "bypass". Results produced
+    while a model was still loading or over its latency budget are not cached.
+
+    With multi_query, the query is expanded with paraphrases when the shared
+    paraphraser is ready and fits within latency_budget_ms; otherwise only the
+    original query is searched. The returned list's `info["expansion"]` says
+    which path was taken and how long expansion took.
+
+    mode (default RETRIEVAL_MODE) selects dense, hybrid or lexical retrieval.
+    `info["mode"]` is the mode that actually ran and `info["score_type"]` says
+    how to read each result's score: an L2 distance (lower is better) for
+    dense, a fused RRF score or a BM25 score (higher is better) otherwise.
+
+    With rerank (default: RERANK_ENABLED), the best RERANK_CANDIDATES
+    chunks are rescored by the cross-encoder and returned in that order with
+    a 'rerank_score'; `info["rerank"]` says whether it ran or why the
+    first-stage order was kept. rerank=True with RERANK_ENABLED off loads the
+    model on first use.
+    """
+    data, index_version = index_store.get_with_version()
+    index, metadata, chunks = data[:3]
+    lexical = data[3] if len(data) > 3 else None
+    model_name = current_embedding_model_name()
+    requested_mode = mode or RETRIEVAL_MODE
+    mode, mode_fallback = _resolve_mode(requested_mode, lexical, model_name)
+    rerank = reranker.enabled if rerank is None else rerank
+    cache_key = None
+    if use_cache and result_cache.enabled:
+        cache_key = make_key(query, top_k, index_version, multi_query=multi_query,
+                       mode=requested_mode, rerank=rerank)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            # Callers may modify results, their metadata and info; the cached entry stays untouched
+            cached = copy.deepcopy(cached)
+            return RetrievalResults(cached['results'], info={**cached['info'], "result_cache": 'hit'})
+
+    num_candidates = max(top_k, RERANK_CANDIDATES) if rerank else top_k
     queries = [query]
-    # Multi-query reformulation (simple version: synonyms/LLM expansion)
-    if multi_query:
-        try:
-            from transformers import pipeline
-            # Use a paraphrasing model if available
-            paraphraser = pipeline('text2text-generation', model='Vamsi/T5_Paraphrase_Paws')
-            alt = paraphraser(query, max_length=64, num_return_sequences=2)
-            queries += [x['generated_text'] for x in alt]
-        except Exception:
-            pass  # Fallback to single query if paraphraser not available
-    all_results = []
-    for q in queries:
-        q_emb = model.encode([q], convert_to_numpy=True)
-        D, I = index.search(q_emb, top_k)
-        for i, idx in enumerate(I[0]):
-            all_results.append({
-                'score': float(D[0][i]),
-                'chunk': chunks[idx],
-                'metadata': metadata[idx],
-                'query': q
-            })
-    # Deduplicate and sort by score
+    cache_hits = 0
+    batch_info = {"batched": False, "batch_size": 1, "queue_ms": 0.0}
+
+    if mode == 'lexical':
+        expansion = {"expanded": False, "fallback_reason": 'lexical_mode', "expansion_ms": 0.0}
+        ids, scores = lexical.search(query, max(num_candidates, HYBRID_CANDIDATES))
+        rows = np.zeros(len(ids), dtype=np.int64)
+        score_type = 'bm25'
+    else:
+        # Announce early so concurrent requests can be searched together
+        with retrieval_coalescer.announce() as ticket:
+            model = model_registry.get_embedding_model(model_name)
+            # Multi-query reformulation using the shared paraphraser
+            if multi_query:
+                alternatives, expansion = model_registry.paraphrase(query, budget_ms=latency_budget_ms)
+                queries += alternatives
+            else:
+                expansion = {"expanded": False, "fallback_reason": 'multi_query_disabled', "expansion_ms": 0.0}
+            # Encode all uncached variants (with those of concurrent requests) in one batch
+            # and search them as one matrix
+            D, I, cache_hits, batch_info = retrieval_coalescer.search(
+                ticket, queries, num_candidates if mode == 'dense' else max(num_candidates, HYBRID_CANDIDATES),
+                model_name, lambda texts: model.encode(texts, convert_to_numpy=True), index, query_embedding_cache
+            )
+        ids, scores, rows = merge_search_results(D, I)
+        score_type = 'l2_distance'
+        if mode == 'hybrid':
+            lexical_ids, _ = lexical.search(query, max(num_candidates, HYBRID_CANDIDATES))
+            dense_rows = dict(zip(ids.tolist(), rows.tolist()))
+            ids, scores = reciprocal_rank_fusion([ids, lexical_ids], k=RRF_K)
+            # Chunks found only by BM25 are attributed to the original query
+            rows = np.array([dense_rows.get(i, 0) for i in ids.tolist()], dtype=np.int64)
+            score_type = 'rrf'
+
+    # Deduplicate on (file, chunk_id) in case the same chunk was indexed twice
     seen = set()
     deduped = []
-    for r in sorted(all_results, key=lambda x: x['score']):
-        key = (r['metadata']['file'], r['metadata']['chunk_id'])
-        if key not in seen:
-            deduped.append(r)
-            seen.add(key)
-    return deduped[:top_k]
+    for idx, score, row in zip(ids, scores, rows):
+        key = (metadata[idx]['file'], metadata[idx]['chunk_id'])
+        if key in seen:
+            continue
+        seen.add(key)
+        deduped.append({
+            'score': float(score),
+            'chunk': chunks[idx],
+            'metadata': metadata[idx],
+            'query': queries[row]
+        })
+        if len(deduped) == num_candidates:
+            break
+    if rerank:
+        deduped, rerank_info = reranker.rerank(query, deduped, top_k, version=index_version)
+    else:
+        rerank_info = {"reranked": False, "fallback_reason": 'rerank_disabled', "rerank_ms": 0.0, "cache_hits": 0}
+    info = {
+        "mode": mode,
+        "requested_mode": requested_mode,
+        "mode_fallback_reason": mode_fallback,
+        "score_type": score_type,
+        "expansion": expansion,
+        "rerank": rerank_info,
+        "queries": queries,
+        "embedding_cache_hits": cache_hits,
+        "batch": batch_info
+    }
+    if cache_key is not None and _is_cacheable(info):
+        result_cache.set(cache_key, copy.deepcopy({"results": deduped, "info": info}))
+    info["result_cache"] = 'miss' if cache_key is not None else 'bypass'
+    return RetrievalResults(deduped, info=info)
+
+async def aretrieve(query: str, top_k: int = TOP_K_RESULTS, **kwargs) -> RetrievalResults:
+    """
+    Async retrieve(): runs on `retrieval_executor` so the event loop keeps
+    serving other requests and streams while embedding and search run.
+    Accepts the same keyword arguments as retrieve().
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(retrieval_executor, functools.partial(retrieve, query, top_k, **kwargs))
 
 if __name__ == '__main__':
     import sys
     query = sys.argv[1] if len(sys.argv) > 1 else 'How do I improve my resume?'
     results = retrieve(query)
     for r in results:
-        print(f"[{r['metadata']['file']}]: {r['chunk'][:200]}...\nScore: {r['score']:.2f}\n") 
\ No newline at end of file
+        print(f"[{cite(r['metadata'])}]: {r['chunk'][:200]}...\nScore: {r['score']:.2f}\n") 
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+Two-level dense retrieval: route each query to its nearest documents, then
+search only their chunks.
+
+The indexer keeps, for every routing unit, the sum of its chunk vectors,
+the sum of their squared norms and their ids, and writes them to
+ROUTING_FILE. A unit is a document, or a run of DOC_ROUTING_GROUP_CHUNKS
+consecutive chunks of a longer one (roughly a section), so one long PDF
+cannot hide a relevant page behind a broad average.
+
+At query time the units are ranked by the mean squared L2 distance from the
+query to their chunks, ||q||^2 - 2 q.c + mean ||x||^2 with c the unit
+centroid. That takes one small matrix product, after which only the vectors
+of the DOC_ROUTING_TOP_M best units are compared with the query exactly. A
+query whose best units do not stand out, which is what an off-topic query
+looks like, is searched in full instead. This is measured as the distance
+from the best unit to the first unit left out, in standard deviations of
+all unit distances (DOC_ROUTING_MIN_GAP).
+
+Whether routing works at all depends on the corpus: when chunks are closer
+to chunks of other documents on the same topic than to their own document,
+the nearest units miss most neighbours. The indexer therefore routes a
+sample of indexed chunks and records the share of their exact top-k that
+routing finds; in auto mode routing is used only if that recall reaches
+DOC_ROUTING_MIN_RECALL.
+
+Routing applies to flat indexes. HNSW and IVF indexes already avoid the
+full scan.
+"""
+
+import os
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+# off | on | auto (route once the index holds DOC_ROUTING_MIN_CHUNKS vectors)
+DOC_ROUTING = os.getenv('DOC_ROUTING', 'auto').lower()
+DOC_ROUTING_TOP_M = int(os.getenv('DOC_ROUTING_TOP_M', '32'))
+# On-topic queries stand 4-7 standard deviations clear of the first unit left out, random ones 1-2
+DOC_ROUTING_MIN_GAP = float(os.getenv('DOC_ROUTING_MIN_GAP', '3.0'))
+DOC_ROUTING_MIN_CHUNKS = int(os.getenv('DOC_ROUTING_MIN_CHUNKS', '20000'))
+DOC_ROUTING_MIN_RECALL = float(os.getenv('DOC_ROUTING_MIN_RECALL', '0.9'))
+DOC_ROUTING_GROUP_CHUNKS = int(os.getenv('DOC_ROUTING_GROUP_CHUNKS', '64'))
+ROUTING_FILE = 'routing.npz'
+RECALL_SAMPLES = 64
+RECALL_K = 5
+
+
+class RoutingTableBuilder:
+    """Per-unit vector sums and ids, filled batch by batch as the indexer embeds chunks."""
+
+    def __init__(self, group_chunks: int = DOC_ROUTING_GROUP_CHUNKS):
+        self.group_chunks = max(1, group_chunks)
+        self._units: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._units)
+
+    def add(self, keys: Sequence[Tuple[str, int]], vectors: np.ndarray, ids: Sequence[int]):
+        """keys are the (file, chunk_id) of each vector."""
+        vectors = np.asarray(vectors, dtype='float32')
+        rows: Dict[Tuple[str, int], List[int]] = {}
+        for row, (name, chunk_id) in enumerate(keys):
+            rows.setdefault((name, chunk_id // self.group_chunks), []).append(row)
+        # A batch holds consecutive chunks of a few files, so this is a handful of vectorised sums
+        for key, members in rows.items():
+            unit = self._units.get(key)
+            if unit is None:
+                unit = self._units[key] = {'sum': np.zeros(vectors.shape[1], dtype=np.float64),
+                                           'sq_norms': 0.0, 'ids': []}
+            part = vectors[members]
+            unit['sum'] += part.sum(axis=0, dtype=np.float64)
+            unit['sq_norms'] += float((part.astype(np.float64) ** 2).sum())
+            unit['ids'].extend(int(ids[row]) for row in members)
+
+    def load(self, path: str, drop_files: Sequence[str] = ()) -> bool:
+        """Take over the units saved in path, except those of drop_files; False if there are none."""
+        try:
+            table = np.load(os.path.join(path, ROUTING_FILE))
+        except FileNotFoundError:
+            return False
+        if int(table['group_chunks']) != self.group_chunks:
+            return False
+        drop = set(drop_files)
+        offsets, ids = table['offsets'], table['ids']
+        for u, (name, part) in enumerate(zip(table['files'].tolist(), table['parts'].tolist())):
+            if name not in drop:
+                self._units[(name, part)] = {'sum': table['sums'][u].astype(np.float64),
+                                             'sq_norms': float(table['sq_norms'][u]),
+                                             'ids': ids[offsets[u]:offsets[u + 1]].tolist()}
+        return True
+
+    def table(self) -> Dict[str, np.ndarray]:
+        """The arrays saved in ROUTING_FILE, units sorted by (file, part)."""
+        keys = sorted(self._units)
+        units = [self._units[key] for key in keys]
+        dim = len(units[0]['sum']) if units else 0
+        return {
+            'group_chunks': np.int64(self.group_chunks),
+            'files': np.array([name for name, _ in keys], dtype=str),
+            'parts': np.array([part for _, part in keys], dtype=np.int64),
+            'sums': np.array([u['sum'] for u in units], dtype=np.float32).reshape(len(units), dim),
+            'sq_norms': np.array([u['sq_norms'] for u in units], dtype=np.float64),
+            'offsets': np.concatenate([[0], np.cumsum([len(u['ids']) for u in units])]).astype(np.int64),
+            'ids': np.array([i for u in units for i in u['ids']], dtype=np.int64),
+        }
+
+    def save(self, path: str, table: Dict[str, np.ndarray] = None, recall: float = float('nan')):
+        """Write table (by default self.table()) and the measured routing recall, NaN if not measured."""
+        with open(os.path.join(path, ROUTING_FILE), 'wb') as f:
+            np.savez(f, recall=np.float64(recall), **(table if table is not None else self.table()))
+
+
+class DocumentRouter:
+    """Picks the routing units, and so the chunk ids, to search for each query."""
+
+    def __init__(self, files: np.ndarray, centroids: np.ndarray, mean_sq_norms: np.ndarray,
+                 offsets: np.ndarray, ids: np.ndarray, top_m: int = DOC_ROUTING_TOP_M,
+                 min_gap: float = DOC_ROUTING_MIN_GAP, recall: float = float('nan')):
+        self.files = files
+        self.centroids = np.ascontiguousarray(centroids, dtype='float32')
+        self.mean_sq_norms = mean_sq_norms.astype('float32')
+        self.offsets = offsets
+        self.ids = ids
+        self.top_m = top_m
+        self.min_gap = min_gap
+        self.recall = recall
+
+    @classmethod
+    def from_table(cls, table, **kwargs) -> 'DocumentRouter':
+        offsets = table['offsets']
+        counts = np.maximum(np.diff(offsets), 1)[:, None]
+        recall = float(table['recall']) if 'recall' in table else float('nan')
+        return cls(table['files'], table['sums'] / counts, table['sq_norms'] / counts[:, 0],
+                   offsets, table['ids'], recall=recall, **kwargs)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> Optional['DocumentRouter']:
+        try:
+            table = np.load(os.path.join(path, ROUTING_FILE))
+        except FileNotFoundError:
+            return None
+        return cls.from_table(table, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.centroids)
+
+    def unit_distances(self, queries: np.ndarray) -> np.ndarray:
+        """[queries, units] mean squared L2 distance from each query to each unit's chunks."""
+        return ((queries * queries).sum(axis=1, keepdims=True) - 2 * queries @ self.centroids.T
+                + self.mean_sq_norms[None, :])
+
+    def route(self, queries: np.ndarray) -> List[Optional[np.ndarray]]:
+        """Chunk ids to search for each query, or None where the full index should be searched."""
+        queries = np.asarray(queries, dtype='float32')
+        if len(self) <= self.top_m:
+            return [None] * len(queries)
+        distances = self.unit_distances(queries)
+        nearest = np.argpartition(distances, self.top_m, axis=1)[:, :self.top_m + 1]
+        routes: List[Optional[np.ndarray]] = []
+        for row, units in zip(distances, nearest):
+            units = units[np.argsort(row[units])]
+            spread = float(row.std())
+            if spread and (row[units[self.top_m]] - row[units[0]]) / spread < self.min_gap:
+                routes.append(None)
+                continue
+            routes.append(np.concatenate([self.ids[self.offsets[u]:self.offsets[u + 1]] for u in units[:self.top_m]]))
+        return routes
+
+
+class RoutedIndex:
+    """
+    A flat FAISS index whose search() routes each query through a DocumentRouter.
+
+    Other attributes are those of the wrapped index; routed and full_scans
+    count the queries searched each way.
+    """
+
+    def __init__(self, index, router: DocumentRouter):
+        self.index = index
+        self.router = router
+        self.routed = 0
+        self.full_scans = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+    def search(self, queries: np.ndarray, k: int):
+        queries = np.ascontiguousarray(queries, dtype='float32')
+        D = np.full((len(queries), k), np.finfo('float32').max, dtype='float32')
+        I = np.full((len(queries), k), -1, dtype='int64')
+        full = []
+        for i, ids in enumerate(self.router.route(queries)):
+            if ids is None or len(ids) < k:
+                full.append(i)
+                continue
+            vectors = self.index.reconstruct_batch(ids)
+            distances, positions = faiss.knn(queries[i:i + 1], vectors, k)
+            D[i], I[i] = distances[0], ids[positions[0]]
+        if full:
+            D[full], I[full] = self.index.search(queries[full], k)
+        with self._lock:
+            self.routed += len(queries) - len(full)
+            self.full_scans += len(full)
+        return D, I
+
+    def stats(self) -> Dict[str, Any]:
+        return {'units': len(self.router), 'top_m': self.router.top_m, 'min_gap': self.router.min_gap,
+                'build_recall': self.router.recall, 'routed': self.routed, 'full_scans': self.full_scans}
+
+
+def is_flat(index) -> bool:
+    if not isinstance(index, faiss.Index):
+        return False
+    base = faiss.downcast_index(index)
+    if isinstance(base, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        if not isinstance(base, faiss.IndexIDMap2):
+            return False  # no reverse map, so vectors cannot be fetched by id
+        base = faiss.downcast_index(base.index)
+    return isinstance(base, faiss.IndexFlat) and base.metric_type == faiss.METRIC_L2
+
+
+def measure_recall(index, router: DocumentRouter, samples: int = RECALL_SAMPLES, k: int = RECALL_K) -> float:
+    """
+    Share of the exact top-k of sampled indexed chunks that routing finds,
+    with every query routed (no gap check).
+
+    A sampled chunk is always its own nearest neighbour and always found in
+    its own document, so it is left out of both result lists: each query is
+    searched for k + 1 and scored on the k other chunks.
+    """
+    rng = np.random.default_rng(0)
+    ids = np.unique(rng.choice(router.ids, size=min(samples, len(router.ids)), replace=False))
+    if not len(ids):
+        return float('nan')
+    queries = index.reconstruct_batch(ids)
+    _, exact = index.search(queries, k + 1)
+    routed = RoutedIndex(index, DocumentRouter(router.files, router.centroids, router.mean_sq_norms,
+                                               router.offsets, router.ids, router.top_m, min_gap=0.0))
+    _, found = routed.search(queries, k + 1)
+
+    def others(row, own):
+        return [i for i in row if i >= 0 and i != own][:k]
+
+    hits = total = 0
+    for own, e, f in zip(ids, exact, found):
+        expected = others(e, own)
+        hits += len(set(expected) & set(others(f, own)))
+        total += len(expected)
+    return hits / max(1, total)
+
+
+def routed_index(index, path: str, mode: str = DOC_ROUTING, min_chunks: int = DOC_ROUTING_MIN_CHUNKS,
+                 min_recall: float = DOC_ROUTING_MIN_RECALL, **kwargs):
+    """index wrapped in a RoutedIndex when routing is on for it, else index itself."""
+    if mode == 'off' or not is_flat(index) or (mode == 'auto' and index.ntotal < min_chunks):
+        return index
+    router = DocumentRouter.load(path, **kwargs)
+    if router is None:
+        logger.info(f"No {ROUTING_FILE} in {path}; searching every chunk (rebuild the index to enable routing)")
+        return index
+    # NaN (not measured) fails the comparison too
+    if mode == 'auto' and not router.recall >= min_recall:
+        logger.info(f"Routing found {router.recall:.2f} of the exact neighbours at build time "
+                    f"(DOC_ROUTING_MIN_RECALL {min_recall}); searching every chunk")
+        return index
+    logger.info(f"Routing queries to the {router.top_m} nearest of {len(router)} document units")
+    return RoutedIndex(index, router)
@@ -0,0 +1,211 @@
+"""
+Versioned, atomically published snapshots of the vector store.
+
+Every indexing run writes a complete index into a new directory and then
+makes it active by replacing the CURRENT pointer file, so a reader sees
+either the previous set of files or the new one, never a mix:
+
+    VECTOR_DB_PATH/
+        CURRENT                        name of the active snapshot
+        versions/<version>/            faiss.index, chunk store, BM25 index, manifest.json, snapshot.json
+        versions/<older versions>/     the last INDEX_KEEP_VERSIONS snapshots, for rollback
+
+Version names sort by build time. A VECTOR_DB_PATH without CURRENT that
+holds the index files directly (the layout of earlier builds) is read as a
+single unversioned snapshot.
+
+Usage:
+    python -m rag.snapshots list|rollback [VERSION]|prune
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = 'CURRENT'
+VERSIONS_DIR = 'versions'
+SNAPSHOT_INFO_FILE = 'snapshot.json'
+INDEX_KEEP_VERSIONS = int(os.getenv('INDEX_KEEP_VERSIONS', '3'))
+# An unpublished snapshot directory is only taken for a dead build once nothing in it changed for this long
+INDEX_UNFINISHED_GRACE_SECONDS = float(os.getenv('INDEX_UNFINISHED_GRACE_SECONDS', '3600'))
+
+
+def version_path(root: str, version: str) -> str:
+    return os.path.join(root, VERSIONS_DIR, version)
+
+
+def active_version(root: str) -> Optional[str]:
+    """Name of the snapshot CURRENT points to, or None for an unversioned store."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def active_path(root: str) -> str:
+    """Directory of the active snapshot; root itself for an unversioned store."""
+    version = active_version(root)
+    return version_path(root, version) if version else root
+
+
+def list_versions(root: str) -> List[str]:
+    """Published snapshots, oldest first."""
+    try:
+        names = os.listdir(os.path.join(root, VERSIONS_DIR))
+    except FileNotFoundError:
+        return []
+    return sorted(n for n in names if os.path.exists(os.path.join(version_path(root, n), SNAPSHOT_INFO_FILE)))
+
+
+def snapshot_info(path: str) -> Dict[str, Any]:
+    """snapshot.json of the snapshot in path; for an unversioned store, the index file's build time."""
+    try:
+        with open(os.path.join(path, SNAPSHOT_INFO_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        pass
+    try:
+        return {'version': None, 'built_at': os.path.getmtime(os.path.join(path, 'faiss.index'))}
+    except OSError:
+        return {'version': None, 'built_at': None}
+
+
+def create_snapshot(root: str) -> Tuple[str, str]:
+    """Make an empty directory for a new snapshot; returns (version, path)."""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    try:
+        existing = os.listdir(os.path.join(root, VERSIONS_DIR))
+    except FileNotFoundError:
+        existing = []
+    # Number after the versions already made this second, so names keep sorting by build order
+    taken = [int(name[len(stamp) + 1:]) for name in existing
+             if name.startswith(stamp + '-') and name[len(stamp) + 1:].isdigit()]
+    for n in range(max(taken, default=-1) + 1, 1000):
+        version = f"{stamp}-{n:03d}"
+        path = version_path(root, version)
+        try:
+            os.makedirs(path)
+            return version, path
+        except FileExistsError:
+            continue
+    raise RuntimeError(f"Could not create a snapshot directory under {os.path.join(root, VERSIONS_DIR)}")
+
+
+def discard_snapshot(root: str, version: str):
+    """Remove an unpublished snapshot, e.g. after a failed build."""
+    shutil.rmtree(version_path(root, version), ignore_errors=True)
+    try:
+        os.rmdir(os.path.join(root, VERSIONS_DIR))  # only if it is now empty
+    except OSError:
+        pass
+
+
+def _point_to(root: str, version: str):
+    tmp = os.path.join(root, CURRENT_FILE + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+
+def publish_snapshot(root: str, version: str, info: Dict[str, Any]):
+    """Record info in the snapshot and make it the active one."""
+    info = {**info, 'version': version, 'built_at': time.time(), 'previous': active_version(root)}
+    with open(os.path.join(version_path(root, version), SNAPSHOT_INFO_FILE), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2, sort_keys=True)
+    _point_to(root, version)
+
+
+def _last_modified(path: str) -> float:
+    """Newest mtime of a directory and the files in it; a build writing there keeps it recent."""
+    latest = os.path.getmtime(path)
+    for entry in os.scandir(path):
+        try:
+            latest = max(latest, entry.stat().st_mtime)
+        except OSError:
+            pass
+    return latest
+
+
+def prune_snapshots(root: str, keep: int = INDEX_KEEP_VERSIONS,
+                    grace_seconds: float = INDEX_UNFINISHED_GRACE_SECONDS) -> List[str]:
+    """
+    Delete all but the newest `keep` published snapshots (never the active one),
+    and directories of builds that died before an older snapshot was published.
+
+    A build still running next to another one (a manual run alongside
+    --watch) has such a directory too, so an unfinished directory is only
+    deleted once nothing in it has been written for grace_seconds.
+
+    Servers that still have a deleted snapshot loaded keep reading it from
+    their open file handles and memory maps until they switch.
+    """
+    active = active_version(root)
+    published = list_versions(root)
+    doomed = [v for v in published[:max(0, len(published) - max(1, keep))] if v != active]
+    if published:
+        unfinished = set(os.listdir(os.path.join(root, VERSIONS_DIR))) - set(published)
+        now = time.time()
+        for version in sorted(v for v in unfinished if v < published[-1]):
+            try:
+                idle = now - _last_modified(version_path(root, version))
+            except OSError:
+                continue  # removed meanwhile
+            if idle >= grace_seconds:
+                doomed.append(version)
+    for version in doomed:
+        shutil.rmtree(version_path(root, version), ignore_errors=True)
+    if doomed:
+        logger.info(f"Pruned index snapshots: {', '.join(doomed)}")
+    return doomed
+
+
+def rollback(root: str, version: str = None) -> str:
+    """Make version (default: the one published before the active snapshot) active again."""
+    versions = list_versions(root)
+    if version is None:
+        active = active_version(root)
+        older = [v for v in versions if active is None or v < active]
+        if not older:
+            raise ValueError(f"No snapshot older than {active} in {root}")
+        version = older[-1]
+    elif version not in versions:
+        raise ValueError(f"Unknown snapshot '{version}'. Available: {', '.join(versions) or 'none'}")
+    _point_to(root, version)
+    return version
+
+
+def _main(argv: List[str]):
+    root = os.getenv('VECTOR_DB_PATH', './data/vector_db')
+    command = argv[0] if argv else 'list'
+    if command == 'list':
+        active = active_version(root)
+        for version in list_versions(root):
+            info = snapshot_info(version_path(root, version))
+            built = datetime.fromtimestamp(info['built_at']).isoformat(timespec='seconds')
+            print(f"{'*' if version == active else ' '} {version}  built {built}  "
+                  f"{info.get('chunks', '?')} chunks, {info.get('files', '?')} files")
+    elif command == 'rollback':
+        print(f"Active snapshot is now {rollback(root, argv[1] if len(argv) > 1 else None)}")
+    elif command == 'prune':
+        print(f"Removed {len(prune_snapshots(root))} snapshots")
+    else:
+        print("Usage: python -m rag.snapshots list|rollback [VERSION]|prune")
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    _main(sys.argv[1:])
@@ -0,0 +1,319 @@
+"""
+Columnar, memory-mapped storage for chunk text and chunk metadata.
+
+Instead of pickling a list of strings and a list of dicts, the indexer writes:
+
+    chunks.bin            all chunk texts, UTF-8, back to back
+    chunk_offsets.npy     int64 [n + 1] byte offsets into chunks.bin
+    chunk_file_ids.npy    int32 [n] index into files.json
+    chunk_ids.npy         int32 [n] position of the chunk within its file
+    files.json            source file names
+    chunk_extra.bin/.npy  optional JSON object per chunk for any other metadata keys
+    chunk_duplicates.json optional {row: [rows whose 'duplicate_of' is row]}, see rag.dedup
+
+Retrieval memory-maps these files and decodes only the rows it returns, so
+several server processes on one host share the same page-cache pages and
+nothing is unpickled. `python -m rag.storage migrate` converts the
+metadata.pkl / chunks.pkl pair of the active index into a new snapshot (see
+rag.snapshots), leaving the published one untouched.
+"""
+
+import os
+import sys
+import json
+import mmap
+import pickle
+import shutil
+import logging
+from array import array
+from typing import Any, Dict, List, Sequence, Set
+
+import numpy as np
+import faiss
+
+from rag.snapshots import (
+    SNAPSHOT_INFO_FILE, active_path, active_version, create_snapshot, discard_snapshot, publish_snapshot,
+    snapshot_info,
+)
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_BLOB = 'chunks.bin'
+CHUNK_OFFSETS = 'chunk_offsets.npy'
+CHUNK_FILE_IDS = 'chunk_file_ids.npy'
+CHUNK_IDS = 'chunk_ids.npy'
+FILES_LIST = 'files.json'
+EXTRA_BLOB = 'chunk_extra.bin'
+EXTRA_OFFSETS = 'chunk_extra_offsets.npy'
+DUPLICATES_FILE = 'chunk_duplicates.json'
+COLUMNAR_FILES = (CHUNKS_BLOB, CHUNK_OFFSETS, CHUNK_FILE_IDS, CHUNK_IDS, FILES_LIST)
+
+FAISS_MMAP = os.getenv('FAISS_MMAP', 'true').lower() == 'true'
+
+
+class ChunkStoreWriter:
+    """
+    Append chunks and their metadata one row at a time in the columnar format.
+
+    Only offsets and ids are kept in memory. Files are written under .tmp
+    names and moved into place by close(), so a reader that has the previous
+    store memory-mapped is never truncated underneath.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._chunks = open(self._tmp(CHUNKS_BLOB), 'wb')
+        self._extra = open(self._tmp(EXTRA_BLOB), 'wb')
+        self._offsets = array('q', [0])
+        self._extra_offsets = array('q', [0])
+        self._file_ids = array('i')
+        self._chunk_ids = array('i')
+        self._files: List[str] = []
+        self._file_index: Dict[str, int] = {}
+        self._has_extra = False
+        self._duplicates: Dict[int, List[int]] = {}
+
+    def _tmp(self, name: str) -> str:
+        return os.path.join(self.path, name + '.tmp')
+
+    def _save_array(self, name: str, values: np.ndarray):
+        with open(self._tmp(name), 'wb') as f:  # np.save would add .npy to the .tmp name
+            np.save(f, values)
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+    def append(self, chunk: str, meta: Dict[str, Any]):
+        name = meta['file']
+        if name not in self._file_index:
+            self._file_index[name] = len(self._files)
+            self._files.append(name)
+        self._file_ids.append(self._file_index[name])
+        if meta.get('duplicate_of') is not None:
+            self._duplicates.setdefault(int(meta['duplicate_of']), []).append(len(self._chunk_ids))
+        self._chunk_ids.append(meta['chunk_id'])
+        data = chunk.encode('utf-8')
+        self._chunks.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        # 'also_in' is derived from the other rows' 'duplicate_of' when reading
+        extra = {k: v for k, v in meta.items() if k not in ('file', 'chunk_id', 'also_in')}
+        data = json.dumps(extra).encode('utf-8') if extra else b''
+        self._has_extra = self._has_extra or bool(extra)
+        self._extra.write(data)
+        self._extra_offsets.append(self._extra_offsets[-1] + len(data))
+
+    def close(self):
+        """Finish writing and replace the store in path."""
+        self._chunks.close()
+        self._extra.close()
+        self._save_array(CHUNK_OFFSETS, np.frombuffer(self._offsets, dtype=np.int64))
+        self._save_array(CHUNK_FILE_IDS, np.frombuffer(self._file_ids, dtype=np.int32))
+        self._save_array(CHUNK_IDS, np.frombuffer(self._chunk_ids, dtype=np.int32))
+        with open(self._tmp(FILES_LIST), 'w', encoding='utf-8') as f:
+            json.dump(self._files, f)
+        optional = []
+        if self._has_extra:
+            self._save_array(EXTRA_OFFSETS, np.frombuffer(self._extra_offsets, dtype=np.int64))
+            optional += [EXTRA_BLOB, EXTRA_OFFSETS]
+        else:
+            os.remove(self._tmp(EXTRA_BLOB))
+        if self._duplicates:
+            with open(self._tmp(DUPLICATES_FILE), 'w', encoding='utf-8') as f:
+                json.dump(self._duplicates, f)
+            optional.append(DUPLICATES_FILE)
+        for name in (EXTRA_BLOB, EXTRA_OFFSETS, DUPLICATES_FILE):
+            if name not in optional and os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+        names = COLUMNAR_FILES + tuple(optional)
+        for name in names:
+            os.replace(self._tmp(name), os.path.join(self.path, name))
+
+    def abort(self):
+        """Discard the rows written so far and leave the existing store alone."""
+        self._chunks.close()
+        self._extra.close()
+        for name in COLUMNAR_FILES + (EXTRA_BLOB, EXTRA_OFFSETS, DUPLICATES_FILE):
+            if os.path.exists(self._tmp(name)):
+                os.remove(self._tmp(name))
+
+    def __enter__(self) -> 'ChunkStoreWriter':
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_chunk_store(path: str, chunks: Sequence[str], metadata: Sequence[Dict[str, Any]]):
+    """Write chunks and their metadata in the columnar format."""
+    if len(chunks) != len(metadata):
+        raise ValueError(f"{len(chunks)} chunks but {len(metadata)} metadata entries")
+    with ChunkStoreWriter(path) as writer:
+        for chunk, meta in zip(chunks, metadata):
+            writer.append(chunk, meta)
+
+
+def has_chunk_store(path: str) -> bool:
+    return all(os.path.exists(os.path.join(path, name)) for name in COLUMNAR_FILES)
+
+
+class _TextColumn:
+    """Read-only sequence of strings backed by a memory-mapped UTF-8 blob."""
+
+    def __init__(self, blob_path: str, offsets_path: str):
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        size = int(self.offsets[-1]) if len(self.offsets) else 0
+        if size:
+            with open(blob_path, 'rb') as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._blob = b''
+        self.nbytes = size + self.offsets.nbytes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._blob[int(self.offsets[i]):int(self.offsets[i + 1])].decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ChunkStore(_TextColumn):
+    """Chunk texts, indexed like the old chunks list."""
+
+    def __init__(self, path: str):
+        super().__init__(os.path.join(path, CHUNKS_BLOB), os.path.join(path, CHUNK_OFFSETS))
+
+
+class MetadataStore:
+    """
+    Chunk metadata, indexed like the old metadata list of dicts.
+
+    A row that near-duplicate chunks were folded into lists their locations
+    under 'also_in'.
+    """
+
+    def __init__(self, path: str):
+        self.file_ids = np.load(os.path.join(path, CHUNK_FILE_IDS), mmap_mode='r')
+        self.chunk_ids = np.load(os.path.join(path, CHUNK_IDS), mmap_mode='r')
+        with open(os.path.join(path, FILES_LIST), 'r', encoding='utf-8') as f:
+            self.files = json.load(f)
+        extra_offsets = os.path.join(path, EXTRA_OFFSETS)
+        self.extra = _TextColumn(os.path.join(path, EXTRA_BLOB), extra_offsets) if os.path.exists(extra_offsets) else None
+        try:
+            with open(os.path.join(path, DUPLICATES_FILE), 'r', encoding='utf-8') as f:
+                self.duplicates: Dict[int, List[int]] = {int(row): rows for row, rows in json.load(f).items()}
+        except FileNotFoundError:
+            self.duplicates = {}
+        self.nbytes = self.file_ids.nbytes + self.chunk_ids.nbytes + (self.extra.nbytes if self.extra else 0)
+
+    def __len__(self) -> int:
+        return len(self.file_ids)
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        meta = {'file': self.files[int(self.file_ids[i])], 'chunk_id': int(self.chunk_ids[i])}
+        if self.extra is not None:
+            raw = self.extra[i]
+            if raw:
+                meta.update(json.loads(raw))
+        return meta
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        i = int(i)
+        meta = self._row(i)
+        if i in self.duplicates:
+            meta['also_in'] = [{k: v for k, v in self._row(row).items() if k != 'duplicate_of'}
+                               for row in self.duplicates[i]]
+        return meta
+
+    def duplicate_rows(self) -> Set[int]:
+        """Rows folded into another row; they have no vector."""
+        return {row for rows in self.duplicates.values() for row in rows}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def load_chunk_store(path: str):
+    """Memory-map (metadata, chunks) from the columnar files in path."""
+    return MetadataStore(path), ChunkStore(path)
+
+
+def read_index(index_path: str, use_mmap: bool = FAISS_MMAP):
+    """Read a FAISS index, memory-mapping its vectors when the build supports it."""
+    if use_mmap:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+        try:
+            return faiss.read_index(index_path, flags)
+        except RuntimeError as e:
+            logger.warning(f"Memory-mapped read of {index_path} not supported ({e}); reading into memory")
+    return faiss.read_index(index_path)
+
+
+def migrate_pickles(path: str, remove: bool = False) -> int:
+    """Convert metadata.pkl / chunks.pkl in path to the columnar format, in place (not for published snapshots)."""
+    with open(os.path.join(path, 'metadata.pkl'), 'rb') as f:
+        metadata = pickle.load(f)
+    with open(os.path.join(path, 'chunks.pkl'), 'rb') as f:
+        chunks = pickle.load(f)
+    write_chunk_store(path, chunks, metadata)
+    if remove:
+        os.remove(os.path.join(path, 'metadata.pkl'))
+        os.remove(os.path.join(path, 'chunks.pkl'))
+    return len(chunks)
+
+
+def migrate_snapshot(root: str, remove: bool = False):
+    """
+    Publish a copy of the active index in root with its pickles converted to the columnar format.
+
+    Published snapshots are never changed: the other index files are copied
+    into a new snapshot next to the converted chunk store. With remove, the
+    pickles of an unversioned store (files directly in root) are deleted
+    once the snapshot is active. Returns (version, number of chunks).
+    """
+    source = active_path(root)
+    if not os.path.exists(os.path.join(source, 'metadata.pkl')):
+        raise FileNotFoundError(f"No metadata.pkl / chunks.pkl in the active index {source}")
+    previous = active_version(root)
+    version, target = create_snapshot(root)
+    try:
+        for name in os.listdir(source):
+            if name not in ('metadata.pkl', 'chunks.pkl', SNAPSHOT_INFO_FILE) and \
+                    os.path.isfile(os.path.join(source, name)):
+                shutil.copy2(os.path.join(source, name), os.path.join(target, name))
+        with open(os.path.join(source, 'metadata.pkl'), 'rb') as f:
+            metadata = pickle.load(f)
+        with open(os.path.join(source, 'chunks.pkl'), 'rb') as f:
+            chunks = pickle.load(f)
+        write_chunk_store(target, chunks, metadata)
+    except BaseException:
+        discard_snapshot(root, version)
+        raise
+    info = {k: v for k, v in snapshot_info(source).items() if k not in ('version', 'built_at', 'previous')}
+    publish_snapshot(root, version, {**info, 'chunks': len(chunks), 'migrated_from': previous})
+    if remove and previous is None:
+        os.remove(os.path.join(root, 'metadata.pkl'))
+        os.remove(os.path.join(root, 'chunks.pkl'))
+    return version, len(chunks)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        print("Usage: python -m rag.storage migrate [VECTOR_DB_PATH] [--remove-pickles]")
+        sys.exit(1)
+    args = [a for a in sys.argv[2:] if not a.startswith('--')]
+    root = args[0] if args else os.getenv('VECTOR_DB_PATH', './data/vector_db')
+    version, count = migrate_snapshot(root, remove='--remove-pickles' in sys.argv)
+    print(f"Migrated {count} chunks to the columnar format and published snapshot {version} in {root}")
@@ -0,0 +1,112 @@
+"""
+Load test: concurrent SSE streams keep flowing while retrieval runs.
+
+Retrieval is replaced by a 300 ms blocking call. The streams use aretrieve(),
+which runs it on the retrieval executor, so a heartbeat coroutine on the same
+event loop must keep ticking and the streams must overlap instead of queueing
+behind each other.
+"""
+
+import time
+import json
+import asyncio
+import pytest
+import httpx
+from unittest.mock import AsyncMock, Mock, patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from mcp_server.server import app
+
+RETRIEVAL_SECONDS = 0.3
+CONCURRENT_STREAMS = 4
+
+
+def slow_retrieve(query, top_k=3, **kwargs):
+    time.sleep(RETRIEVAL_SECONDS)  # stands in for embedding + FAISS search, which release the GIL
+    return [{'chunk': 'Negotiate after the offer.', 'metadata': {'file': 'salary_negotiation_guide.md', 'chunk_id': 0},
+             'score': 0.1}]
+
+
+@pytest.fixture
+def career_advice_llm():
+    llm = Mock()
+    llm.agenerate_response = AsyncMock(return_value="CAREER_ADVICE")
+    llm.is_available.return_value = False
+    with patch('mcp_server.server.llm_client', llm):
+        yield llm
+
+
+async def _heartbeat(stop: asyncio.Event, gaps: list, interval: float = 0.01):
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+
+async def _stream(client: httpx.AsyncClient, message: str) -> list:
+    response = await client.post('/chat/stream', json={'message': message})
+    return [json.loads(line[len('data: '):]) for line in response.text.splitlines() if line.startswith('data: ')]
+
+
+class TestAsyncRetrievalLoad:
+    """Concurrent streaming requests with slow retrieval."""
+
+    @pytest.mark.asyncio
+    async def test_streams_keep_flowing_during_retrieval(self, career_advice_llm):
+        stop = asyncio.Event()
+        gaps: list = []
+        transport = httpx.ASGITransport(app=app)
+
+        with patch('rag.retrieval.retrieve', side_effect=slow_retrieve) as mock_retrieve:
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                heartbeat = asyncio.create_task(_heartbeat(stop, gaps))
+                start = time.perf_counter()
+                streams = await asyncio.gather(*[
+                    _stream(client, f"How do I negotiate salary? ({i})") for i in range(CONCURRENT_STREAMS)
+                ])
+                elapsed = time.perf_counter() - start
+                stop.set()
+                await heartbeat
+
+        assert mock_retrieve.call_count == CONCURRENT_STREAMS
+        for events in streams:
+            assert any(e['type'] == 'tool_result' for e in events)
+            assert events[-1]['type'] == 'done'
+        # The event loop was never blocked for anything close to one retrieval...
+        assert max(gaps) < RETRIEVAL_SECONDS / 2
+        # ...and the retrievals overlapped instead of running one after another.
+        assert elapsed < RETRIEVAL_SECONDS * CONCURRENT_STREAMS * 0.75
+
+
+class TestAsyncLLMLoad:
+    """Concurrent chat requests with slow LLM calls."""
+
+    @pytest.mark.asyncio
+    async def test_llm_calls_overlap(self):
+        llm_seconds, requests = 0.2, 50
+
+        async def slow_llm(prompt, max_tokens=None):
+            await asyncio.sleep(llm_seconds)  # stands in for the provider round-trip
+            return "GENERAL_CHAT"
+
+        llm = Mock()
+        llm.agenerate_response = AsyncMock(side_effect=slow_llm)
+        transport = httpx.ASGITransport(app=app)
+        with patch('mcp_server.server.llm_client', llm):
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                start = time.perf_counter()
+                responses = await asyncio.gather(*[
+                    client.post('/chat/enhanced', json={'message': f"Hello ({i})"}) for i in range(requests)
+                ])
+                elapsed = time.perf_counter() - start
+
+        assert all(r.json()['action'] == 'general_chat' for r in responses)
+        assert llm.agenerate_response.await_count == requests
+        # Run one after another, the calls would take llm_seconds * requests = 10 s
+        assert elapsed < llm_seconds * 5
@@ -4,9 +4,10 @@ Integration tests for FastAPI server endpoints.
 
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 import os
 import sys
+import json
 from pathlib import Path
 
 # Add the project root to the path
@@ -32,6 +33,14 @@ class TestHealthEndpoint:
         assert "llm_providers" in data
         assert data["status"] == "healthy"
     
+    def test_health_check_reports_index_version(self):
+        """The active index snapshot and its age are reported."""
+        response = client.get("/health")
+
+        index = response.json()["index"]
+        for key in ("version", "published_version", "built_at", "age_seconds"):
+            assert key in index
+
     @patch('mcp_server.server.llm_client')
     def test_health_check_with_llm_info(self, mock_llm_client):
         """Test health check with LLM provider information."""
@@ -49,6 +58,20 @@ class TestHealthEndpoint:
         assert data["llm_available"] is True
         assert "gemini" in str(data["llm_providers"])
 
+    @patch('mcp_server.server.llm_client')
+    def test_health_check_degraded_while_circuit_open(self, mock_llm_client):
+        """An open provider circuit and its transitions are reported."""
+        transition = {"from": "closed", "to": "open", "at": 1700000000.0, "reason": "error rate 100% over 5 calls"}
+        mock_llm_client.get_provider_info.return_value = {
+            "circuit_breakers": {"gemini": {"state": "open", "transitions": [transition]},
+                                 "openai": {"state": "closed", "transitions": []}}
+        }
+        
+        data = client.get("/health").json()
+        
+        assert data["status"] == "degraded"
+        assert data["llm_providers"]["circuit_breakers"]["gemini"]["transitions"] == [transition]
+
 
 class TestRootEndpoint:
     """Test cases for root endpoint."""
@@ -124,7 +147,7 @@ class TestResumeAnalysisEndpoint:
     def test_analyze_resume_with_llm(self, mock_llm_client):
         """Test resume analysis with LLM enhancement."""
         mock_llm_client.is_available.return_value = True
-        mock_llm_client.generate_response.return_value = "This is a comprehensive LLM analysis of your resume."
+        mock_llm_client.agenerate_response = AsyncMock(return_value="This is a comprehensive LLM analysis of your resume.")
         
         resume_text = "Sample resume content"
         
@@ -161,7 +184,7 @@ class TestResumeAnalysisEndpoint:
     def test_analyze_resume_llm_error(self, mock_llm_client):
         """Test resume analysis when LLM fails."""
         mock_llm_client.is_available.return_value = True
-        mock_llm_client.generate_response.side_effect = Exception("LLM error")
+        mock_llm_client.agenerate_response = AsyncMock(side_effect=Exception("LLM error"))
         
         response = client.post("/tools/analyze_resume", json={
             "resume_text": "Sample resume",
@@ -196,7 +219,7 @@ class TestMockInterviewEndpoint:
     def test_mock_interview_with_llm(self, mock_llm_client):
         """Test mock interview with LLM enhancement."""
         mock_llm_client.is_available.return_value = True
-        mock_llm_client.generate_response.return_value = "1. Tell me about yourself\n2. Describe a challenging project"
+        mock_llm_client.agenerate_response = AsyncMock(return_value="1. Tell me about yourself\n2. Describe a challenging project")
         
         response = client.post("/tools/mock_interview", json={
             "position": "data scientist",
@@ -235,7 +258,7 @@ class TestMockInterviewEndpoint:
     def test_mock_interview_llm_error(self, mock_llm_client):
         """Test mock interview when LLM fails."""
         mock_llm_client.is_available.return_value = True
-        mock_llm_client.generate_response.side_effect = Exception("LLM error")
+        mock_llm_client.agenerate_response = AsyncMock(side_effect=Exception("LLM error"))
         
         response = client.post("/tools/mock_interview", json={
             "position": "software engineer",
@@ -413,6 +436,84 @@ class TestChatEndpoint:
         assert "Chat processing failed" in response.json()["detail"]
 
 
+class TestStreamingChatEndpoint:
+    """Test cases for the streaming chat endpoint."""
+    
+    DOCS = [{'chunk': 'Negotiate after the offer.', 'metadata': {'file': 'salary_negotiation_guide.md', 'chunk_id': 0}}]
+    
+    @staticmethod
+    def _events(response):
+        return [json.loads(line[len('data: '):]) for line in response.text.splitlines() if line.startswith('data: ')]
+    
+    @staticmethod
+    def _llm(pieces):
+        async def stream(prompt, max_tokens=None):
+            for piece in pieces:
+                yield piece
+        
+        llm = Mock()
+        llm.is_available.return_value = True
+        llm.agenerate_response = AsyncMock(return_value="CAREER_ADVICE")
+        llm.astream_response = Mock(side_effect=stream)
+        return llm
+    
+    @pytest.mark.parametrize("format_preference, expected", [
+        ("markdown", '## Career Advice\n\nSay "yes"\nlater.\n\n### Sources:\n- salary_negotiation_guide.md\n\n---\n'
+                     '*Advice generated using RAG-enhanced knowledge base*'),
+        ("code", '```json\n{\n  "advice": "Say \\"yes\\"\\nlater.",\n  "sources": [\'salary_negotiation_guide.md\']\n}\n```'),
+        ("plain", 'Career Advice:\n\nSay "yes"\nlater.\n\nSources: salary_negotiation_guide.md'),
+    ])
+    def test_llm_deltas_are_forwarded(self, format_preference, expected):
+        """Each piece the LLM streams becomes its own content event, inside the format's wrapper."""
+        llm = self._llm(['Say "yes"', '\nlater', '.'])
+        
+        with patch('mcp_server.server.llm_client', llm), \
+                patch('mcp_server.server.aretrieve', AsyncMock(return_value=self.DOCS)):
+            response = client.post("/chat/stream", json={"message": "How do I negotiate?",
+                                                         "format_preference": format_preference})
+        
+        events = self._events(response)
+        content = [e for e in events if e['type'] == 'content']
+        assert ''.join(e['content'] for e in content) == expected
+        assert len(content) == 5  # header, three pieces, sources
+        assert [e['is_final'] for e in content] == [False] * 4 + [True]
+        assert [e['type'] for e in events[-2:]] == ['metadata', 'done']
+        llm.agenerate_response.assert_awaited_once()  # intent only; the advice is streamed
+    
+    def test_mid_stream_failure_is_an_error_event(self):
+        """A stream that fails after its first piece still closes the JSON wrapper; the error is not content."""
+        async def stream(prompt, max_tokens=None):
+            yield 'Say "yes"'
+            raise RuntimeError("connection reset")
+        
+        llm = self._llm([])
+        llm.astream_response = Mock(side_effect=stream)
+        
+        with patch('mcp_server.server.llm_client', llm), \
+                patch('mcp_server.server.aretrieve', AsyncMock(return_value=self.DOCS)):
+            response = client.post("/chat/stream", json={"message": "How do I negotiate?", "format_preference": "code"})
+        
+        events = self._events(response)
+        content = ''.join(e['content'] for e in events if e['type'] == 'content')
+        assert content == '```json\n{\n  "advice": "Say \\"yes\\"",\n  "sources": [\'salary_negotiation_guide.md\']\n}\n```'
+        assert 'Sorry' not in content
+        errors = [e for e in events if e['type'] == 'error']
+        assert len(errors) == 1 and 'connection reset' in errors[0]['content']
+        assert [e['type'] for e in events[-2:]] == ['metadata', 'done']
+        assert events[-2]['action'] == 'error'
+    
+    def test_static_response_is_sent_at_once(self):
+        llm = self._llm([])
+        llm.agenerate_response = AsyncMock(return_value="GENERAL_CHAT")
+        
+        with patch('mcp_server.server.llm_client', llm):
+            response = client.post("/chat/stream", json={"message": "Hi", "format_preference": "plain"})
+        
+        content = [e for e in self._events(response) if e['type'] == 'content']
+        assert len(content) == 1 and content[0]['is_final']
+        assert content[0]['content'].startswith("I'm here to help with your career development!")
+
+
 class TestEndpointErrorHandling:
     """Test error handling across endpoints."""
     
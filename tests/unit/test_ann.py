@@ -0,0 +1,156 @@
+"""
+Unit tests for FAISS index construction and search settings.
+"""
+
+import pytest
+import numpy as np
+import faiss
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.ann import (
+    build_index, apply_search_params, save_index_info, load_index_info, supports_removal,
+    training_sample_size, StreamingIndexBuilder,
+)
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((500, 32)).astype('float32')
+
+
+class TestBuildIndex:
+    """Test cases for build_index."""
+
+    def test_flat_is_default_and_exact(self, embeddings):
+        index, info = build_index(embeddings, 'flat')
+
+        assert isinstance(index, faiss.IndexFlatL2)
+        assert info['index_type'] == 'flat'
+        assert info['ntotal'] == 500
+        _, I = index.search(embeddings[:3], 1)
+        assert I[:, 0].tolist() == [0, 1, 2]
+
+    def test_hnsw_records_params(self, embeddings):
+        index, info = build_index(embeddings, 'hnsw', {'hnsw_m': 8, 'ef_search': 40})
+
+        assert isinstance(index, faiss.IndexHNSWFlat)
+        assert info['params']['hnsw_m'] == 8
+        assert index.hnsw.efSearch == 40
+        assert index.ntotal == 500
+
+    def test_ivf_flat_clamps_nlist_to_data(self, embeddings):
+        index, info = build_index(embeddings, 'ivf_flat', {'nlist': 1000, 'nprobe': 4})
+
+        assert info['params']['nlist'] == 500 // 39
+        assert faiss.extract_index_ivf(index).nprobe == 4
+        assert index.is_trained
+
+    def test_ivf_pq_adjusts_code_size(self, embeddings):
+        index, info = build_index(embeddings, 'ivf_pq', {'nlist': 4, 'pq_m': 5, 'pq_nbits': 8})
+
+        assert 32 % info['params']['pq_m'] == 0
+        assert info['params']['pq_nbits'] <= 8
+        assert index.ntotal == 500
+
+    def test_unknown_type_raises(self, embeddings):
+        with pytest.raises(ValueError, match="Unknown FAISS index type"):
+            build_index(embeddings, 'lsh')
+
+
+class TestExplicitIds:
+    """Test cases for indexes built with explicit vector ids."""
+
+    @pytest.mark.parametrize('index_type', ['flat', 'ivf_flat'])
+    def test_vectors_can_be_removed_by_id(self, embeddings, index_type):
+        ids = np.arange(100, 600)
+        index, _ = build_index(embeddings, index_type, {'nlist': 4, 'nprobe': 4}, ids=ids)
+
+        _, I = index.search(embeddings[:1], 1)
+        assert I[0, 0] == 100
+        index.remove_ids(np.array([100], dtype='int64'))
+        _, I = index.search(embeddings[:1], 1)
+        assert I[0, 0] != 100
+        assert index.ntotal == 499
+
+    def test_hnsw_with_ids_keeps_search_params(self, embeddings):
+        index, info = build_index(embeddings, 'hnsw', {'hnsw_m': 8, 'ef_search': 40}, ids=np.arange(500))
+
+        assert isinstance(index, faiss.IndexIDMap2)
+        assert faiss.downcast_index(index.index).hnsw.efSearch == 40
+
+    def test_supports_removal(self):
+        assert supports_removal('flat')
+        assert supports_removal('IVF_PQ')
+        assert not supports_removal('hnsw')
+
+
+class TestStreamingIndexBuilder:
+    """Test cases for building an index batch by batch."""
+
+    def test_flat_matches_one_shot_build(self, embeddings):
+        builder = StreamingIndexBuilder('flat')
+        for start in range(0, 500, 64):
+            builder.add(embeddings[start:start + 64], np.arange(start, min(start + 64, 500)))
+        index, info = builder.finish()
+
+        assert info['ntotal'] == 500
+        _, I = index.search(embeddings[:5], 1)
+        assert I[:, 0].tolist() == [0, 1, 2, 3, 4]
+
+    def test_ivf_trains_on_first_sample_then_streams(self, embeddings):
+        params = {'nlist': 4, 'nprobe': 4}
+        builder = StreamingIndexBuilder('ivf_flat', params)
+        assert builder.train_size == training_sample_size('ivf_flat', params) == 156
+
+        builder.add(embeddings[:100], np.arange(100))
+        assert builder.index is None  # still collecting the training sample
+        builder.add(embeddings[100:200], np.arange(100, 200))
+        assert builder.index.is_trained and builder.index.ntotal == 200
+        builder.add(embeddings[200:], np.arange(200, 500))
+        index, info = builder.finish()
+
+        assert info['ntotal'] == 500
+        _, I = index.search(embeddings[450:451], 1)
+        assert I[0, 0] == 450
+
+    def test_small_corpus_is_trained_on_what_there_is(self, embeddings):
+        builder = StreamingIndexBuilder('ivf_flat', {'nlist': 100})
+        builder.add(embeddings[:80], np.arange(80))
+        index, info = builder.finish()
+
+        assert info['ntotal'] == 80
+        assert info['params']['nlist'] == 2
+
+    def test_resumes_existing_index(self, embeddings):
+        index, info = build_index(embeddings[:100], 'flat', ids=np.arange(100))
+        builder = StreamingIndexBuilder('flat', index=index, index_info=info)
+        builder.add(embeddings[100:150], np.arange(100, 150))
+
+        _, info = builder.finish()
+        assert info['ntotal'] == 150
+
+    def test_empty_build_raises(self):
+        with pytest.raises(ValueError):
+            StreamingIndexBuilder('flat').finish()
+
+
+class TestIndexInfo:
+    """Test cases for recorded index settings."""
+
+    def test_round_trip_and_apply(self, embeddings, tmp_path):
+        index, info = build_index(embeddings, 'hnsw', {'ef_search': 96})
+        faiss.write_index(index, str(tmp_path / 'faiss.index'))
+        save_index_info(str(tmp_path), info)
+
+        loaded = faiss.read_index(str(tmp_path / 'faiss.index'))
+        apply_search_params(loaded, load_index_info(str(tmp_path)))
+
+        assert loaded.hnsw.efSearch == 96
+
+    def test_missing_info_means_flat(self, tmp_path):
+        assert load_index_info(str(tmp_path))['index_type'] == 'flat'
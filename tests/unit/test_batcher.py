@@ -0,0 +1,165 @@
+"""
+Unit tests for cross-request retrieval batching.
+"""
+
+import time
+import threading
+import pytest
+import numpy as np
+from unittest.mock import Mock, patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.batcher import RetrievalCoalescer
+from rag.embedding_cache import QueryEmbeddingCache
+
+
+def _encode(texts):
+    # One distinct, recognisable vector per text
+    return np.array([[float(len(t)), 0.0] for t in texts], dtype='float32')
+
+
+def _index():
+    index = Mock()
+    # Return each query's first coordinate as its "distance" and id 0..k-1
+    index.search.side_effect = lambda q, k: (np.repeat(q[:, :1], k, axis=1),
+                                             np.tile(np.arange(k), (len(q), 1)))
+    return index
+
+
+class TestRetrievalCoalescer:
+    """Test cases for RetrievalCoalescer."""
+
+    def test_disabled_searches_inline(self):
+        coalescer = RetrievalCoalescer(enabled=False)
+        index = _index()
+
+        D, I, hits, info = coalescer.search(coalescer.announce(), ['abc'], 2, 'm', _encode, index,
+                                            QueryEmbeddingCache())
+
+        assert D.shape == (1, 2) and D[0, 0] == 3.0
+        assert info['batched'] is False
+        assert coalescer.stats()['batches'] == 0
+
+    def test_lone_request_is_not_delayed(self):
+        coalescer = RetrievalCoalescer(window_ms=500, max_batch=8)
+
+        start = time.perf_counter()
+        with coalescer.announce() as ticket:
+            _, _, _, info = coalescer.search(ticket, ['abc'], 2, 'm', _encode, _index(), QueryEmbeddingCache())
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.25  # no other request was announced, so the window is skipped
+        assert info['batch_size'] == 1
+
+    def test_concurrent_requests_share_one_search(self):
+        coalescer = RetrievalCoalescer(window_ms=200, max_batch=8)
+        index = _index()
+        cache = QueryEmbeddingCache()
+        encode = Mock(side_effect=_encode)
+        tickets = [coalescer.announce() for _ in range(3)]
+        results = {}
+
+        def worker(i, queries, k):
+            results[i] = coalescer.search(tickets[i], queries, k, 'm', encode, index, cache)
+
+        threads = [threading.Thread(target=worker, args=(0, ['a'], 1)),
+                   threading.Thread(target=worker, args=(1, ['bb', 'ccc'], 3)),
+                   threading.Thread(target=worker, args=(2, ['dddd'], 2))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+
+        index.search.assert_called_once()
+        encode.assert_called_once()
+        assert index.search.call_args[0][1] == 3  # the largest k in the batch
+        D0, I0, _, info0 = results[0]
+        D1, I1, _, _ = results[1]
+        D2, I2, _, _ = results[2]
+        assert D0.shape == (1, 1) and D0[0, 0] == 1.0
+        assert D1.shape == (2, 3) and list(D1[:, 0]) == [2.0, 3.0]
+        assert D2.shape == (1, 2) and D2[0, 0] == 4.0
+        assert info0['batch_size'] == 3
+        assert coalescer.stats()['batch_sizes'] == {'3': 1}
+
+    def test_cache_hits_are_reported_per_caller(self):
+        coalescer = RetrievalCoalescer(window_ms=200, max_batch=8)
+        cache = QueryEmbeddingCache()
+        cache.encode(['cached'], 'm', _encode)
+        tickets = [coalescer.announce() for _ in range(2)]
+        results = {}
+
+        def worker(i, queries):
+            results[i] = coalescer.search(tickets[i], queries, 1, 'm', _encode, _index(), cache)
+
+        threads = [threading.Thread(target=worker, args=(0, ['cached', 'new'])),
+                   threading.Thread(target=worker, args=(1, ['other']))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+
+        assert results[0][2] == 1
+        assert results[1][2] == 0
+
+    def test_withdrawn_ticket_ends_the_wait(self):
+        coalescer = RetrievalCoalescer(window_ms=2000, max_batch=8)
+        waiting = coalescer.announce()
+
+        def withdraw_soon():
+            time.sleep(0.05)
+            waiting.close()
+
+        threading.Thread(target=withdraw_soon).start()
+        start = time.perf_counter()
+        with coalescer.announce() as ticket:
+            coalescer.search(ticket, ['abc'], 1, 'm', _encode, _index(), QueryEmbeddingCache())
+
+        assert time.perf_counter() - start < 1.0
+
+    def test_search_errors_reach_the_caller(self):
+        coalescer = RetrievalCoalescer(window_ms=1, max_batch=8)
+        index = Mock()
+        index.search.side_effect = RuntimeError("search failed")
+
+        with pytest.raises(RuntimeError):
+            coalescer.search(coalescer.announce(), ['abc'], 1, 'm', _encode, index, QueryEmbeddingCache())
+
+    def test_coalescer_failures_outside_the_search_reach_the_caller(self):
+        coalescer = RetrievalCoalescer(window_ms=1, max_batch=8, timeout_ms=5000)
+
+        start = time.perf_counter()
+        with patch.object(coalescer, '_dispatch', side_effect=RuntimeError("coalescer broke")):
+            with pytest.raises(RuntimeError, match="coalescer broke"):
+                coalescer.search(coalescer.announce(), ['abc'], 1, 'm', _encode, _index(), QueryEmbeddingCache())
+
+        assert time.perf_counter() - start < 1.0
+        D, _, _, info = coalescer.search(coalescer.announce(), ['abc'], 1, 'm', _encode, _index(),
+                                         QueryEmbeddingCache())
+        assert D[0, 0] == 3.0 and info['batched'] is True
+
+    def test_searches_directly_when_the_batch_does_not_answer(self):
+        coalescer = RetrievalCoalescer(window_ms=1, max_batch=8, timeout_ms=50)
+
+        with patch.object(coalescer, '_run'):  # the coalescer thread exits without serving anyone
+            D, _, _, info = coalescer.search(coalescer.announce(), ['abc'], 1, 'm', _encode, _index(),
+                                             QueryEmbeddingCache())
+
+        assert D[0, 0] == 3.0
+        assert info['batched'] is False and info['queue_ms'] >= 50
+        assert coalescer.stats()['timeouts'] == 1
+        assert coalescer._pending == []
+
+    def test_stats_report_queue_delay(self):
+        coalescer = RetrievalCoalescer(window_ms=1, max_batch=8)
+        coalescer.search(coalescer.announce(), ['abc'], 1, 'm', _encode, _index(), QueryEmbeddingCache())
+
+        stats = coalescer.stats()
+
+        assert stats['requests'] == 1
+        assert stats['mean_batch_size'] == 1.0
+        assert stats['queue_ms_mean'] >= 0.0
@@ -0,0 +1,114 @@
+"""
+Unit tests for the BM25 inverted index and rank fusion.
+"""
+
+import math
+import pytest
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.bm25 import BM25Index, tokenize, load_bm25_index, reciprocal_rank_fusion
+
+
+CHUNKS = [
+    'Use the STAR method to answer behavioral interview questions.',
+    'Your LinkedIn summary should tell a story about your career.',
+    'Negotiate salary after the offer, never before it.',
+    'Practice interview questions out loud before the interview.',
+]
+
+
+class TestTokenize:
+    """Test cases for tokenization."""
+
+    def test_lowercases_and_drops_stopwords(self):
+        assert tokenize('How do I use the STAR method?') == ['use', 'star', 'method']
+
+    def test_empty_text(self):
+        assert tokenize('') == []
+
+
+class TestBM25Index:
+    """Test cases for building and searching the index."""
+
+    def test_keyword_query_finds_chunk(self):
+        index = BM25Index.build(CHUNKS)
+
+        ids, scores = index.search('STAR method', top_k=2)
+
+        assert ids[0] == 0
+        assert len(ids) == 1  # no other chunk mentions either term
+        assert scores[0] > 0
+
+    def test_term_frequency_ranks_higher(self):
+        index = BM25Index.build(CHUNKS)
+
+        ids, scores = index.search('interview questions', top_k=4)
+
+        assert list(ids) == [3, 0]
+        assert scores[0] > scores[1]
+
+    def test_scores_match_reference_formula(self):
+        index = BM25Index.build(CHUNKS, k1=1.5, b=0.75)
+        docs = [tokenize(c) for c in CHUNKS]
+        avgdl = sum(len(d) for d in docs) / len(docs)
+        df = sum('salary' in d for d in docs)
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        tf = docs[2].count('salary')
+        expected = idf * tf * 2.5 / (tf + 1.5 * (1 - 0.75 + 0.75 * len(docs[2]) / avgdl))
+
+        ids, scores = index.search('salary', top_k=1)
+
+        assert ids[0] == 2
+        assert scores[0] == pytest.approx(expected, rel=1e-5)
+
+    def test_unknown_terms_return_nothing(self):
+        index = BM25Index.build(CHUNKS)
+
+        ids, scores = index.search('quantum', top_k=3)
+
+        assert len(ids) == 0 and len(scores) == 0
+
+    def test_top_k_limits_results(self):
+        index = BM25Index.build(CHUNKS)
+
+        ids, _ = index.search('interview linkedin salary star', top_k=2)
+
+        assert len(ids) == 2
+
+    def test_save_and_load_round_trip(self, tmp_path):
+        index = BM25Index.build(CHUNKS)
+        index.save(str(tmp_path))
+
+        loaded = load_bm25_index(str(tmp_path))
+
+        assert loaded.num_docs == len(CHUNKS)
+        assert loaded.nbytes == index.nbytes
+        for query in ('STAR method', 'interview questions', 'LinkedIn summary'):
+            expected_ids, expected_scores = index.search(query, top_k=3)
+            ids, scores = loaded.search(query, top_k=3)
+            np.testing.assert_array_equal(ids, expected_ids)
+            np.testing.assert_allclose(scores, expected_scores)
+
+    def test_load_missing_index_returns_none(self, tmp_path):
+        assert load_bm25_index(str(tmp_path)) is None
+
+
+class TestReciprocalRankFusion:
+    """Test cases for reciprocal rank fusion."""
+
+    def test_chunk_in_both_rankings_wins(self):
+        ids, scores = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 4])], k=60)
+
+        assert ids[0] == 3
+        assert scores[0] == pytest.approx(1 / 63 + 1 / 61)
+        assert set(ids) == {1, 2, 3, 4}
+
+    def test_empty_rankings(self):
+        ids, scores = reciprocal_rank_fusion([np.array([]), np.array([])])
+
+        assert len(ids) == 0 and len(scores) == 0
@@ -0,0 +1,148 @@
+"""
+Unit tests for character and token-aware chunking.
+"""
+
+import re
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import rag.chunking
+from rag.chunking import chunk_by_tokens, chunk_document_text, model_max_tokens, token_offsets
+
+
+class WordTokenizer:
+    """Words and punctuation marks are one token each; [CLS] and [SEP] are added around them."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text, **kwargs):
+        self.calls += 1
+        return {'offset_mapping': [m.span() for m in re.finditer(r'\w+|[^\w\s]', text)]}
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+
+def _tokens(tokenizer, text):
+    return len(token_offsets(tokenizer, text))
+
+
+GUIDE = """# Interview Guide
+
+## Preparation
+
+Research the company. Read its recent news and annual report.
+
+Practice answers out loud with a friend.
+
+## During the Interview
+
+### First Impressions
+Arrive ten minutes early. Greet everyone politely.
+
+### Answering Questions
+- Use the STAR method
+- Keep answers under two minutes
+- Ask clarifying questions
+
+## Follow Up
+
+Send a thank-you note within a day.
+"""
+
+
+class TestChunkByTokens:
+    """Test cases for chunk_by_tokens."""
+
+    def test_short_text_is_one_chunk(self):
+        tokenizer = WordTokenizer()
+        text = "Short guide.\n\nTwo paragraphs."
+
+        assert chunk_by_tokens(text, token_offsets(tokenizer, text), 50) == [text]
+
+    def test_chunks_fit_the_budget_and_cover_the_text(self):
+        tokenizer = WordTokenizer()
+        offsets = token_offsets(tokenizer, GUIDE)
+
+        chunks = chunk_by_tokens(GUIDE, offsets, 25)
+
+        assert all(_tokens(tokenizer, c) <= 25 for c in chunks)
+        assert sum(_tokens(tokenizer, c) for c in chunks) == len(offsets)  # nothing lost or repeated
+        assert re.sub(r'\s', '', ''.join(chunks)) == re.sub(r'\s', '', GUIDE)
+
+    def test_prefers_top_level_headings(self):
+        tokenizer = WordTokenizer()
+        chunks = chunk_by_tokens(GUIDE, token_offsets(tokenizer, GUIDE), 45)
+
+        # Sections are packed whole; every chunk after the first starts at a "## " heading
+        assert all(c.startswith('## ') for c in chunks[1:])
+        assert any('### First Impressions' in c and '### Answering Questions' in c for c in chunks)
+
+    def test_falls_back_to_paragraphs_then_lines(self):
+        tokenizer = WordTokenizer()
+        section = GUIDE[GUIDE.index('### Answering'):GUIDE.index('## Follow')]
+        chunks = chunk_by_tokens(section, token_offsets(tokenizer, section), 9)
+
+        assert chunks == ['### Answering Questions', '- Use the STAR method',
+                          '- Keep answers under two minutes', '- Ask clarifying questions']
+
+    def test_unbreakable_block_uses_overlapping_windows(self):
+        tokenizer = WordTokenizer()
+        text = ' '.join(f'w{i}' for i in range(25))
+
+        chunks = chunk_by_tokens(text, token_offsets(tokenizer, text), 10, overlap_tokens=2)
+
+        assert [c.split()[0] for c in chunks] == ['w0', 'w8', 'w16']
+        assert chunks[-1].endswith('w24')
+        assert all(len(c.split()) <= 10 for c in chunks)
+
+    def test_empty_text(self):
+        assert chunk_by_tokens('  \n', np.empty((0, 2), dtype=np.int64), 10) == []
+
+
+class TestChunkDocumentText:
+    """Test cases for choosing the chunking strategy."""
+
+    def test_tokens_strategy_tokenizes_once_and_reserves_special_tokens(self):
+        tokenizer = WordTokenizer()
+        settings = {'chunking': 'tokens', 'embedding_model': 'm', 'chunk_max_tokens': 27, 'chunk_overlap_tokens': 0}
+
+        with patch('rag.chunking.load_tokenizer', return_value=tokenizer):
+            chunks = chunk_document_text(GUIDE, settings)
+
+        assert tokenizer.calls == 1
+        assert max(_tokens(WordTokenizer(), c) for c in chunks) <= 25
+
+    def test_chars_strategy(self):
+        settings = {'chunking': 'chars', 'chunk_size': 10, 'chunk_overlap': 2}
+
+        assert chunk_document_text('abcdefghijklmnop', settings) == ['abcdefghij', 'ijklmnop']
+
+
+class TestModelMaxTokens:
+    """Test cases for the default token budget."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self, monkeypatch):
+        monkeypatch.setattr(rag.chunking, '_max_tokens', {})
+
+    def test_reads_max_seq_length(self, tmp_path):
+        (tmp_path / 'sentence_bert_config.json').write_text('{"max_seq_length": 384, "do_lower_case": false}')
+
+        with patch('rag.chunking.load_tokenizer') as mock_load:
+            assert model_max_tokens(str(tmp_path)) == 384
+
+        mock_load.assert_not_called()
+
+    def test_falls_back_to_the_tokenizer(self, tmp_path):
+        with patch('rag.chunking.load_tokenizer', return_value=Mock(model_max_length=512)):
+            assert model_max_tokens(str(tmp_path)) == 512
+        with patch('rag.chunking.load_tokenizer', return_value=Mock(model_max_length=int(1e30))):
+            assert model_max_tokens(str(tmp_path / 'other')) == 256
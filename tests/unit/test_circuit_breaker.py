@@ -0,0 +1,160 @@
+"""
+Unit tests for the LLM provider circuit breaker.
+"""
+
+import pytest
+from unittest.mock import patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from mcp_server.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with patch('mcp_server.circuit_breaker.time.monotonic', side_effect=clock):
+        yield clock
+
+
+def make_breaker(**kwargs):
+    options = dict(window_seconds=60, min_requests=4, error_rate=0.5, slow_call_seconds=10,
+                   slow_call_rate=0.75, open_seconds=30, half_open_probes=1)
+    options.update(kwargs)
+    return CircuitBreaker('test', **options)
+
+
+def fail(breaker):
+    with pytest.raises(RuntimeError):
+        with breaker.attempt():
+            raise RuntimeError("provider down")
+
+
+class TestClosed:
+    """Test cases for opening the circuit."""
+
+    def test_opens_at_error_rate(self, clock):
+        breaker = make_breaker()
+        fail(breaker)
+        fail(breaker)
+        breaker.record(False, 0.5)
+        assert breaker.state == CLOSED  # 3 calls are fewer than min_requests
+
+        fail(breaker)
+
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        stats = breaker.stats()
+        assert stats['rejected'] == 1 and stats['times_opened'] == 1
+        assert stats['transitions'][-1]['to'] == OPEN
+        assert 'error rate 75%' in stats['transitions'][-1]['reason']
+
+    def test_opens_at_slow_call_rate(self, clock):
+        breaker = make_breaker()
+        for latency in (12, 15, 0.5, 11):
+            breaker.record(False, latency)
+
+        assert breaker.state == OPEN
+
+    def test_old_calls_leave_the_window(self, clock):
+        breaker = make_breaker()
+        for _ in range(3):
+            fail(breaker)
+        clock.now += 61
+        for _ in range(3):
+            breaker.record(False, 0.5)
+        fail(breaker)
+
+        assert breaker.state == CLOSED
+        assert breaker.stats()['calls'] == 4
+
+    def test_disabled(self, clock):
+        breaker = make_breaker(enabled=False)
+        for _ in range(10):
+            fail(breaker)
+
+        assert breaker.allow() and breaker.state == CLOSED
+
+
+class TestHalfOpen:
+    """Test cases for trial calls after the cool-down."""
+
+    @pytest.fixture
+    def opened(self, clock):
+        breaker = make_breaker(half_open_probes=2)
+        for _ in range(4):
+            fail(breaker)
+        assert not breaker.allow()
+        clock.now += 30
+        return breaker
+
+    def test_probes_close_the_circuit(self, opened):
+        assert opened.allow() and opened.allow()
+        assert opened.state == HALF_OPEN
+        assert not opened.allow()  # both probe slots taken
+
+        opened.record(False, 0.5)
+        assert opened.state == HALF_OPEN
+        opened.record(False, 0.5)
+
+        assert opened.state == CLOSED
+        assert [t['to'] for t in opened.stats()['transitions']] == [OPEN, HALF_OPEN, CLOSED]
+        assert opened.stats()['calls'] == 0
+
+    def test_failed_or_slow_probe_reopens(self, opened, clock):
+        assert opened.allow()
+        fail(opened)
+        assert opened.state == OPEN and not opened.allow()
+
+        clock.now += 30
+        assert opened.allow()
+        opened.record(False, 12)
+
+        assert opened.state == OPEN
+        assert opened.stats()['times_opened'] == 3
+
+    def test_cancelled_probe_is_released(self, opened):
+        assert opened.allow() and opened.allow()
+
+        for _ in range(2):
+            with pytest.raises(KeyboardInterrupt):
+                with opened.attempt():
+                    raise KeyboardInterrupt
+
+        assert opened.state == HALF_OPEN and opened.allow()
+
+    def test_streamed_latency_is_time_to_first_byte(self, opened, clock):
+        assert opened.allow()
+        with opened.attempt() as attempt:
+            clock.now += 1
+            attempt.first_byte()
+            clock.now += 30
+
+        assert opened.stats()['latency_p50_ms'] == 1000.0
+
+    def test_calls_from_before_the_circuit_opened_are_not_probes(self, clock):
+        breaker = make_breaker(half_open_probes=1)
+        with breaker.attempt():  # started while closed, still running when the circuit opens
+            for _ in range(4):
+                fail(breaker)
+            clock.now += 30
+            assert breaker.allow() and breaker.state == HALF_OPEN
+
+        assert breaker.state == HALF_OPEN
+        assert not breaker.allow()  # the real probe is still in flight
+        assert breaker.stats()['stale_results'] == 1
+
+        breaker.record(False, 0.5)
+
+        assert breaker.state == CLOSED
@@ -0,0 +1,130 @@
+"""
+Unit tests for near-duplicate chunk detection.
+"""
+
+import pytest
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.dedup import (
+    ChunkDeduplicator, MinHasher, NearDuplicateIndex, jaccard, shingles, similarity, MINHASH_FILE,
+)
+
+ADVICE = ("Reach out to former colleagues before you need a job. Send a short note that mentions a shared "
+          "project, ask one specific question about their team, and offer something useful in return. "
+          "Follow up within two weeks and keep a simple spreadsheet of who you contacted and when.")
+# The same paragraph with its last word changed, as it might appear in a second guide
+EDITED = ADVICE.replace('and when.', 'and why.')
+OTHER = ("Negotiate the whole offer rather than base salary alone: signing bonus, equity, vacation days, "
+         "remote work and the start date can all move, and asking politely never withdraws an offer.")
+
+
+class TestShingles:
+    """Test cases for word shingles."""
+
+    def test_word_five_grams(self):
+        assert shingles('One two three four five six', size=5) == {'one two three four five', 'two three four five six'}
+
+    def test_short_and_empty_text(self):
+        assert shingles('Hello, World!') == {'hello world'}
+        assert shingles(' \n ') == set()
+
+    def test_jaccard(self):
+        assert jaccard(shingles(ADVICE), shingles(ADVICE)) == 1.0
+        assert 0.8 < jaccard(shingles(ADVICE), shingles(EDITED)) < 1.0
+        assert jaccard(shingles(ADVICE), shingles(OTHER)) == 0.0
+
+
+class TestMinHasher:
+    """Test cases for MinHash signatures."""
+
+    def test_deterministic_across_instances(self):
+        a, b = MinHasher().signature(ADVICE), MinHasher().signature(ADVICE)
+
+        assert a.dtype == np.uint32 and a.shape == (128,)
+        np.testing.assert_array_equal(a, b)
+
+    def test_estimates_jaccard(self):
+        hasher = MinHasher()
+        estimated = similarity(hasher.signature(ADVICE), hasher.signature(EDITED))
+
+        assert estimated == pytest.approx(jaccard(shingles(ADVICE), shingles(EDITED)), abs=0.1)
+        assert similarity(hasher.signature(ADVICE), hasher.signature(OTHER)) < 0.1
+
+    def test_text_without_words(self):
+        assert MinHasher().signature('  -- ') is None
+
+
+class TestNearDuplicateIndex:
+    """Test cases for the LSH index."""
+
+    def test_finds_near_duplicates_only(self):
+        hasher = MinHasher()
+        index = NearDuplicateIndex(threshold=0.8)
+        index.add(7, hasher.signature(ADVICE))
+        index.add(9, hasher.signature(OTHER))
+
+        assert index.find(hasher.signature(EDITED)) == 7
+        half = OTHER.split(':')[0] + ': take the first number they give you, sign it the same day and move on.'
+        assert index.find(hasher.signature(half)) is None  # shares a few shingles, below the threshold
+        assert len(index) == 2
+
+    def test_ties_go_to_the_lowest_key(self):
+        signature = MinHasher().signature(ADVICE)
+        index = NearDuplicateIndex()
+        index.add(5, signature)
+        index.add(2, signature)
+
+        assert index.find(signature) == 2
+
+    def test_unrelated_chunks_are_not_compared(self):
+        hasher = MinHasher()
+        index = NearDuplicateIndex()
+        for i in range(200):
+            index.add(i, hasher.signature(f"chunk number {i} about topic {i * 7} and nothing else at all"))
+
+        index.find(hasher.signature(ADVICE))
+
+        assert index.comparisons == 0
+
+    def test_bands_must_divide_permutations(self):
+        with pytest.raises(ValueError, match='bands'):
+            NearDuplicateIndex(permutations=128, bands=30)
+
+
+class TestChunkDeduplicator:
+    """Test cases for streaming deduplication and saved signatures."""
+
+    def test_check_returns_representative(self):
+        dedup = ChunkDeduplicator(0.8)
+
+        assert dedup.check(0, ADVICE) is None
+        assert dedup.check(1, OTHER) is None
+        assert dedup.check(2, EDITED) == 0
+        assert dedup.check(3, '') is None
+        assert dedup.duplicates == 1
+        assert len(dedup) == 4
+
+    def test_save_and_load_skips_dead_rows(self, tmp_path):
+        dedup = ChunkDeduplicator(0.8)
+        for row, text in enumerate([ADVICE, OTHER, EDITED]):
+            dedup.check(row, text)
+        dedup.save(str(tmp_path))
+
+        signatures = np.load(tmp_path / MINHASH_FILE)
+        assert signatures.shape == (3, 128)
+        assert not signatures[2].any()  # duplicates have no signature
+
+        loaded = ChunkDeduplicator(0.8)
+        assert loaded.load(str(tmp_path), dead={0})
+        assert len(loaded) == 3
+        # Row 0 was removed, so the edited copy is now a representative itself
+        assert loaded.check(2, EDITED) is None
+        assert loaded.check(3, ADVICE) == 2
+
+    def test_load_without_signatures(self, tmp_path):
+        assert not ChunkDeduplicator().load(str(tmp_path))
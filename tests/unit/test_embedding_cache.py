@@ -0,0 +1,122 @@
+"""
+Unit tests for the query embedding cache.
+"""
+
+import numpy as np
+from unittest.mock import Mock
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.embedding_cache import QueryEmbeddingCache, normalize_query
+
+
+def _encoder(dim=4):
+    return Mock(side_effect=lambda texts: np.arange(len(texts) * dim, dtype='float32').reshape(len(texts), dim))
+
+
+class TestNormalizeQuery:
+    """Test cases for query normalization."""
+
+    def test_folds_case_whitespace_and_punctuation(self):
+        assert normalize_query("  How do I   negotiate SALARY?! ") == "how do i negotiate salary"
+
+    def test_keeps_word_characters(self):
+        assert normalize_query("tell me about yourself") == "tell me about yourself"
+
+    def test_keeps_punctuation_inside_names(self):
+        assert normalize_query("C++ vs. C#?") == "c++ vs c#"
+        assert normalize_query("Node.js or .NET") == "node.js or .net"
+        assert len({normalize_query(q) for q in ("C++ jobs", "C# jobs", "C jobs")}) == 3
+
+
+class TestQueryEmbeddingCache:
+    """Test cases for QueryEmbeddingCache."""
+
+    def test_misses_are_encoded_in_one_batch(self):
+        cache = QueryEmbeddingCache()
+        encoder = _encoder()
+
+        vectors, hits = cache.encode(["a", "b", "c"], "model", encoder)
+
+        assert vectors.shape == (3, 4)
+        assert hits == 0
+        encoder.assert_called_once_with(["a", "b", "c"])
+
+    def test_hits_skip_the_encoder(self):
+        cache = QueryEmbeddingCache()
+        encoder = _encoder()
+        first, _ = cache.encode(["Salary tips?"], "model", encoder)
+
+        second, hits = cache.encode(["salary tips", "new query"], "model", encoder)
+
+        assert hits == 1
+        np.testing.assert_array_equal(second[0], first[0])
+        assert encoder.call_args_list[-1][0][0] == ["new query"]
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 2
+
+    def test_repeated_queries_count_once_per_lookup(self):
+        cache = QueryEmbeddingCache()
+        encoder = _encoder()
+
+        cache.encode(["Salary", "salary", "other"], "model", encoder)
+        _, hits = cache.encode(["SALARY", "salary"], "model", encoder)
+
+        assert hits == 2
+        assert encoder.call_count == 1
+        assert cache.stats()['hits'] == 2
+        assert cache.stats()['misses'] == 3
+
+    def test_entry_limit_evicts_least_recently_used(self):
+        cache = QueryEmbeddingCache(max_entries=2)
+        encoder = _encoder()
+        cache.encode(["a"], "model", encoder)
+        cache.encode(["b"], "model", encoder)
+        cache.encode(["a"], "model", encoder)  # refresh "a"
+        cache.encode(["c"], "model", encoder)  # evicts "b"
+
+        _, hits = cache.encode(["a", "b"], "model", encoder)
+
+        assert hits == 1
+        assert cache.stats()['evictions'] >= 1
+
+    def test_memory_limit_is_enforced(self):
+        cache = QueryEmbeddingCache(max_entries=100, max_bytes=40)
+        cache.encode(["a", "b", "c", "d"], "model", _encoder(dim=4))  # 16 bytes each
+
+        stats = cache.stats()
+        assert stats['bytes'] <= 40
+        assert stats['entries'] == 2
+        assert stats['evictions'] == 2
+
+    def test_model_change_invalidates(self):
+        cache = QueryEmbeddingCache()
+        encoder = _encoder()
+        cache.encode(["a"], "model-a", encoder)
+
+        _, hits = cache.encode(["a"], "model-b", encoder)
+
+        assert hits == 0
+        assert cache.stats()['invalidations'] == 1
+        assert cache.stats()['model'] == "model-b"
+
+    def test_disabled_cache_always_encodes(self):
+        cache = QueryEmbeddingCache(max_entries=0)
+        encoder = _encoder()
+        cache.encode(["a"], "model", encoder)
+        _, hits = cache.encode(["a"], "model", encoder)
+
+        assert hits == 0
+        assert encoder.call_count == 2
+
+    def test_cached_vectors_are_read_only(self):
+        cache = QueryEmbeddingCache()
+        vectors, _ = cache.encode(["a"], "model", _encoder())
+        cache.encode(["a"], "model", _encoder())
+
+        vectors[0, 0] = 99.0  # the stacked result is a copy
+        again, _ = cache.encode(["a"], "model", _encoder())
+        assert again[0, 0] != 99.0
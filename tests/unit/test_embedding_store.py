@@ -0,0 +1,171 @@
+"""
+Unit tests for the persistent chunk embedding store.
+"""
+
+import time
+import multiprocessing
+import numpy as np
+import pytest
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.embedding_store import EmbeddingStore, STORE_INFO_FILE, VECTORS_FILE
+
+
+class FakeModel:
+    """Deterministic 4-d embeddings that count how many texts were encoded."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def __call__(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(t), sum(map(ord, t)) % 97, 1.0, 0.0] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def model():
+    return FakeModel()
+
+
+def _build(root, tag, started):
+    """One indexing run: open the store, add vectors batch by batch, save."""
+    store = EmbeddingStore('m', root)
+    started.set()
+    for i in range(20):
+        store.encode([f'{tag} chunk {i}'], FakeModel())
+        store.flush()
+        time.sleep(0.005)
+    store.save()
+
+
+class TestEmbeddingStore:
+    """Test cases for EmbeddingStore."""
+
+    def test_only_unseen_texts_are_encoded(self, tmp_path, model):
+        store = EmbeddingStore('m', str(tmp_path))
+        first, hits = store.encode(['a', 'bb', 'a'], model)
+
+        assert hits == 0
+        assert model.encoded == ['a', 'bb']  # duplicates encoded once
+        np.testing.assert_array_equal(first[0], first[2])
+
+        second, hits = store.encode(['bb', 'ccc'], model)
+        assert hits == 1
+        assert model.encoded == ['a', 'bb', 'ccc']
+        np.testing.assert_array_equal(second[0], first[1])
+
+    def test_persists_across_builds(self, tmp_path, model):
+        store = EmbeddingStore('m', str(tmp_path))
+        expected, _ = store.encode(['alpha', 'beta'], model)
+        store.save()
+
+        reopened = EmbeddingStore('m', str(tmp_path))
+        embeddings, hits = reopened.encode(['beta', 'alpha', 'gamma'], model)
+
+        assert hits == 2
+        np.testing.assert_array_equal(embeddings[:2], expected[::-1])
+        assert reopened.stats()['hit_ratio'] == pytest.approx(2 / 3, abs=1e-4)
+        reopened.save()
+        assert len(EmbeddingStore('m', str(tmp_path))) == 3
+
+    def test_models_do_not_share_vectors(self, tmp_path, model):
+        store = EmbeddingStore('org/model-a', str(tmp_path))
+        store.encode(['alpha'], model)
+        store.save()
+
+        _, hits = EmbeddingStore('org/model-b', str(tmp_path)).encode(['alpha'], model)
+        assert hits == 0
+
+    def test_rows_of_an_interrupted_build_are_ignored(self, tmp_path, model):
+        store = EmbeddingStore('m', str(tmp_path))
+        store.encode(['alpha'], model)
+        store.save()
+        vectors = tmp_path / 'm' / VECTORS_FILE
+        with open(vectors, 'ab') as f:
+            f.write(b'\x00' * 16)  # appended, but the build died before keys.npy was replaced
+
+        reopened = EmbeddingStore('m', str(tmp_path))
+        reopened.encode(['beta'], model)
+        reopened.save()
+
+        final = EmbeddingStore('m', str(tmp_path))
+        embeddings, hits = final.encode(['alpha', 'beta'], model)
+        assert hits == 2
+        np.testing.assert_array_equal(embeddings, model(['alpha', 'beta']))
+        assert vectors.stat().st_size == 2 * 4 * 4
+
+    def test_compaction_keeps_recently_used_rows(self, tmp_path, model):
+        store = EmbeddingStore('m', str(tmp_path))
+        store.encode(['old', 'kept'], model)
+        store.save()
+        store.encode(['kept', 'new'], model)
+        store.save()
+
+        store.compact(max_rows=2)
+
+        reopened = EmbeddingStore('m', str(tmp_path))
+        assert len(reopened) == 2
+        _, hits = reopened.encode(['kept', 'new'], model)
+        assert hits == 2
+        _, hits = reopened.encode(['old'], model)
+        assert hits == 0
+
+    def test_size_limit_compacts_on_save(self, tmp_path, model):
+        # 4-d float32 rows are 16 bytes, so this limit holds 3 rows
+        store = EmbeddingStore('m', str(tmp_path), max_mb=48 / (1024 * 1024))
+        store.encode(['a', 'b', 'c', 'd', 'e'], model)
+        store.save()
+
+        assert len(EmbeddingStore('m', str(tmp_path), max_mb=1)) == 3
+        assert store.stats()['compacted'] == 2
+
+    def test_unreadable_store_starts_empty(self, tmp_path, model):
+        store = EmbeddingStore('m', str(tmp_path))
+        store.encode(['alpha'], model)
+        store.save()
+        (tmp_path / 'm' / STORE_INFO_FILE).write_text('{broken')
+
+        assert len(EmbeddingStore('m', str(tmp_path))) == 0
+
+    def test_wrong_number_of_embeddings_raises(self, tmp_path):
+        store = EmbeddingStore('m', str(tmp_path))
+        with pytest.raises(ValueError):
+            store.encode(['a', 'b'], lambda texts: np.zeros((1, 4), dtype=np.float32))
+
+    @pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="needs fork")
+    def test_concurrent_builds_do_not_overwrite_each_other(self, tmp_path, model):
+        context = multiprocessing.get_context('fork')
+        first_started, second_started = context.Event(), context.Event()
+        first = context.Process(target=_build, args=(str(tmp_path), 'manual', first_started))
+        first.start()
+        assert first_started.wait(10)
+        second = context.Process(target=_build, args=(str(tmp_path), 'watch', second_started))
+        second.start()
+        for process in (first, second):
+            process.join(30)
+            assert process.exitcode == 0
+
+        texts = [f'{tag} chunk {i}' for tag in ('manual', 'watch') for i in range(20)]
+        embeddings, hits = EmbeddingStore('m', str(tmp_path)).encode(texts, model)
+
+        assert hits == 40
+        np.testing.assert_array_equal(embeddings, FakeModel()(texts))
+
+    def test_save_releases_the_lock_and_picks_up_other_builds(self, tmp_path, model):
+        store = EmbeddingStore('m', str(tmp_path))
+        store.encode(['alpha'], model)
+        store.save()
+        other = EmbeddingStore('m', str(tmp_path))  # would wait forever if save() kept the lock
+        other.encode(['beta'], model)
+        other.save()
+
+        store.encode(['gamma'], model)
+        store.save()
+
+        embeddings, hits = EmbeddingStore('m', str(tmp_path)).encode(['alpha', 'beta', 'gamma'], model)
+        assert hits == 3
+        np.testing.assert_array_equal(embeddings, model(['alpha', 'beta', 'gamma']))
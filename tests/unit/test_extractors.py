@@ -0,0 +1,138 @@
+"""
+Unit tests for the document format extractors.
+"""
+
+import pytest
+from types import ModuleType, SimpleNamespace
+from unittest.mock import Mock, patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import rag.extractors as extractors
+from rag.extractors import EXTRACTORS, extract, register_extractor
+
+HTML = """<html><head><title>Ignored</title><style>p { color: red }</style></head>
+<body>
+<p>Welcome to the <b>handbook</b>.</p>
+<h1>Interviews</h1>
+<p>Prepare   stories
+   in advance.</p>
+<h3>Follow&nbsp;up</h3>
+<ul><li>Send a note</li><li>Within a day</li></ul>
+<script>var x = "<h2>not a heading</h2>";</script>
+<h2>Offers</h2>
+<p>Negotiate &amp; compare.</p>
+</body></html>"""
+
+
+def _fake_docx(paragraphs):
+    module = ModuleType('docx')
+    module.Document = Mock(return_value=SimpleNamespace(paragraphs=[
+        SimpleNamespace(text=text, style=SimpleNamespace(name=style)) for style, text in paragraphs]))
+    return module
+
+
+def _fake_pypdf2(pages):
+    module = ModuleType('PyPDF2')
+    module.PdfReader = Mock(return_value=SimpleNamespace(
+        is_encrypted=False, pages=[SimpleNamespace(extract_text=lambda t=t: t) for t in pages]))
+    return module
+
+
+class TestExtract:
+    """Test cases for choosing an extractor."""
+
+    def test_markdown_is_one_section(self, tmp_path):
+        path = tmp_path / 'guide.md'
+        path.write_text('# Guide\n\nText.')
+
+        assert list(extract(str(path))) == [('# Guide\n\nText.', {})]
+
+    def test_unknown_extension(self, tmp_path):
+        with pytest.raises(ValueError, match=r"'\.odt'"):
+            extract(str(tmp_path / 'notes.odt'))
+
+    def test_register_extractor(self, tmp_path):
+        @register_extractor('.CSV')
+        def extract_csv(path):
+            yield 'rows', {'section': 'csv'}
+
+        try:
+            assert list(extract(str(tmp_path / 'data.csv'))) == [('rows', {'section': 'csv'})]
+        finally:
+            del EXTRACTORS['.csv']
+
+
+class TestHTML:
+    """Test cases for the HTML extractor."""
+
+    def test_sections_split_at_top_level_headings(self, tmp_path):
+        path = tmp_path / 'page.html'
+        path.write_text(HTML)
+
+        sections = list(extract(str(path)))
+
+        assert sections == [
+            ('Welcome to the handbook.', {}),
+            ('# Interviews\n\nPrepare stories in advance.\n\n### Follow up\n\n- Send a note\n\n- Within a day',
+             {'section': 'Interviews'}),
+            ('## Offers\n\nNegotiate & compare.', {'section': 'Offers'}),
+        ]
+
+    def test_sections_are_yielded_while_reading(self, tmp_path):
+        path = tmp_path / 'page.html'
+        path.write_text(HTML)
+        reads = []
+
+        with patch.object(extractors, '_READ_BLOCK', 64):
+            for text, _ in extract(str(path)):
+                reads.append(text)
+                if len(reads) == 1:
+                    # The first section is handed on before the parser reaches the end of the file
+                    assert 'Offers' not in text
+
+        assert len(reads) == 3
+
+
+class TestDOCX:
+    """Test cases for the DOCX extractor."""
+
+    def test_headings_and_lists(self, tmp_path):
+        docx = _fake_docx([('Title', 'Career Handbook'), ('Normal', 'Intro.'), ('Heading 2', 'Resumes'),
+                           ('List Bullet', 'One page'), ('Heading 3', 'Fonts'), ('Normal', '  '),
+                           ('Normal', 'Pick one.')])
+
+        with patch.dict(sys.modules, {'docx': docx}):
+            sections = list(extract(str(tmp_path / 'handbook.docx')))
+
+        assert sections == [
+            ('# Career Handbook\n\nIntro.', {'section': 'Career Handbook'}),
+            ('## Resumes\n\n- One page\n\n### Fonts\n\nPick one.', {'section': 'Resumes'}),
+        ]
+
+    def test_missing_dependency(self, tmp_path):
+        with patch.dict(sys.modules, {'docx': None}), pytest.raises(ImportError, match='python-docx'):
+            list(extract(str(tmp_path / 'handbook.docx')))
+
+
+class TestPDF:
+    """Test cases for the PDF extractor."""
+
+    def test_one_section_per_page(self, tmp_path):
+        path = tmp_path / 'handbook.pdf'
+        path.write_bytes(b'%PDF-1.4')
+
+        with patch.dict(sys.modules, {'PyPDF2': _fake_pypdf2(['Page one', '   ', 'Page three'])}):
+            sections = list(extract(str(path)))
+
+        assert sections == [('Page one', {'page': 1}), ('Page three', {'page': 3})]
+
+    def test_missing_dependency(self, tmp_path):
+        path = tmp_path / 'handbook.pdf'
+        path.write_bytes(b'%PDF-1.4')
+
+        with patch.dict(sys.modules, {'PyPDF2': None}), pytest.raises(ImportError, match='PyPDF2'):
+            list(extract(str(path)))
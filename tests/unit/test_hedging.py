@@ -0,0 +1,76 @@
+"""
+Unit tests for the hedged-request policy.
+"""
+
+import pytest
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from mcp_server.hedging import HedgePolicy
+
+
+class TestHedgeDelay:
+    """Test cases for the head start given to the primary."""
+
+    def test_default_until_enough_samples(self):
+        policy = HedgePolicy(delay_ms=2000, min_samples=3)
+        policy.observe(0.5)
+        policy.observe(0.6)
+
+        assert policy.delay() == 2.0
+
+    def test_percentile_of_recent_latencies(self):
+        policy = HedgePolicy(percentile=90, min_delay_ms=0, min_samples=10, window=100)
+        for latency in range(1, 21):
+            policy.observe(latency / 10)
+
+        assert policy.delay() == pytest.approx(1.8)
+
+    def test_floor_and_window(self):
+        policy = HedgePolicy(percentile=50, min_delay_ms=200, min_samples=1, window=3)
+        for latency in (5.0, 0.01, 0.02, 0.03):
+            policy.observe(latency)
+
+        assert policy.delay() == 0.2
+
+
+class TestHedgeBudget:
+    """Test cases for limiting the extra calls."""
+
+    def test_at_most_budget_share_of_window(self):
+        policy = HedgePolicy(budget=0.2, window=10)
+        fired = []
+        for _ in range(30):
+            fired.append(policy.try_fire(policy.start()))
+
+        # No burst before requests have been seen: the first hedge needs 5 requests at 20%
+        assert fired[:5] == [False] * 4 + [True]
+        assert sum(fired) == 6
+        assert all(sum(fired[i:i + 10]) <= 2 for i in range(21))
+        stats = policy.stats()
+        assert stats['fired'] == 6 and stats['over_budget'] == 24 and stats['fire_rate'] == 0.2
+
+    def test_concurrent_requests_share_the_budget(self):
+        policy = HedgePolicy(budget=0.1, window=200)
+        # 100 requests in flight at once, all slow enough to hedge
+        requests = [policy.start() for _ in range(100)]
+
+        fired = [policy.try_fire(request) for request in requests]
+
+        assert sum(fired) == 10
+        assert policy.stats()['over_budget'] == 90
+        more = [policy.start() for _ in range(100)]
+        assert sum(policy.try_fire(request) for request in more) == 10
+
+    def test_win_rate(self):
+        policy = HedgePolicy(budget=1.0, window=10)
+        for won in (True, False, True, True):
+            policy.try_fire(policy.start())
+            if won:
+                policy.record_win()
+
+        stats = policy.stats()
+        assert stats['won'] == 3 and stats['win_rate'] == 0.75
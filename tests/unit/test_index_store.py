@@ -0,0 +1,213 @@
+"""
+Unit tests for the process-wide index store.
+"""
+
+import os
+import threading
+import pytest
+import faiss
+import numpy as np
+from unittest.mock import Mock, patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.index_store import IndexStore
+from rag.snapshots import create_snapshot, publish_snapshot, rollback, snapshot_info, version_path
+
+
+def _write_index_files(path, marker="v1"):
+    for name in ('faiss.index', 'metadata.pkl', 'chunks.pkl'):
+        (path / name).write_text(marker)
+
+
+@pytest.fixture
+def vector_db(tmp_path):
+    _write_index_files(tmp_path)
+    return tmp_path
+
+
+def _publish(root):
+    version, path = create_snapshot(str(root))
+    _write_index_files(Path(path), marker=version)
+    publish_snapshot(str(root), version, {})
+    return version
+
+
+def _loader():
+    return Mock(side_effect=lambda path: (Mock(ntotal=2, d=3), [{'file': 'a.md', 'chunk_id': 0}], ['chunk']))
+
+
+class TestIndexStore:
+    """Test cases for IndexStore."""
+
+    def test_loads_once(self, vector_db):
+        """Repeated get() calls reuse the resident index."""
+        loader = _loader()
+        store = IndexStore(str(vector_db), loader, check_interval=0)
+
+        first = store.get()
+        second = store.get()
+
+        assert first is second
+        loader.assert_called_once_with(str(vector_db))
+        assert store.stats()['load_count'] == 1
+        assert store.stats()['reload_count'] == 0
+
+    def test_reloads_when_files_change(self, vector_db):
+        """A changed file fingerprint triggers a reload."""
+        loader = _loader()
+        store = IndexStore(str(vector_db), loader, check_interval=0)
+        first = store.get()
+
+        _write_index_files(vector_db, marker="version-2")
+        second = store.get()
+
+        assert first is not second
+        assert loader.call_count == 2
+        assert store.stats()['reload_count'] == 1
+
+    def test_version_stamp_change_triggers_reload(self, vector_db):
+        """Writing a new VERSION stamp triggers a reload."""
+        loader = _loader()
+        store = IndexStore(str(vector_db), loader, check_interval=0)
+        store.get()
+
+        (vector_db / 'VERSION').write_text('2')
+        store.get()
+
+        assert loader.call_count == 2
+
+    def test_check_interval_throttles_stat_calls(self, vector_db):
+        """Within the check interval changes are not picked up."""
+        loader = _loader()
+        store = IndexStore(str(vector_db), loader, check_interval=3600)
+        store.get()
+
+        _write_index_files(vector_db, marker="version-2")
+        store.get()
+
+        loader.assert_called_once()
+
+    def test_failed_reload_keeps_previous_index(self, vector_db):
+        """A failing reload keeps serving the last good index."""
+        loader = _loader()
+        store = IndexStore(str(vector_db), loader, check_interval=0)
+        first = store.get()
+
+        loader.side_effect = FileNotFoundError("half written")
+        _write_index_files(vector_db, marker="version-2")
+
+        assert store.get() is first
+        assert store.stats()['failed_reloads'] == 1
+
+    def test_initial_load_error_propagates(self, vector_db):
+        """Errors on the first load are raised to the caller."""
+        loader = Mock(side_effect=FileNotFoundError("Index not found"))
+        store = IndexStore(str(vector_db), loader)
+
+        with pytest.raises(FileNotFoundError, match="Index not found"):
+            store.get()
+
+    def test_concurrent_first_load(self, vector_db):
+        """Concurrent callers trigger a single load."""
+        loader = _loader()
+        store = IndexStore(str(vector_db), loader, check_interval=3600)
+        results = []
+
+        threads = [threading.Thread(target=lambda: results.append(store.get())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        loader.assert_called_once()
+        assert all(r is results[0] for r in results)
+
+    def test_stats_report_memory(self, vector_db):
+        """Stats expose load time and memory footprint."""
+        store = IndexStore(str(vector_db), _loader())
+        assert store.stats()['loaded'] is False
+
+        store.get()
+        stats = store.stats()
+
+        assert stats['loaded'] is True
+        assert stats['num_chunks'] == 1
+        assert stats['last_load_ms'] >= 0
+        assert stats['memory']['total_bytes'] > 0
+
+    def test_stats_report_auxiliary_index_memory(self, vector_db):
+        """Extra parts returned by the loader, such as the BM25 index, are counted."""
+        loader = Mock(return_value=(Mock(ntotal=2, d=3), [{'file': 'a.md', 'chunk_id': 0}], ['chunk'],
+                                    Mock(nbytes=1024)))
+        store = IndexStore(str(vector_db), loader)
+
+        store.get()
+        memory = store.stats()['memory']
+
+        assert memory['lexical_bytes'] == 1024
+        assert memory['total_bytes'] >= 1024
+
+    def test_version_matches_the_data_returned(self, vector_db):
+        """get_with_version() never pairs data with the version of a later reload."""
+        store = IndexStore(str(vector_db), _loader(), check_interval=0)
+        data, version = store.get_with_version()
+        assert data is store.get() and version == store.version
+
+        _write_index_files(vector_db, marker="v2-longer")
+        reloaded, new_version = store.get_with_version()
+
+        assert reloaded is not data and new_version != version
+        assert new_version == store.version
+
+    def test_index_memory_is_estimated_without_copying(self, vector_db):
+        """The FAISS index is sized from its code size, not by serializing it."""
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(8))
+        index.add_with_ids(np.zeros((100, 8), dtype='float32'), np.arange(100, dtype='int64'))
+        store = IndexStore(str(vector_db), Mock(return_value=(index, [], [])))
+
+        with patch('faiss.serialize_index') as serialize:
+            store.get()
+
+        serialize.assert_not_called()
+        # 32-byte vectors plus an 8-byte id and its reverse-map entry
+        assert store.stats()['memory']['index_bytes'] == 100 * (32 + 24)
+
+
+class TestSnapshotSwitching:
+    """IndexStore follows the CURRENT pointer of a versioned store."""
+
+    def test_switches_when_a_new_snapshot_is_published(self, tmp_path):
+        first = _publish(tmp_path)
+        loader = _loader()
+        store = IndexStore(str(tmp_path), loader, check_interval=0)
+
+        in_flight = store.get()
+        assert store.stats()['version'] == first
+        assert store.stats()['snapshot_path'] == version_path(str(tmp_path), first)
+
+        second = _publish(tmp_path)
+        current = store.get()
+
+        assert current is not in_flight  # requests holding the old tuple keep using it
+        assert loader.call_args_list[-1].args == (version_path(str(tmp_path), second),)
+        assert store.stats()['version'] == second
+        assert store.get() is current  # the snapshot is not reloaded while CURRENT is unchanged
+
+        rollback(str(tmp_path), first)
+        store.get()
+        assert store.stats()['version'] == first and loader.call_count == 3
+
+    def test_stats_report_snapshot_age(self, tmp_path):
+        _publish(tmp_path)
+        store = IndexStore(str(tmp_path), _loader())
+        assert store.stats()['age_seconds'] is None
+
+        store.get()
+        stats = store.stats()
+
+        assert 0 <= stats['age_seconds'] < 60
+        assert stats['built_at'] == pytest.approx(snapshot_info(stats['snapshot_path'])['built_at'])
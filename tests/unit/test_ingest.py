@@ -0,0 +1,252 @@
+"""
+Unit tests for the document reading and chunking pipeline.
+"""
+
+import os
+import hashlib
+import pickle
+import tempfile
+import pytest
+from concurrent.futures import Future
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.ingest import (
+    list_documents, document_extensions, hash_document, locate_chunks, chunk_document, discard_chunks,
+    document_pool, imap_documents, IngestStats,
+)
+from rag.extractors import EXTRACTORS
+from rag.manifest import content_hash
+
+
+SETTINGS = {'chunking': 'chars', 'chunk_size': 20, 'chunk_overlap': 5}
+
+
+@pytest.fixture
+def docs(tmp_path):
+    for i in range(6):
+        (tmp_path / f'guide_{i}.md').write_text(f'Guide {i}: ' + 'networking tips ' * (i + 1))
+    (tmp_path / 'notes.txt').write_text('not a guide')
+    return tmp_path
+
+
+class InlinePool:
+    """Runs submitted work immediately and tracks how many results are outstanding."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def submit(self, fn, *args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        future = Future()
+        future.set_result(fn(*args))
+        original = future.result
+
+        def result(timeout=None):
+            self.in_flight -= 1
+            return original(timeout)
+        future.result = result
+        return future
+
+
+class TestDocuments:
+    """Test cases for listing, hashing and chunking documents."""
+
+    def test_list_documents_is_sorted_markdown_only(self, docs):
+        paths = list_documents(str(docs))
+
+        assert [os.path.basename(p) for p in paths] == [f'guide_{i}.md' for i in range(6)]
+
+    def test_list_documents_includes_other_formats(self, docs):
+        (docs / 'handbook.PDF').write_bytes(b'%PDF-1.4')
+        (docs / 'page.html').write_text('<p>hi</p>')
+        (docs / 'archive.md').mkdir()
+
+        names = [os.path.basename(p) for p in list_documents(str(docs))]
+        assert 'handbook.PDF' in names and 'page.html' in names
+        assert 'archive.md' not in names and 'notes.txt' not in names
+        assert [os.path.basename(p) for p in list_documents(str(docs), formats='txt')] == ['notes.txt']
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError, match=r"\.odt"):
+            document_extensions('md, odt')
+
+    def test_hash_document_matches_manifest_hash(self, docs):
+        path = str(docs / 'guide_0.md')
+        assert hash_document(path) == {'file': 'guide_0.md', 'sha256': content_hash((docs / 'guide_0.md').read_text())}
+
+    def test_hash_document_reports_unreadable_files(self, tmp_path):
+        result = hash_document(str(tmp_path / 'missing.md'))
+
+        assert result['file'] == 'missing.md' and 'sha256' not in result and result['error']
+
+    def test_chunk_document(self, docs):
+        doc = chunk_document(str(docs / 'guide_2.md'), SETTINGS)
+
+        assert doc['file'] == 'guide_2.md' and doc['error'] is None
+        assert doc['sha256'] == content_hash((docs / 'guide_2.md').read_text())
+        assert list(doc['chunks'])[0] == ((docs / 'guide_2.md').read_text()[:20], {})
+        assert len(doc['chunks']) == len(list(doc['chunks']))
+        discard_chunks(doc)
+
+    def test_chunks_are_spooled_and_discarded(self, docs):
+        doc = chunk_document(str(docs / 'guide_2.md'), SETTINGS)
+        spool = doc['chunks'].path
+        assert os.path.exists(spool)
+
+        discard_chunks(doc)
+
+        assert not os.path.exists(spool) and list(doc['chunks']) == []
+
+    def test_pdf_chunks_are_spooled_page_by_page(self, tmp_path, monkeypatch):
+        pages = [(f'Page {n} text. ' * 3, {'page': n}) for n in range(1, 4)]
+        monkeypatch.setitem(EXTRACTORS, '.pdf', lambda path: iter(pages))
+        path = tmp_path / 'handbook.pdf'
+        path.write_bytes(b'%PDF-1.4')
+
+        doc = chunk_document(str(path), SETTINGS)
+
+        with open(doc['chunks'].path, 'rb') as f:
+            records = []
+            while True:
+                try:
+                    records.append(pickle.load(f))
+                except EOFError:
+                    break
+        assert [{loc['page'] for _, loc in record} for record in records] == [{1}, {2}, {3}]
+        discard_chunks(doc)
+
+    def test_file_changed_while_read_is_read_again(self, tmp_path, monkeypatch):
+        path = tmp_path / 'guide.md'
+        path.write_text('first version of the guide')
+        reads = []
+
+        def extract_and_edit(p):
+            reads.append(path.read_text())
+            if len(reads) == 1:
+                path.write_text('second version of the guide')
+            yield reads[-1], {}
+        monkeypatch.setitem(EXTRACTORS, '.md', extract_and_edit)
+
+        doc = chunk_document(str(path), {'chunking': 'chars', 'chunk_size': 100, 'chunk_overlap': 0})
+
+        assert len(reads) == 2
+        assert doc['sha256'] == content_hash('second version of the guide')
+        assert list(doc['chunks']) == [('second version of the guide', {})]
+        discard_chunks(doc)
+
+    def test_chunk_document_records_sections(self, tmp_path):
+        path = tmp_path / 'guide.md'
+        path.write_text('# Resumes\n\nKeep it short.\n\n## Formatting\n\nUse one font.\n')
+
+        doc = chunk_document(str(path), {'chunking': 'chars', 'chunk_size': 14, 'chunk_overlap': 0})
+
+        sections = [location.get('section') for _, location in doc['chunks']]
+        assert sections[0] == 'Resumes'
+        assert sections[-1] == 'Formatting'
+        discard_chunks(doc)
+
+    def test_chunk_document_isolates_failures(self, tmp_path):
+        path = tmp_path / 'broken.md'
+        path.write_bytes(b'\xff\xfe not utf-8')
+
+        doc = chunk_document(str(path), SETTINGS)
+
+        assert doc['file'] == 'broken.md'
+        assert list(doc['chunks']) == [] and doc['error'].startswith('UnicodeDecodeError')
+        assert doc['sha256'] == hashlib.sha256(b'\xff\xfe not utf-8').hexdigest()
+
+
+class TestLocateChunks:
+    """Test cases for locate_chunks."""
+
+    def test_nearest_heading_and_section_location(self):
+        text = 'Intro line\n## First\nalpha beta\n### Deeper\ngamma'
+        chunks = ['Intro line', '## First\nalpha beta', 'beta', '### Deeper\ngamma']
+
+        locations = locate_chunks(text, chunks, {'page': 2})
+
+        assert locations == [{'page': 2}, {'page': 2, 'section': 'First'}, {'page': 2, 'section': 'First'},
+                             {'page': 2, 'section': 'Deeper'}]
+
+    def test_repeated_text_is_located_in_order(self):
+        text = '# A\nsame\n# B\nsame'
+
+        assert [l['section'] for l in locate_chunks(text, ['# A', 'same', '# B', 'same'], {})] == ['A', 'A', 'B', 'B']
+
+
+class TestImapDocuments:
+    """Test cases for imap_documents."""
+
+    def test_without_pool_runs_inline(self, docs):
+        paths = list_documents(str(docs))
+        results = list(imap_documents(None, hash_document, paths))
+
+        assert [r['file'] for r in results] == [os.path.basename(p) for p in paths]
+
+    def test_pending_documents_are_bounded_and_ordered(self, docs):
+        pool = InlinePool()
+        paths = list_documents(str(docs))
+
+        results = list(imap_documents(pool, chunk_document, paths, SETTINGS, max_pending=2))
+
+        assert [r['file'] for r in results] == [os.path.basename(p) for p in paths]
+        assert pool.max_in_flight == 2
+        for doc in results:
+            discard_chunks(doc)
+
+    def test_process_pool_keeps_input_order(self, docs):
+        paths = list_documents(str(docs))
+        with document_pool(2) as pool:
+            results = list(imap_documents(pool, chunk_document, paths, SETTINGS, max_pending=3))
+
+        def contents(doc):
+            chunks = list(doc['chunks'])
+            discard_chunks(doc)
+            return doc['file'], doc['sha256'], chunks
+        assert [contents(r) for r in results] == [contents(chunk_document(p, SETTINGS)) for p in paths]
+
+    def test_unread_results_are_discarded_when_stopped_early(self, docs, tmp_path, monkeypatch):
+        monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+        paths = list_documents(str(docs))
+        with document_pool(2) as pool:
+            documents = imap_documents(pool, chunk_document, paths, SETTINGS, max_pending=3,
+                                       discard=discard_chunks)
+            first = next(documents)
+            documents.close()
+
+        spools = [f for f in os.listdir(tmp_path) if f.startswith('rag-chunks-')]
+        assert spools == [os.path.basename(first['chunks'].path)]
+        discard_chunks(first)
+
+    def test_single_worker_means_no_pool(self):
+        with document_pool(1) as pool:
+            assert pool is None
+
+
+class TestIngestStats:
+    """Test cases for IngestStats."""
+
+    def test_rates(self):
+        stats = IngestStats()
+        stats.documents, stats.chunks, stats.vectors = 10, 100, 100
+        stats.started -= 2.0
+        stats.stop()
+
+        report = stats.as_dict()
+        assert report['documents_per_second'] == pytest.approx(5.0, rel=0.05)
+        assert report['vectors_per_second'] == pytest.approx(50.0, rel=0.05)
+        assert '10 documents, 100 chunks and 100 vectors' in stats.summary()
+
+    def test_failures_are_reported(self):
+        stats = IngestStats()
+        stats.failed['bad.pdf'] = 'PdfReadError: EOF marker not found'
+        stats.stop()
+
+        assert stats.as_dict()['failed'] == 1
+        assert stats.summary().endswith('skipped 1 unreadable: bad.pdf')
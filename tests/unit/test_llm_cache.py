@@ -0,0 +1,150 @@
+"""
+Unit tests for the LLM response cache.
+"""
+
+import time
+import threading
+import pytest
+from unittest.mock import patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from mcp_server.llm_cache import LLMResponseCache, MemoryStore, make_key
+
+PROMPT = "Generate interview questions for a software engineer."
+
+
+class TestMakeKey:
+    """Test cases for cache keys."""
+
+    def test_depends_on_every_part(self):
+        key = make_key('openai', 'gpt-4o-mini', PROMPT, max_tokens=100)
+
+        assert key == make_key('openai', 'gpt-4o-mini', PROMPT, max_tokens=100)
+        assert key != make_key('gemini', 'gpt-4o-mini', PROMPT, max_tokens=100)
+        assert key != make_key('openai', 'gpt-4o', PROMPT, max_tokens=100)
+        assert key != make_key('openai', 'gpt-4o-mini', PROMPT + ' ', max_tokens=100)
+        assert key != make_key('openai', 'gpt-4o-mini', PROMPT, max_tokens=50)
+        assert PROMPT not in key
+
+
+class TestMemoryStore:
+    """Test cases for the in-process level."""
+
+    def test_lru_bounded_by_entries_and_bytes(self):
+        store = MemoryStore(max_entries=2, max_bytes=10)
+        store.set('a', 'aaaa', expires_at=float('inf'))
+        store.set('b', 'bbbb', expires_at=float('inf'))
+        store.get('a')
+        store.set('c', 'cc', expires_at=float('inf'))  # entry limit: b was least recently used
+
+        assert store.get('b') is None and store.get('a') == 'aaaa'
+        store.set('d', 'dddddddd', expires_at=float('inf'))  # byte limit
+        assert len(store) == 1 and store.bytes == 8
+        store.set('e', 'x' * 11, expires_at=float('inf'))  # larger than the whole cache
+        assert store.get('e') is None and store.get('d') == 'dddddddd'
+
+
+class TestLLMResponseCache:
+    """Test cases for the two-level cache."""
+
+    def test_hit_miss_and_bytes_saved(self):
+        cache = LLMResponseCache(path='')
+
+        assert cache.get('k') is None
+        cache.set('k', 'Résumé tips')
+        assert cache.get('k') == 'Résumé tips'
+
+        stats = cache.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 1 and stats['memory_hits'] == 1
+        assert stats['bytes_saved'] == len('Résumé tips'.encode('utf-8'))
+        assert stats['disk'] is None
+
+    def test_entries_expire(self):
+        cache = LLMResponseCache(ttl_seconds=10, path='')
+        with patch('mcp_server.llm_cache.time.time', return_value=1000.0):
+            cache.set('k', 'answer')
+        with patch('mcp_server.llm_cache.time.time', return_value=1009.0):
+            assert cache.get('k') == 'answer'
+        with patch('mcp_server.llm_cache.time.time', return_value=1011.0):
+            assert cache.get('k') is None
+
+    def test_disabled(self):
+        cache = LLMResponseCache(enabled=False, path='')
+        cache.set('k', 'answer')
+
+        assert cache.get('k') is None
+        assert cache.stats()['misses'] == 0
+
+    def test_disk_store_survives_restarts(self, tmp_path):
+        path = str(tmp_path / 'cache' / 'llm.sqlite')
+        LLMResponseCache(path=path).set('k', 'answer')
+
+        restarted = LLMResponseCache(path=path)
+
+        assert restarted.get('k') == 'answer'
+        assert restarted.get('k') == 'answer'
+        stats = restarted.stats()
+        assert stats['disk_hits'] == 1 and stats['memory_hits'] == 1
+        assert stats['disk']['entries'] == 1
+
+    def test_disk_store_trimmed_by_last_use(self, tmp_path):
+        path = str(tmp_path / 'llm.sqlite')
+        cache = LLMResponseCache(path=path, disk_max_bytes=10)
+        now = time.time()
+        with patch('mcp_server.llm_cache.time.time', side_effect=[now + t for t in range(100)]):
+            cache.set('a', 'aaaa')
+            cache.set('b', 'bbbb')
+            cache.memory.clear()
+            cache.get('a')
+            cache.set('c', 'cccc')
+
+        assert cache.disk.get('b') is None
+        assert cache.disk.get('a')[0] == 'aaaa' and cache.disk.get('c')[0] == 'cccc'
+        assert cache.stats()['disk']['evictions'] == 1
+        assert cache.stats()['disk']['bytes'] == 8
+
+    def test_disk_writes_keep_a_running_total(self, tmp_path):
+        cache = LLMResponseCache(path=str(tmp_path / 'llm.sqlite'), disk_max_bytes=100)
+        statements = []
+        cache.disk._db.set_trace_callback(statements.append)
+
+        cache.set('a', 'aaaa')
+        cache.set('a', 'aaaaaa')  # replaced, not added
+        cache.set('b', 'bb')
+
+        assert not any('SUM(' in statement for statement in statements)
+        assert cache.stats()['disk']['bytes'] == 8
+        cache.disk._db.set_trace_callback(None)
+        assert LLMResponseCache(path=str(tmp_path / 'llm.sqlite')).stats()['disk']['bytes'] == 8
+
+    @pytest.mark.asyncio
+    async def test_async_access_leaves_the_event_loop_thread(self, tmp_path):
+        cache = LLMResponseCache(path=str(tmp_path / 'llm.sqlite'))
+        threads = []
+        for name in ('get', 'set'):
+            original = getattr(cache.disk, name)
+
+            def record(*args, original=original):
+                threads.append(threading.current_thread().name)
+                return original(*args)
+            setattr(cache.disk, name, record)
+
+        await cache.aset('k', 'answer')
+        cache.memory.clear()
+
+        assert await cache.aget('k') == 'answer'
+        assert len(threads) == 2 and all(name.startswith('llm-cache') for name in threads)
+        assert cache.stats()['disk_hits'] == 1
+
+    def test_unusable_disk_path_falls_back_to_memory(self, tmp_path):
+        blocker = tmp_path / 'file'
+        blocker.write_text('')
+
+        cache = LLMResponseCache(path=str(blocker / 'llm.sqlite'))
+        cache.set('k', 'answer')
+
+        assert cache.disk is None and cache.get('k') == 'answer'
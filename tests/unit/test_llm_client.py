@@ -3,8 +3,9 @@ Unit tests for LLM client module.
 """
 
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 import os
+import asyncio
 from mcp_server.llm_client import LLMClient
 
 
@@ -199,4 +200,363 @@ class TestLLMClientIntegration:
         with patch.dict(os.environ, {}, clear=True):
             client = LLMClient()
             response = client.generate_response("Test prompt")
-            assert "technical difficulties" in response.lower() 
\ No newline at end of file
+            assert "technical difficulties" in response.lower() 
+
+class TestAsyncLLMClient:
+    """Test cases for agenerate_response."""
+    
+    @pytest.fixture
+    def llm_client(self):
+        with patch.dict(os.environ, {'DEFAULT_LLM': 'gemini-2.5-flash'}, clear=True):
+            return LLMClient()
+    
+    @staticmethod
+    def _openai(content):
+        client = Mock()
+        client.chat.completions.create = AsyncMock(return_value=Mock(choices=[Mock(message=Mock(content=content))]))
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_gemini_first(self, llm_client):
+        llm_client.gemini_client = Mock()
+        llm_client.gemini_client.generate_content_async = AsyncMock(return_value=Mock(text="Gemini answer"))
+        llm_client.openai_async_client = self._openai("OpenAI answer")
+        
+        assert await llm_client.agenerate_response("Test prompt") == "Gemini answer"
+        llm_client.gemini_client.generate_content_async.assert_awaited_once_with("Test prompt")
+        llm_client.gemini_client.generate_content.assert_not_called()
+        llm_client.openai_async_client.chat.completions.create.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_fallback_to_openai(self, llm_client):
+        llm_client.gemini_client = Mock()
+        llm_client.gemini_client.generate_content_async = AsyncMock(side_effect=Exception("Gemini error"))
+        llm_client.openai_async_client = self._openai("OpenAI fallback response")
+        
+        assert await llm_client.agenerate_response("Test prompt", max_tokens=500) == "OpenAI fallback response"
+        call_args = llm_client.openai_async_client.chat.completions.create.call_args
+        assert call_args[1]['max_tokens'] == 500
+        assert call_args[1]['messages'] == [{"role": "user", "content": "Test prompt"}]
+    
+    @pytest.mark.asyncio
+    async def test_default_response_when_all_llms_fail(self, llm_client):
+        llm_client.openai_async_client = Mock()
+        llm_client.openai_async_client.chat.completions.create = AsyncMock(side_effect=Exception("OpenAI error"))
+        
+        response = await llm_client.agenerate_response("Can you analyze my resume?")
+        
+        assert "unable" in response.lower() and "resume" in response.lower()
+    
+    @pytest.mark.asyncio
+    async def test_pooled_async_client(self):
+        env = {'OPENAI_API_KEY': 'test-key', 'LLM_MAX_CONNECTIONS': '7', 'LLM_MAX_KEEPALIVE_CONNECTIONS': '3'}
+        with patch.dict(os.environ, env, clear=True), patch('openai.OpenAI'):
+            client = LLMClient()
+        
+        pool = client.openai_async_client._client._transport._pool
+        assert pool._max_connections == 7 and pool._max_keepalive_connections == 3
+        assert client.get_provider_info()['max_connections'] == 7
+        await client.aclose()
+        assert client.openai_async_client.is_closed()
+
+
+class TestStreamingLLMClient:
+    """Test cases for astream_response."""
+    
+    @pytest.fixture
+    def llm_client(self):
+        with patch.dict(os.environ, {'DEFAULT_LLM': 'gemini-2.5-flash'}, clear=True):
+            return LLMClient()
+    
+    class FakeStream:
+        """Async iterator over text pieces, failing after them if error is given."""
+        
+        def __init__(self, pieces, error=None, wrap=lambda text: text):
+            self.pieces, self.error, self.wrap = list(pieces), error, wrap
+            self.closed = False
+        
+        def __aiter__(self):
+            return self
+        
+        async def __anext__(self):
+            if self.pieces:
+                return self.wrap(self.pieces.pop(0))
+            if self.error:
+                raise self.error
+            raise StopAsyncIteration
+        
+        async def close(self):
+            self.closed = True
+    
+    @staticmethod
+    def _openai_event(text):
+        return Mock(choices=[Mock(delta=Mock(content=text))])
+    
+    async def _collect(self, llm_client, prompt="Test prompt", **kwargs):
+        return [piece async for piece in llm_client.astream_response(prompt, **kwargs)]
+    
+    @pytest.mark.asyncio
+    async def test_gemini_stream(self, llm_client):
+        llm_client.gemini_client = Mock()
+        llm_client.gemini_client.generate_content_async = AsyncMock(
+            return_value=self.FakeStream(["Hello", " world"], wrap=lambda text: Mock(text=text)))
+        
+        assert await self._collect(llm_client) == ["Hello", " world"]
+        llm_client.gemini_client.generate_content_async.assert_awaited_once_with("Test prompt", stream=True)
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_before_first_piece(self, llm_client):
+        llm_client.gemini_client = Mock()
+        llm_client.gemini_client.generate_content_async = AsyncMock(side_effect=Exception("Gemini error"))
+        stream = self.FakeStream(["Open", "AI", None], wrap=self._openai_event)
+        llm_client.openai_async_client = Mock()
+        llm_client.openai_async_client.chat.completions.create = AsyncMock(return_value=stream)
+        
+        assert await self._collect(llm_client, max_tokens=200) == ["Open", "AI"]
+        call_args = llm_client.openai_async_client.chat.completions.create.call_args
+        assert call_args[1]['stream'] is True and call_args[1]['max_tokens'] == 200
+        assert stream.closed
+    
+    @pytest.mark.asyncio
+    async def test_error_after_first_piece_is_raised(self, llm_client):
+        llm_client.gemini_client = Mock()
+        llm_client.gemini_client.generate_content_async = AsyncMock(
+            return_value=self.FakeStream(["Half an"], error=RuntimeError("connection reset"),
+                                         wrap=lambda text: Mock(text=text)))
+        llm_client.openai_async_client = Mock()
+        llm_client.openai_async_client.chat.completions.create = AsyncMock()
+        
+        with pytest.raises(RuntimeError, match="connection reset"):
+            await self._collect(llm_client)
+        llm_client.openai_async_client.chat.completions.create.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_default_response_when_all_llms_fail(self, llm_client):
+        assert await self._collect(llm_client, "Generate interview questions") == [
+            llm_client._get_default_response("Generate interview questions")]
+
+
+class TestLLMClientCache:
+    """Test cases for the LLM response cache inside LLMClient."""
+    
+    @pytest.fixture
+    def llm_client(self):
+        with patch.dict(os.environ, {'DEFAULT_LLM': 'gemini-2.5-flash'}, clear=True):
+            client = LLMClient()
+        client.openai_client = Mock()
+        client.openai_client.chat.completions.create.return_value = Mock(
+            choices=[Mock(message=Mock(content="Cached answer"))])
+        return client
+    
+    def test_identical_prompt_served_from_cache(self, llm_client):
+        assert llm_client.generate_response("Test prompt") == "Cached answer"
+        assert llm_client.generate_response("Test prompt") == "Cached answer"
+        
+        llm_client.openai_client.chat.completions.create.assert_called_once()
+        cache = llm_client.get_provider_info()['cache']
+        assert cache['hits'] == 1 and cache['misses'] == 1
+        assert cache['bytes_saved'] == len("Cached answer")
+    
+    def test_generation_parameters_are_part_of_the_key(self, llm_client):
+        llm_client.generate_response("Test prompt", max_tokens=50)
+        llm_client.generate_response("Test prompt", max_tokens=100)
+        
+        assert llm_client.openai_client.chat.completions.create.call_count == 2
+    
+    def test_opt_out(self, llm_client):
+        llm_client.generate_response("Test prompt")
+        llm_client.generate_response("Test prompt", use_cache=False)
+        
+        assert llm_client.openai_client.chat.completions.create.call_count == 2
+        assert llm_client.cache.stats()['hits'] == 0
+    
+    def test_default_response_is_never_cached(self, llm_client):
+        llm_client.openai_client.chat.completions.create.side_effect = Exception("OpenAI error")
+        default = llm_client.generate_response("Can you analyze my resume?")
+        
+        llm_client.openai_client.chat.completions.create.side_effect = None
+        
+        assert llm_client.generate_response("Can you analyze my resume?") == "Cached answer"
+        assert default != "Cached answer"
+        assert llm_client.cache.stats()['hits'] == 0
+    
+    @pytest.mark.asyncio
+    async def test_async_and_streamed_responses_share_the_cache(self, llm_client):
+        llm_client.generate_response("Test prompt")
+        llm_client.openai_async_client = Mock()
+        llm_client.openai_async_client.chat.completions.create = AsyncMock()
+        
+        assert await llm_client.agenerate_response("Test prompt") == "Cached answer"
+        assert [p async for p in llm_client.astream_response("Test prompt")] == ["Cached answer"]
+        llm_client.openai_async_client.chat.completions.create.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_streamed_response_cached_when_complete(self, llm_client):
+        stream = TestStreamingLLMClient.FakeStream(["Stream", "ed"], wrap=TestStreamingLLMClient._openai_event)
+        llm_client.openai_async_client = Mock()
+        llm_client.openai_async_client.chat.completions.create = AsyncMock(return_value=stream)
+        
+        assert [p async for p in llm_client.astream_response("Stream prompt")] == ["Stream", "ed"]
+        
+        assert [p async for p in llm_client.astream_response("Stream prompt")] == ["Streamed"]
+        llm_client.openai_async_client.chat.completions.create.assert_awaited_once()
+
+
+class TestLLMClientCircuitBreaker:
+    """Test cases for skipping a failing provider."""
+    
+    @pytest.fixture
+    def llm_client(self):
+        with patch.dict(os.environ, {'DEFAULT_LLM': 'gemini-2.5-flash'}, clear=True):
+            client = LLMClient()
+        client.gemini_client = Mock()
+        client.gemini_client.generate_content.side_effect = Exception("Gemini timeout")
+        client.gemini_client.generate_content_async = AsyncMock(side_effect=Exception("Gemini timeout"))
+        client.openai_client = Mock()
+        client.openai_client.chat.completions.create.return_value = Mock(
+            choices=[Mock(message=Mock(content="OpenAI answer"))])
+        client.openai_async_client = TestAsyncLLMClient._openai("OpenAI answer")
+        return client
+    
+    def test_open_circuit_goes_straight_to_fallback(self, llm_client):
+        breaker = llm_client.breakers['gemini']
+        for i in range(breaker.min_requests):
+            assert llm_client.generate_response(f"Prompt {i}", use_cache=False) == "OpenAI answer"
+        assert breaker.state == 'open'
+        
+        assert llm_client.generate_response("Another prompt") == "OpenAI answer"
+        
+        assert llm_client.gemini_client.generate_content.call_count == breaker.min_requests
+        info = llm_client.get_provider_info()['circuit_breakers']
+        assert info['gemini']['state'] == 'open' and info['gemini']['rejected'] == 1
+        assert info['openai']['state'] == 'closed'
+    
+    @pytest.mark.asyncio
+    async def test_async_and_streamed_calls_share_the_breaker(self, llm_client):
+        breaker = llm_client.breakers['gemini']
+        for i in range(breaker.min_requests):
+            await llm_client.agenerate_response(f"Prompt {i}")
+        
+        stream = TestStreamingLLMClient.FakeStream(["OpenAI ", "stream"], wrap=TestStreamingLLMClient._openai_event)
+        llm_client.openai_async_client.chat.completions.create = AsyncMock(return_value=stream)
+        
+        assert [p async for p in llm_client.astream_response("Stream prompt")] == ["OpenAI ", "stream"]
+        assert llm_client.gemini_client.generate_content_async.await_count == breaker.min_requests
+        assert breaker.stats()['rejected'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_trial_call_closes_the_circuit(self, llm_client):
+        breaker = llm_client.breakers['gemini']
+        for i in range(breaker.min_requests):
+            await llm_client.agenerate_response(f"Prompt {i}")
+        llm_client.gemini_client.generate_content_async = AsyncMock(return_value=Mock(text="Gemini answer"))
+        
+        with patch('mcp_server.circuit_breaker.time.monotonic', return_value=breaker._changed_at + breaker.open_seconds):
+            assert await llm_client.agenerate_response("Prompt after cool-down") == "Gemini answer"
+        
+        assert breaker.state == 'closed'
+        assert [t['to'] for t in breaker.stats()['transitions']] == ['open', 'half_open', 'closed']
+
+
+class TestHedgedLLMClient:
+    """Test cases for racing OpenAI against a slow Gemini."""
+    
+    @pytest.fixture
+    def cancelled(self):
+        """Results of the provider calls that were cancelled."""
+        return []
+    
+    @pytest.fixture
+    def llm_client(self, cancelled):
+        with patch.dict(os.environ, {'DEFAULT_LLM': 'gemini-2.5-flash'}, clear=True):
+            client = LLMClient()
+        client.hedge.enabled = True
+        client.hedge.default_delay = 0.05
+        client.hedge.budget = 1.0
+        client.gemini_client = Mock()
+        client.openai_async_client = Mock()
+        client.gemini_client.generate_content_async = self._provider(Mock(text="Gemini answer"), 1.0, cancelled)
+        client.openai_async_client.chat.completions.create = self._provider(
+            Mock(choices=[Mock(message=Mock(content="OpenAI answer"))]), 0.01, cancelled)
+        return client
+    
+    @staticmethod
+    def _provider(result, seconds, cancelled=None):
+        async def call(*args, **kwargs):
+            try:
+                await asyncio.sleep(seconds)
+            except asyncio.CancelledError:
+                cancelled.append(result)
+                raise
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return AsyncMock(side_effect=call)
+    
+    @pytest.mark.asyncio
+    async def test_hedge_wins_and_cancels_primary(self, llm_client, cancelled):
+        assert await llm_client.agenerate_response("Test prompt") == "OpenAI answer"
+        await asyncio.sleep(0)
+        
+        assert [c.text for c in cancelled] == ["Gemini answer"]
+        stats = llm_client.get_provider_info()['hedging']
+        assert stats['fired'] == 1 and stats['won'] == 1 and stats['samples'] == 1
+        assert llm_client.breakers['gemini'].stats()['calls'] == 0
+    
+    @pytest.mark.asyncio
+    async def test_fast_primary_is_not_hedged(self, llm_client):
+        llm_client.gemini_client.generate_content_async = self._provider(Mock(text="Gemini answer"), 0.0)
+        
+        assert await llm_client.agenerate_response("Test prompt") == "Gemini answer"
+        
+        llm_client.openai_async_client.chat.completions.create.assert_not_awaited()
+        assert llm_client.hedge.stats()['fired'] == 0
+    
+    @pytest.mark.asyncio
+    async def test_primary_wins_the_race(self, llm_client, cancelled):
+        llm_client.gemini_client.generate_content_async = self._provider(Mock(text="Gemini answer"), 0.1)
+        llm_client.openai_async_client.chat.completions.create = self._provider("OpenAI answer", 1.0, cancelled)
+        
+        assert await llm_client.agenerate_response("Test prompt") == "Gemini answer"
+        await asyncio.sleep(0)
+        
+        assert cancelled == ["OpenAI answer"]
+        assert llm_client.hedge.stats()['fired'] == 1 and llm_client.hedge.stats()['won'] == 0
+    
+    @pytest.mark.asyncio
+    async def test_over_budget_waits_for_primary(self, llm_client):
+        llm_client.hedge.budget = 0.0
+        llm_client.gemini_client.generate_content_async = self._provider(Mock(text="Gemini answer"), 0.1)
+        
+        assert await llm_client.agenerate_response("Test prompt") == "Gemini answer"
+        
+        llm_client.openai_async_client.chat.completions.create.assert_not_awaited()
+        assert llm_client.hedge.stats()['over_budget'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_failures_fall_back(self, llm_client):
+        # Gemini fails before the hedge delay, then after it
+        for seconds in (0.0, 0.1):
+            llm_client.gemini_client.generate_content_async = self._provider(Exception("Gemini error"), seconds)
+            llm_client.openai_async_client.chat.completions.create = self._provider(
+                Mock(choices=[Mock(message=Mock(content="OpenAI answer"))]), 0.2)
+            
+            assert await llm_client.agenerate_response(f"Prompt {seconds}") == "OpenAI answer"
+        
+        assert llm_client.hedge.stats()['fired'] == 1
+        
+        llm_client.openai_async_client.chat.completions.create = self._provider(Exception("OpenAI error"), 0.0)
+        response = await llm_client.agenerate_response("Can you analyze my resume?")
+        assert "unable" in response.lower()
+    
+    @pytest.mark.asyncio
+    async def test_only_calls_to_gemini_count_as_requests(self, llm_client):
+        llm_client.gemini_client.generate_content_async = self._provider(Mock(text="Gemini answer"), 0.0)
+        
+        assert await llm_client.agenerate_response("Test prompt") == "Gemini answer"
+        assert await llm_client.agenerate_response("Test prompt") == "Gemini answer"  # cached
+        with patch.object(llm_client.breakers['gemini'], 'allow', return_value=False):
+            assert await llm_client.agenerate_response("Other prompt") == "OpenAI answer"
+        
+        assert llm_client.gemini_client.generate_content_async.await_count == 1
+        assert llm_client.hedge.stats()['requests'] == 1
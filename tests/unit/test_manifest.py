@@ -0,0 +1,116 @@
+"""
+Unit tests for the incremental re-indexing manifest.
+"""
+
+import json
+import pytest
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.manifest import (
+    MANIFEST_FILE, content_hash, load_manifest, save_manifest, plan_update,
+)
+
+SETTINGS = {'chunk_size': 500, 'chunk_overlap': 50, 'embedding_model': 'm', 'index_type': 'flat'}
+
+
+def _manifest(**files):
+    entries, next_id = {}, 0
+    for name, (text, num_chunks) in files.items():
+        entries[name] = {'sha256': content_hash(text), 'first_id': next_id, 'num_chunks': num_chunks}
+        next_id += num_chunks
+    return {'settings': dict(SETTINGS), 'files': entries, 'next_id': next_id, 'tombstones': 0}
+
+
+class TestManifestFile:
+    """Test cases for saving and loading the manifest."""
+
+    def test_round_trip(self, tmp_path):
+        manifest = _manifest(**{'a.md': ('alpha', 2)})
+        save_manifest(str(tmp_path), manifest)
+
+        loaded = load_manifest(str(tmp_path))
+        assert loaded['files'] == manifest['files']
+        assert loaded['next_id'] == 2
+
+    def test_missing_manifest(self, tmp_path):
+        assert load_manifest(str(tmp_path)) is None
+
+    def test_unreadable_or_old_manifest_is_ignored(self, tmp_path):
+        (tmp_path / MANIFEST_FILE).write_text('{not json')
+        assert load_manifest(str(tmp_path)) is None
+
+        (tmp_path / MANIFEST_FILE).write_text(json.dumps({'version': 0, 'files': {}}))
+        assert load_manifest(str(tmp_path)) is None
+
+
+class TestPlanUpdate:
+    """Test cases for plan_update."""
+
+    def test_no_manifest_means_full_rebuild(self):
+        plan = plan_update(None, [{'file': 'a.md', 'text': 'alpha'}], SETTINGS)
+
+        assert plan.full_rebuild_reason == 'no manifest'
+        assert plan.added == ['a.md']
+
+    def test_classifies_files_by_content_hash(self):
+        manifest = _manifest(**{'a.md': ('alpha', 1), 'b.md': ('beta', 1), 'c.md': ('gamma', 1),
+                                'd.md': ('delta', 1), 'e.md': ('eps', 1), 'f.md': ('phi', 1),
+                                'g.md': ('chi', 1), 'h.md': ('psi', 1), 'i.md': ('omega', 1), 'j.md': ('mu', 1)})
+        docs = [{'file': name, 'text': text} for name, text in
+                [('a.md', 'alpha'), ('b.md', 'beta v2'), ('new.md', 'new'), ('d.md', 'delta'), ('e.md', 'eps'),
+                 ('f.md', 'phi'), ('g.md', 'chi'), ('h.md', 'psi'), ('i.md', 'omega'), ('j.md', 'mu')]]
+
+        plan = plan_update(manifest, docs, SETTINGS)
+
+        assert plan.full_rebuild_reason is None
+        assert plan.added == ['new.md']
+        assert plan.updated == ['b.md']
+        assert plan.removed == ['c.md']
+        assert len(plan.skipped) == 8
+        assert plan.changed
+
+    def test_unchanged_corpus_has_nothing_to_do(self):
+        manifest = _manifest(**{'a.md': ('alpha', 3)})
+        plan = plan_update(manifest, [{'file': 'a.md', 'text': 'alpha'}], SETTINGS)
+
+        assert plan.full_rebuild_reason is None
+        assert not plan.changed
+
+    def test_unreadable_file_retried_only_once_changed(self):
+        manifest = _manifest(**{'a.md': ('alpha', 3)})
+        manifest['failed'] = {'bad.pdf': {'sha256': content_hash('broken'), 'error': 'PdfReadError'}}
+
+        plan = plan_update(manifest, [{'file': 'a.md', 'text': 'alpha'}, {'file': 'bad.pdf', 'text': 'broken'}],
+                           SETTINGS)
+        assert not plan.changed and plan.skipped == ['a.md', 'bad.pdf']
+
+        plan = plan_update(manifest, [{'file': 'a.md', 'text': 'alpha'}, {'file': 'bad.pdf', 'text': 'fixed'}],
+                           SETTINGS)
+        assert plan.added == ['bad.pdf']
+
+    def test_settings_change_forces_full_rebuild(self):
+        manifest = _manifest(**{'a.md': ('alpha', 3)})
+        plan = plan_update(manifest, [{'file': 'a.md', 'text': 'alpha'}], {**SETTINGS, 'chunk_size': 300})
+
+        assert plan.full_rebuild_reason == 'settings changed'
+
+    def test_index_without_removal_rebuilds_on_update(self):
+        manifest = _manifest(**{'a.md': ('alpha', 3)})
+        docs = [{'file': 'a.md', 'text': 'alpha v2'}]
+
+        assert plan_update(manifest, docs, SETTINGS, supports_removal=False).full_rebuild_reason == \
+            'index type cannot remove vectors'
+        # Additions alone never need removal
+        docs = [{'file': 'a.md', 'text': 'alpha'}, {'file': 'b.md', 'text': 'beta'}]
+        assert plan_update(manifest, docs, SETTINGS, supports_removal=False).full_rebuild_reason is None
+
+    def test_too_many_tombstones_compacts(self):
+        manifest = _manifest(**{'a.md': ('alpha', 5), 'b.md': ('beta', 5)})
+        plan = plan_update(manifest, [{'file': 'a.md', 'text': 'alpha'}], SETTINGS)
+
+        assert plan.removed == ['b.md']
+        assert plan.full_rebuild_reason == 'compacting removed chunks'
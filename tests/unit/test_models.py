@@ -0,0 +1,173 @@
+"""
+Unit tests for the RAG model registry.
+"""
+
+import os
+import time
+import threading
+import pytest
+from unittest.mock import Mock, patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.models import ModelRegistry
+
+
+def _ready_registry(paraphraser, warmup=False):
+    registry = ModelRegistry(warmup=warmup)
+    with patch('rag.models.pipeline', return_value=paraphraser):
+        registry.start_paraphraser_loading().join()
+    return registry
+
+
+class TestEmbeddingModel:
+    """Test cases for the shared embedding model."""
+
+    @patch('rag.models.SentenceTransformer')
+    def test_embedding_model_built_once(self, mock_sentence_transformer):
+        """The embedding model is constructed once and reused."""
+        registry = ModelRegistry(paraphraser_enabled=False)
+
+        with patch.dict(os.environ, {'EMBEDDING_MODEL': 'test-model'}):
+            first = registry.get_embedding_model()
+            second = registry.get_embedding_model()
+
+        assert first is second
+        mock_sentence_transformer.assert_called_once_with('test-model')
+
+    @patch('rag.models.SentenceTransformer')
+    def test_embedding_model_follows_env_change(self, mock_sentence_transformer):
+        """Changing EMBEDDING_MODEL loads the new model."""
+        registry = ModelRegistry(paraphraser_enabled=False)
+
+        with patch.dict(os.environ, {'EMBEDDING_MODEL': 'model-a'}):
+            registry.get_embedding_model()
+        with patch.dict(os.environ, {'EMBEDDING_MODEL': 'model-b'}):
+            registry.get_embedding_model()
+
+        assert mock_sentence_transformer.call_count == 2
+        assert registry.stats()['embedding_models'] == ['model-b']
+
+    @patch('rag.models.SentenceTransformer')
+    def test_background_embedding_load(self, mock_sentence_transformer):
+        """start_embedding_loading builds the model off the request path."""
+        registry = ModelRegistry(paraphraser_enabled=False)
+
+        thread = registry.start_embedding_loading('test-model')
+        thread.join(timeout=5)
+
+        assert registry.embedding_model_ready('test-model')
+        assert not registry.embedding_model_loading('test-model')
+        assert registry.start_embedding_loading('test-model') is None
+        mock_sentence_transformer.assert_called_once_with('test-model')
+
+    def test_background_embedding_load_failure_is_reported(self):
+        registry = ModelRegistry(paraphraser_enabled=False)
+
+        with patch('rag.models.SentenceTransformer', side_effect=OSError("model not found")):
+            registry.start_embedding_loading('missing-model').join(timeout=5)
+
+        assert not registry.embedding_model_ready('missing-model')
+        assert 'model not found' in registry.embedding_model_error('missing-model')
+        assert registry.start_embedding_loading('missing-model') is None
+
+
+class TestParaphraser:
+    """Test cases for the background paraphraser."""
+
+    def test_disabled_paraphraser_falls_back(self):
+        """A disabled paraphraser never expands the query."""
+        registry = ModelRegistry(paraphraser_enabled=False)
+
+        variants, info = registry.paraphrase("test query")
+
+        assert variants == []
+        assert info['expanded'] is False
+        assert info['fallback_reason'] == 'paraphraser_disabled'
+
+    def test_paraphrase_when_ready(self):
+        """A ready paraphraser returns variants and timing."""
+        paraphraser = Mock(return_value=[{'generated_text': 'alt 1'}, {'generated_text': 'alt 2'}])
+        registry = _ready_registry(paraphraser)
+
+        variants, info = registry.paraphrase("test query", budget_ms=5000)
+
+        assert variants == ['alt 1', 'alt 2']
+        assert info['expanded'] is True
+        assert info['expansion_ms'] >= 0
+        assert registry.paraphraser_state == 'ready'
+
+    def test_warmup_runs_once_on_load(self):
+        """Warm-up runs the paraphraser once before it is marked ready."""
+        paraphraser = Mock(return_value=[{'generated_text': 'alt'}])
+        registry = _ready_registry(paraphraser, warmup=True)
+
+        assert paraphraser.call_count == 1
+        assert registry.stats()['paraphrase_latency_ms'] is not None
+
+    def test_over_budget_falls_back(self):
+        """A paraphrase slower than the budget is abandoned."""
+        paraphraser = Mock(side_effect=lambda *a, **k: time.sleep(0.2) or [{'generated_text': 'late'}])
+        registry = _ready_registry(paraphraser)
+
+        variants, info = registry.paraphrase("test query", budget_ms=10)
+
+        assert variants == []
+        assert info['fallback_reason'] == 'over_budget'
+
+    def test_predicted_over_budget_skips_call(self):
+        """When recent paraphrases were slow, the model is not called at all."""
+        paraphraser = Mock(return_value=[{'generated_text': 'alt'}])
+        registry = _ready_registry(paraphraser)
+        registry._record_latency(1000)
+
+        variants, info = registry.paraphrase("test query", budget_ms=50)
+
+        assert variants == []
+        assert info['fallback_reason'] == 'predicted_over_budget'
+        paraphraser.assert_not_called()
+
+    def test_slow_estimate_decays_with_time(self):
+        """A slow period skips expansion for a while, however many requests arrive."""
+        paraphraser = Mock(return_value=[{'generated_text': 'alt'}])
+        registry = _ready_registry(paraphraser)
+        now = time.monotonic()
+        with patch('rag.models.time.monotonic', return_value=now):
+            registry._record_latency(400)
+            for _ in range(50):
+                assert registry.paraphrase("test query", budget_ms=100)[1]['fallback_reason'] == 'predicted_over_budget'
+        with patch('rag.models.time.monotonic', return_value=now + 61):  # two half-lives: 100 ms
+            variants, info = registry.paraphrase("test query", budget_ms=100)
+
+        assert info['expanded'] and variants == ['alt']
+
+    def test_busy_while_an_abandoned_paraphrase_runs(self):
+        """A call is not queued behind a paraphrase that overran its budget."""
+        release = threading.Event()
+        paraphraser = Mock(side_effect=lambda *a, **k: release.wait(5) and [{'generated_text': 'late'}])
+        registry = _ready_registry(paraphraser)
+
+        assert registry.paraphrase("first", budget_ms=10)[1]['fallback_reason'] == 'over_budget'
+        variants, info = registry.paraphrase("second", budget_ms=10)
+
+        assert variants == [] and info['fallback_reason'] == 'paraphraser_busy'
+        assert paraphraser.call_count == 1
+        assert registry.stats()['paraphrase_busy'] == 1
+        release.set()
+        registry._paraphrase_job.result(timeout=5)
+        assert registry.paraphrase("third", budget_ms=5000)[1]['expanded']
+
+    def test_load_failure_is_reported(self):
+        """A paraphraser that fails to load is reported, not swallowed."""
+        registry = ModelRegistry(warmup=False)
+        with patch('rag.models.pipeline', side_effect=OSError("model not found")):
+            registry.start_paraphraser_loading().join()
+
+        variants, info = registry.paraphrase("test query")
+
+        assert variants == []
+        assert info['fallback_reason'] == 'paraphraser_unavailable'
+        assert registry.stats()['paraphraser_error'] == "model not found"
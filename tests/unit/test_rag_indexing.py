@@ -5,6 +5,7 @@ Unit tests for RAG indexing module.
 import pytest
 from unittest.mock import Mock, patch, mock_open, MagicMock
 import os
+import json
 import tempfile
 from pathlib import Path
 import sys
@@ -12,7 +13,13 @@ import sys
 # Add the project root to the path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from rag.indexing import chunk_text, load_documents, main
+import numpy as np
+import faiss
+
+from rag.indexing import chunk_text, load_documents, main, _settings
+from rag.storage import load_chunk_store
+from rag.snapshots import active_path, active_version, list_versions, rollback
+from rag.manifest import file_hash
 
 
 class TestChunkText:
@@ -74,7 +81,7 @@ class TestChunkText:
 class TestLoadDocuments:
     """Test cases for document loading functionality."""
     
-    @patch('rag.indexing.glob.glob')
+    @patch('rag.ingest.glob.glob')
     @patch('builtins.open', new_callable=mock_open)
     def test_load_documents_success(self, mock_file, mock_glob):
         """Test successful document loading."""
@@ -91,7 +98,7 @@ class TestLoadDocuments:
         
         mock_glob.assert_called_once_with('/test/data/dir/*.md')
     
-    @patch('rag.indexing.glob.glob')
+    @patch('rag.ingest.glob.glob')
     def test_load_documents_no_files(self, mock_glob):
         """Test loading documents when no files exist."""
         mock_glob.return_value = []
@@ -101,7 +108,7 @@ class TestLoadDocuments:
         assert docs == []
         mock_glob.assert_called_once_with('/test/data/dir/*.md')
     
-    @patch('rag.indexing.glob.glob')
+    @patch('rag.ingest.glob.glob')
     @patch('builtins.open', side_effect=FileNotFoundError("File not found"))
     def test_load_documents_file_error(self, mock_file, mock_glob):
         """Test handling of file reading errors."""
@@ -110,7 +117,7 @@ class TestLoadDocuments:
         with pytest.raises(FileNotFoundError):
             load_documents('/test/data/dir')
     
-    @patch('rag.indexing.glob.glob')
+    @patch('rag.ingest.glob.glob')
     @patch('builtins.open', new_callable=mock_open)
     def test_load_documents_encoding(self, mock_file, mock_glob):
         """Test document loading with proper encoding."""
@@ -123,112 +130,382 @@ class TestLoadDocuments:
         mock_file.assert_called_with('/path/to/doc1.md', 'r', encoding='utf-8')
 
 
+class FakeModel:
+    """Deterministic 8-d embeddings; records the size of every encode() batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(len(texts))
+        return np.stack([np.random.default_rng(sum(map(ord, t)) + len(t)).standard_normal(8) for t in texts])
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    (data_dir / 'doc1.md').write_text('Document one talks about resumes and cover letters.')
+    (data_dir / 'doc2.md').write_text('Document two is about interviews, offers and salary negotiation.')
+    return data_dir
+
+
+def _env(corpus, tmp_path, **overrides):
+    env = {
+        'DATA_DIR': str(corpus),
+        'VECTOR_DB_PATH': str(tmp_path / 'vector_db'),
+        'CHUNKING': 'chars',
+        'CHUNK_SIZE': '20',
+        'CHUNK_OVERLAP': '5',
+        'EMBEDDING_MODEL': 'all-MiniLM-L6-v2',
+        'EMBEDDING_STORE_ENABLED': 'false',
+        'INDEX_WORKERS': '1',
+        'INDEX_EMBED_BATCH_SIZE': '3',
+    }
+    env.update(overrides)
+    return env
+
+
 class TestRAGIndexingIntegration:
     """Integration tests for RAG indexing."""
-    
+
     @patch('rag.indexing.SentenceTransformer')
-    @patch('rag.indexing.faiss.IndexFlatL2')
-    @patch('rag.indexing.faiss.write_index')
-    @patch('builtins.open', new_callable=mock_open)
-    @patch('pickle.dump')
-    @patch('rag.indexing.load_documents')
-    @patch('rag.indexing.chunk_text')
-    def test_main_function_success(self, mock_chunk_text, mock_load_docs, 
-                                 mock_pickle_dump, mock_file, mock_write_index,
-                                 mock_faiss_index, mock_sentence_transformer):
+    def test_main_function_success(self, mock_sentence_transformer, corpus, tmp_path):
         """Test successful execution of main function."""
-        # Mock document loading
-        mock_load_docs.return_value = [
-            {'file': 'doc1.md', 'text': 'Document 1 content'},
-            {'file': 'doc2.md', 'text': 'Document 2 content'}
-        ]
-        
-        # Mock chunking
-        mock_chunk_text.side_effect = lambda text, chunk_size, overlap: [text[:5], text[5:]]
-        
-        # Mock sentence transformer
-        mock_model = Mock()
-        mock_model.encode.return_value = [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
-        mock_sentence_transformer.return_value = mock_model
-        
-        # Mock FAISS index
-        mock_index = Mock()
-        mock_faiss_index.return_value = mock_index
-        
-        # Mock environment variables
-        with patch.dict(os.environ, {
-            'DATA_DIR': '/test/data',
-            'VECTOR_DB_PATH': '/test/vector_db',
-            'CHUNK_SIZE': '1000',
-            'CHUNK_OVERLAP': '200',
-            'EMBEDDING_MODEL': 'all-MiniLM-L6-v2'
-        }):
+        model = FakeModel()
+        mock_sentence_transformer.return_value = model
+
+        with patch.dict(os.environ, _env(corpus, tmp_path)):
             main()
-        
-        # Verify function calls
-        mock_load_docs.assert_called_once_with('/test/data')
-        assert mock_chunk_text.call_count == 2  # Called for each document
-        mock_model.encode.assert_called_once()
-        mock_index.add.assert_called_once()
-        mock_write_index.assert_called_once()
-        assert mock_pickle_dump.call_count == 2  # metadata and chunks
-    
+
+        vector_db = active_path(str(tmp_path / 'vector_db'))
+        metadata, chunks = load_chunk_store(vector_db)
+        index = faiss.read_index(os.path.join(vector_db, 'faiss.index'))
+        assert len(chunks) == index.ntotal == sum(model.batches)
+        # Chunks were embedded in fixed-size batches, not in one call
+        assert max(model.batches) == 3 and len(model.batches) > 1
+        # Vector ids are chunk-store rows
+        _, I = index.search(model.encode([chunks[4]]).astype('float32'), 1)
+        assert I[0, 0] == 4
+        assert {m['file'] for m in metadata} == {'doc1.md', 'doc2.md'}
+        assert not [name for name in os.listdir(vector_db) if name.endswith('.tmp')]
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_worker_pool_builds_the_same_index(self, mock_sentence_transformer, corpus, tmp_path):
+        """Chunking in worker processes yields the same rows as chunking inline."""
+        mock_sentence_transformer.return_value = FakeModel()
+        for i in range(3, 7):
+            (corpus / f'doc{i}.md').write_text(f'Extra guide number {i} about networking events. ' * 3)
+
+        with patch.dict(os.environ, _env(corpus, tmp_path / 'inline')):
+            main()
+        with patch.dict(os.environ, _env(corpus, tmp_path / 'pool', INDEX_WORKERS='2', INDEX_MAX_PENDING_DOCS='1')):
+            main()
+
+        inline_metadata, inline_chunks = load_chunk_store(active_path(str(tmp_path / 'inline' / 'vector_db')))
+        pool_metadata, pool_chunks = load_chunk_store(active_path(str(tmp_path / 'pool' / 'vector_db')))
+        assert list(pool_chunks) == list(inline_chunks)
+        assert list(pool_metadata) == list(inline_metadata)
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_other_formats_and_unreadable_documents(self, mock_sentence_transformer, corpus, tmp_path):
+        """HTML chunks record their section; a broken PDF is skipped without failing the build."""
+        mock_sentence_transformer.return_value = FakeModel()
+        (corpus / 'offers.html').write_text('<h1>Offers</h1><p>Compare salary, equity and benefits.</p>')
+        (corpus / 'broken.pdf').write_bytes(b'not a pdf')
+
+        with patch.dict(os.environ, _env(corpus, tmp_path)):
+            main()
+
+        vector_db = active_path(str(tmp_path / 'vector_db'))
+        metadata, _ = load_chunk_store(vector_db)
+        assert {m.get('section') for m in metadata if m['file'] == 'offers.html'} == {'Offers'}
+        with open(os.path.join(vector_db, 'manifest.json')) as f:
+            manifest = json.load(f)
+        assert set(manifest['files']) == {'doc1.md', 'doc2.md', 'offers.html'}
+        assert list(manifest['failed']) == ['broken.pdf']
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_unchanged_unreadable_document_is_not_retried(self, mock_sentence_transformer, corpus, tmp_path):
+        """A broken PDF does not make every later run publish a new snapshot."""
+        mock_sentence_transformer.return_value = FakeModel()
+        (corpus / 'broken.pdf').write_bytes(b'not a pdf')
+
+        with patch.dict(os.environ, _env(corpus, tmp_path)):
+            first = main()
+            assert main() is None
+            (corpus / 'doc1.md').write_text('Rewritten guide about salary negotiation.')
+            second = main()
+
+        assert second != first
+        with open(os.path.join(active_path(str(tmp_path / 'vector_db')), 'manifest.json')) as f:
+            manifest = json.load(f)
+        assert list(manifest['failed']) == ['broken.pdf']
+        assert manifest['failed']['broken.pdf']['sha256'] == file_hash(str(corpus / 'broken.pdf'))
+
+        (corpus / 'broken.pdf').write_bytes(b'still not a pdf')
+        with patch.dict(os.environ, _env(corpus, tmp_path)):
+            assert main() is not None
+
     @patch('rag.indexing.os.makedirs')
     @patch('rag.indexing.SentenceTransformer')
     def test_main_function_creates_directories(self, mock_sentence_transformer, mock_makedirs):
         """Test that main function creates necessary directories."""
-        mock_model = Mock()
-        mock_model.encode.return_value = [[0.1, 0.2, 0.3]]
-        mock_sentence_transformer.return_value = mock_model
-        
-        with patch('rag.indexing.load_documents', return_value=[]), \
-             patch('rag.indexing.faiss.IndexFlatL2'), \
-             patch('rag.indexing.faiss.write_index'), \
-             patch('builtins.open', new_callable=mock_open), \
-             patch('pickle.dump'), \
+        with patch('rag.indexing.list_documents', return_value=[]), \
              patch.dict(os.environ, {'VECTOR_DB_PATH': '/test/vector_db'}):
             main()
-        
+
         mock_makedirs.assert_called_once_with('/test/vector_db', exist_ok=True)
-    
+
     @patch('rag.indexing.SentenceTransformer')
-    def test_main_function_handles_empty_documents(self, mock_sentence_transformer):
+    def test_main_function_handles_empty_documents(self, mock_sentence_transformer, tmp_path):
         """Test main function behavior with empty document list."""
         mock_model = Mock()
         mock_sentence_transformer.return_value = mock_model
-        
-        with patch('rag.indexing.load_documents', return_value=[]), \
-             patch('rag.indexing.faiss.IndexFlatL2'), \
-             patch('rag.indexing.faiss.write_index'), \
-             patch('builtins.open', new_callable=mock_open), \
-             patch('pickle.dump'):
+
+        with patch('rag.indexing.list_documents', return_value=[]), \
+             patch.dict(os.environ, {'VECTOR_DB_PATH': str(tmp_path)}):
             main()
-        
+
         # Should not call encode if no documents
         mock_model.encode.assert_not_called()
 
 
 class TestRAGIndexingEdgeCases:
     """Test edge cases and error handling."""
-    
+
     @patch('rag.indexing.SentenceTransformer')
-    def test_main_function_model_loading_error(self, mock_sentence_transformer):
+    def test_main_function_model_loading_error(self, mock_sentence_transformer, corpus, tmp_path):
         """Test handling of model loading errors."""
         mock_sentence_transformer.side_effect = Exception("Model loading failed")
-        
-        with pytest.raises(Exception, match="Model loading failed"):
+
+        with patch.dict(os.environ, _env(corpus, tmp_path)), \
+             pytest.raises(Exception, match="Model loading failed"):
             main()
-    
+
     @patch('rag.indexing.SentenceTransformer')
-    @patch('rag.indexing.load_documents')
-    def test_main_function_encoding_error(self, mock_load_docs, mock_sentence_transformer):
+    def test_main_function_encoding_error(self, mock_sentence_transformer, corpus, tmp_path):
         """Test handling of encoding errors."""
-        mock_load_docs.return_value = [{'file': 'doc1.md', 'text': 'content'}]
         mock_model = Mock()
         mock_model.encode.side_effect = Exception("Encoding failed")
         mock_sentence_transformer.return_value = mock_model
-        
-        with patch('rag.indexing.chunk_text', return_value=['content']), \
-             patch('rag.indexing.faiss.IndexFlatL2'), \
+
+        with patch.dict(os.environ, _env(corpus, tmp_path)), \
              pytest.raises(Exception, match="Encoding failed"):
-            main() 
\ No newline at end of file
+            main()
+        # The half-written snapshot was discarded and nothing was published
+        assert os.listdir(tmp_path / 'vector_db') == []
+
+
+class TestSnapshots:
+    """Each build is published as a new snapshot; failed builds leave the active one alone."""
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_builds_publish_versions_and_prune(self, mock_sentence_transformer, corpus, tmp_path):
+        mock_sentence_transformer.return_value = FakeModel()
+        root = str(tmp_path / 'vector_db')
+        env = _env(corpus, tmp_path, INDEX_KEEP_VERSIONS='2')
+
+        with patch.dict(os.environ, env):
+            first = main()
+            assert active_version(root) == first
+            (corpus / 'doc3.md').write_text('Document three covers networking at career fairs.')
+            second = main()
+            assert main() is None  # nothing changed: no new snapshot
+            assert active_version(root) == second
+            (corpus / 'doc4.md').write_text('Document four covers informational interviews.')
+            main()
+
+        versions = list_versions(root)
+        assert first not in versions and second in versions and len(versions) == 2
+        assert active_version(root) == versions[-1]
+        # The incremental build carried the unchanged files over from the previous snapshot
+        metadata, _ = load_chunk_store(active_path(root))
+        assert {m['file'] for m in metadata} == {'doc1.md', 'doc2.md', 'doc3.md', 'doc4.md'}
+        with open(os.path.join(active_path(root), 'snapshot.json')) as f:
+            assert json.load(f)['previous'] == second
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_models_are_reused_across_builds(self, mock_sentence_transformer, corpus, tmp_path):
+        mock_sentence_transformer.return_value = FakeModel()
+        models = {}
+
+        with patch.dict(os.environ, _env(corpus, tmp_path)):
+            main(models=models)
+            (corpus / 'doc3.md').write_text('Document three covers networking at career fairs.')
+            main(models=models)
+
+        assert mock_sentence_transformer.call_count == 1
+        assert list(models.values()) == [mock_sentence_transformer.return_value]
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_failed_build_keeps_active_snapshot(self, mock_sentence_transformer, corpus, tmp_path):
+        model = FakeModel()
+        mock_sentence_transformer.return_value = model
+        root = str(tmp_path / 'vector_db')
+
+        with patch.dict(os.environ, _env(corpus, tmp_path)):
+            main()
+            active = active_version(root)
+            (corpus / 'doc3.md').write_text('Document three covers networking at career fairs.')
+            with patch.object(model, 'encode', side_effect=Exception("Encoding failed")), \
+                 pytest.raises(Exception, match="Encoding failed"):
+                main()
+
+        assert active_version(root) == active
+        assert os.listdir(os.path.join(root, 'versions')) == [active]
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_next_build_starts_from_a_rolled_back_snapshot(self, mock_sentence_transformer, corpus, tmp_path):
+        mock_sentence_transformer.return_value = FakeModel()
+        root = str(tmp_path / 'vector_db')
+
+        with patch.dict(os.environ, _env(corpus, tmp_path)):
+            main()
+            first = active_version(root)
+            (corpus / 'doc1.md').unlink()
+            main()
+            assert rollback(root) == first
+            main()  # doc1.md is gone again relative to the rolled-back snapshot
+
+        metadata, _ = load_chunk_store(active_path(root))
+        assert {m['file'] for m in metadata if m['file']} == {'doc2.md'}
+
+
+class TestDeduplication:
+    """Near-duplicate chunks are stored but get no vector, and stay consistent across incremental builds."""
+
+    TEXT = 'Ask former colleagues for a referral and follow up within two weeks of applying.'
+
+    def _env(self, corpus, tmp_path, **overrides):
+        return _env(corpus, tmp_path, CHUNK_SIZE='1000', CHUNK_OVERLAP='0', **overrides)
+
+    def _load(self, tmp_path):
+        path = active_path(str(tmp_path / 'vector_db'))
+        metadata, chunks = load_chunk_store(path)
+        return faiss.read_index(os.path.join(path, 'faiss.index')), metadata, chunks
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_duplicates_get_no_vector(self, mock_sentence_transformer, corpus, tmp_path):
+        mock_sentence_transformer.return_value = FakeModel()
+        (corpus / 'doc3.md').write_text(self.TEXT)
+        (corpus / 'doc4.md').write_text(self.TEXT.replace('weeks', 'weeks.'))
+
+        with patch.dict(os.environ, self._env(corpus, tmp_path)):
+            main()
+
+        index, metadata, chunks = self._load(tmp_path)
+        assert len(chunks) == 4 and index.ntotal == 3
+        assert metadata[2]['also_in'] == [{'file': 'doc4.md', 'chunk_id': 0}]
+        assert metadata[3]['duplicate_of'] == 2
+        with open(os.path.join(active_path(str(tmp_path / 'vector_db')), 'manifest.json')) as f:
+            manifest = json.load(f)
+        assert manifest['duplicates'] == 1 and manifest['throughput']['duplicates'] == 1
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_disabled(self, mock_sentence_transformer, corpus, tmp_path):
+        mock_sentence_transformer.return_value = FakeModel()
+        (corpus / 'doc3.md').write_text(self.TEXT)
+        (corpus / 'doc4.md').write_text(self.TEXT)
+
+        with patch.dict(os.environ, self._env(corpus, tmp_path, CHUNK_DEDUP='false')):
+            main()
+
+        index, metadata, _ = self._load(tmp_path)
+        assert index.ntotal == 4
+        assert not metadata.duplicate_rows()
+        assert not os.path.exists(os.path.join(active_path(str(tmp_path / 'vector_db')), 'minhash.npy'))
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_incremental_builds(self, mock_sentence_transformer, corpus, tmp_path):
+        mock_sentence_transformer.return_value = FakeModel()
+        (corpus / 'doc3.md').write_text(self.TEXT)
+
+        with patch.dict(os.environ, self._env(corpus, tmp_path)):
+            main()
+            # A new file repeating an indexed chunk is folded into it without a full rebuild
+            (corpus / 'doc4.md').write_text(self.TEXT)
+            (corpus / 'doc5.md').write_text(self.TEXT)
+            main()
+            index, metadata, _ = self._load(tmp_path)
+            assert index.ntotal == 3
+            assert [m['file'] for m in metadata[2]['also_in']] == ['doc4.md', 'doc5.md']
+
+            # Removing the representative embeds the first remaining copy; the other is folded into it
+            (corpus / 'doc3.md').unlink()
+            main()
+
+        index, metadata, chunks = self._load(tmp_path)
+        assert metadata[2] == {'file': '', 'chunk_id': -1}
+        assert 'duplicate_of' not in metadata[3]
+        assert metadata[3]['also_in'] == [{'file': 'doc5.md', 'chunk_id': 0}]
+        assert metadata[4]['duplicate_of'] == 3
+        assert index.ntotal == 3
+        distances, ids = index.search(FakeModel().encode([self.TEXT]).astype('float32'), 1)
+        assert ids[0][0] == 3 and distances[0][0] == pytest.approx(0.0, abs=1e-5)
+
+
+class TestRouting:
+    """The indexer keeps the document routing table in step with the index."""
+
+    def _table(self, tmp_path):
+        return np.load(os.path.join(active_path(str(tmp_path / 'vector_db')), 'routing.npz'))
+
+    @patch('rag.indexing.SentenceTransformer')
+    def test_full_and_incremental_builds(self, mock_sentence_transformer, corpus, tmp_path):
+        mock_sentence_transformer.return_value = FakeModel()
+        for i, topic in enumerate(['referrals', 'portfolios', 'internships'], start=3):
+            (corpus / f'doc{i}.md').write_text(f'Document {i} is about {topic}.')
+
+        with patch.dict(os.environ, _env(corpus, tmp_path, CHUNK_SIZE='1000', CHUNK_OVERLAP='0')):
+            main()
+            table = self._table(tmp_path)
+            assert table['files'].tolist() == ['doc1.md', 'doc2.md', 'doc3.md', 'doc4.md', 'doc5.md']
+            assert sorted(table['ids'].tolist()) == [0, 1, 2, 3, 4]
+            assert 0.0 <= float(table['recall']) <= 1.0
+
+            (corpus / 'doc1.md').unlink()
+            (corpus / 'doc6.md').write_text('Prepare three questions for the interviewer.')
+            main()
+
+        table = self._table(tmp_path)
+        assert table['files'].tolist() == ['doc2.md', 'doc3.md', 'doc4.md', 'doc5.md', 'doc6.md']
+        index = faiss.read_index(os.path.join(active_path(str(tmp_path / 'vector_db')), 'faiss.index'))
+        assert len(table['ids']) == index.ntotal == 5
+        assert sorted(table['ids'].tolist()) == [1, 2, 3, 4, 5]  # doc1's row is gone, doc6 is appended
+
+
+class TestChunkingSettings:
+    """Test how the chunking strategy is chosen."""
+
+    def test_tokens_strategy(self):
+        with patch('rag.indexing.load_tokenizer') as mock_load, \
+             patch.dict(os.environ, {'CHUNKING': 'tokens', 'CHUNK_MAX_TOKENS': '128', 'CHUNK_OVERLAP_TOKENS': '16'}):
+            settings = _settings()
+
+        mock_load.assert_called_once_with(settings['embedding_model'])
+        assert settings['chunking'] == 'tokens'
+        assert (settings['chunk_max_tokens'], settings['chunk_overlap_tokens']) == (128, 16)
+        assert 'chunk_size' not in settings
+
+    def test_token_budget_defaults_to_the_models_window(self, monkeypatch):
+        monkeypatch.delenv('CHUNK_MAX_TOKENS', raising=False)
+        monkeypatch.setenv('CHUNKING', 'tokens')
+        with patch('rag.indexing.load_tokenizer'), \
+             patch('rag.indexing.model_max_tokens', return_value=384) as mock_limit:
+            settings = _settings()
+
+        mock_limit.assert_called_once_with(settings['embedding_model'])
+        assert settings['chunk_max_tokens'] == 384
+
+    def test_falls_back_to_characters_without_a_tokenizer(self):
+        with patch('rag.indexing.load_tokenizer', side_effect=OSError("offline")), \
+             patch.dict(os.environ, {'CHUNKING': 'tokens', 'CHUNK_SIZE': '300', 'CHUNK_OVERLAP': '30'}):
+            settings = _settings()
+
+        assert settings['chunking'] == 'chars'
+        assert (settings['chunk_size'], settings['chunk_overlap']) == (300, 30)
+
+    def test_unknown_strategy(self):
+        with patch.dict(os.environ, {'CHUNKING': 'sentences'}), pytest.raises(ValueError, match="CHUNKING"):
+            _settings()
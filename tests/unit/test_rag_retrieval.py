@@ -13,7 +13,41 @@ import numpy as np
 # Add the project root to the path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from rag.retrieval import load_index_and_metadata, retrieve
+from rag.retrieval import load_index_and_metadata, retrieve, index_store
+from rag.index_store import IndexStore
+from rag.models import ModelRegistry
+from rag.embedding_cache import QueryEmbeddingCache
+from rag.result_cache import ResultCache
+
+
+@pytest.fixture(autouse=True)
+def reset_index_store():
+    """Drop the resident index so each test sees its own mocked loader."""
+    index_store.clear()
+    yield
+    index_store.clear()
+
+
+@pytest.fixture(autouse=True)
+def fresh_model_registry(monkeypatch):
+    """Give each test its own registry with the paraphraser switched off."""
+    registry = ModelRegistry(paraphraser_enabled=False)
+    monkeypatch.setattr('rag.retrieval.model_registry', registry)
+    return registry
+
+
+@pytest.fixture(autouse=True)
+def fresh_query_embedding_cache(monkeypatch):
+    """Give each test an empty query embedding cache."""
+    cache = QueryEmbeddingCache()
+    monkeypatch.setattr('rag.retrieval.query_embedding_cache', cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def disabled_result_cache(monkeypatch):
+    """Bypass the result cache so each call exercises the full pipeline."""
+    monkeypatch.setattr('rag.retrieval.result_cache', ResultCache(max_entries=0))
 
 
 class TestLoadIndexAndMetadata:
@@ -48,8 +82,11 @@ class TestLoadIndexAndMetadata:
         expected_chunks_path = '/test/vector_db/chunks.pkl'
         expected_index_path = '/test/vector_db/faiss.index'
         
-        mock_read_index.assert_called_once_with(expected_index_path)
-        assert mock_file.call_count == 2  # metadata and chunks files
+        mock_read_index.assert_called_once()
+        assert mock_read_index.call_args[0][0] == expected_index_path
+        # The CURRENT snapshot pointer (empty here, so the unversioned layout), then metadata and chunks
+        assert [c.args[0] for c in mock_file.call_args_list] == [
+            '/test/vector_db/CURRENT', expected_metadata_path, expected_chunks_path]
     
     @patch('rag.retrieval.faiss.read_index')
     def test_load_index_and_metadata_file_not_found(self, mock_read_index):
@@ -76,7 +113,7 @@ class TestRetrieve:
     """Test cases for retrieval functionality."""
     
     @patch('rag.retrieval.load_index_and_metadata')
-    @patch('rag.retrieval.SentenceTransformer')
+    @patch('rag.models.SentenceTransformer')
     def test_retrieve_basic(self, mock_sentence_transformer, mock_load_index):
         """Test basic retrieval functionality."""
         # Mock sentence transformer
@@ -105,12 +142,12 @@ class TestRetrieve:
         mock_index.search.assert_called_once()
     
     @patch('rag.retrieval.load_index_and_metadata')
-    @patch('rag.retrieval.SentenceTransformer')
-    def test_retrieve_with_multi_query(self, mock_sentence_transformer, mock_load_index):
+    @patch('rag.models.SentenceTransformer')
+    def test_retrieve_with_multi_query(self, mock_sentence_transformer, mock_load_index, monkeypatch):
         """Test retrieval with multi-query reformulation."""
         # Mock sentence transformer
         mock_model = Mock()
-        mock_model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        mock_model.encode.side_effect = lambda texts, **kwargs: np.array([[0.1, 0.2, 0.3]] * len(texts))
         mock_sentence_transformer.return_value = mock_model
         
         # Mock FAISS index and metadata
@@ -120,25 +157,35 @@ class TestRetrieve:
         mock_chunks = ['chunk 1 content', 'chunk 2 content']
         mock_load_index.return_value = (mock_index, mock_metadata, mock_chunks)
         
-        # Mock paraphrasing pipeline
+        # Mock paraphrasing pipeline, built once by the registry
         mock_paraphraser = Mock()
         mock_paraphraser.return_value = [
             {'generated_text': 'alternative query 1'},
             {'generated_text': 'alternative query 2'}
         ]
+        registry = ModelRegistry(warmup=False)
+        monkeypatch.setattr('rag.retrieval.model_registry', registry)
+        with patch('rag.models.pipeline', return_value=mock_paraphraser) as mock_pipeline:
+            registry.start_paraphraser_loading().join()
         
-        with patch('rag.retrieval.pipeline', return_value=mock_paraphraser), \
-             patch.dict(os.environ, {'TOP_K_RESULTS': '5'}):
-            results = retrieve("test query", top_k=2, multi_query=True)
+        with patch.dict(os.environ, {'TOP_K_RESULTS': '5'}):
+            results = retrieve("test query", top_k=2, multi_query=True, latency_budget_ms=5000)
+            retrieve("test query", top_k=2, multi_query=True, latency_budget_ms=5000)
         
         # Should have results from multiple queries
         assert len(results) >= 2
-        mock_index.search.assert_called()  # Called for each query
+        assert results.info['expansion']['expanded'] is True
+        assert results.info['queries'] == ['test query', 'alternative query 1', 'alternative query 2']
+        assert mock_index.search.call_count == 2  # One multi-row search per retrieve() call
+        encoded = mock_model.encode.call_args[0][0]
+        assert encoded == ["test query", "alternative query 1", "alternative query 2"]
+        mock_model.encode.assert_called_once()  # Second call served from the embedding cache
+        mock_pipeline.assert_called_once()  # Built once, reused across calls
     
     @patch('rag.retrieval.load_index_and_metadata')
-    @patch('rag.retrieval.SentenceTransformer')
-    def test_retrieve_multi_query_fallback(self, mock_sentence_transformer, mock_load_index):
-        """Test retrieval when paraphrasing fails."""
+    @patch('rag.models.SentenceTransformer')
+    def test_retrieve_multi_query_fallback(self, mock_sentence_transformer, mock_load_index, monkeypatch):
+        """Test retrieval when the paraphraser cannot be built."""
         # Mock sentence transformer
         mock_model = Mock()
         mock_model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
@@ -152,16 +199,40 @@ class TestRetrieve:
         mock_load_index.return_value = (mock_index, mock_metadata, mock_chunks)
         
         # Mock paraphrasing to fail
-        with patch('rag.retrieval.pipeline', side_effect=Exception("Paraphrasing failed")), \
-             patch.dict(os.environ, {'TOP_K_RESULTS': '5'}):
+        registry = ModelRegistry(warmup=False)
+        monkeypatch.setattr('rag.retrieval.model_registry', registry)
+        with patch('rag.models.pipeline', side_effect=Exception("Paraphrasing failed")):
+            registry.start_paraphraser_loading().join()
+        
+        with patch.dict(os.environ, {'TOP_K_RESULTS': '5'}):
             results = retrieve("test query", top_k=2, multi_query=True)
         
         # Should still work with single query
         assert len(results) == 2
+        assert results.info['expansion']['expanded'] is False
+        assert results.info['expansion']['fallback_reason'] == 'paraphraser_unavailable'
         mock_index.search.assert_called_once()  # Called only once for original query
     
     @patch('rag.retrieval.load_index_and_metadata')
-    @patch('rag.retrieval.SentenceTransformer')
+    @patch('rag.models.SentenceTransformer')
+    def test_retrieve_paraphraser_not_ready(self, mock_sentence_transformer, mock_load_index, fresh_model_registry):
+        """Test that retrieval does not wait for a paraphraser that is still loading."""
+        mock_model = Mock()
+        mock_model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        mock_sentence_transformer.return_value = mock_model
+        
+        mock_index = Mock()
+        mock_index.search.return_value = (np.array([[0.1]]), np.array([[0]]))
+        mock_load_index.return_value = (mock_index, [{'file': 'doc1.md', 'chunk_id': 0}], ['chunk 1 content'])
+        
+        with patch.object(fresh_model_registry, '_paraphraser_state', 'loading'):
+            results = retrieve("test query", top_k=1, multi_query=True)
+        
+        assert results.info['expansion']['fallback_reason'] == 'paraphraser_not_ready'
+        mock_index.search.assert_called_once()
+    
+    @patch('rag.retrieval.load_index_and_metadata')
+    @patch('rag.models.SentenceTransformer')
     def test_retrieve_deduplication(self, mock_sentence_transformer, mock_load_index):
         """Test that duplicate results are removed."""
         # Mock sentence transformer
@@ -189,7 +260,7 @@ class TestRetrieve:
         assert results[1]['metadata']['file'] == 'doc2.md'
     
     @patch('rag.retrieval.load_index_and_metadata')
-    @patch('rag.retrieval.SentenceTransformer')
+    @patch('rag.models.SentenceTransformer')
     def test_retrieve_empty_results(self, mock_sentence_transformer, mock_load_index):
         """Test retrieval when no results are found."""
         # Mock sentence transformer
@@ -210,7 +281,7 @@ class TestRetrieve:
         assert results == []
     
     @patch('rag.retrieval.load_index_and_metadata')
-    @patch('rag.retrieval.SentenceTransformer')
+    @patch('rag.models.SentenceTransformer')
     def test_retrieve_respects_top_k(self, mock_sentence_transformer, mock_load_index):
         """Test that retrieval respects the top_k parameter."""
         # Mock sentence transformer
@@ -237,7 +308,7 @@ class TestRetrieve:
         assert len(results) == 3  # Should respect top_k=3
     
     @patch('rag.retrieval.load_index_and_metadata')
-    @patch('rag.retrieval.SentenceTransformer')
+    @patch('rag.models.SentenceTransformer')
     def test_retrieve_environment_variables(self, mock_sentence_transformer, mock_load_index):
         """Test that environment variables are used correctly."""
         # Mock sentence transformer
@@ -274,7 +345,7 @@ class TestRetrieveEdgeCases:
             retrieve("test query")
     
     @patch('rag.retrieval.load_index_and_metadata')
-    @patch('rag.retrieval.SentenceTransformer')
+    @patch('rag.models.SentenceTransformer')
     def test_retrieve_encoding_error(self, mock_sentence_transformer, mock_load_index):
         """Test handling of encoding errors."""
         mock_model = Mock()
@@ -290,7 +361,7 @@ class TestRetrieveEdgeCases:
             retrieve("test query")
     
     @patch('rag.retrieval.load_index_and_metadata')
-    @patch('rag.retrieval.SentenceTransformer')
+    @patch('rag.models.SentenceTransformer')
     def test_retrieve_search_error(self, mock_sentence_transformer, mock_load_index):
         """Test handling of FAISS search errors."""
         mock_model = Mock()
@@ -304,4 +375,308 @@ class TestRetrieveEdgeCases:
         mock_load_index.return_value = (mock_index, mock_metadata, mock_chunks)
         
         with pytest.raises(Exception, match="Search failed"):
-            retrieve("test query") 
\ No newline at end of file
+            retrieve("test query") 
+
+class TestRetrieveEmbeddingCache:
+    """Test cases for the query embedding cache in retrieve()."""
+    
+    @patch('rag.retrieval.load_index_and_metadata')
+    @patch('rag.models.SentenceTransformer')
+    def test_repeated_query_is_not_re_encoded(self, mock_sentence_transformer, mock_load_index,
+                                               fresh_query_embedding_cache):
+        """Equivalent phrasings of a query share one cached embedding."""
+        mock_model = Mock()
+        mock_model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        mock_sentence_transformer.return_value = mock_model
+        
+        mock_index = Mock()
+        mock_index.search.return_value = (np.array([[0.1]]), np.array([[0]]))
+        mock_load_index.return_value = (mock_index, [{'file': 'doc1.md', 'chunk_id': 0}], ['chunk 1 content'])
+        
+        retrieve("How do I negotiate salary?", top_k=1, multi_query=False)
+        results = retrieve("  how do i NEGOTIATE salary ", top_k=1, multi_query=False)
+        
+        mock_model.encode.assert_called_once()
+        assert results.info['embedding_cache_hits'] == 1
+        assert fresh_query_embedding_cache.stats()['hits'] == 1
+        assert fresh_query_embedding_cache.stats()['misses'] == 1
+
+
+class TestHybridRetrieval:
+    """Test cases for hybrid and lexical retrieval modes."""
+    
+    CHUNKS = ['Use the STAR method for behavioral questions.', 'Tailor your resume to the job.']
+    METADATA = [{'file': 'interview.md', 'chunk_id': 0}, {'file': 'resume.md', 'chunk_id': 0}]
+    
+    @pytest.fixture
+    def lexical_index(self):
+        from rag.bm25 import BM25Index
+        with patch('rag.retrieval.load_bm25_index', return_value=BM25Index.build(self.CHUNKS)):
+            yield
+    
+    @pytest.fixture
+    def dense_index(self):
+        mock_index = Mock()
+        # Dense search ranks the resume chunk first
+        mock_index.search.return_value = (np.array([[0.1, 0.9]]), np.array([[1, 0]]))
+        with patch('rag.retrieval.load_index_and_metadata',
+                   return_value=(mock_index, self.METADATA, self.CHUNKS)):
+            yield mock_index
+    
+    @patch('rag.models.SentenceTransformer')
+    def test_hybrid_fuses_rankings(self, mock_sentence_transformer, dense_index, lexical_index):
+        """A keyword match ranked low by the dense index is promoted by BM25."""
+        mock_sentence_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        
+        results = retrieve("STAR method", top_k=2, multi_query=False, mode='hybrid')
+        
+        assert results.info['mode'] == 'hybrid'
+        assert results.info['score_type'] == 'rrf'
+        assert results[0]['metadata'] == {'file': 'interview.md', 'chunk_id': 0}
+        assert results[0]['score'] > results[1]['score']
+        assert results[0]['query'] == "STAR method"
+    
+    @patch('rag.models.SentenceTransformer')
+    def test_lexical_mode_skips_embedding_model(self, mock_sentence_transformer, dense_index, lexical_index):
+        """Lexical mode answers from BM25 alone."""
+        results = retrieve("STAR method", top_k=2, mode='lexical')
+        
+        mock_sentence_transformer.assert_not_called()
+        dense_index.search.assert_not_called()
+        assert results.info['score_type'] == 'bm25'
+        assert [r['chunk'] for r in results] == [self.CHUNKS[0]]
+    
+    @patch('rag.models.SentenceTransformer')
+    def test_falls_back_to_lexical_while_model_loads(self, mock_sentence_transformer, dense_index,
+                                                     lexical_index, fresh_model_registry, monkeypatch):
+        """Requests do not wait for a background embedding model load."""
+        monkeypatch.setattr(fresh_model_registry, 'embedding_model_loading', lambda name=None: True)
+        
+        results = retrieve("STAR method", top_k=2, mode='hybrid')
+        
+        mock_sentence_transformer.assert_not_called()
+        assert results.info['mode'] == 'lexical'
+        assert results.info['requested_mode'] == 'hybrid'
+        assert results.info['mode_fallback_reason'] == 'embedding_model_loading'
+    
+    @patch('rag.models.SentenceTransformer')
+    def test_hybrid_without_lexical_index_uses_dense(self, mock_sentence_transformer, dense_index):
+        """Indexes built before BM25 keep working in dense mode."""
+        mock_sentence_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        
+        with patch('rag.retrieval.load_bm25_index', return_value=None):
+            results = retrieve("STAR method", top_k=2, multi_query=False, mode='hybrid')
+        
+        assert results.info['mode'] == 'dense'
+        assert results.info['mode_fallback_reason'] == 'no_lexical_index'
+        assert results[0]['chunk'] == self.CHUNKS[1]
+    
+    def test_unknown_mode_raises(self, dense_index):
+        with pytest.raises(ValueError):
+            retrieve("STAR method", mode='semantic')
+
+
+class TestRetrieveRerank:
+    """Test cases for the cross-encoder stage in retrieve()."""
+    
+    @patch('rag.retrieval.load_index_and_metadata')
+    @patch('rag.models.SentenceTransformer')
+    def test_rerank_rescores_candidates(self, mock_sentence_transformer, mock_load_index, monkeypatch):
+        """More candidates than top_k are fetched and reordered by the reranker."""
+        from rag.rerank import Reranker
+        mock_sentence_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        mock_index = Mock()
+        mock_index.search.return_value = (np.array([[0.1, 0.2]]), np.array([[0, 1]]))
+        mock_load_index.return_value = (
+            mock_index,
+            [{'file': 'doc1.md', 'chunk_id': 0}, {'file': 'doc2.md', 'chunk_id': 0}],
+            ['chunk 1 content', 'chunk 2 content'],
+        )
+        cross_encoder = Mock()
+        cross_encoder.predict.side_effect = lambda pairs, **kwargs: [0.0, 1.0]
+        with patch('sentence_transformers.CrossEncoder', return_value=cross_encoder):
+            reranker = Reranker(enabled=True)
+            reranker.start_loading().join(timeout=5)
+        monkeypatch.setattr('rag.retrieval.reranker', reranker)
+        
+        results = retrieve("test query", top_k=1, multi_query=False)
+        
+        assert mock_index.search.call_args[0][1] == 20  # RERANK_CANDIDATES
+        assert [r['chunk'] for r in results] == ['chunk 2 content']
+        assert results.info['rerank']['reranked'] is True
+
+
+class TestRetrieveResultCache:
+    """Test cases for the retrieval result cache in retrieve()."""
+    
+    @pytest.fixture
+    def result_cache(self, monkeypatch):
+        cache = ResultCache(max_entries=16, ttl_seconds=60)
+        monkeypatch.setattr('rag.retrieval.result_cache', cache)
+        return cache
+    
+    @pytest.fixture
+    def mock_index(self):
+        mock_index = Mock()
+        mock_index.search.return_value = (np.array([[0.1]]), np.array([[0]]))
+        with patch('rag.retrieval.load_index_and_metadata',
+                   return_value=(mock_index, [{'file': 'doc1.md', 'chunk_id': 0}], ['chunk 1 content'])):
+            yield mock_index
+    
+    @patch('rag.models.SentenceTransformer')
+    def test_repeated_query_served_from_cache(self, mock_sentence_transformer, mock_index, result_cache):
+        mock_sentence_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        
+        first = retrieve("How do I negotiate salary?", top_k=1, multi_query=False)
+        first[0]['chunk'] = 'mutated by caller'
+        first[0]['metadata']['file'] = 'mutated.md'
+        first.info['expansion']['fallback_reason'] = 'mutated'
+        second = retrieve("how do i negotiate salary", top_k=1, multi_query=False)
+        second[0]['metadata']['file'] = 'mutated again.md'
+        third = retrieve("how do i negotiate salary", top_k=1, multi_query=False)
+        
+        mock_index.search.assert_called_once()
+        assert first.info['result_cache'] == 'miss'
+        assert second.info['result_cache'] == 'hit'
+        assert second[0]['chunk'] == 'chunk 1 content'
+        assert third[0]['metadata']['file'] == 'doc1.md'
+        assert third.info['expansion']['fallback_reason'] != 'mutated'
+        assert result_cache.stats()['hits'] == 2
+    
+    @patch('rag.models.SentenceTransformer')
+    def test_options_are_part_of_the_key(self, mock_sentence_transformer, mock_index, result_cache):
+        mock_sentence_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        
+        retrieve("test query", top_k=1, multi_query=False)
+        retrieve("test query", top_k=2, multi_query=False)
+        retrieve("test query", top_k=1, multi_query=True)
+        
+        assert mock_index.search.call_count == 3
+    
+    @patch('rag.models.SentenceTransformer')
+    def test_new_index_version_misses(self, mock_sentence_transformer, mock_index, result_cache, monkeypatch):
+        mock_sentence_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        
+        retrieve("test query", top_k=1, multi_query=False)
+        monkeypatch.setattr(IndexStore, '_version_of', staticmethod(lambda fingerprint: 'rebuilt'))
+        index_store.reload()
+        results = retrieve("test query", top_k=1, multi_query=False)
+        
+        assert results.info['result_cache'] == 'miss'
+        assert mock_index.search.call_count == 2
+    
+    @patch('rag.models.SentenceTransformer')
+    def test_transient_fallbacks_are_not_cached(self, mock_sentence_transformer, mock_index, result_cache,
+                                                fresh_model_registry, monkeypatch):
+        """Results computed while the paraphraser loads are not pinned for the TTL."""
+        mock_sentence_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        monkeypatch.setattr(fresh_model_registry, 'paraphrase',
+                            lambda query, budget_ms: ([], {"expanded": False, "fallback_reason": 'paraphraser_not_ready'}))
+        
+        retrieve("test query", top_k=1)
+        results = retrieve("test query", top_k=1)
+        
+        assert results.info['result_cache'] == 'miss'
+    
+    @patch('rag.models.SentenceTransformer')
+    def test_use_cache_false_bypasses(self, mock_sentence_transformer, mock_index, result_cache):
+        mock_sentence_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        
+        retrieve("test query", top_k=1, multi_query=False)
+        results = retrieve("test query", top_k=1, multi_query=False, use_cache=False)
+        
+        assert results.info['result_cache'] == 'bypass'
+        assert mock_index.search.call_count == 2
+
+
+class TestAsyncRetrieve:
+    """Test cases for aretrieve()."""
+    
+    @pytest.mark.asyncio
+    async def test_runs_on_retrieval_executor(self):
+        """aretrieve() forwards its arguments and runs off the event loop thread."""
+        import threading
+        from rag.retrieval import aretrieve
+        calls = []
+        
+        def fake_retrieve(query, top_k, **kwargs):
+            calls.append((query, top_k, kwargs, threading.current_thread().name))
+            return ['result']
+        
+        with patch('rag.retrieval.retrieve', side_effect=fake_retrieve):
+            results = await aretrieve("test query", 3, multi_query=False)
+        
+        assert results == ['result']
+        query, top_k, kwargs, thread_name = calls[0]
+        assert (query, top_k, kwargs) == ("test query", 3, {'multi_query': False})
+        assert thread_name.startswith('retrieval')
+
+
+class TestMergeSearchResults:
+    """Test cases for the vectorized multi-query merge."""
+    
+    def test_merge_keeps_best_distance_per_chunk(self):
+        """Each chunk appears once, with its best distance and source row."""
+        from rag.retrieval import merge_search_results
+        D = np.array([[0.5, 0.9], [0.2, 0.6]], dtype='float32')
+        I = np.array([[3, 7], [7, 1]])
+        
+        ids, dists, rows = merge_search_results(D, I)
+        
+        assert ids.tolist() == [7, 3, 1]
+        assert dists.tolist() == pytest.approx([0.2, 0.5, 0.6])
+        assert rows.tolist() == [1, 0, 1]
+    
+    def test_merge_ignores_padding(self):
+        """FAISS -1 padding is dropped."""
+        from rag.retrieval import merge_search_results
+        D = np.array([[0.1, 3.4e38]], dtype='float32')
+        I = np.array([[0, -1]])
+        
+        ids, _, _ = merge_search_results(D, I)
+        
+        assert ids.tolist() == [0]
+
+
+class TestColumnarStore:
+    """Test cases for loading the memory-mapped chunk store."""
+    
+    def test_load_prefers_columnar_store(self, tmp_path):
+        """The columnar files are memory-mapped instead of unpickling."""
+        from rag.storage import write_chunk_store
+        import faiss
+        vectors = np.random.default_rng(0).standard_normal((2, 4)).astype('float32')
+        index = faiss.IndexFlatL2(4)
+        index.add(vectors)
+        faiss.write_index(index, str(tmp_path / 'faiss.index'))
+        write_chunk_store(str(tmp_path), ['chunk 1 content', 'chunk 2 content'],
+                          [{'file': 'doc1.md', 'chunk_id': 0}, {'file': 'doc2.md', 'chunk_id': 0}])
+        
+        with patch('pickle.load') as mock_pickle_load:
+            index, metadata, chunks = load_index_and_metadata(str(tmp_path))
+        
+        mock_pickle_load.assert_not_called()
+        assert index.ntotal == 2
+        assert chunks[1] == 'chunk 2 content'
+        assert metadata[1] == {'file': 'doc2.md', 'chunk_id': 0}
+
+
+class TestCite:
+    """Test cases for source citations."""
+
+    def test_file_page_and_section(self):
+        from rag.retrieval import cite
+        assert cite({'file': 'handbook.pdf', 'chunk_id': 3, 'page': 12, 'section': 'Offers'}) == \
+            'handbook.pdf, p. 12, Offers'
+
+    def test_lists_files_of_folded_duplicates(self):
+        from rag.retrieval import cite
+        metadata = {'file': 'networking_strategies.md', 'chunk_id': 2, 'also_in': [
+            {'file': 'job_search_strategies.md', 'chunk_id': 5},
+            {'file': 'networking_strategies.md', 'chunk_id': 9},
+            {'file': 'job_search_strategies.md', 'chunk_id': 6},
+            {'file': 'personal_branding_guide.md', 'chunk_id': 1},
+        ]}
+
+        assert cite(metadata) == ('networking_strategies.md '
+                                  '(also in job_search_strategies.md, personal_branding_guide.md)')
@@ -0,0 +1,178 @@
+"""
+Unit tests for the cross-encoder reranker.
+"""
+
+import time
+import threading
+import pytest
+from unittest.mock import Mock, patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.rerank import Reranker
+
+
+CANDIDATES = [
+    {'chunk': 'chunk a', 'metadata': {'file': 'a.md', 'chunk_id': 0}, 'score': 0.1},
+    {'chunk': 'chunk b', 'metadata': {'file': 'b.md', 'chunk_id': 0}, 'score': 0.2},
+    {'chunk': 'chunk c', 'metadata': {'file': 'c.md', 'chunk_id': 1}, 'score': 0.3},
+]
+
+
+def _ready_reranker(predict, **kwargs):
+    model = Mock()
+    model.predict.side_effect = predict
+    with patch('sentence_transformers.CrossEncoder', return_value=model):
+        reranker = Reranker(enabled=True, **kwargs)
+        reranker.start_loading().join(timeout=5)
+    return reranker, model
+
+
+def _by_chunk(scores):
+    return lambda pairs, **kwargs: [scores[chunk] for _, chunk in pairs]
+
+
+class TestReranker:
+    """Test cases for Reranker."""
+
+    def test_disabled_is_not_loaded_at_startup(self):
+        reranker = Reranker(enabled=False)
+
+        assert reranker.start_loading() is None
+        assert reranker.state == 'disabled'
+
+    def test_explicit_request_loads_disabled_reranker(self):
+        model = Mock()
+        model.predict.side_effect = _by_chunk({'chunk a': 0.1, 'chunk b': 0.9, 'chunk c': 0.5})
+        loaded = threading.Event()
+
+        def load(name):
+            loaded.wait(timeout=5)
+            return model
+
+        with patch('sentence_transformers.CrossEncoder', side_effect=load):
+            reranker = Reranker(enabled=False)
+            results, info = reranker.rerank("query", CANDIDATES, top_k=2)
+            assert results == CANDIDATES[:2]
+            assert info['fallback_reason'] == 'reranker_not_ready'
+            loaded.set()
+            deadline = time.monotonic() + 5
+            while reranker.state != 'ready' and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        results, info = reranker.rerank("query", CANDIDATES, top_k=2)
+
+        assert info['reranked'] is True
+        assert [r['chunk'] for r in results] == ['chunk b', 'chunk c']
+
+    def test_reorders_in_one_batch(self):
+        reranker, model = _ready_reranker(_by_chunk({'chunk a': 0.1, 'chunk b': 0.9, 'chunk c': 0.5}))
+
+        results, info = reranker.rerank("query", CANDIDATES, top_k=2)
+
+        assert [r['chunk'] for r in results] == ['chunk b', 'chunk c']
+        assert results[0]['rerank_score'] == pytest.approx(0.9)
+        assert results[0]['score'] == 0.2  # first-stage score is kept
+        assert info['reranked'] is True
+        model.predict.assert_called_once()
+        assert len(model.predict.call_args[0][0]) == 3
+
+    def test_repeated_query_uses_cached_scores(self):
+        reranker, model = _ready_reranker(_by_chunk({'chunk a': 0.1, 'chunk b': 0.9, 'chunk c': 0.5}))
+
+        reranker.rerank("How do I negotiate?", CANDIDATES, top_k=2)
+        results, info = reranker.rerank("how do i negotiate", CANDIDATES, top_k=2)
+
+        model.predict.assert_called_once()
+        assert info['cache_hits'] == 3
+        assert [r['chunk'] for r in results] == ['chunk b', 'chunk c']
+
+    def test_only_uncached_pairs_are_scored(self):
+        reranker, model = _ready_reranker(_by_chunk({'chunk a': 0.1, 'chunk b': 0.9, 'chunk c': 0.5}))
+
+        reranker.rerank("query", CANDIDATES[:2], top_k=2)
+        reranker.rerank("query", CANDIDATES, top_k=2)
+
+        assert [chunk for _, chunk in model.predict.call_args[0][0]] == ['chunk c']
+
+    def test_new_index_version_drops_cache(self):
+        reranker, model = _ready_reranker(_by_chunk({'chunk a': 0.1, 'chunk b': 0.9, 'chunk c': 0.5}))
+
+        reranker.rerank("query", CANDIDATES, top_k=2, version=1)
+        reranker.rerank("query", CANDIDATES, top_k=2, version=2)
+
+        assert model.predict.call_count == 2
+
+    def test_over_time_cap_keeps_bi_encoder_order(self):
+        release = threading.Event()
+
+        def slow_predict(pairs, **kwargs):
+            release.wait(timeout=5)
+            return [1.0] * len(pairs)
+
+        reranker, _ = _ready_reranker(slow_predict, time_cap_ms=20)
+
+        results, info = reranker.rerank("query", CANDIDATES, top_k=2)
+        release.set()
+
+        assert results == CANDIDATES[:2]
+        assert info['fallback_reason'] == 'over_time_cap'
+        assert reranker.stats()['timeouts'] == 1
+
+    def test_batches_do_not_queue_behind_an_overrun(self):
+        release = threading.Event()
+
+        def slow_predict(pairs, **kwargs):
+            release.wait(timeout=5)
+            return [1.0] * len(pairs)
+
+        reranker, model = _ready_reranker(slow_predict, time_cap_ms=20)
+        reranker.rerank("first", CANDIDATES, top_k=2)
+
+        start = time.perf_counter()
+        results, info = reranker.rerank("second", CANDIDATES, top_k=2)
+
+        assert time.perf_counter() - start < 0.02
+        assert results == CANDIDATES[:2]
+        assert info['fallback_reason'] == 'reranker_busy'
+        assert model.predict.call_count == 1
+        release.set()
+        deadline = time.monotonic() + 5
+        while reranker.stats()['cached_scores'] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        model.predict.side_effect = _by_chunk({'chunk a': 0.1, 'chunk b': 0.9, 'chunk c': 0.5})
+        assert reranker.rerank("second", CANDIDATES, top_k=2)[1]['reranked'] is True
+
+    def test_late_scores_are_cached(self):
+        release = threading.Event()
+
+        def slow_predict(pairs, **kwargs):
+            release.wait(timeout=5)
+            return [float(i) for i in range(len(pairs))]
+
+        reranker, model = _ready_reranker(slow_predict, time_cap_ms=20)
+        reranker.rerank("query", CANDIDATES, top_k=2)
+        release.set()
+        deadline = time.monotonic() + 5
+        while reranker.stats()['cached_scores'] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        results, info = reranker.rerank("query", CANDIDATES, top_k=2)
+
+        assert info['reranked'] is True
+        assert info['cache_hits'] == 3
+        assert [r['chunk'] for r in results] == ['chunk c', 'chunk b']
+
+    def test_load_failure_is_reported(self):
+        with patch('sentence_transformers.CrossEncoder', side_effect=OSError("model not found")):
+            reranker = Reranker(enabled=True)
+            reranker.start_loading().join(timeout=5)
+
+        results, info = reranker.rerank("query", CANDIDATES, top_k=2)
+
+        assert results == CANDIDATES[:2]
+        assert info['fallback_reason'] == 'reranker_unavailable'
+        assert 'model not found' in reranker.stats()['error']
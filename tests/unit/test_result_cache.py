@@ -0,0 +1,138 @@
+"""
+Unit tests for the retrieval result cache.
+"""
+
+import time
+import types
+from unittest.mock import patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.result_cache import ResultCache, make_key
+
+
+VALUE = {"results": [{"chunk": "chunk 1 content"}], "info": {"mode": "dense"}}
+
+
+class _FakeRedis:
+    """Just enough of redis.Redis for the result cache."""
+
+    def __init__(self):
+        self.data = {}
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        return cls()
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        return self.data.get(key.encode('utf-8'))
+
+    def set(self, key, value, px=None):
+        self.data[key.encode('utf-8')] = value.encode('utf-8')
+
+    def scan_iter(self, match, count=None):
+        prefix = match.rstrip('*').encode('utf-8')
+        return iter([k for k in list(self.data) if k.startswith(prefix)])
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class TestMakeKey:
+    """Test cases for cache keys."""
+
+    def test_normalizes_query(self):
+        assert make_key("How do I negotiate?", 3, 'v1') == make_key("  how do i NEGOTIATE ", 3, 'v1')
+
+    def test_options_and_version_change_the_key(self):
+        base = make_key("query", 3, 'v1', multi_query=True)
+        assert base != make_key("query", 3, 'v2', multi_query=True)
+        assert base != make_key("query", 3, 'v1', multi_query=False)
+        assert base != make_key("query", 5, 'v1', multi_query=True)
+
+    def test_option_order_does_not_matter(self):
+        assert make_key("q", 3, 'v1', a=1, b=2) == make_key("q", 3, 'v1', b=2, a=1)
+
+
+class TestResultCache:
+    """Test cases for ResultCache with the in-process backend."""
+
+    def test_hit_after_set(self):
+        cache = ResultCache(max_entries=4, ttl_seconds=60)
+        key = make_key("query", 3, 'v1')
+
+        assert cache.get(key) is None
+        cache.set(key, VALUE)
+
+        assert cache.get(key) == VALUE
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_entries_expire(self):
+        cache = ResultCache(max_entries=4, ttl_seconds=0.01)
+        key = make_key("query", 3, 'v1')
+        cache.set(key, VALUE)
+
+        time.sleep(0.02)
+
+        assert cache.get(key) is None
+
+    def test_lru_eviction(self):
+        cache = ResultCache(max_entries=2, ttl_seconds=60)
+        keys = [make_key(f"query {i}", 3, 'v1') for i in range(3)]
+        cache.set(keys[0], VALUE)
+        cache.set(keys[1], VALUE)
+        cache.get(keys[0])  # keys[1] is now least recently used
+        cache.set(keys[2], VALUE)
+
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) == VALUE
+        assert cache.stats()['evictions'] == 1
+
+    def test_new_index_version_drops_old_entries(self):
+        cache = ResultCache(max_entries=4, ttl_seconds=60)
+        old = make_key("query", 3, 'v1')
+        cache.get(old)
+        cache.set(old, VALUE)
+
+        cache.get(make_key("query", 3, 'v2'))
+
+        assert cache.stats()['entries'] == 0
+        assert cache.stats()['index_version'] == 'v2'
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = ResultCache(max_entries=0)
+        key = make_key("query", 3, 'v1')
+        cache.set(key, VALUE)
+
+        assert cache.get(key) is None
+        assert cache.enabled is False
+
+    def test_redis_without_package_falls_back_to_memory(self):
+        with patch.dict(sys.modules, {'redis': None}):
+            cache = ResultCache(backend='redis')
+
+        assert cache.stats()['backend'] == 'memory'
+
+    def test_redis_new_index_version_deletes_old_namespaces(self):
+        with patch.dict(sys.modules, {'redis': types.SimpleNamespace(Redis=_FakeRedis)}):
+            cache = ResultCache(backend='redis', ttl_seconds=60)
+        old, new = make_key("query", 3, 'v1'), make_key("query", 3, 'v2')
+        cache.get(old)
+        cache.backend._purge_thread.join(timeout=5)
+        cache.set(old, VALUE)
+
+        assert cache.get(new) is None
+        cache.backend._purge_thread.join(timeout=5)
+        cache.set(new, VALUE)
+
+        assert cache.stats()['backend'] == 'redis'
+        assert cache.get(new) == VALUE
+        assert list(cache.backend.client.data) == [cache.backend._redis_key(new).encode('utf-8')]
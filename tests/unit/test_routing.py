@@ -0,0 +1,193 @@
+"""
+Unit tests for document-centroid routing.
+"""
+
+import pytest
+from unittest.mock import Mock
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import faiss
+
+from rag.ann import build_index
+from rag.routing import (
+    DocumentRouter, RoutedIndex, RoutingTableBuilder, is_flat, measure_recall, routed_index, ROUTING_FILE,
+)
+
+DIM = 16
+
+
+def clustered(docs=12, chunks=10, seed=0):
+    """Vectors of docs well-separated documents and their (file, chunk_id) keys."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((docs, DIM)).astype('float32') * 5
+    vectors = np.repeat(centers, chunks, axis=0) + rng.standard_normal((docs * chunks, DIM)).astype('float32') * 0.3
+    keys = [(f"doc{d:02d}.md", c) for d in range(docs) for c in range(chunks)]
+    return vectors, keys
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    vectors, keys = clustered()
+    builder = RoutingTableBuilder(group_chunks=64)
+    builder.add(keys, vectors, range(len(vectors)))
+    builder.save(str(tmp_path), recall=0.95)
+    index, _ = build_index(vectors, 'flat', ids=np.arange(len(vectors), dtype='int64'))
+    return vectors, index, tmp_path
+
+
+class TestRoutingTableBuilder:
+    """Test cases for building, saving and reloading the routing table."""
+
+    def test_units_and_groups(self):
+        vectors, keys = clustered(docs=2, chunks=5)
+        builder = RoutingTableBuilder(group_chunks=3)
+        # Added in two batches, as the indexer would
+        builder.add(keys[:4], vectors[:4], range(4))
+        builder.add(keys[4:], vectors[4:], range(4, 10))
+
+        table = builder.table()
+        assert list(zip(table['files'].tolist(), table['parts'].tolist())) == [
+            ('doc00.md', 0), ('doc00.md', 1), ('doc01.md', 0), ('doc01.md', 1)]
+        assert table['offsets'].tolist() == [0, 3, 5, 8, 10]
+        assert table['ids'].tolist() == list(range(10))
+        np.testing.assert_allclose(table['sums'][1], vectors[3:5].sum(axis=0), rtol=1e-5)
+        assert table['sq_norms'][0] == pytest.approx(float((vectors[:3].astype(np.float64) ** 2).sum()))
+
+    def test_save_and_load_drops_files(self, tmp_path):
+        vectors, keys = clustered(docs=3, chunks=4)
+        builder = RoutingTableBuilder()
+        builder.add(keys, vectors, range(12))
+        builder.save(str(tmp_path), recall=0.5)
+
+        loaded = RoutingTableBuilder()
+        assert loaded.load(str(tmp_path), drop_files=['doc01.md'])
+        assert len(loaded) == 2
+        assert loaded.table()['ids'].tolist() == [0, 1, 2, 3, 8, 9, 10, 11]
+        assert DocumentRouter.load(str(tmp_path)).recall == 0.5
+
+    def test_load_missing_or_other_grouping(self, tmp_path):
+        assert not RoutingTableBuilder().load(str(tmp_path))
+        RoutingTableBuilder(group_chunks=8).save(str(tmp_path))
+        assert not RoutingTableBuilder(group_chunks=64).load(str(tmp_path))
+
+
+class TestDocumentRouter:
+    """Test cases for choosing units per query."""
+
+    def test_routes_to_nearest_documents(self, corpus):
+        vectors, _, path = corpus
+        router = DocumentRouter.load(str(path), top_m=2, min_gap=0.0)
+
+        ids = router.route(vectors[[25]])[0]
+
+        assert len(router) == 12
+        assert 25 in ids and len(ids) == 20
+        assert router.recall == 0.95
+
+    def test_unit_distances_are_mean_squared_distances(self, corpus):
+        vectors, _, path = corpus
+        router = DocumentRouter.load(str(path))
+        query = vectors[:1] + 1.0
+
+        expected = ((vectors[:10] - query) ** 2).sum(axis=1).mean()
+        assert router.unit_distances(query)[0, 0] == pytest.approx(expected, rel=1e-4)
+
+    def test_falls_back_when_no_unit_stands_out(self, corpus):
+        _, _, path = corpus
+        router = DocumentRouter.load(str(path), top_m=2, min_gap=3.0)
+        # Equidistant from every document
+        off_topic = np.zeros((1, DIM), dtype='float32')
+
+        assert router.route(off_topic) == [None]
+
+    def test_no_routing_with_few_units(self, corpus):
+        vectors, _, path = corpus
+        router = DocumentRouter.load(str(path), top_m=12, min_gap=0.0)
+
+        assert router.route(vectors[:2]) == [None, None]
+
+
+class TestRoutedIndex:
+    """Test cases for searching through the router."""
+
+    def test_matches_flat_search(self, corpus):
+        vectors, index, path = corpus
+        routed = RoutedIndex(index, DocumentRouter.load(str(path), top_m=2, min_gap=0.0))
+        queries = vectors[::7] + 0.01
+
+        D, I = routed.search(queries, 5)
+        expected_D, expected_I = index.search(queries, 5)
+
+        np.testing.assert_array_equal(I, expected_I)
+        np.testing.assert_allclose(D, expected_D, rtol=1e-4, atol=1e-4)
+        assert routed.routed == len(queries) and routed.full_scans == 0
+        assert routed.ntotal == 120
+
+    def test_full_scan_fallbacks(self, corpus):
+        vectors, index, path = corpus
+        routed = RoutedIndex(index, DocumentRouter.load(str(path), top_m=1, min_gap=3.0))
+        queries = np.vstack([vectors[:1], np.zeros((1, DIM), dtype='float32')])
+
+        # k larger than the routed unit, and an off-topic query
+        _, I = routed.search(queries, 15)
+
+        np.testing.assert_array_equal(I, index.search(queries, 15)[1])
+        assert routed.full_scans == 2
+        assert routed.stats()['full_scans'] == 2
+
+    def test_measure_recall(self, corpus):
+        _, index, path = corpus
+        router = DocumentRouter.load(str(path), top_m=2)
+
+        assert measure_recall(index, router) == 1.0
+
+    def test_measure_recall_leaves_out_the_query_chunk(self, tmp_path):
+        # Along one axis: doc0 at 0 and 10, doc1 at 10.1 and 20, so the chunks at 10 and 10.1
+        # are each other's nearest neighbour but each is routed to its own document only
+        vectors = np.zeros((4, DIM), dtype='float32')
+        vectors[:, 0] = [0, 10, 10.1, 20]
+        builder = RoutingTableBuilder(group_chunks=64)
+        builder.add([('doc0.md', 0), ('doc0.md', 1), ('doc1.md', 0), ('doc1.md', 1)], vectors, range(4))
+        builder.save(str(tmp_path))
+        index, _ = build_index(vectors, 'flat', ids=np.arange(4, dtype='int64'))
+        router = DocumentRouter.load(str(tmp_path), top_m=1)
+
+        assert measure_recall(index, router, k=1) == 0.5
+
+
+class TestRoutedIndexFactory:
+    """Test cases for deciding when to route."""
+
+    def test_modes(self, corpus):
+        _, index, path = corpus
+
+        assert isinstance(routed_index(index, str(path), mode='on'), RoutedIndex)
+        assert isinstance(routed_index(index, str(path), mode='auto', min_chunks=100), RoutedIndex)
+        assert routed_index(index, str(path), mode='auto', min_chunks=1000) is index
+        assert routed_index(index, str(path), mode='off') is index
+
+    def test_auto_needs_build_recall(self, corpus):
+        _, index, path = corpus
+
+        assert routed_index(index, str(path), mode='auto', min_chunks=0, min_recall=0.99) is index
+        RoutingTableBuilder().save(str(path))  # recall not measured
+        assert routed_index(index, str(path), mode='auto', min_chunks=0) is index
+
+    def test_without_table(self, corpus):
+        _, index, path = corpus
+        (path / ROUTING_FILE).unlink()
+
+        assert routed_index(index, str(path), mode='on') is index
+
+    def test_only_flat_indexes(self, corpus):
+        vectors, _, path = corpus
+        hnsw, _ = build_index(vectors, 'hnsw', ids=np.arange(len(vectors), dtype='int64'))
+
+        assert not is_flat(hnsw) and not is_flat(Mock())
+        assert routed_index(hnsw, str(path), mode='on') is hnsw
+        assert is_flat(faiss.IndexFlatL2(DIM))
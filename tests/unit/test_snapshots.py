@@ -0,0 +1,119 @@
+"""
+Unit tests for versioned index snapshots.
+"""
+
+import os
+import time
+import pytest
+from unittest.mock import patch
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.snapshots import (
+    active_version, active_path, list_versions, snapshot_info, create_snapshot, discard_snapshot,
+    publish_snapshot, prune_snapshots, rollback,
+)
+
+
+def _publish(root, chunks=1):
+    version, path = create_snapshot(str(root))
+    (Path(path) / 'faiss.index').write_text(version)
+    publish_snapshot(str(root), version, {'chunks': chunks})
+    return version
+
+
+class TestSnapshots:
+    """Test cases for creating, publishing and pruning snapshots."""
+
+    def test_unversioned_store_is_its_own_snapshot(self, tmp_path):
+        (tmp_path / 'faiss.index').write_text('legacy')
+
+        assert active_version(str(tmp_path)) is None
+        assert active_path(str(tmp_path)) == str(tmp_path)
+        assert snapshot_info(str(tmp_path))['built_at'] == pytest.approx(os.path.getmtime(tmp_path / 'faiss.index'))
+
+    def test_publish_switches_the_pointer(self, tmp_path):
+        first = _publish(tmp_path)
+        second = _publish(tmp_path, chunks=2)
+
+        assert active_version(str(tmp_path)) == second
+        assert list_versions(str(tmp_path)) == [first, second]
+        info = snapshot_info(active_path(str(tmp_path)))
+        assert info['chunks'] == 2 and info['previous'] == first and info['version'] == second
+        assert not (tmp_path / 'CURRENT.tmp').exists()
+
+    def test_versions_sort_in_build_order_within_a_second(self, tmp_path):
+        with patch('rag.snapshots.datetime') as mock_datetime:
+            mock_datetime.now.return_value.strftime.return_value = '20260101T000000'
+            versions = [_publish(tmp_path) for _ in range(3)]
+            prune_snapshots(str(tmp_path), keep=1)
+            versions.append(_publish(tmp_path))
+
+        assert versions == ['20260101T000000-000', '20260101T000000-001', '20260101T000000-002',
+                            '20260101T000000-003']
+
+    def test_unpublished_snapshot_is_not_listed_or_active(self, tmp_path):
+        published = _publish(tmp_path)
+        version, _ = create_snapshot(str(tmp_path))
+
+        assert list_versions(str(tmp_path)) == [published]
+        assert active_version(str(tmp_path)) == published
+
+        discard_snapshot(str(tmp_path), version)
+        assert os.listdir(tmp_path / 'versions') == [published]
+
+    def test_discarding_the_only_snapshot_leaves_nothing_behind(self, tmp_path):
+        version, _ = create_snapshot(str(tmp_path))
+        discard_snapshot(str(tmp_path), version)
+
+        assert os.listdir(tmp_path) == []
+
+    def test_prune_keeps_newest_and_active(self, tmp_path):
+        versions = [_publish(tmp_path) for _ in range(4)]
+        rollback(str(tmp_path), versions[0])
+        crashed, _ = create_snapshot(str(tmp_path))  # unfinished, newer than everything published
+        dead = tmp_path / 'versions' / '00000000T000000-000'  # unfinished, older, untouched for two hours
+        os.makedirs(dead)
+        (dead / 'chunks.bin').write_text('partial')
+        for path in (dead / 'chunks.bin', dead):
+            os.utime(path, (time.time() - 7200, time.time() - 7200))
+
+        pruned = prune_snapshots(str(tmp_path), keep=2)
+
+        assert pruned == [versions[1], '00000000T000000-000']
+        assert list_versions(str(tmp_path)) == [versions[0], versions[2], versions[3]]
+        assert (tmp_path / 'versions' / crashed).exists()
+
+    def test_prune_spares_a_build_still_writing(self, tmp_path):
+        running = tmp_path / 'versions' / '00000000T000000-000'  # started before the last publish
+        os.makedirs(running)
+        (running / 'chunks.bin').write_text('in progress')
+        os.utime(running, (time.time() - 7200, time.time() - 7200))  # only the file is recent
+        _publish(tmp_path)
+
+        assert prune_snapshots(str(tmp_path), keep=1, grace_seconds=3600) == []
+        assert running.exists()
+
+
+class TestRollback:
+    """Test cases for rollback."""
+
+    def test_rolls_back_to_previous(self, tmp_path):
+        versions = [_publish(tmp_path) for _ in range(3)]
+
+        assert rollback(str(tmp_path)) == versions[1]
+        assert rollback(str(tmp_path)) == versions[0]
+        assert active_version(str(tmp_path)) == versions[0]
+        with pytest.raises(ValueError, match="No snapshot older"):
+            rollback(str(tmp_path))
+
+    def test_rollback_to_named_version(self, tmp_path):
+        versions = [_publish(tmp_path) for _ in range(2)]
+        rollback(str(tmp_path), versions[0])
+
+        assert rollback(str(tmp_path), versions[1]) == versions[1]
+        with pytest.raises(ValueError, match="Unknown snapshot"):
+            rollback(str(tmp_path), 'nope')
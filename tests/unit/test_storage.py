@@ -0,0 +1,194 @@
+"""
+Unit tests for the columnar chunk store.
+"""
+
+import os
+import pickle
+import pytest
+import numpy as np
+import faiss
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.storage import (
+    write_chunk_store, load_chunk_store, has_chunk_store, migrate_pickles, migrate_snapshot, read_index,
+    ChunkStoreWriter,
+)
+from rag.snapshots import active_path, active_version, create_snapshot, publish_snapshot, snapshot_info
+
+
+CHUNKS = ['First chunk about résumés', '', 'Third chunk — networking tips']
+METADATA = [
+    {'file': 'resume_writing_guide.md', 'chunk_id': 0},
+    {'file': 'resume_writing_guide.md', 'chunk_id': 1},
+    {'file': 'networking_strategies.md', 'chunk_id': 0},
+]
+
+
+class TestChunkStore:
+    """Test cases for writing and memory-mapping chunks."""
+
+    def test_round_trip(self, tmp_path):
+        write_chunk_store(str(tmp_path), CHUNKS, METADATA)
+
+        assert has_chunk_store(str(tmp_path))
+        metadata, chunks = load_chunk_store(str(tmp_path))
+
+        assert len(chunks) == 3
+        assert list(chunks) == CHUNKS
+        assert list(metadata) == METADATA
+        assert chunks[np.int64(2)] == CHUNKS[2]  # FAISS ids are numpy ints
+        assert chunks[-1] == CHUNKS[-1]
+
+    def test_extra_metadata_is_preserved(self, tmp_path):
+        metadata_in = [dict(m) for m in METADATA]
+        metadata_in[2]['page'] = 4
+        write_chunk_store(str(tmp_path), CHUNKS, metadata_in)
+
+        metadata, _ = load_chunk_store(str(tmp_path))
+
+        assert metadata[2] == {'file': 'networking_strategies.md', 'chunk_id': 0, 'page': 4}
+        assert metadata[0] == METADATA[0]
+
+    def test_duplicates_are_listed_on_their_representative(self, tmp_path):
+        metadata_in = [dict(m) for m in METADATA] + [
+            {'file': 'networking_strategies.md', 'chunk_id': 1, 'section': 'Events', 'duplicate_of': 0}]
+        write_chunk_store(str(tmp_path), CHUNKS + [CHUNKS[0]], metadata_in)
+
+        metadata, _ = load_chunk_store(str(tmp_path))
+
+        assert metadata[0]['also_in'] == [{'file': 'networking_strategies.md', 'chunk_id': 1, 'section': 'Events'}]
+        assert metadata[3]['duplicate_of'] == 0
+        assert metadata.duplicate_rows() == {3}
+        # Copying rows into a new store (as incremental builds do) does not persist the derived list
+        write_chunk_store(str(tmp_path), [CHUNKS[0]], [metadata[0]])
+        metadata, _ = load_chunk_store(str(tmp_path))
+        assert metadata[0] == METADATA[0]
+        assert not (tmp_path / 'chunk_duplicates.json').exists()
+
+    def test_out_of_range_raises(self, tmp_path):
+        write_chunk_store(str(tmp_path), CHUNKS, METADATA)
+        _, chunks = load_chunk_store(str(tmp_path))
+
+        with pytest.raises(IndexError):
+            chunks[3]
+
+    def test_length_mismatch_raises(self, tmp_path):
+        with pytest.raises(ValueError):
+            write_chunk_store(str(tmp_path), CHUNKS, METADATA[:2])
+
+    def test_reports_mapped_size(self, tmp_path):
+        write_chunk_store(str(tmp_path), CHUNKS, METADATA)
+        metadata, chunks = load_chunk_store(str(tmp_path))
+
+        assert chunks.nbytes >= sum(len(c.encode('utf-8')) for c in CHUNKS)
+        assert metadata.nbytes > 0
+
+
+class TestChunkStoreWriter:
+    """Test cases for writing the chunk store row by row."""
+
+    def test_rows_appear_only_on_close(self, tmp_path):
+        write_chunk_store(str(tmp_path), ['old'], [{'file': 'old.md', 'chunk_id': 0}])
+        writer = ChunkStoreWriter(str(tmp_path))
+        for chunk, meta in zip(CHUNKS, METADATA):
+            writer.append(chunk, meta)
+
+        assert list(load_chunk_store(str(tmp_path))[1]) == ['old']
+        writer.close()
+        metadata, chunks = load_chunk_store(str(tmp_path))
+        assert list(chunks) == CHUNKS
+        assert list(metadata) == METADATA
+        assert not list(tmp_path.glob('*.tmp'))
+
+    def test_error_keeps_previous_store(self, tmp_path):
+        write_chunk_store(str(tmp_path), CHUNKS, METADATA)
+
+        with pytest.raises(RuntimeError):
+            with ChunkStoreWriter(str(tmp_path)) as writer:
+                writer.append('partial', {'file': 'new.md', 'chunk_id': 0})
+                raise RuntimeError("embedding failed")
+
+        assert list(load_chunk_store(str(tmp_path))[1]) == CHUNKS
+        assert not list(tmp_path.glob('*.tmp'))
+
+
+class TestMigration:
+    """Test cases for converting pickles."""
+
+    def test_migrate_pickles(self, tmp_path):
+        with open(tmp_path / 'metadata.pkl', 'wb') as f:
+            pickle.dump(METADATA, f)
+        with open(tmp_path / 'chunks.pkl', 'wb') as f:
+            pickle.dump(CHUNKS, f)
+
+        count = migrate_pickles(str(tmp_path), remove=True)
+
+        assert count == 3
+        assert not (tmp_path / 'chunks.pkl').exists()
+        metadata, chunks = load_chunk_store(str(tmp_path))
+        assert list(chunks) == CHUNKS
+        assert list(metadata) == METADATA
+
+
+class TestMigrateSnapshot:
+    """Test cases for converting the active index into a new snapshot."""
+
+    @staticmethod
+    def _pickled(path):
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / 'metadata.pkl', 'wb') as f:
+            pickle.dump(METADATA, f)
+        with open(path / 'chunks.pkl', 'wb') as f:
+            pickle.dump(CHUNKS, f)
+        (path / 'faiss.index').write_bytes(b'index')
+
+    def test_published_snapshot_is_left_untouched(self, tmp_path):
+        old, old_path = create_snapshot(str(tmp_path))
+        self._pickled(Path(old_path))
+        publish_snapshot(str(tmp_path), old, {'files': 2})
+
+        version, count = migrate_snapshot(str(tmp_path))
+
+        assert count == 3 and version != old
+        assert active_version(str(tmp_path)) == version
+        assert sorted(os.listdir(old_path)) == ['chunks.pkl', 'faiss.index', 'metadata.pkl', 'snapshot.json']
+        new_path = active_path(str(tmp_path))
+        assert (Path(new_path) / 'faiss.index').read_bytes() == b'index'
+        assert not (Path(new_path) / 'chunks.pkl').exists()
+        metadata, chunks = load_chunk_store(new_path)
+        assert list(chunks) == CHUNKS and list(metadata) == METADATA
+        assert snapshot_info(new_path)['migrated_from'] == old
+
+    def test_unversioned_store(self, tmp_path):
+        self._pickled(tmp_path)
+
+        version, _ = migrate_snapshot(str(tmp_path), remove=True)
+
+        assert active_version(str(tmp_path)) == version
+        assert not (tmp_path / 'chunks.pkl').exists()
+        assert list(load_chunk_store(active_path(str(tmp_path)))[1]) == CHUNKS
+
+    def test_nothing_to_migrate(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            migrate_snapshot(str(tmp_path))
+        assert not (tmp_path / 'versions').exists()
+
+
+class TestReadIndex:
+    """Test cases for memory-mapped FAISS loading."""
+
+    def test_mmap_read_matches_in_memory(self, tmp_path):
+        vectors = np.random.default_rng(0).standard_normal((50, 8)).astype('float32')
+        index = faiss.IndexFlatL2(8)
+        index.add(vectors)
+        faiss.write_index(index, str(tmp_path / 'faiss.index'))
+
+        mapped = read_index(str(tmp_path / 'faiss.index'), use_mmap=True)
+
+        assert mapped.ntotal == 50
+        _, I = mapped.search(vectors[:2], 1)
+        assert I[:, 0].tolist() == [0, 1]
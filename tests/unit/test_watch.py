@@ -0,0 +1,186 @@
+"""
+Unit tests for the indexer's watch mode.
+"""
+
+import os
+import threading
+import pytest
+from pathlib import Path
+import sys
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from rag.watch import DocumentWatcher, IndexWatcher, describe_changes, merge_changes, watch
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _touch(path, text, mtime=None):
+    path.write_text(text)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+class TestDocumentWatcher:
+    """Test cases for detecting document changes."""
+
+    def test_created_modified_deleted(self, tmp_path):
+        _touch(tmp_path / 'a.md', 'a', mtime=1000)
+        _touch(tmp_path / 'b.md', 'b', mtime=1000)
+        watcher = DocumentWatcher(str(tmp_path))
+
+        assert watcher.poll() == {}
+
+        _touch(tmp_path / 'a.md', 'a', mtime=2000)  # same size, new mtime
+        (tmp_path / 'b.md').unlink()
+        _touch(tmp_path / 'c.md', 'c')
+
+        assert watcher.poll() == {'a.md': 'modified', 'b.md': 'deleted', 'c.md': 'created'}
+        assert watcher.poll() == {}
+
+    def test_ignores_unsupported_files(self, tmp_path):
+        watcher = DocumentWatcher(str(tmp_path))
+        _touch(tmp_path / 'notes.odt', 'x')
+        _touch(tmp_path / '.a.md.swp', 'x')
+
+        assert watcher.poll() == {}
+
+
+class TestMergeChanges:
+    """Test cases for folding changes into a pending burst."""
+
+    @pytest.mark.parametrize('before,after,expected', [
+        ('created', 'modified', {'a.md': 'created'}),
+        ('created', 'deleted', {}),
+        ('deleted', 'created', {'a.md': 'modified'}),
+        ('modified', 'deleted', {'a.md': 'deleted'}),
+        ('modified', 'modified', {'a.md': 'modified'}),
+    ])
+    def test_merge(self, before, after, expected):
+        assert merge_changes({'a.md': before}, {'a.md': after}) == expected
+
+    def test_describe(self):
+        assert describe_changes({'b.md': 'deleted', 'a.md': 'created', 'c.md': 'created'}) == \
+            'created a.md, c.md; deleted b.md'
+        assert describe_changes({}) == 'no document changes'
+
+
+class TestIndexWatcher:
+    """Test cases for debouncing and running refreshes."""
+
+    def _watcher(self, tmp_path, refresh, **kwargs):
+        clock = FakeClock()
+        settings = {'interval': 1.0, 'debounce': 2.0, 'max_delay': 10.0, **kwargs}
+        return IndexWatcher(str(tmp_path), refresh, clock=clock, sleep=lambda s: None, **settings), clock
+
+    def test_refreshes_once_burst_is_quiet(self, tmp_path):
+        refresh = []
+        watcher, clock = self._watcher(tmp_path, lambda: refresh.append(1) or 'v1')
+
+        _touch(tmp_path / 'a.md', 'a')
+        assert watcher.step() is None
+        clock.now += 1
+        _touch(tmp_path / 'b.md', 'b')
+        assert watcher.step() is None
+        clock.now += 1
+        assert watcher.step() is None  # quiet for 1s only
+        clock.now += 1
+
+        report = watcher.step()
+
+        assert refresh == [1]
+        assert report['version'] == 'v1'
+        assert report['changes'] == {'a.md': 'created', 'b.md': 'created'}
+        assert report['end_to_end_seconds'] == 3.0
+        assert watcher.pending == {}
+        assert watcher.step() is None
+
+    def test_max_delay_during_continuous_edits(self, tmp_path):
+        refresh = []
+        watcher, clock = self._watcher(tmp_path, lambda: refresh.append(1) or 'v1', max_delay=5.0)
+
+        for i in range(6):
+            _touch(tmp_path / 'a.md', 'a' * (i + 1))
+            report = watcher.step()
+            clock.now += 1
+
+        assert refresh == [1]
+        assert report['end_to_end_seconds'] == 5.0
+
+    def test_changes_that_cancel_out_do_not_refresh(self, tmp_path):
+        refresh = []
+        watcher, clock = self._watcher(tmp_path, lambda: refresh.append(1))
+
+        _touch(tmp_path / 'a.md', 'a')
+        watcher.step()
+        (tmp_path / 'a.md').unlink()
+        watcher.step()
+        clock.now += 5
+
+        assert watcher.step() is None
+        assert refresh == []
+
+    def test_failed_refresh_is_retried_with_backoff(self, tmp_path):
+        outcomes = [RuntimeError('disk full'), RuntimeError('disk full'), 'v1']
+
+        def refresh():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        watcher, clock = self._watcher(tmp_path, refresh)
+        _touch(tmp_path / 'a.md', 'a')
+        watcher.step()
+        clock.now += 2
+
+        assert watcher.step() == {'changes': {'a.md': 'created'}, 'error': 'disk full'}
+        clock.now += 3
+        assert watcher.step() is None  # backing off for 4s
+        clock.now += 1
+        assert 'error' in watcher.step()
+        clock.now += 7
+        assert watcher.step() is None  # backing off for 8s
+        clock.now += 1
+
+        assert watcher.step()['version'] == 'v1'
+        assert watcher.failed_refreshes == 2
+        assert watcher.refreshes == 1
+
+    def test_run_stops_on_event(self, tmp_path):
+        stop = threading.Event()
+        polls = []
+        watcher = IndexWatcher(str(tmp_path), lambda: None, interval=0.0,
+                               sleep=lambda s: polls.append(s) or (len(polls) == 3 and stop.set()))
+
+        watcher.run(stop)
+
+        assert len(polls) == 3
+
+
+class TestWatch:
+    """Test cases for the watch entry point."""
+
+    def test_initial_refresh_then_watch(self, tmp_path):
+        calls = []
+        stop = threading.Event()
+        stop.set()
+
+        watcher = watch(str(tmp_path), lambda: calls.append(1) or 'v1', stop=stop)
+
+        assert calls == [1]
+        assert watcher.refreshes == 0
+
+    def test_initial_refresh_failure_is_raised(self, tmp_path):
+        def refresh():
+            raise ValueError('No chunks')
+
+        with pytest.raises(ValueError, match='No chunks'):
+            watch(str(tmp_path), refresh, stop=threading.Event())